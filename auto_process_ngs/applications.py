@@ -452,7 +452,7 @@ class general:
 
     @staticmethod
     def rsync(source,target,dry_run=False,mirror=False,chmod=None,
-              prune_empty_dirs=False,extra_options=None):
+              chown=None,prune_empty_dirs=False,extra_options=None):
         """Generate Command instance for 'rsync' command
 
         Create a Command instance to run the 'rsync' command line, to
@@ -473,6 +473,9 @@ class general:
             that have also been removed from the source)
           chmod: optional, mode specification to be applied to the copied
             files e.g. chmod='u+rwX,g+rwX,o-w
+          chown: optional, ownership to be applied to the copied files
+            in the form 'USER:GROUP' (e.g. chown=':mygroup' to only set
+            the group; requires rsync 3.1.0 or later)
           prune_empty_dirs: optional, don't include empty target
             directories i.e. -m option
           extra_options: optional, a list of additional rsync options to be
@@ -501,6 +504,9 @@ class general:
         # Set mode of target files and directories
         if chmod is not None:
             rsync_cmd.add_args('--chmod=%s' % chmod)
+        # Set ownership of target files and directories
+        if chown is not None:
+            rsync_cmd.add_args('--chown=%s' % chown)
         # Additional options
         if extra_options is not None:
             rsync_cmd.add_args(*extra_options)
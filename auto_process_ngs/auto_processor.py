@@ -22,6 +22,7 @@ import uuid
 import time
 import ast
 import gzip
+import bisect
 import bcftbx.IlluminaData as IlluminaData
 import bcftbx.platforms as platforms
 import bcftbx.TabFile as TabFile
@@ -40,6 +41,8 @@ import icell8_utils
 import tenx_genomics_utils
 import settings
 from .qc.processing import report_processing_qc
+from .qc.illumina_qc import QCVerifier
+from .qc.illumina_qc import update_qc_manifests
 from .exceptions import MissingParameterFileException
 from auto_process_ngs import get_version
 
@@ -130,6 +133,8 @@ class AutoProcess:
         # Set flags to indicate whether it's okay to save parameters
         self._save_params = False
         self._save_metadata = False
+        # Cached listings of the analysis directory contents
+        self.dir_index = utils.DirectoryIndex()
         # Set where the analysis directory actually is
         self.analysis_dir = analysis_dir
         if self.analysis_dir is not None:
@@ -421,7 +426,8 @@ class AutoProcess:
             for line in project_metadata:
                 pname = line['Project']
                 test_project = utils.AnalysisProject(
-                    pname,os.path.join(self.analysis_dir,pname))
+                    pname,os.path.join(self.analysis_dir,pname),
+                    dir_index=self.dir_index)
                 if not test_project.is_analysis_dir:
                     # Project doesn't exist
                     logging.warning("Project '%s' listed in metadata file doesn't exist" \
@@ -490,14 +496,10 @@ class AutoProcess:
             print "Creating new project metadata file: %s" % filen
             project_metadata = utils.ProjectMetadataFile()
         # Populate/update
-        for project in illumina_data.projects:
-            project_name = project.name
-            sample_names = [s.name for s in project.samples]
-            if project_name not in project_metadata:
-                project_metadata.add_project(project_name,sample_names)
-            else:
-                project_metadata.update_project(project_name,
-                                                sample_names=sample_names)
+        project_metadata.update_projects(
+            [(project.name,
+              dict(sample_names=[s.name for s in project.samples]))
+             for project in illumina_data.projects])
         # Save
         project_metadata.save(filen)
 
@@ -1149,7 +1151,13 @@ class AutoProcess:
 
         If any project in 'projects.info' doesn't have a
         matching analysis directory then an exception is
-        raised.
+        raised. A directory with exactly the same name as the
+        project is preferred; otherwise there must be a single
+        directory which starts with the project name.
+
+        The samples and Fastqs for each project are only
+        located when they're first accessed (see
+        'AnalysisProject').
 
         Note:
 
@@ -1169,42 +1177,46 @@ class AutoProcess:
         """
         project_metadata = self.load_project_metadata(
             self.params.project_metadata)
-        projects = []
         if pattern is None:
             pattern = '*'
-        for line in project_metadata:
-            name = line['Project']
-            if not bcf_utils.name_matches(name,pattern):
-                # Name failed to match, ignore
-                continue
+        matches = utils.name_matcher(pattern)
+        names = [line['Project'] for line in project_metadata
+                 if matches(line['Project'])]
+        # Resolve the directories for all the projects from a
+        # single listing of the analysis directory
+        dirs = sorted(self.dir_index.list_dirs(self.analysis_dir))
+        projects = []
+        for name in names:
             logging.debug("Acquiring data for project %s" % name)
-            # Look for a matching project directory
-            project_dir = None
-            dirs = bcf_utils.list_dirs(self.analysis_dir,startswith=name)
-            logging.debug("Possible matching directories: %s" % dirs)
-            if len(dirs) == 1:
+            # Locate the directories starting with the name
+            i = bisect.bisect_left(dirs,name)
+            candidates = []
+            while i < len(dirs) and dirs[i].startswith(name):
+                candidates.append(dirs[i])
+                i += 1
+            logging.debug("Possible matching directories: %s" %
+                          candidates)
+            if name in candidates:
+                # Exact match
+                project_dir = name
+            elif len(candidates) == 1:
                 # Just a single match
-                project_dir = dirs[0]
+                project_dir = candidates[0]
             else:
-                # Multiple matches, look for an exact match
-                for d in dirs:
-                    if d == name:
-                        project_dir = name
-                    break
-            if project_dir is None:
                 logging.error("Unable to resolve directory for project "
                               "'%s'" % name)
-                logging.error("Possible dirs: %s" % dirs)
+                logging.error("Possible dirs: %s" % candidates)
                 raise Exception("Unable to resolve directory for project "
                                 "'%s'" % name)
-            # Attempt to load the project data
-            project_dir = os.path.join(self.analysis_dir,project_dir)
-            projects.append(utils.AnalysisProject(name,project_dir))
-        # Add undetermined reads directory
-        if bcf_utils.name_matches('undetermined',pattern):
+            projects.append(utils.AnalysisProject(
+                name,
+                os.path.join(self.analysis_dir,project_dir),
+                dir_index=self.dir_index))
+        # Add undetermined reads directory (unless it was
+        # already loaded from the metadata)
+        if matches('undetermined') and 'undetermined' not in names:
             undetermined_analysis = self.undetermined()
-            if undetermined_analysis is not None and \
-               'undetermined' not in [p.name for p in projects]:
+            if undetermined_analysis is not None:
                 projects.append(undetermined_analysis)
         return projects
 
@@ -1237,7 +1249,7 @@ class AutoProcess:
         if pattern is None:
             pattern = '*'
         # Try loading each subdirectory as a project
-        for dirn in bcf_utils.list_dirs(self.analysis_dir):
+        for dirn in self.dir_index.list_dirs(self.analysis_dir):
             # Test for bcl2fastq output
             try:
                 IlluminaData.IlluminaData(self.analysis_dir,
@@ -1252,7 +1264,8 @@ class AutoProcess:
                               "(ignored): %s" % (dirn,ex))
             # Try loading as a project
             test_project = utils.AnalysisProject(
-                dirn,os.path.join(self.analysis_dir,dirn))
+                dirn,os.path.join(self.analysis_dir,dirn),
+                dir_index=self.dir_index)
             if test_project.is_analysis_dir:
                 logging.debug("* %s: analysis directory" % dirn)
                 if bcf_utils.name_matches(test_project.name,
@@ -1265,7 +1278,8 @@ class AutoProcess:
     def undetermined(self):
         # Return analysis project directory for undetermined indices
         # or None if not found
-        dirs = bcf_utils.list_dirs(self.analysis_dir,matches='undetermined')
+        dirs = self.dir_index.list_dirs(self.analysis_dir,
+                                        matches='undetermined')
         if len(dirs) == 0:
             logging.debug("No undetermined analysis directory found")
             return None
@@ -1274,7 +1288,8 @@ class AutoProcess:
                 % ' '.join(dirs)
         # Attempt to load the analysis project data
         undetermined_dir = os.path.join(self.analysis_dir,dirs[0])
-        return utils.AnalysisProject(dirs[0],undetermined_dir)
+        return utils.AnalysisProject(dirs[0],undetermined_dir,
+                                     dir_index=self.dir_index)
         
     def make_fastqs(self,protocol='standard',platform=None,
                     unaligned_dir=None,sample_sheet=None,lanes=None,
@@ -2072,7 +2087,8 @@ class AutoProcess:
         # Schedule the jobs needed to do counting
         sched = simple_scheduler.SimpleScheduler(
             runner=runner,
-            max_concurrent=self.settings.general.max_concurrent_jobs)
+            max_concurrent=self.settings.general.max_concurrent_jobs,
+            accounting_dir=self.log_dir)
         sched.start()
         # Do counting
         print "Getting counts from fastq files"
@@ -2292,7 +2308,7 @@ class AutoProcess:
         print "Collecting bcl2fastq directories"
         primary_illumina_data = None
         unaligned_dirs = {}
-        for dirn in bcf_utils.list_dirs(self.analysis_dir):
+        for dirn in self.dir_index.list_dirs(self.analysis_dir):
             try:
                 illumina_data = IlluminaData.IlluminaData(self.analysis_dir,
                                                           unaligned_dir=dirn)
@@ -2319,7 +2335,9 @@ class AutoProcess:
             self.set_log_dir(self.get_log_subdir('merge_fastq_dirs'))
             runner = self.settings.general.default_runner
             runner.set_log_dir(self.log_dir)
-            sched = simple_scheduler.SimpleScheduler(runner=runner)
+            sched = simple_scheduler.SimpleScheduler(
+                runner=runner,
+                accounting_dir=self.log_dir)
             sched.start()
             jobs = []
         # Top-level for undetermined reads
@@ -2544,7 +2562,8 @@ class AutoProcess:
     def run_qc(self,projects=None,max_jobs=4,ungzip_fastqs=False,
                fastq_screen_subset=100000,nthreads=1,
                runner=None,fastq_dir=None,qc_dir=None,
-               report_html=None,run_multiqc=True):
+               report_html=None,run_multiqc=True,
+               incremental_report=None):
         """Run QC pipeline script for projects
 
         Run the illumina_qc.sh script to perform QC on projects.
@@ -2584,6 +2603,11 @@ class AutoProcess:
                     HTML QC report (default is '<QC_DIR>_report.html')
           run_multiqc: if True then run MultiQC at the end of the
                     QC run (default)
+          incremental_report: (optional) if True then only
+                    regenerate the report sections for samples with
+                    new or updated QC outputs, if False then
+                    regenerate the report from scratch (default is
+                    to use the 'incremental_reports' setting)
 
         Returns:
           UNIX-style integer returncode: 0 = successful termination,
@@ -2601,6 +2625,9 @@ class AutoProcess:
             logging.error("QC script version is %s, needs %s" %
                           (version,'/'.join(compatible_versions)))
             return 1
+        # Incremental reporting
+        if incremental_report is None:
+            incremental_report = self.settings.qc.incremental_reports
         # Process project pattern matching
         if projects is None:
             project_pattern = '*'
@@ -2622,12 +2649,15 @@ class AutoProcess:
             qc_runner = fetch_runner(runner)
         else:
             qc_runner = self.settings.runners.qc
-        # Set up a simple scheduler
+        # Set up a log directory and a simple scheduler
+        self.set_log_dir(self.get_log_subdir('run_qc'))
         sched = simple_scheduler.SimpleScheduler(runner=qc_runner,
-                                                 max_concurrent=max_jobs)
+                                                 max_concurrent=max_jobs,
+                                                 accounting_dir=self.log_dir)
         sched.start()
         # Look for samples with no/invalid QC outputs and populate
         # pipeline with the associated fastq.gz files
+        qc_jobs = []
         for project in projects:
             print "*** Setting up QC for %s ***" % project.name
             # Set up qc directory
@@ -2646,6 +2676,9 @@ class AutoProcess:
             # Loop over samples and queue up those where the QC
             # isn't validated
             samples = project.get_samples(sample_pattern)
+            verifier = QCVerifier(project_qc_dir)
+            manifest = verifier.manifest
+            manifest.version = version
             if len(samples) == 0:
                 logging.warning("No samples found for QC analysis in project '%s'" %
                                 project.name)
@@ -2659,9 +2692,16 @@ class AutoProcess:
                         logging.warning("Ignoring index read: %s" %
                                         os.path.basename(fq))
                         continue
-                    if sample.verify_qc(project_qc_dir,fq):
+                    if verifier.verify(fq):
                         logging.debug("\t%s: QC verified" % fq)
+                        if fq not in manifest:
+                            manifest.add(fq)
                     else:
+                        if manifest.is_stale(fq):
+                            # Remove outputs from the old Fastq
+                            print "\t%s: Fastq has changed, removing " \
+                                "old QC outputs" % os.path.basename(fq)
+                            manifest.clear_outputs(fq)
                         print "\t%s: setting up QC run" % os.path.basename(fq)
                         # Create a group if none exists for this sample
                         if group is None:
@@ -2682,10 +2722,14 @@ class AutoProcess:
                             '--qc_dir',project_qc_dir)
                         job = group.add(qc_cmd,name=label,wd=project.dirn)
                         print "Job: %s" %  job
+                        qc_jobs.append((manifest,fq,job))
                 # Indicate no more jobs to add
                 if group:
                     group.close()
                     groups.append(group.name)
+            # Update the QC manifest with Fastqs which were
+            # already verified
+            manifest.save()
             # Add MultiQC job (if requested)
             if run_multiqc:
                 multiqc_out = "multi%s_report.html" % \
@@ -2709,6 +2753,9 @@ class AutoProcess:
         # Wait for the scheduler to run all jobs
         sched.wait()
         sched.stop()
+        # Update the QC manifests for Fastqs which completed
+        # QC successfully
+        update_qc_manifests(qc_jobs)
         # Verify the outputs and generate QC reports
         failed_projects = []
         for project in projects:
@@ -2730,7 +2777,8 @@ class AutoProcess:
                 print "QC okay, generating report for %s" % project.name
                 project.qc_report(qc_dir=qc_dir,
                                   title=title,
-                                  report_html=out_file)
+                                  report_html=out_file,
+                                  incremental=incremental_report)
             if run_multiqc:
                 multiqc_report = os.path.join(project.dirn,multiqc_out)
                 if not os.path.exists(multiqc_report):
@@ -2764,7 +2812,7 @@ class AutoProcess:
         # Check that project doesn't already exist
         project_name = os.path.basename(project_dir)
         project_metadata = self.load_project_metadata()
-        if project_name in [p['Project'] for p in project_metadata] or \
+        if project_name in project_metadata or \
            utils.AnalysisProject(project_name,
                                  os.path.join(self.analysis_dir,
                                               project_name)).exists:
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+#
+#     checksums.py: generate and verify checksum manifests
+#     Copyright (C) University of Manchester 2018 Peter Briggs
+#
+########################################################################
+#
+# checksums.py
+#
+#########################################################################
+
+"""
+checksums
+
+Utility functions for generating and verifying checksum manifests
+for directories (for example, analysis directories copied to the
+archive).
+
+A manifest is a tab-delimited file with one line for each regular
+file under the directory, giving the checksum, size, modification
+time and relative path of the file; the first line records the
+checksum algorithm that was used, e.g.:
+
+::
+
+    #algorithm	md5
+    d41d8cd98f00b204e9800998ecf8427e	0	1504262400	PJB/README.info
+
+Functions:
+
+- checksum: compute the checksum for a file
+- list_files: list the regular files under a directory
+- generate_manifest: generate manifest entries for files
+- write_manifest: write manifest entries to a file
+- read_manifest: read manifest entries from a file
+- verify_manifest: check the files in a directory against a manifest
+
+Checksums can be computed using either MD5 (the default) or xxHash
+(which is faster, but requires the 'xxhash' module to be installed).
+"""
+
+########################################################################
+# Imports
+#########################################################################
+
+import os
+import hashlib
+import logging
+import tempfile
+from multiprocessing import Pool
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Module specific logger
+logger = logging.getLogger(__name__)
+
+#######################################################################
+# Module data
+#######################################################################
+
+# Default name for manifest files
+MANIFEST_FILE = "archive.manifest"
+
+# Supported checksum algorithms
+CHECKSUM_ALGORITHMS = ('md5','xxhash',)
+
+# Size of blocks to read when computing checksums
+CHECKSUM_BLOCKSIZE = 1024*1024
+
+# Status values reported by 'verify_manifest'
+CHECKSUM_OK = "OK"
+CHECKSUM_FAILED = "CHECKSUM DIFFERS"
+SIZE_DIFFERS = "SIZE DIFFERS"
+MTIME_DIFFERS = "MTIME DIFFERS"
+MISSING = "MISSING"
+NOT_IN_MANIFEST = "NOT IN MANIFEST"
+
+#######################################################################
+# Functions
+#######################################################################
+
+def checksum(filen,algorithm='md5',blocksize=CHECKSUM_BLOCKSIZE):
+    """
+    Return the checksum for a file
+
+    Arguments:
+      filen (str): path to the file
+      algorithm (str): checksum algorithm to use (one of
+        'md5' or 'xxhash')
+      blocksize (int): size of the blocks to read from the
+        file
+
+    Returns:
+      String: hex digest of the checksum.
+    """
+    if algorithm == 'md5':
+        h = hashlib.md5()
+    elif algorithm == 'xxhash':
+        if xxhash is None:
+            raise Exception("'xxhash' checksums requested but "
+                            "xxhash module not available")
+        h = xxhash.xxh64()
+    else:
+        raise Exception("'%s': unsupported checksum algorithm" %
+                        algorithm)
+    with open(filen,'rb') as fp:
+        while True:
+            block = fp.read(blocksize)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+def list_files(dirn,exclude=None):
+    """
+    Return the regular files under a directory
+
+    Symbolic links are not followed and are not included
+    in the list.
+
+    Arguments:
+      dirn (str): path to the directory
+      exclude (list): optional list of relative paths to
+        omit from the list
+
+    Returns:
+      List: sorted list of file paths relative to 'dirn'.
+    """
+    if exclude is None:
+        exclude = ()
+    files = []
+    for d,dirs,filens in os.walk(dirn):
+        for f in filens:
+            path = os.path.join(d,f)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            relpath = os.path.relpath(path,dirn)
+            if relpath not in exclude:
+                files.append(relpath)
+    files.sort()
+    return files
+
+def generate_manifest(dirn,files=None,algorithm='md5',nprocessors=1,
+                      previous=None):
+    """
+    Generate manifest entries for the files in a directory
+
+    If entries from an earlier manifest are supplied then
+    the checksums are reused for files whose size and
+    modification time haven't changed, rather than being
+    computed again.
+
+    Files which don't exist (or can't be read) are reported
+    as warnings and are omitted from the entries.
+
+    Arguments:
+      dirn (str): path to the directory
+      files (list): optional list of file paths relative to
+        'dirn' (if not supplied then all the regular files
+        under 'dirn' are included)
+      algorithm (str): checksum algorithm to use
+      nprocessors (int): number of processes to use for
+        computing the checksums
+      previous (list): optional list of entries from an
+        earlier manifest generated with the same algorithm
+        (e.g. as returned by 'read_manifest')
+
+    Returns:
+      List: list of (relpath,size,mtime,checksum) tuples,
+        sorted by relative path.
+    """
+    if files is None:
+        files = list_files(dirn)
+    if previous is None:
+        previous = []
+    previous = dict([(entry[0],entry) for entry in previous])
+    entries = []
+    tasks = []
+    for f in files:
+        try:
+            st = os.stat(os.path.join(dirn,f))
+        except OSError as ex:
+            logger.warning("%s: not added to manifest: %s" % (f,ex))
+            continue
+        entry = previous.get(f)
+        if entry is not None and \
+           entry[1:3] == (st.st_size,int(st.st_mtime)):
+            entries.append(entry)
+        else:
+            tasks.append((dirn,f,algorithm))
+    for entry in _map(_manifest_worker,tasks,nprocessors):
+        if entry is not None:
+            entries.append(entry)
+    entries.sort()
+    return entries
+
+def write_manifest(manifest_file,entries,algorithm='md5'):
+    """
+    Write manifest entries to a file
+
+    The entries are written to a temporary file which is
+    then moved into place, so an interrupted write can't
+    leave a partial manifest.
+
+    Arguments:
+      manifest_file (str): path to the manifest file
+      entries (list): list of (relpath,size,mtime,checksum)
+        tuples (e.g. as returned by 'generate_manifest')
+      algorithm (str): checksum algorithm used to generate
+        the entries
+    """
+    fd,tmp_file = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(manifest_file)),
+        prefix=".%s." % os.path.basename(manifest_file))
+    try:
+        with os.fdopen(fd,'w') as fp:
+            fp.write("#algorithm\t%s\n" % algorithm)
+            for relpath,size,mtime,chksum in entries:
+                fp.write("%s\t%d\t%d\t%s\n" % (chksum,size,mtime,relpath))
+        os.chmod(tmp_file,0664)
+        os.rename(tmp_file,manifest_file)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def read_manifest(manifest_file):
+    """
+    Read manifest entries from a file
+
+    Arguments:
+      manifest_file (str): path to the manifest file
+
+    Returns:
+      Tuple: tuple of (algorithm,entries) where 'entries'
+        is a list of (relpath,size,mtime,checksum) tuples.
+    """
+    algorithm = 'md5'
+    entries = []
+    with open(manifest_file,'r') as fp:
+        for line in fp:
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            if line.startswith('#'):
+                if line.startswith('#algorithm\t'):
+                    algorithm = line.split('\t')[1]
+                continue
+            chksum,size,mtime,relpath = line.split('\t',3)
+            entries.append((relpath,int(size),int(mtime),chksum))
+    return (algorithm,entries)
+
+def verify_manifest(dirn,manifest_file=None,fast=False,nprocessors=1):
+    """
+    Check the files in a directory against a manifest
+
+    Each file in the manifest is checked first for existence
+    and size; if these match then the checksum is recomputed
+    and compared (or, in 'fast' mode, only the modification
+    time is compared). Files under the directory which aren't
+    in the manifest are also reported.
+
+    This is a generator which yields results as the checks
+    complete (so not necessarily in the order of the files
+    in the manifest).
+
+    Arguments:
+      dirn (str): path to the directory to verify
+      manifest_file (str): path to the manifest file (if
+        not supplied then defaults to 'MANIFEST_FILE' in
+        'dirn')
+      fast (bool): if True then only compare sizes and
+        modification times, without recomputing checksums
+      nprocessors (int): number of processes to use for
+        computing the checksums
+
+    Yields:
+      Tuple: (relpath,status) pairs, where 'status' is one
+        of 'CHECKSUM_OK', 'CHECKSUM_FAILED', 'SIZE_DIFFERS',
+        'MTIME_DIFFERS', 'MISSING' or 'NOT_IN_MANIFEST'.
+    """
+    if manifest_file is None:
+        manifest_file = os.path.join(dirn,MANIFEST_FILE)
+    algorithm,entries = read_manifest(manifest_file)
+    # Check files which aren't in the manifest
+    exclude = set([entry[0] for entry in entries])
+    manifest_relpath = os.path.relpath(os.path.abspath(manifest_file),
+                                       os.path.abspath(dirn))
+    exclude.add(manifest_relpath)
+    for relpath in list_files(dirn,exclude=exclude):
+        yield (relpath,NOT_IN_MANIFEST)
+    # Check sizes (and timestamps) without reading files
+    tasks = []
+    for relpath,size,mtime,chksum in entries:
+        try:
+            st = os.stat(os.path.join(dirn,relpath))
+        except OSError:
+            yield (relpath,MISSING)
+            continue
+        if st.st_size != size:
+            yield (relpath,SIZE_DIFFERS)
+        elif fast:
+            if int(st.st_mtime) != mtime:
+                yield (relpath,MTIME_DIFFERS)
+            else:
+                yield (relpath,CHECKSUM_OK)
+        else:
+            tasks.append((dirn,relpath,algorithm,chksum))
+    # Compare checksums for the remaining files
+    for result in _map(_verify_worker,tasks,nprocessors):
+        yield result
+
+def _map(func,tasks,nprocessors=1):
+    """
+    Internal: apply function to tasks, yielding results as they complete
+
+    If 'nprocessors' is greater than one then the tasks are
+    distributed across a pool of processes.
+    """
+    if nprocessors > 1 and len(tasks) > 1:
+        pool = Pool(nprocessors)
+        try:
+            for result in pool.imap_unordered(func,tasks):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            yield func(task)
+
+def _manifest_worker(task):
+    """
+    Internal: generate manifest entry for a file
+
+    The task is a tuple (dirn,relpath,algorithm); returns
+    a tuple (relpath,size,mtime,checksum), or None if the
+    file can't be read.
+    """
+    dirn,relpath,algorithm = task
+    path = os.path.join(dirn,relpath)
+    try:
+        st = os.stat(path)
+        return (relpath,st.st_size,int(st.st_mtime),
+                checksum(path,algorithm=algorithm))
+    except (OSError,IOError) as ex:
+        logger.warning("%s: not added to manifest: %s" % (relpath,ex))
+        return None
+
+def _verify_worker(task):
+    """
+    Internal: verify checksum for a file
+
+    The task is a tuple (dirn,relpath,algorithm,checksum);
+    returns a tuple (relpath,status).
+    """
+    dirn,relpath,algorithm,chksum = task
+    try:
+        if checksum(os.path.join(dirn,relpath),
+                    algorithm=algorithm) == chksum:
+            return (relpath,CHECKSUM_OK)
+    except IOError as ex:
+        logger.warning("%s: %s" % (relpath,ex))
+    return (relpath,CHECKSUM_FAILED)
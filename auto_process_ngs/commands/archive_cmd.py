@@ -12,10 +12,15 @@
 import os
 import time
 import logging
+import tempfile
+import hashlib
 import auto_process_ngs.applications as applications
+import auto_process_ngs.checksums as checksums
 import auto_process_ngs.fileops as fileops
 import auto_process_ngs.simple_scheduler as simple_scheduler
 import auto_process_ngs.tenx_genomics_utils as tenx_genomics_utils
+from auto_process_ngs.qc.illumina_qc import REPORT_CACHE_DIR
+from auto_process_ngs.qc.plots import MICROPLOT_CACHE_DIR
 from bcftbx.JobRunner import fetch_runner
 
 # Fetch configuration settings
@@ -25,14 +30,22 @@ __settings = auto_process_ngs.settings.Settings()
 # Module specific logger
 logger = logging.getLogger(__name__)
 
+#######################################################################
+# Module data
+#######################################################################
+
+# File in the staging directory used to record the partitions
+# which were successfully staged in parallel mode
+ARCHIVE_CHECKPOINT_FILE = "archive.checkpoint"
+
 #######################################################################
 # Command functions
 #######################################################################
 
 def archive(ap,archive_dir=None,platform=None,year=None,
             perms=None,group=None,include_bcl2fastq=False,
-            read_only_fastqs=True,runner=None,
-            final=False,force=False,dry_run=False):
+            read_only_fastqs=True,runner=None,parallel=False,
+            checksum=None,final=False,force=False,dry_run=False):
     """
     Copy an analysis directory and contents to an archive area
 
@@ -68,6 +81,28 @@ def archive(ap,archive_dir=None,platform=None,year=None,
     The fastqs will be switched to be read-only in the archive
     by default.
 
+    If 'parallel' is set then the copying is split into
+    partitions (one for each project directory plus the
+    'bcl2fastq' directory, if included), which are run as
+    concurrent 'rsync' jobs via the scheduler after the
+    top-level of the analysis directory has been copied. The
+    group and permissions are set by 'rsync' as the files are
+    copied (which requires rsync 3.1.0 or later). Partitions
+    which complete successfully are recorded in a checkpoint
+    file in the staging directory, and are skipped on
+    subsequent archiving attempts unless their contents have
+    changed (or the copy in the staging directory is missing);
+    so if a partition fails then archiving can be rerun
+    without copying the other partitions again.
+
+    Once the copy has completed, a manifest file with the
+    checksums of the copied files is written to the staging
+    directory (see the 'checksums' module). The checksums are
+    computed from the source files, so the archived copy can
+    subsequently be verified without needing the originals;
+    checksums from an existing manifest are reused for files
+    which haven't changed since it was written.
+
     Arguments:
       ap (AutoProcessor): autoprocessor pointing to the
         analysis directory to be archived
@@ -95,6 +130,12 @@ def archive(ap,archive_dir=None,platform=None,year=None,
         the original permissions.
       runner: (optional) specify a non-default job runner to use
         for primary data rsync
+      parallel (bool): if True then copy the project and
+        'bcl2fastq' directories using concurrent rsync jobs
+      checksum (str): checksum algorithm to use for the
+        manifest ('md5' or 'xxhash', or 'none' to not write
+        a manifest) (if not set then use the value from the
+        settings.ini file)
       final (bool): if True then finalize the archive by
         moving the '.pending' temporary archive to the final
         location
@@ -190,6 +231,9 @@ def archive(ap,archive_dir=None,platform=None,year=None,
             print "Excluding '%s' directory from archive" % \
                 ap.params.unaligned_dir
             excludes.append('--exclude=%s' % ap.params.unaligned_dir)
+        # QC report caches (regenerated on demand)
+        excludes.append('--exclude=%s' % MICROPLOT_CACHE_DIR)
+        excludes.append('--exclude=%s' % REPORT_CACHE_DIR)
         # 10xgenomics products to exclude
         excludes.append('--exclude=*.mro')
         excludes.append('--exclude="%s*"' %
@@ -208,91 +252,467 @@ def archive(ap,archive_dir=None,platform=None,year=None,
         # Setup a scheduler for multiple rsync jobs
         sched = simple_scheduler.SimpleScheduler(
             runner=runner,
-            max_concurrent=ap.settings.general.max_concurrent_jobs)
+            max_concurrent=ap.settings.general.max_concurrent_jobs,
+            accounting_dir=ap.log_dir)
         sched.start()
-        # Keep track of jobs
-        archiving_jobs = []
-        # If making fastqs read-only then transfer them separately
-        if read_only_fastqs and final:
-            rsync_fastqs = applications.general.rsync(
+        if parallel:
+            # Copy partitions of the analysis directory concurrently
+            retval = stage_partitions(ap,
+                                      os.path.join(archive_dir,staging),
+                                      sched,
+                                      partitions=get_partitions(
+                                          ap,projects,
+                                          include_bcl2fastq=include_bcl2fastq),
+                                      excludes=excludes,
+                                      perms=perms,
+                                      group=group,
+                                      read_only_fastqs=(read_only_fastqs
+                                                        and final),
+                                      dry_run=dry_run)
+        else:
+            # Keep track of jobs
+            archiving_jobs = []
+            # If making fastqs read-only then transfer them separately
+            if read_only_fastqs and final:
+                rsync_fastqs = applications.general.rsync(
+                    "%s/" % ap.analysis_dir,
+                    os.path.join(archive_dir,staging),
+                    prune_empty_dirs=True,
+                    dry_run=dry_run,
+                    chmod='ugo-w',
+                    extra_options=(
+                        '--include=*/',
+                        '--include=fastqs/**',
+                        '--exclude=*',))
+                print "Running %s" % rsync_fastqs
+                rsync_fastqs_job = sched.submit(rsync_fastqs,
+                                                name="rsync.archive_fastqs")
+                # Exclude fastqs from main rsync
+                excludes.append('--exclude=fastqs')
+                wait_for = [rsync_fastqs_job.job_name]
+                # Add to list of jobs
+                archiving_jobs.append(rsync_fastqs_job)
+            else:
+                # No separate Fastq rsync
+                rsync_fastqs_job = None
+                wait_for = ()
+            # Main rsync command
+            rsync = applications.general.rsync(
                 "%s/" % ap.analysis_dir,
                 os.path.join(archive_dir,staging),
                 prune_empty_dirs=True,
+                mirror=True,
                 dry_run=dry_run,
-                chmod='ugo-w',
-                extra_options=(
-                    '--include=*/',
-                    '--include=fastqs/**',
-                    '--exclude=*',))
-            print "Running %s" % rsync_fastqs
-            rsync_fastqs_job = sched.submit(rsync_fastqs,
-                                            name="rsync.archive_fastqs")
-            # Exclude fastqs from main rsync
-            excludes.append('--exclude=fastqs')
-            wait_for = [rsync_fastqs_job.job_name]
-            # Add to list of jobs
-            archiving_jobs.append(rsync_fastqs_job)
-        else:
-            # No separate Fastq rsync
-            rsync_fastqs_job = None
-            wait_for = ()
-        # Main rsync command
-        rsync = applications.general.rsync(
-            "%s/" % ap.analysis_dir,
-            os.path.join(archive_dir,staging),
-            prune_empty_dirs=True,
-            mirror=True,
-            dry_run=dry_run,
-            chmod=perms,
-            extra_options=excludes)
-        print "Running %s" % rsync
-        rsync_job = sched.submit(rsync,name="rsync.archive",
-                                 wait_for=wait_for)
-        archiving_jobs.append(rsync_job)
-        # Wait for jobs to complete
-        rsync_job.wait()
-        # Check exit status on jobs
-        for job in archiving_jobs:
-            print "%s completed: exit code %s" % (job.name,
-                                                  job.exit_code)
-        retval = sum([j.exit_code for j in archiving_jobs])
-        if retval != 0:
-            logger.warning("One or more archiving jobs failed "
-                           "(non-zero exit code returned)")
-        else:
-            # Set the group
-            if group is not None:
-                print "Setting group of archived files to '%s'" % group
-                if not dry_run:
-                    set_group = fileops.set_group_command(
-                        group,
-                        os.path.join(archive_dir,staging),
-                        verbose=True)
-                    print "Running %s" % set_group
-                    set_group_job = sched.submit(
-                        set_group,
-                        name="set_group.archive")
-                    set_group_job.wait()
-                    # Check exit status
-                    exit_code = set_group_job.exit_code
-                    print "%s completed: exit code %s" % (
-                        set_group_job.name,
-                        exit_code)
-                    if exit_code != 0:
-                        logger.warning("Setting group failed (non-zero "
-                                       "exit status code returned)")
-                    retval = retval + exit_code
+                chmod=perms,
+                extra_options=excludes)
+            print "Running %s" % rsync
+            rsync_job = sched.submit(rsync,name="rsync.archive",
+                                     wait_for=wait_for)
+            archiving_jobs.append(rsync_job)
+            # Wait for jobs to complete
+            rsync_job.wait()
+            # Check exit status on jobs
+            for job in archiving_jobs:
+                print "%s completed: exit code %s" % (job.name,
+                                                      job.exit_code)
+            retval = sum([j.exit_code for j in archiving_jobs])
+            if retval != 0:
+                logger.warning("One or more archiving jobs failed "
+                               "(non-zero exit code returned)")
+            else:
+                # Set the group
+                if group is not None:
+                    print "Setting group of archived files to '%s'" % group
+                    if not dry_run:
+                        set_group = fileops.set_group_command(
+                            group,
+                            os.path.join(archive_dir,staging),
+                            verbose=True)
+                        print "Running %s" % set_group
+                        set_group_job = sched.submit(
+                            set_group,
+                            name="set_group.archive")
+                        set_group_job.wait()
+                        # Check exit status
+                        exit_code = set_group_job.exit_code
+                        print "%s completed: exit code %s" % (
+                            set_group_job.name,
+                            exit_code)
+                        if exit_code != 0:
+                            logger.warning("Setting group failed (non-zero "
+                                           "exit status code returned)")
+                        retval = retval + exit_code
         # Finish with scheduler
         sched.wait()
         sched.stop()
         # Bail out if there was a problem
         if retval != 0:
             raise Exception("Staging to archive failed")
+        # Generate the checksum manifest
+        if checksum is None:
+            checksum = ap.settings.archive.checksum
+        if checksum == 'none':
+            print "Checksum manifest disabled"
+        elif fileops.Location(archive_dir).is_remote:
+            logger.warning("Remote archive location, not generating "
+                           "checksum manifest")
+        elif not dry_run:
+            staging_dir = os.path.join(archive_dir,staging)
+            manifest_file = os.path.join(staging_dir,
+                                         checksums.MANIFEST_FILE)
+            print "Generating checksum manifest (%s)" % checksum
+            files = checksums.list_files(staging_dir,
+                                         exclude=(checksums.MANIFEST_FILE,
+                                                  ARCHIVE_CHECKPOINT_FILE))
+            # Logs from this run are still being written, so use
+            # the copies in the archive for these
+            current_logs = "%s%s" % (os.path.relpath(ap.log_dir,
+                                                     ap.analysis_dir),
+                                     os.sep)
+            # Files in the archive which are no longer in the
+            # source (e.g. Fastqs removed from the analysis dir)
+            # can't be checksummed against the originals
+            source_files = []
+            for f in files:
+                if f.startswith(current_logs):
+                    continue
+                if os.path.exists(os.path.join(ap.analysis_dir,f)):
+                    source_files.append(f)
+                else:
+                    logger.warning("%s: in archive but not in source "
+                                   "directory, not added to manifest" % f)
+            # Reuse checksums from an earlier manifest for
+            # files which haven't changed
+            previous = None
+            if os.path.exists(manifest_file):
+                algorithm,entries = checksums.read_manifest(manifest_file)
+                if algorithm == checksum:
+                    previous = entries
+            entries = checksums.generate_manifest(
+                ap.analysis_dir,
+                files=source_files,
+                algorithm=checksum,
+                nprocessors=ap.settings.archive.nprocessors,
+                previous=previous)
+            entries.extend(checksums.generate_manifest(
+                staging_dir,
+                files=filter(lambda f: f.startswith(current_logs),
+                             files),
+                algorithm=checksum))
+            entries.sort()
+            checksums.write_manifest(manifest_file,
+                                     entries,
+                                     algorithm=checksum)
+            print "Wrote manifest for %d files" % len(entries)
     # Move to final location
     if final:
         print "Moving to final location: %s" % final_dest
         if not dry_run:
             fileops.rename(os.path.join(archive_dir,staging),
                            os.path.join(archive_dir,final_dest))
+            # Checkpoints are no longer needed
+            checkpoint_file = get_checkpoint_file(
+                ap,
+                os.path.join(archive_dir,final_dest))
+            if fileops.exists(checkpoint_file):
+                fileops.remove_file(checkpoint_file)
     # Finish
     return retval
+
+#######################################################################
+# Helper functions
+#######################################################################
+
+def get_partitions(ap,projects,include_bcl2fastq=False):
+    """
+    Return the subdirectories to copy as separate partitions
+
+    The partitions are the project directories (including the
+    'undetermined' project) plus the 'bcl2fastq' directory,
+    if it is to be included and exists.
+
+    Arguments:
+      ap (AutoProcessor): autoprocessor pointing to the
+        analysis directory to be archived
+      projects (list): list of AnalysisProject instances
+        for the projects in the analysis directory
+      include_bcl2fastq (bool): if True then also include
+        the 'bcl2fastq' directory
+
+    Returns:
+      List: names of the partition subdirectories, relative
+        to the analysis directory.
+    """
+    partitions = []
+    for project in projects:
+        name = os.path.relpath(project.dirn,ap.analysis_dir)
+        if name not in partitions:
+            partitions.append(name)
+    if include_bcl2fastq and ap.params.unaligned_dir is not None:
+        unaligned_dir = ap.params.unaligned_dir
+        if os.path.isdir(os.path.join(ap.analysis_dir,unaligned_dir)) and \
+           unaligned_dir not in partitions:
+            partitions.append(unaligned_dir)
+    return partitions
+
+def stage_partitions(ap,dest,sched,partitions,excludes=None,
+                     perms=None,group=None,read_only_fastqs=False,
+                     dry_run=False):
+    """
+    Copy the analysis directory using concurrent rsync jobs
+
+    The top-level of the analysis directory (i.e. everything
+    outside of the partitions) is copied first; then each of
+    the partitions is copied by a separate job. Partitions
+    which are unchanged since they were last successfully
+    copied (according to the checkpoint file) are skipped,
+    provided that the copy still exists in the destination.
+
+    Arguments:
+      ap (AutoProcessor): autoprocessor pointing to the
+        analysis directory to be archived
+      dest (str): destination directory to copy to
+      sched (SimpleScheduler): running scheduler to submit
+        the rsync jobs to
+      partitions (list): names of the subdirectories to copy
+        as separate partitions
+      excludes (list): list of rsync '--exclude=...' options
+        to apply to all the copies
+      perms (str): if set then apply these permissions to
+        the copied files
+      group (str): if set then set the group of the copied
+        files to this group
+      read_only_fastqs (bool): if True then make the Fastqs
+        in each partition read-only
+      dry_run (bool): if True then run rsync in 'dry run'
+        mode (and don't update the checkpoint file)
+
+    Returns:
+      Integer: sum of the exit codes from the rsync jobs
+        (i.e. zero if all the jobs succeeded).
+    """
+    if excludes is None:
+        excludes = []
+    if group is not None:
+        chown = ":%s" % group
+    else:
+        chown = None
+    checkpoint_file = get_checkpoint_file(ap,dest)
+    checkpoints = read_checkpoints(checkpoint_file)
+    archiving_jobs = []
+    # Copy everything outside the partitions
+    rsync = applications.general.rsync(
+        "%s/" % ap.analysis_dir,
+        dest,
+        prune_empty_dirs=True,
+        mirror=True,
+        dry_run=dry_run,
+        chmod=perms,
+        chown=chown,
+        extra_options=(excludes +
+                       ['--exclude=/%s' % ARCHIVE_CHECKPOINT_FILE] +
+                       ['--exclude=/%s' % p for p in partitions]))
+    print "Running %s" % rsync
+    rsync_top_job = sched.submit(rsync,name="rsync.archive")
+    archiving_jobs.append(rsync_top_job)
+    # Copy each of the partitions
+    for partition in partitions:
+        src = os.path.join(ap.analysis_dir,partition)
+        # Build the commands for this partition
+        rsync_cmds = []
+        partition_excludes = list(excludes)
+        if read_only_fastqs:
+            rsync_cmds.append(
+                ("rsync.archive_fastqs.%s" % partition,
+                 applications.general.rsync(
+                     "%s/" % src,
+                     os.path.join(dest,partition),
+                     prune_empty_dirs=True,
+                     dry_run=dry_run,
+                     chmod='ugo-w',
+                     chown=chown,
+                     extra_options=(
+                         '--include=*/',
+                         '--include=fastqs/**',
+                         '--exclude=*',))))
+            partition_excludes.append('--exclude=fastqs')
+        rsync_cmds.append(
+            ("rsync.archive.%s" % partition,
+             applications.general.rsync(
+                 "%s/" % src,
+                 os.path.join(dest,partition),
+                 prune_empty_dirs=True,
+                 mirror=True,
+                 dry_run=dry_run,
+                 chmod=perms,
+                 chown=chown,
+                 extra_options=partition_excludes)))
+        # Skip the partition if it's unchanged since the last
+        # successful copy
+        checksum = partition_checksum(src,
+                                      [str(cmd) for _,cmd in rsync_cmds])
+        if checkpoints.get(partition) == checksum:
+            if fileops.exists(os.path.join(dest,partition)):
+                print "Skipping '%s': unchanged since last copied" % \
+                    partition
+                continue
+            print "'%s' missing from destination, copying again" % \
+                partition
+        # Submit the jobs for this partition
+        wait_for = [rsync_top_job.job_name]
+        partition_jobs = []
+        for name,rsync in rsync_cmds:
+            print "Running %s" % rsync
+            job = sched.submit(rsync,name=name,wait_for=wait_for)
+            partition_jobs.append(job)
+            wait_for = [job.job_name]
+        archiving_jobs.extend(partition_jobs)
+        # Record the checkpoint once all the jobs succeeded
+        if not dry_run:
+            sched.callback("checkpoint.%s" % partition,
+                           make_checkpoint_callback(checkpoint_file,
+                                                    partition,
+                                                    checksum,
+                                                    partition_jobs),
+                           wait_for=wait_for)
+    # Wait for jobs to complete
+    sched.wait()
+    # Check exit status on jobs
+    for job in archiving_jobs:
+        print "%s completed: exit code %s" % (job.name,job.exit_code)
+    retval = sum([j.exit_code for j in archiving_jobs])
+    if retval != 0:
+        logger.warning("One or more archiving jobs failed "
+                       "(non-zero exit code returned)")
+    return retval
+
+def get_checkpoint_file(ap,dest):
+    """
+    Return the path to the checkpoint file for a destination
+
+    The checkpoint file is kept in the destination directory,
+    so that the checkpoints are discarded along with the
+    copied data if the destination is removed. For remote
+    destinations (which can't be written to directly) it is
+    kept in the analysis directory instead.
+
+    Arguments:
+      ap (AutoProcessor): autoprocessor pointing to the
+        analysis directory being archived
+      dest (str): destination directory being copied to
+
+    Returns:
+      String: path to the checkpoint file.
+    """
+    if fileops.Location(dest).is_remote:
+        return os.path.join(ap.analysis_dir,ARCHIVE_CHECKPOINT_FILE)
+    return os.path.join(dest,ARCHIVE_CHECKPOINT_FILE)
+
+def make_checkpoint_callback(checkpoint_file,partition,checksum,jobs):
+    """
+    Return a scheduler callback which records a checkpoint
+
+    Arguments:
+      checkpoint_file (str): path to the checkpoint file
+      partition (str): name of the partition
+      checksum (str): checksum to record for the partition
+      jobs (list): scheduler jobs which must all have
+        completed successfully for the checkpoint to be
+        recorded
+
+    Returns:
+      Function: callback function suitable for passing to
+        the 'callback' method of a SimpleScheduler.
+    """
+    def callback(name,jobs_,sched):
+        if any([job.exit_code != 0 for job in jobs]):
+            logger.warning("'%s' not copied successfully, not "
+                           "recording checkpoint" % partition)
+            return
+        checkpoints = read_checkpoints(checkpoint_file)
+        checkpoints[partition] = checksum
+        write_checkpoints(checkpoint_file,checkpoints)
+    return callback
+
+def partition_checksum(dirn,cmds):
+    """
+    Return a checksum identifying the state of a partition
+
+    The checksum is generated from the rsync commands used
+    to copy the partition, together with the number, total
+    size and latest modification time of the files and
+    directories under it, so that it changes if either the
+    copy options or the contents of the partition change.
+
+    Arguments:
+      dirn (str): path to the partition directory
+      cmds (list): list of the rsync command lines used to
+        copy the partition
+
+    Returns:
+      String: MD5 hex digest for the partition.
+    """
+    nfiles = 0
+    total_size = 0
+    mtime = os.lstat(dirn).st_mtime
+    for d,dirs,files in os.walk(dirn):
+        for f in dirs + files:
+            st = os.lstat(os.path.join(d,f))
+            nfiles += 1
+            total_size += st.st_size
+            mtime = max(mtime,st.st_mtime)
+    md5 = hashlib.md5()
+    for cmd in cmds:
+        md5.update("%s\n" % cmd)
+    md5.update("%d\t%d\t%r\n" % (nfiles,total_size,mtime))
+    return md5.hexdigest()
+
+def read_checkpoints(checkpoint_file):
+    """
+    Read the partition checkpoints from a file
+
+    Arguments:
+      checkpoint_file (str): path to the checkpoint file
+
+    Returns:
+      Dictionary: mapping of partition names to checksums
+        (empty if the file doesn't exist).
+    """
+    checkpoints = dict()
+    if not os.path.exists(checkpoint_file):
+        return checkpoints
+    with open(checkpoint_file,'r') as fp:
+        for line in fp:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            partition,checksum = line.split('\t')
+            checkpoints[partition] = checksum
+    return checkpoints
+
+def write_checkpoints(checkpoint_file,checkpoints):
+    """
+    Write the partition checkpoints to a file
+
+    The file is written to a temporary file which is then
+    moved into place, so an interrupted write can't leave
+    a partial checkpoint file.
+
+    Arguments:
+      checkpoint_file (str): path to the checkpoint file
+      checkpoints (dict): mapping of partition names to
+        checksums
+    """
+    fd,tmp_file = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(checkpoint_file)),
+        prefix=".%s." % os.path.basename(checkpoint_file))
+    try:
+        with os.fdopen(fd,'w') as fp:
+            for partition in sorted(checkpoints):
+                fp.write("%s\t%s\n" % (partition,checkpoints[partition]))
+        os.chmod(tmp_file,0664)
+        os.rename(tmp_file,checkpoint_file)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
@@ -19,6 +19,7 @@ from ..docwriter import Document
 from ..docwriter import Table
 from ..docwriter import Link
 from ..docwriter import Para
+from ..qc.illumina_qc import QC_MANIFEST
 import bcftbx.utils as bcf_utils
 from auto_process_ngs import get_version
 
@@ -57,13 +58,17 @@ div.footer { font-style: italic;
              font-size: 70%; }
 """
 
+# Interval (in seconds) for the scheduler to check on the
+# progress of QC report transfers
+TRANSFER_POLL_INTERVAL = 1
+
 #######################################################################
 # Command functions
 #######################################################################
 
 def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
                regenerate_reports=False,force=False,use_hierarchy=False,
-               exclude_zip_files=False):
+               exclude_zip_files=False,max_transfers=None):
     """
     Copy the QC reports to the webserver
 
@@ -88,6 +93,11 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
     - ICell8 processing report, or
     - 'cellranger count' reports for each sample
 
+    The reports for all the projects are copied (and unpacked)
+    concurrently, with at most 'max_transfers' operations
+    running at any one time, and the HTML index is generated
+    once all the transfers have finished.
+
     Raises an exception if:
 
     - 'source' and 'run_number' metadata items are not set
@@ -117,6 +127,9 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
       exclude_zip_files (bool): if True then exclude any ZIP
         archives from publication (default is to include ZIP
         files)
+      max_transfers (int): maximum number of concurrent copy
+        and unzip operations (if not set then use the value
+        from the settings.ini file)
     """
     # Turn off saving of parameters etc
     ap._save_params = False
@@ -233,8 +246,21 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
                     "%s_report.%s.%s.zip" %
                     (qc_dir,project.name,
                      os.path.basename(ap.analysis_dir)))
+                # Check if the QC outputs have been updated since
+                # the report was generated (the QC manifest is
+                # updated when QC completes for a Fastq)
+                qc_manifest = os.path.join(project.dirn,qc_dir,
+                                           QC_MANIFEST)
+                report_outdated = (os.path.exists(qc_zip) and
+                                   os.path.exists(qc_manifest) and
+                                   (os.path.getmtime(qc_manifest) >
+                                    os.path.getmtime(qc_zip)))
+                if report_outdated:
+                    print "...%s: QC updated since report was " \
+                        "generated" % qc_dir
                 # Check if we need to (re)generate report
                 if (regenerate_reports or
+                    report_outdated or
                     not os.path.exists(qc_zip)):
                     try:
                         project.qc_report(qc_dir=qc_dir,
@@ -307,14 +333,76 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
     if not fileops.exists(dirn):
         raise Exception("Failed to create directory: %s" % dirn)
     # Do file transfer and unpacking
+    transfers = dict()
     if projects:
         # Make log directory and set up scheduler
         # to farm out the intensive operations to
         ap.set_log_dir(ap.get_log_subdir('publish_qc'))
         runner = __settings.general.default_runner
         runner.set_log_dir(ap.log_dir)
-        sched = simple_scheduler.SimpleScheduler(runner=runner)
+        if max_transfers is None:
+            max_transfers = __settings.qc_web_server.max_transfers
+        sched = simple_scheduler.SimpleScheduler(
+            runner=runner,
+            max_concurrent=max_transfers,
+            poll_interval=TRANSFER_POLL_INTERVAL,
+            accounting_dir=ap.log_dir)
         sched.start()
+        # Start the transfers for all projects
+        print "Copying QC reports for %d projects (maximum of %s " \
+            "concurrent transfers)" % (len(projects),max_transfers)
+        for project in projects:
+            for qc_dir in project_qc[project.name].qc_dirs:
+                qc_artefacts = project_qc[project.name].qc_dirs[qc_dir]
+                qc_base = "%s_report" % qc_dir
+                # QC report
+                if 'qc_zip' in qc_artefacts:
+                    transfers[qc_artefacts.qc_zip] = submit_transfer(
+                        sched,
+                        qc_artefacts.qc_zip,
+                        dirn,
+                        name="qc_report.%s.%s" % (project.name,qc_dir),
+                        unzip=True)
+                # MultiQC
+                if 'multiqc_report' in qc_artefacts:
+                    final_multiqc = "multi%s.%s.html" % (qc_base,
+                                                         project.name)
+                    transfers[qc_artefacts.multiqc_report] = \
+                        submit_transfer(
+                            sched,
+                            qc_artefacts.multiqc_report,
+                            os.path.join(dirn,final_multiqc),
+                            name="multiqc_report.%s.%s" % (project.name,
+                                                           qc_dir))
+            # ICell8 pipeline report
+            if 'icell8_zip' in project_qc[project.name]:
+                icell8_zip = project_qc[project.name].icell8_zip
+                transfers[icell8_zip] = submit_transfer(
+                    sched,
+                    icell8_zip,
+                    dirn,
+                    name="icell8_report.%s" % project.name,
+                    unzip=True)
+            # Cellranger count report
+            if 'cellranger_zip' in project_qc[project.name]:
+                cellranger_zip = project_qc[project.name].cellranger_zip
+                transfers[cellranger_zip] = submit_transfer(
+                    sched,
+                    cellranger_zip,
+                    dirn,
+                    name="cellranger_report.%s" % project.name,
+                    unzip=True)
+        # Wait for all the transfers to finish
+        sched.wait()
+        # Remove ZIP archives from the server
+        if exclude_zip_files:
+            for filen in transfers:
+                if filen.endswith(".zip") and \
+                   transfer_succeeded(transfers[filen]):
+                    print "Removing %s from server" % filen
+                    fileops.remove_file(os.path.join(
+                        dirn,
+                        os.path.basename(filen)))
     else:
         sched = None
     # Start building an index page
@@ -422,7 +510,7 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
                                        PI=PI,
                                        Samples=project.prettyPrintSamples(),
                                        Nsamples=len(project.samples))
-            # Copy QC reports and other artefacts
+            # Add links to QC reports and other artefacts
             report_html = Para()
             for qc_dir in project_qc[project.name].qc_dirs:
                 qc_artefacts = project_qc[project.name].qc_dirs[qc_dir]
@@ -432,36 +520,13 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
                     fastq_set = fastq_dir
                 else:
                     fastq_set = None
+                fastq_set_name = (" (%s)" % fastq_set
+                                  if fastq_set is not None
+                                  else "")
                 # QC report
-                try:
+                if 'qc_zip' in qc_artefacts:
                     qc_zip = qc_artefacts.qc_zip
-                    try:
-                        # Copy and unzip QC report
-                        copy_job = sched.submit(
-                            fileops.copy_command(qc_zip,dirn),
-                            name="copy.qc_report.%s.%s" % (project.name,
-                                                           qc_dir))
-                        unzip_job = sched.submit(
-                            fileops.unzip_command(os.path.join(
-                                dirn,
-                                os.path.basename(qc_zip)),
-                                                  fileops.Location(dirn).path),
-                            name="unzip.qc_report.%s.%s" % (project.name,
-                                                            qc_dir),
-                            wait_for=(copy_job.name,))
-                        sched.wait()
-                        # Check the jobs completed ok
-                        if copy_job.exit_status or unzip_job.exit_status:
-                            raise Exception("copy and/or unzip job failed")
-                        if exclude_zip_files:
-                            print "Removing %s from server" % qc_zip
-                            fileops.remove_file(os.path.join(
-                                dirn,
-                                os.path.basename(qc_zip)))
-                        # Append info to the index page
-                        fastq_set_name = (" (%s)" % fastq_set
-                                          if fastq_set is not None
-                                          else "")
+                    if transfer_succeeded(transfers[qc_zip]):
                         report_html.add(
                             Link("[Report%s]" % fastq_set_name,
                                  "%s.%s.%s/%s.html"
@@ -473,56 +538,28 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
                             report_html.add(
                                 Link("[ZIP%s]" % fastq_set_name,
                                      os.path.basename(qc_zip)))
-                    except Exception as ex:
-                        print "Failed to copy QC report: %s" % ex
-                except AttributeError:
-                    # No QC report
-                    pass
+                    else:
+                        print "Failed to copy QC report: copy and/or " \
+                            "unzip job failed (%s)" % qc_zip
                 # MultiQC
-                try:
+                if 'multiqc_report' in qc_artefacts:
                     multiqc_report = qc_artefacts.multiqc_report
-                    assert(os.path.isfile(multiqc_report))
                     final_multiqc = "multi%s.%s.html" % (qc_base,
                                                          project.name)
-                    try:
-                        fileops.copy(multiqc_report,
-                                     os.path.join(dirn,final_multiqc))
+                    if transfer_succeeded(transfers[multiqc_report]):
                         report_html.add(
                             Link("[MultiQC%s]" % fastq_set_name,
                                  final_multiqc))
-                    except Exception as ex:
-                        print "Failed to copy MultiQC report: %s" % ex
-                except AttributeError:
-                    # No MultiQC report
-                    pass
+                    else:
+                        print "Failed to copy MultiQC report: copy " \
+                            "job failed (%s)" % multiqc_report
             # Check there is something to add
             if not report_html:
                 report_html.add("QC reports not available")
             # ICell8 pipeline report
-            try:
+            if 'icell8_zip' in project_qc[project.name]:
                 icell8_zip = project_qc[project.name].icell8_zip
-                try:
-                    # Copy and unzip ICell8 report
-                    copy_job = sched.submit(
-                        fileops.copy_command(icell8_zip,dirn),
-                        name="copy.icell8_report.%s" % project.name)
-                    unzip_job = sched.submit(
-                        fileops.unzip_command(os.path.join(
-                            dirn,
-                            os.path.basename(icell8_zip)),
-                                              fileops.Location(dirn).path),
-                        name="unzip.icell8_report.%s" % project.name,
-                        wait_for=(copy_job.name,))
-                    sched.wait()
-                    # Check the jobs completed ok
-                    if copy_job.exit_status or unzip_job.exit_status:
-                        raise Exception("copy and/or unzip job failed")
-                    if exclude_zip_files:
-                        print "Removing %s from server" % icell8_zip
-                        fileops.remove_file(os.path.join(
-                            dirn,
-                            os.path.basename(icell8_zip)))
-                    # Append info to the index page
+                if transfer_succeeded(transfers[icell8_zip]):
                     report_html.add(
                         Link("[Icell8 processing]",
                              "icell8_processing.%s.%s/"
@@ -532,37 +569,14 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
                     if not exclude_zip_files:
                         report_html.add(
                             Link("[ZIP]",
-                                 os.path.basename(icell8_processing_zip)))
-                except Exception as ex:
-                    print "Failed to copy ICell8 report: %s" % ex
-            except AttributeError:
-                # No ICell8 report
-                pass
+                                 os.path.basename(icell8_zip)))
+                else:
+                    print "Failed to copy ICell8 report: copy and/or " \
+                        "unzip job failed (%s)" % icell8_zip
             # Cellranger count reports
-            try:
+            if 'cellranger_zip' in project_qc[project.name]:
                 cellranger_zip = project_qc[project.name].cellranger_zip
-                try:
-                    # Copy and unzip cellranger report
-                    copy_job = sched.submit(
-                        fileops.copy_command(cellranger_zip,dirn),
-                        name="copy.cellranger_report.%s" % project.name)
-                    unzip_job = sched.submit(
-                        fileops.unzip_command(os.path.join(
-                            dirn,
-                            os.path.basename(cellranger_zip)),
-                                              fileops.Location(dirn).path),
-                        name="unzip.cellranger_report.%s" % project.name,
-                        wait_for=(copy_job.name,))
-                    sched.wait()
-                    # Check the jobs completed ok
-                    if copy_job.exit_status or unzip_job.exit_status:
-                        raise Exception("copy and/or unzip job failed")
-                    if exclude_zip_files:
-                            print "Removing %s from server" % cellranger_zip
-                            fileops.remove_file(os.path.join(
-                                dirn,
-                                os.path.basename(cellranger_zip)))
-                    # Append info to the index page
+                if transfer_succeeded(transfers[cellranger_zip]):
                     report_html.add(
                         Link("[Cellranger count]",
                              "cellranger_count_report.%s.%s/"
@@ -573,11 +587,9 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
                         report_html.add(
                             Link("[ZIP]",
                                  os.path.basename(cellranger_zip)))
-                except Exception as ex:
-                    print "Failed to copy cellranger report: %s" % ex
-            except AttributeError:
-                # No cellranger count data to copy
-                pass
+                else:
+                    print "Failed to copy cellranger report: copy " \
+                        "and/or unzip job failed (%s)" % cellranger_zip
             # Add to the index
             projects_tbl.set_value(idx,"Reports",report_html)
     # Finish index page
@@ -603,3 +615,56 @@ def publish_qc(ap,projects=None,location=None,ignore_missing_qc=False,
                                os.path.basename(ap.analysis_dir),
                                "index.html")
         print "QC published to %s" % url
+
+#######################################################################
+# Helper functions
+#######################################################################
+
+def submit_transfer(sched,src,dest,name,unzip=False):
+    """
+    Submit jobs to copy (and optionally unpack) a file
+
+    Arguments:
+      sched (SimpleScheduler): running scheduler to submit
+        the jobs to
+      src (str): path to the file to copy
+      dest (str): location to copy the file to, of the form
+        '[[user@]server:]path'
+      name (str): base name for the jobs (the jobs will be
+        called 'copy.NAME' and 'unzip.NAME')
+      unzip (bool): if True then also unpack the copied file
+        (which should be a ZIP archive) in the 'dest'
+        directory, once the copy has completed
+
+    Returns:
+      List: list of the submitted scheduler jobs.
+    """
+    copy_job = sched.submit(fileops.copy_command(src,dest),
+                            name="copy.%s" % name)
+    jobs = [copy_job]
+    if unzip:
+        unzip_job = sched.submit(
+            fileops.unzip_command(os.path.join(dest,
+                                               os.path.basename(src)),
+                                  fileops.Location(dest).path),
+            name="unzip.%s" % name,
+            wait_for=(copy_job.name,))
+        jobs.append(unzip_job)
+    return jobs
+
+def transfer_succeeded(jobs):
+    """
+    Check whether all the jobs for a transfer completed ok
+
+    Arguments:
+      jobs (list): list of scheduler jobs returned by
+        'submit_transfer'
+
+    Returns:
+      Boolean: True if all the jobs completed with zero exit
+        status, False otherwise.
+    """
+    for job in jobs:
+        if job.exit_code:
+            return False
+    return True
@@ -137,7 +137,8 @@ def report_concise(ap):
       String with the report text.
     """
     report = []
-    analysis_dir = utils.AnalysisDir(ap.analysis_dir)
+    analysis_dir = utils.AnalysisDir(ap.analysis_dir,
+                                     dir_index=ap.dir_index)
     for p in analysis_dir.projects:
         samples = "%d sample%s" % (len(p.samples),
                                    's' if len(p.samples) != 1
@@ -198,7 +199,8 @@ def report_summary(ap):
       String with the report text.
     """
     # Gather information
-    analysis_dir = utils.AnalysisDir(ap.analysis_dir)
+    analysis_dir = utils.AnalysisDir(ap.analysis_dir,
+                                     dir_index=ap.dir_index)
     datestamp = None
     instrument = None
     run_number = None
@@ -328,7 +330,8 @@ def report_projects(ap):
       String with the report text.
     """
     # Acquire data
-    analysis_dir = utils.AnalysisDir(ap.analysis_dir)
+    analysis_dir = utils.AnalysisDir(ap.analysis_dir,
+                                     dir_index=ap.dir_index)
     # General information
     run_name = ap.run_name
     try:
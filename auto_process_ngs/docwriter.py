@@ -37,6 +37,10 @@ Write the HTML document to a file:
 
 >>> d.write("report.html")
 
+The document is rendered and written in chunks (generated by the
+'iter_html' methods of the document and its contents), so large
+documents don't need to be held in memory in their entirety.
+
 There are also classes to create lists, tables, images, links and
 anchors (aka "targets") within documents.
 
@@ -52,12 +56,6 @@ The full list of available classes are:
 - Para: wrap heterogeneous items into a single block
 """
 
-#######################################################################
-# Imports
-#######################################################################
-
-from bcftbx.htmlpagewriter import HTMLPageWriter
-
 #######################################################################
 # Module data
 #######################################################################
@@ -86,7 +84,8 @@ class Document(object):
       list
 
     The 'html' method returns the document
-    body rendered as HTML; the 'write'
+    body rendered as HTML ('iter_html' yields
+    the same HTML in chunks); the 'write'
     method writes the full HTML document to
     file, including the document header, CSS
     rules etc.
@@ -167,29 +166,69 @@ class Document(object):
           String: HTML representation of the document
             content.
         """
-        html = []
+        return ''.join(self.iter_html())
+
+    def iter_html(self):
+        """
+        Generate HTML version of the document contents
+
+        Generator which yields the "body" HTML code
+        in chunks; concatenating the chunks gives
+        the same HTML as returned by the 'html'
+        method.
+
+        Yields:
+          String: successive chunks of HTML.
+        """
+        sep = ''
         if self._title is not None:
-            html.append("<h1>%s</h1>" % self._title)
+            yield "<h1>%s</h1>" % self._title
+            sep = '\n'
         for section in self._sections:
+            yield sep
+            sep = '\n'
             try:
-                html.append(section.html())
+                chunks = _html_chunks(section)
             except AttributeError,ex:
-                html.append("<p>Failed to render section: %s</p>" % ex)
-        return '\n'.join(html)
+                chunks = ("<p>Failed to render section: %s</p>" % ex,)
+            for chunk in chunks:
+                yield chunk
 
-    def write(self,outfile):
+    def write(self,outfile=None,fp=None):
         """
         Write document contents to a file
 
+        The document is rendered and written in
+        chunks, so the full HTML doesn't need to
+        be held in memory.
+
         Arguments
           outfile (str): path to file to write
             HTML document to
-        """
-        html = HTMLPageWriter(self._title)
-        for css_rule in self._css_rules:
-            html.addCSSRule(css_rule)
-        html.add(self.html())
-        html.write("%s" % outfile)
+          fp (File): file-like object to write
+            the HTML document to (used if 'outfile'
+            is not specified)
+        """
+        if outfile is not None:
+            with open(outfile,'w') as fp:
+                self.write(fp=fp)
+            return
+        # Header
+        fp.write("<html>\n")
+        fp.write("<head>\n")
+        fp.write("<title>%s</title>\n" % self._title)
+        if self._css_rules:
+            fp.write("<style type=\"text/css\">\n")
+            fp.write('\n'.join(self._css_rules))
+            fp.write("</style>\n")
+        fp.write("</head>\n")
+        # Content
+        fp.write("<body>\n")
+        for chunk in self.iter_html():
+            fp.write(chunk)
+        fp.write("</body>\n")
+        # Footer
+        fp.write("</html>\n")
 
 class Section(object):
     """
@@ -337,28 +376,39 @@ class Section(object):
         """
         Generate HTML version of the section
         """
+        return ''.join(self.iter_html())
+
+    def iter_html(self):
+        """
+        Generate HTML version of the section in chunks
+
+        Yields:
+          String: successive chunks of HTML.
+        """
         if self._title is None and \
            not self._content and \
            not self._css_classes:
-            return ""
+            return
         div = "<div"
         if self.name:
             div += " id='%s'" % self.name
         if self._css_classes:
             div += " class='%s'" % ' '.join(self._css_classes)
         div += ">"
-        html = [div,]
+        yield div
         if self._title is not None:
-            html.append("<h%d>%s</h%d>" % (self._level,
-                                           self._title,
-                                           self._level))
+            yield "\n<h%d>%s</h%d>" % (self._level,
+                                        self._title,
+                                        self._level)
         for content in self._content:
+            yield '\n'
             try:
-                html.append(content.html())
+                chunks = _html_chunks(content)
             except AttributeError,ex:
-                html.append("<p>%s</p>" % str(content))
-        html.append('</div>')
-        return '\n'.join(html)
+                chunks = ("<p>%s</p>" % str(content),)
+            for chunk in chunks:
+                yield chunk
+        yield '\n</div>'
 
 class Table(object):
     """
@@ -409,6 +459,7 @@ class Table(object):
     The Table class provides the following properties:
 
     - nrows: number of rows in the table
+    - columns: list of the column ids
 
     It provides the following methods:
 
@@ -417,6 +468,7 @@ class Table(object):
     - append_columns: add additional columns to the table
     - add_row: append a row to the table
     - set_value: set the value in a table cell
+    - get_value: get the value in a table cell
     """
     def __init__(self,columns,**aliases):
         """
@@ -442,6 +494,13 @@ class Table(object):
         """
         return len(self._rows)
 
+    @property
+    def columns(self):
+        """
+        Return the list of column ids
+        """
+        return [col for col in self._columns]
+
     def add_css_classes(self,*classes,**kws):
         """
         Associate CSS classes with the table
@@ -542,12 +601,40 @@ class Table(object):
             raise KeyError("Key '%s' not found" % key)
         self._rows[row][key] = value
 
+    def get_value(self,row,key):
+        """
+        Get the value of a cell in the table
+
+        Arguments:
+          row (int): index of the row
+          key (str): id of the column to get the
+            value for in this row
+
+        Returns:
+          Object: the value assigned to the table
+            cell, or None if no value has been set.
+        """
+        if key not in self._columns:
+            raise KeyError("Key '%s' not found" % key)
+        return self._rows[row].get(key)
+
     def html(self,css_id=None):
         """
         Generate HTML version of the table contents
 
         """
-        html = []
+        return ''.join(self.iter_html(css_id=css_id))
+
+    def iter_html(self,css_id=None):
+        """
+        Generate HTML version of the table in chunks
+
+        Each row of the table is yielded as a
+        separate chunk.
+
+        Yields:
+          String: successive chunks of HTML.
+        """
         # Opening tag
         table_tag = []
         table_tag.append("<table")
@@ -556,48 +643,45 @@ class Table(object):
         if self._css_classes:
             table_tag.append(" class='%s'" % ' '.join(self._css_classes))
         table_tag.append(">")
-        html.append(''.join(table_tag))
+        yield ''.join(table_tag)
+        # CSS classes for each column
+        css_classes = {}
+        for col in self._columns:
+            try:
+                css_classes[col] = " class='%s'" % \
+                                   ' '.join(self._css_classes_columns[col])
+            except KeyError:
+                css_classes[col] = ''
         # Header
         if self._output_header:
             header = []
-            header.append("<tr>")
+            header.append("\n<tr>")
             for col in self._columns:
-                try:
-                    css_classes = " class='%s'" % \
-                                  ' '.join(self._css_classes_columns[col])
-                except KeyError:
-                    css_classes = ''
                 try:
                     col_name = self._column_names[col]
                 except KeyError:
                     col_name = col
-                header.append("<th%s>%s</th>" % (css_classes,
+                header.append("<th%s>%s</th>" % (css_classes[col],
                                                  str(col_name)))
             header.append("</tr>")
-            html.append(''.join(header))
+            yield ''.join(header)
         # Body
         for row in self._rows:
             line = []
-            line.append("<tr>")
+            line.append("\n<tr>")
             for col in self._columns:
-                try:
-                    css_classes = " class='%s'" % \
-                                  ' '.join(self._css_classes_columns[col])
-                except KeyError:
-                    css_classes = ''
                 try:
                     value = row[col].html()
                 except KeyError:
                     value = '&nbsp;'
                 except AttributeError:
                     value = row[col]
-                line.append("<td%s>%s</td>" % (css_classes,
+                line.append("<td%s>%s</td>" % (css_classes[col],
                                                value))
             line.append("</tr>")
-            html.append(''.join(line))
+            yield ''.join(line)
         # Finish
-        html.append("</table>")
-        return '\n'.join(html)
+        yield "\n</table>"
 
 class List(object):
     """
@@ -649,32 +733,41 @@ class List(object):
         """
         Generate HTML version of the list
         """
+        return ''.join(self.iter_html())
+
+    def iter_html(self):
+        """
+        Generate HTML version of the list in chunks
+
+        Yields:
+          String: successive chunks of HTML.
+        """
         # Empty list?
         if not self._items:
-            return ""
+            return
         # List type
         if self._ordered:
             tag = "ol"
         else:
             tag = "ul"
-        # Build the html
-        html = []
-        html.append("<%s" % tag)
+        # Opening tag
         if self._name:
-            html.append(" id='%s'" % self._name)
-        html.append(">")
+            yield "<%s id='%s'>" % (tag,self._name)
+        else:
+            yield "<%s>" % tag
         # Add items
         for item in self._items:
-            html.append("<li>")
+            yield "<li>"
             for i in item:
                 try:
-                    html.append(i.html())
+                    chunks = _html_chunks(i)
                 except AttributeError:
-                    html.append(str(i))
-            html.append("</li>")
+                    chunks = (str(i),)
+                for chunk in chunks:
+                    yield chunk
+            yield "</li>"
         # Close the list
-        html.append("</%s>" % tag)
-        return "".join(html)
+        yield "</%s>" % tag
 
 class Img(object):
     """
@@ -688,7 +781,7 @@ class Img(object):
 
     """
     def __init__(self,src,name=None,height=None,width=None,href=None,
-                 alt=None):
+                 alt=None,lazy=False):
         """
         Create a new Img instance
 
@@ -705,6 +798,10 @@ class Img(object):
           alt (str): if specified then used as the
             'alternative text' ('alt' attribute
             for <img.../> tag
+          lazy (bool): if True then the browser is
+            asked to defer loading the image until it
+            is about to be displayed ('loading'
+            attribute for <img.../> tag)
 
         """
         self._src = src
@@ -713,6 +810,7 @@ class Img(object):
         self._name = name
         self._target = href
         self._alt = alt
+        self._lazy = lazy
 
     @property
     def name(self):
@@ -739,6 +837,9 @@ class Img(object):
         # Optional alt text
         if self._alt:
             html.append("alt='%s'" % self._alt)
+        # Optional lazy loading
+        if self._lazy:
+            html.append("loading='lazy'")
         # Close the tag
         html.append("/>")
         # Wrap in a hef
@@ -914,3 +1015,29 @@ class Para(object):
         Para instance is True if has content, False otherwise
         """
         return bool(self._content)
+
+#######################################################################
+# Functions
+#######################################################################
+
+def _html_chunks(item):
+    """
+    Internal: return an iterator over the HTML for an item
+
+    Items which implement an 'iter_html' method are
+    rendered incrementally; otherwise the item's 'html'
+    method is invoked to render the whole item at once.
+
+    Raises AttributeError if the item doesn't implement
+    either method.
+
+    Arguments:
+      item (object): item to render
+
+    Returns:
+      Iterator: yields chunks of HTML for the item.
+    """
+    try:
+        return item.iter_html()
+    except AttributeError:
+        return iter((item.html(),))
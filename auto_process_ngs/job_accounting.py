@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+#
+#     job_accounting.py: collect resource usage for scheduler jobs
+#     Copyright (C) University of Manchester 2018 Peter Briggs
+#
+########################################################################
+#
+# job_accounting.py
+#
+#########################################################################
+
+"""
+job_accounting
+
+Utility functions for collecting and reporting the resources used
+by jobs run via the scheduler (wall time, CPU time, maximum
+resident set size and I/O).
+
+For jobs run locally, the module can be run as a script to wrap
+the job command:
+
+::
+
+    python job_accounting.py STATS_FILE COMMAND [ARGS...]
+
+in which case the command is run as a child process and the
+resource usage reported by 'os.wait4' is written to STATS_FILE
+(as JSON) when it finishes; the exit code is that of the
+command.
+
+For jobs run on Grid Engine, the resource usage is obtained
+from the 'qacct' accounting utility.
+
+Functions:
+
+- run_command: run a command and record its resource usage
+- read_accounting_file: read resource usage written by
+  'run_command'
+- parse_qacct: extract resource usage from 'qacct' output
+- qacct: fetch resource usage for a Grid Engine job
+- write_accounting_csv: write resource usage for jobs as CSV
+- write_accounting_json: write resource usage for jobs as JSON
+- format_accounting_table: format resource usage for jobs as
+  a table
+"""
+
+########################################################################
+# Imports
+#########################################################################
+
+import os
+import sys
+import time
+import json
+import errno
+import signal
+import logging
+import subprocess
+
+# Module specific logger
+logger = logging.getLogger(__name__)
+
+########################################################################
+# Constants
+#########################################################################
+
+# Resource usage fields, in output order
+ACCOUNTING_FIELDS = ('wall_time',
+                     'cpu_time',
+                     'max_rss',
+                     'read_bytes',
+                     'write_bytes',)
+
+# Size of blocks reported by 'getrusage'
+RUSAGE_BLOCK_SIZE = 512
+
+########################################################################
+# Functions
+#########################################################################
+
+def run_command(args,stats_file):
+    """
+    Run a command and record the resources that it used
+
+    The command is run as a child process; signals which
+    would terminate this process (e.g. SIGTERM) are
+    forwarded to the child, and on Linux the child is
+    also sent SIGTERM if this process is killed.
+
+    Arguments:
+      args (list): command and arguments to run
+      stats_file (str): path to file to write resource
+        usage to (as JSON)
+
+    Returns:
+      Integer: exit code from the command.
+    """
+    # Forward termination signals to the child
+    child = []
+    def forward_signal(signum,frame):
+        if child:
+            os.kill(child[0],signum)
+    for signum in (signal.SIGTERM,signal.SIGINT,signal.SIGHUP):
+        signal.signal(signum,forward_signal)
+    # Run the command
+    start_time = time.time()
+    pid = os.fork()
+    if pid == 0:
+        _set_parent_death_signal(signal.SIGTERM)
+        try:
+            os.execvp(args[0],args)
+        except OSError as ex:
+            sys.stderr.write("%s: %s\n" % (args[0],ex))
+        os._exit(127)
+    child.append(pid)
+    while True:
+        try:
+            pid,status,rusage = os.wait4(pid,0)
+            break
+        except OSError as ex:
+            if ex.errno != errno.EINTR:
+                raise
+    end_time = time.time()
+    if os.WIFEXITED(status):
+        exit_code = os.WEXITSTATUS(status)
+    else:
+        exit_code = 128 + os.WTERMSIG(status)
+    # Maximum RSS is in kilobytes on Linux and bytes on OSX
+    max_rss = rusage.ru_maxrss
+    if sys.platform != 'darwin':
+        max_rss = max_rss*1024
+    stats = dict(wall_time=end_time-start_time,
+                 cpu_time=rusage.ru_utime+rusage.ru_stime,
+                 user_time=rusage.ru_utime,
+                 system_time=rusage.ru_stime,
+                 max_rss=max_rss,
+                 read_bytes=rusage.ru_inblock*RUSAGE_BLOCK_SIZE,
+                 write_bytes=rusage.ru_oublock*RUSAGE_BLOCK_SIZE,
+                 exit_code=exit_code)
+    try:
+        with open(stats_file,'w') as fp:
+            json.dump(stats,fp)
+    except IOError as ex:
+        sys.stderr.write("Failed to write job accounting to %s: %s\n" %
+                         (stats_file,ex))
+    return exit_code
+
+def read_accounting_file(stats_file):
+    """
+    Read resource usage written by 'run_command'
+
+    Arguments:
+      stats_file (str): path to the file with resource
+        usage data
+
+    Returns:
+      Dictionary: resource usage (with the keys in
+        ACCOUNTING_FIELDS), or None if the file doesn't
+        exist or can't be read.
+    """
+    try:
+        with open(stats_file,'r') as fp:
+            stats = json.load(fp)
+    except (IOError,ValueError) as ex:
+        logger.debug("Failed to read job accounting from %s: %s" %
+                     (stats_file,ex))
+        return None
+    return dict([(field,stats.get(field)) for field in ACCOUNTING_FIELDS])
+
+def parse_qacct(output):
+    """
+    Extract resource usage from 'qacct -j' output
+
+    Arguments:
+      output (str): output from 'qacct -j JOB_ID'
+
+    Returns:
+      Dictionary: resource usage (with the keys in
+        ACCOUNTING_FIELDS), or None if no accounting
+        data was found.
+    """
+    values = dict()
+    for line in output.split('\n'):
+        fields = line.strip().split(None,1)
+        if len(fields) == 2:
+            values[fields[0]] = fields[1].strip()
+    if not values:
+        return None
+    # Maximum RSS is in kilobytes, but may not be
+    # reported by some systems (in which case use the
+    # maximum virtual memory instead)
+    max_rss = _parse_number(values.get('ru_maxrss'))
+    if max_rss:
+        max_rss = int(max_rss*1024)
+    else:
+        max_rss = _parse_size(values.get('maxvmem'))
+    read_bytes = _parse_number(values.get('ru_inblock'))
+    if read_bytes is not None:
+        read_bytes = int(read_bytes*RUSAGE_BLOCK_SIZE)
+    write_bytes = _parse_number(values.get('ru_oublock'))
+    if write_bytes is not None:
+        write_bytes = int(write_bytes*RUSAGE_BLOCK_SIZE)
+    return dict(wall_time=_parse_number(values.get('ru_wallclock')),
+                cpu_time=_parse_number(values.get('cpu')),
+                max_rss=max_rss,
+                read_bytes=read_bytes,
+                write_bytes=write_bytes)
+
+def qacct(job_id):
+    """
+    Fetch resource usage for a Grid Engine job
+
+    Arguments:
+      job_id (str): Grid Engine job id
+
+    Returns:
+      Dictionary: resource usage (with the keys in
+        ACCOUNTING_FIELDS), or None if 'qacct' failed
+        or returned no data.
+    """
+    try:
+        p = subprocess.Popen(['qacct','-j',str(job_id)],
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        output,error = p.communicate()
+    except OSError as ex:
+        logger.debug("Failed to run qacct: %s" % ex)
+        return None
+    if p.returncode != 0:
+        logger.debug("qacct returned %s for job %s: %s" %
+                     (p.returncode,job_id,error))
+        return None
+    return parse_qacct(output)
+
+def write_accounting_csv(filen,jobs):
+    """
+    Write resource usage for jobs to a CSV file
+
+    Arguments:
+      filen (str): path to the output file
+      jobs (list): list of SchedulerJob instances
+    """
+    with open(filen,'w') as fp:
+        fp.write("%s\n" % ','.join(('job_number','job_name','job_id',
+                                     'exit_code')+ACCOUNTING_FIELDS))
+        for job in jobs:
+            values = [job.job_number,
+                      '"%s"' % str(job.job_name).replace('"','""'),
+                      job.job_id,
+                      job.exit_code]
+            values.extend([getattr(job,field) for field in ACCOUNTING_FIELDS])
+            fp.write("%s\n" % ','.join(['' if v is None else str(v)
+                                        for v in values]))
+
+def write_accounting_json(filen,jobs):
+    """
+    Write resource usage for jobs to a JSON file
+
+    Arguments:
+      filen (str): path to the output file
+      jobs (list): list of SchedulerJob instances
+    """
+    data = []
+    for job in jobs:
+        job_data = dict(job_number=job.job_number,
+                        job_name=job.job_name,
+                        job_id=job.job_id,
+                        exit_code=job.exit_code)
+        for field in ACCOUNTING_FIELDS:
+            job_data[field] = getattr(job,field)
+        data.append(job_data)
+    with open(filen,'w') as fp:
+        json.dump(data,fp,indent=2)
+
+def format_accounting_table(jobs):
+    """
+    Format resource usage for jobs as a text table
+
+    Arguments:
+      jobs (list): list of SchedulerJob instances
+
+    Returns:
+      String: table with one line for each job.
+    """
+    lines = ["%-6s %-40s %5s %10s %10s %10s %10s %10s" %
+             ('#','Name','Exit','Wall(s)','CPU(s)','RSS(MB)',
+              'Read(MB)','Write(MB)')]
+    for job in jobs:
+        name = str(job.job_name)
+        if len(name) > 40:
+            name = "...%s" % name[-37:]
+        lines.append("%-6s %-40s %5s %10s %10s %10s %10s %10s" %
+                     (job.job_number,
+                      name,
+                      '' if job.exit_code is None else job.exit_code,
+                      _format_value(job.wall_time),
+                      _format_value(job.cpu_time),
+                      _format_value(job.max_rss,scale=1024*1024),
+                      _format_value(job.read_bytes,scale=1024*1024),
+                      _format_value(job.write_bytes,scale=1024*1024)))
+    return '\n'.join(lines)
+
+def _set_parent_death_signal(signum):
+    """
+    Internal: request signal when the parent process dies
+
+    Only available on Linux (does nothing on other systems).
+    """
+    if not sys.platform.startswith('linux'):
+        return
+    try:
+        import ctypes
+        PR_SET_PDEATHSIG = 1
+        ctypes.CDLL("libc.so.6").prctl(PR_SET_PDEATHSIG,signum)
+    except Exception:
+        pass
+
+def _format_value(value,scale=1):
+    """
+    Internal: format a resource usage value for display
+    """
+    if value is None:
+        return 'n/a'
+    return "%.1f" % (float(value)/scale)
+
+def _parse_number(s):
+    """
+    Internal: convert a 'qacct' value to a float
+
+    Trailing units (e.g. 's' for seconds) are ignored;
+    returns None if the value can't be converted.
+    """
+    if s is None:
+        return None
+    s = s.rstrip('s')
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+def _parse_size(s):
+    """
+    Internal: convert a 'qacct' memory size (e.g. '1.2G') to bytes
+    """
+    if s is None:
+        return None
+    multiplier = 1
+    units = { 'B': 1,
+              'K': 1024,
+              'M': 1024*1024,
+              'G': 1024*1024*1024,
+              'T': 1024*1024*1024*1024, }
+    if s[-1:].upper() in units:
+        multiplier = units[s[-1:].upper()]
+        s = s[:-1]
+    try:
+        return int(float(s)*multiplier)
+    except ValueError:
+        return None
+
+########################################################################
+# Main program
+#########################################################################
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.stderr.write("Usage: %s STATS_FILE COMMAND [ARGS...]\n" %
+                         os.path.basename(sys.argv[0]))
+        sys.exit(2)
+    sys.exit(run_command(sys.argv[2:],sys.argv[1]))
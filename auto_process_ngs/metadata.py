@@ -30,13 +30,24 @@ Classes:
 #######################################################################
 
 import os
+import stat
+import errno
 import logging
+import tempfile
 import bcftbx.TabFile as TabFile
 import bcftbx.utils as bcf_utils
 
 # Module specific logger
 logger = logging.getLogger(__name__)
 
+# Values with special meanings in metadata files
+_SPECIAL_VALUES = { '.': None,
+                    'None': None,
+                    'Y': True,
+                    'True': True,
+                    'N': False,
+                    'False': False, }
+
 #######################################################################
 # Classes
 #######################################################################
@@ -108,11 +119,13 @@ class MetadataDict(bcf_utils.AttributeDictionary):
         # Set up empty metadata attributes
         self.__attributes = attributes
         for key in self.__attributes:
-            self[key] = None
-        if self.__filen:
-            # Load data from external file
-            if os.path.exists(self.__filen):
-                self.load(self.__filen)
+            bcf_utils.AttributeDictionary.__setitem__(self,key,None)
+        # Lookup table mapping file keys to attributes
+        self.__file_keys = dict([(self.__attributes[key],key)
+                                 for key in self.__attributes])
+        # State of the file when the data were last loaded or
+        # saved (set to None when the data are modified)
+        self.__file_state = None
         # Set up order of keys for output
         if order is None:
             self.__key_order = self.__attributes.keys()
@@ -133,9 +146,16 @@ class MetadataDict(bcf_utils.AttributeDictionary):
             if extra_keys:
                 extra_keys.sort()
                 self.__key_order.extend(extra_keys)
+        if self.__filen:
+            # Load data from external file
+            if os.path.exists(self.__filen):
+                self.load(self.__filen)
 
     def __setitem__(self,key,value):
         if key in self.__attributes:
+            if key not in self or \
+               bcf_utils.AttributeDictionary.__getitem__(self,key) != value:
+                self.__file_state = None
             bcf_utils.AttributeDictionary.__setitem__(self,key,value)
         else:
             raise AttributeError,"Key '%s' not defined" % key
@@ -143,6 +163,17 @@ class MetadataDict(bcf_utils.AttributeDictionary):
     def __iter__(self):
         return iter(self.__key_order)
 
+    @property
+    def modified(self):
+        """
+        Check if the data differ from the associated file
+
+        Returns True if values have been changed since
+        the data were last loaded or saved (or if they
+        have never been loaded or saved).
+        """
+        return (self.__file_state is None)
+
     def load(self,filen,strict=True):
         """Load key-value pairs from a tab-delimited file
         
@@ -162,26 +193,24 @@ class MetadataDict(bcf_utils.AttributeDictionary):
 
         """
         self.__filen = filen
-        metadata = TabFile.TabFile(filen)
-        for line in metadata:
+        st = os.stat(filen)
+        with open(filen,'rU') as fp:
+            contents = fp.read()
+        for line in contents.split('\n'):
+            if not line.strip() or line.startswith('#'):
+                continue
             try:
                 # Get data from file and convert special values
                 # to Python equivalents
-                attr,value = line[0],line[1]
-                if value == '.' or value == 'None':
-                    value = None
-                elif value == 'Y' or value == 'True':
-                    value = True
-                elif value == 'N' or value == 'False':
-                    value = False
+                attr,value = line.split('\t')[0:2]
+                try:
+                    value = _SPECIAL_VALUES[value]
+                except KeyError:
+                    value = _typed_value(value)
                 # Locate dictionary key matching file key
-                found_key = False
-                for key in self.__attributes:
-                    if self.__attributes[key] == attr:
-                        self[key] = value
-                        found_key = True
-                        break
-                if not found_key:
+                try:
+                    self[self.__file_keys[attr]] = value
+                except KeyError:
                     if strict:
                         logger.debug("Unrecognised key in %s: %s"
                                      % (filen,attr))
@@ -189,10 +218,19 @@ class MetadataDict(bcf_utils.AttributeDictionary):
                         logger.debug("Adding key from %s: %s"
                                      % (filen,attr))
                         self.__attributes[attr] = attr
+                        self.__file_keys[attr] = attr
                         self.__key_order.append(attr)
                         self[attr] = value
-            except IndexError:
+            except ValueError:
                 logger.warning("Bad line in %s: %s" % (filen,line))
+        # Only consider the data to be unmodified if saving
+        # would reproduce the file exactly
+        if self.__contents() == contents:
+            self.__file_state = (os.path.realpath(filen),
+                                 st.st_mtime,
+                                 st.st_size)
+        else:
+            self.__file_state = None
 
     def save(self,filen=None):
         """Save metadata to tab-delimited file
@@ -201,7 +239,11 @@ class MetadataDict(bcf_utils.AttributeDictionary):
         The data can be recovered using the 'load' method.
  
         Note that if the specified file already exists then
-        it will be overwritten.
+        it will be overwritten (unless it was the file the
+        data were loaded from, and neither the data nor
+        the file have changed since, in which case nothing
+        is written). The data are written to a temporary
+        file first and then moved into place.
 
         Arguments:
           filen: name of the tab-delimited file with key-value
@@ -209,25 +251,55 @@ class MetadataDict(bcf_utils.AttributeDictionary):
             object was instantiated will be used instead.
 
         """
-        metadata = TabFile.TabFile()
+        if filen is not None:
+            self.__filen = filen
+        # Resolve links so that the target file is replaced
+        filen = os.path.realpath(self.__filen)
+        try:
+            st = os.stat(filen)
+            if self.__file_state == (filen,st.st_mtime,st.st_size):
+                logger.debug("%s: unchanged, not saving" % filen)
+                return
+            mode = stat.S_IMODE(st.st_mode)
+            gid = st.st_gid
+        except OSError:
+            mode = 0664
+            gid = None
+        # Write the file
+        fd,tmp = tempfile.mkstemp(dir=os.path.dirname(filen),
+                                  prefix=".%s." % os.path.basename(filen))
+        with os.fdopen(fd,'w') as fp:
+            fp.write(self.__contents())
+        os.chmod(tmp,mode)
+        if gid is not None:
+            # Keep the group of the original file (if allowed)
+            try:
+                os.chown(tmp,-1,gid)
+            except OSError as ex:
+                if ex.errno != errno.EPERM:
+                    raise
+        os.rename(tmp,filen)
+        st = os.stat(filen)
+        self.__file_state = (filen,st.st_mtime,st.st_size)
+
+    def __contents(self):
+        """Internal: return the data formatted for writing to file
+
+        Values are converted to the appropriate format for
+        persistent storage (e.g. None is written as '.').
+        """
+        lines = []
         for key in self.__key_order:
-            # Retrieve value and convert to appropriate
-            # format for persistent storage
-            value = self[key]
+            value = bcf_utils.AttributeDictionary.__getitem__(self,key)
             if value is None:
                 value = '.'
             elif value is True:
                 value = 'Y'
             elif value is False:
                 value = 'N'
-            # Get the equivalent file key
-            attr = self.__attributes[key]
-            # Store in the file
-            metadata.append(data=(attr,value))
-        # Write the file
-        if filen is not None:
-            self.__filen = filen
-        metadata.write(self.__filen)
+            lines.append("%s\t%s\n" % (str(self.__attributes[key]),
+                                       str(value)))
+        return ''.join(lines)
 
     def null_items(self):
         """
@@ -414,6 +486,10 @@ class ProjectMetadataFile(TabFile.TabFile):
 
     Any fields set to None will be written to file with a '.'
     placeholder.
+
+    An index of the lines for each project name is maintained,
+    so that projects can be located without scanning the whole
+    file.
     """
     def __init__(self,filen=None):
         """Create a new ProjectsMetadataFile instance
@@ -464,6 +540,10 @@ class ProjectMetadataFile(TabFile.TabFile):
         for field in self._default_fields:
             if field not in self._fields:
                 self.appendColumn(field)
+        # Index the data lines by project name
+        self._projects = dict()
+        for line in self:
+            self._projects.setdefault(line['Project'],line)
 
     def add_project(self,project_name,sample_names,**kws):
         """Add information about a project into the file
@@ -487,6 +567,7 @@ class ProjectMetadataFile(TabFile.TabFile):
         kws['sample_names'] = ','.join(sample_names)
         # Create an empty data line for the project
         project = self.append()
+        self._projects[project_name] = project
         # Assign the data
         for field in self._fields:
             # Identify the keyword parameter for this field
@@ -522,10 +603,11 @@ class ProjectMetadataFile(TabFile.TabFile):
             information about the project
         """
         # Fetch data line for existing project
-        if project_name not in self:
+        try:
+            project = self._projects[project_name]
+        except KeyError:
             raise Exception("Project '%s' not found" %
                             project_name)
-        project = self.lookup("Project",project_name)[0]
         # Set sample names, if supplied
         try:
             kws['sample_names'] = ','.join(kws['sample_names'])
@@ -548,11 +630,72 @@ class ProjectMetadataFile(TabFile.TabFile):
             else:
                 project[field] = value
 
+    def update_projects(self,projects):
+        """Add or update information for multiple projects
+
+        Projects which are already in the file are updated
+        (as for 'update_project'), and those which aren't
+        are added (as for 'add_project').
+
+        Arguments:
+          projects (list): list of tuples of the form
+            '(project_name,kws)', where 'kws' is a dictionary
+            with the keyword arguments (e.g. 'sample_names',
+            'user' etc) to set for the project
+        """
+        for project_name,kws in projects:
+            kws = dict(kws)
+            if project_name in self:
+                self.update_project(project_name,**kws)
+            else:
+                sample_names = kws.pop('sample_names',[])
+                self.add_project(project_name,sample_names,**kws)
+
     def project(self,name):
         """Return AttributeDictionary for a project
 
+        The keys of the returned dictionary are the same
+        as the keyword arguments for 'add_project' (e.g.
+        'project_name', 'sample_names', 'user' etc); values
+        which are '.' in the file are returned as None.
+
+        Arguments:
+          name (str): name of the project
+
+        Returns:
+          AttributeDictionary: the data for the project.
+        """
+        try:
+            line = self._projects[name]
+        except KeyError:
+            raise Exception("Project '%s' not found" % name)
+        project = bcf_utils.AttributeDictionary()
+        for field in self._fields:
+            value = line[field]
+            if value == '.':
+                value = None
+            project[self._kwmap.get(field,field)] = value
+        return project
+
+    def lookup(self,key,value):
+        """Return the data lines where a field matches a value
+
+        Lookups on project names use the index rather than
+        scanning the data.
+
+        Arguments:
+          key (str): name of the field to look up
+          value (str): value to match
+
+        Returns:
+          List: the matching data lines.
         """
-        raise NotImplementedError
+        if key == 'Project':
+            try:
+                return [self._projects[value]]
+            except KeyError:
+                return []
+        return TabFile.TabFile.lookup(self,key,value)
 
     def save(self,filen=None):
         """Save the data back to file
@@ -568,8 +711,9 @@ class ProjectMetadataFile(TabFile.TabFile):
 
     def __contains__(self,name):
         """
+        Check if a project name appears in the file
         """
-        return (name in [p[self._fields[0]] for p in self])
+        return (name in self._projects)
 
 class AnalysisProjectQCDirInfo(MetadataDict):
     """Class for storing metadata for a QC output directory
@@ -596,3 +740,26 @@ class AnalysisProjectQCDirInfo(MetadataDict):
                                   'fastq_dir',
                               ),
                               filen=filen)
+
+#######################################################################
+# Functions
+#######################################################################
+
+def _typed_value(value):
+    """
+    Internal: convert a metadata value to int or float
+
+    Arguments:
+      value (str): value read from a metadata file
+
+    Returns:
+      The value as an int or float if it can be
+      converted, otherwise the original string.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
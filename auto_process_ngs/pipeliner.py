@@ -21,12 +21,15 @@ The core classes are:
 Additional supporting classes:
 
 - PipelineCommandWrapper: shortcut alternative to PipelineCommand
+- PipelineMapTask: running a command for each of a set of input items
 - FileCollector: returning collections of files based on glob patterns
+- OutputStream: outputs from a task which become available incrementally
 
 There are some underlying classes and functions that are intended for
 internal use:
 
 - Capturing: capture stdout from a Python function
+- PipelineCommandChunk: run a set of commands from a single script
 - sanitize_name: clean up task and command names for use in pipeline
 - collect_files: collect files based on glob patterns
 
@@ -234,6 +237,102 @@ be used as an alternative where appropriate. For example::
         def output():
             return FileCollector(self.args.d,"*")
 
+Streaming outputs between tasks
+-------------------------------
+
+Normally a task can only start once all the tasks that it
+depends on have completed. Alternatively a task can make its
+outputs available incrementally, as individual commands
+complete, via its ``stream`` property; tasks which take this
+stream as an argument can then start processing each item as
+soon as it becomes available.
+
+For example::
+
+    class MakeFiles(PipelineTask):
+        def init(self,d,filenames):
+            pass
+        def setup(self):
+            for f in self.args.filenames:
+                f = os.path.join(self.args.d,f)
+                self.add_cmd(PipelineCommandWrapper(
+                    "Make file","touch",f),
+                             stream_item=f)
+        def output(self):
+            return self.stream
+
+    class CompressFiles(PipelineTask):
+        def init(self,files):
+            pass
+        def setup(self):
+            pass
+        def setup_item(self,f):
+            self.add_cmd(PipelineCommandWrapper(
+                "Compress file","gzip",f),
+                         stream_item="%s.gz" % f)
+        def output(self):
+            return self.stream
+
+    make_files = MakeFiles("Make files",d,filenames)
+    compress_files = CompressFiles("Compress files",
+                                   make_files.stream)
+
+The key features are:
+
+1. The ``stream_item`` argument of ``add_cmd`` associates an
+   item with each command; it is added to the task's output
+   stream as soon as the command completes successfully.
+
+2. A task which receives an ``OutputStream`` as an argument
+   implements the ``setup_item`` method, which is invoked for
+   each item in the stream as soon as it becomes available.
+   Commands added within ``setup_item`` are submitted
+   immediately. The ``setup`` method is still invoked once,
+   before any items are processed.
+
+3. The receiving task completes (and its ``finish`` method is
+   invoked) once the input stream has been closed (i.e. the
+   producing task has finished) and all of its commands have
+   completed.
+
+When the tasks are added to a pipeline, the producing task
+should still be listed as a requirement of the receiving task;
+however the receiving task will be started as soon as the
+producing task has started, rather than waiting for it to
+complete.
+
+Running a command for each input item
+-------------------------------------
+
+The ``PipelineMapTask`` class provides a task which runs a
+command for each item in a set of inputs (which can be either
+a list or the ``stream`` from another task), for example::
+
+    compress_files = PipelineMapTask(
+        "Compress files",
+        make_files.stream,
+        lambda f: PipelineCommandWrapper("Compress file","gzip",f),
+        output=lambda f: "%s.gz" % f,
+        chunk_size=10,
+        max_concurrent=4)
+
+The ``chunk_size`` argument groups the commands for consecutive
+items so that they are run one after another within a single
+job (which can reduce the number of jobs and scripts when there
+are many quick commands), and ``max_concurrent`` limits the
+number of jobs from the task that will run at the same time.
+
+The outputs are added to the task's ``stream`` as each job
+completes, and the list returned by ``output`` contains the
+outputs for all the items (in the same order as the inputs)
+once the task has finished.
+
+``PipelineMapTask`` can also be subclassed, in which case the
+subclass implements ``map_command`` (and optionally
+``map_items`` and ``map_output``) in place of the functions
+supplied as arguments, along with any ``setup`` and ``finish``
+methods.
+
 Building and running a pipeline
 -------------------------------
 
@@ -302,6 +401,28 @@ The ``run`` method also accepts a ``runner`` method which sets
 the default job runner that the pipeline will use. By default
 jobs are run using a ``SimpleJobRunner`` instance.
 
+Task ordering and timings
+-------------------------
+
+When more than one task is ready to run, the pipeline starts
+those on the 'critical path' first (that is, the tasks on the
+longest chain of dependent tasks through the pipeline). Tasks
+are started in a pool of threads (set by the ``max_setup_threads``
+argument of ``run``), so that slow ``setup`` methods don't hold
+up other tasks.
+
+When the pipeline completes, the time taken by each task is
+written to a ``.durations`` file in the log directory, and the
+critical path and the 'slack' for each task (i.e. how long it
+could be delayed without delaying the pipeline) are reported.
+If the pipeline is run again using the same log directory then
+the recorded durations are used to determine the critical path.
+
+If the pipeline creates its own scheduler then the resources used
+by each job (wall time, CPU time, maximum memory and I/O) are also
+written to ``job_accounting.csv`` and ``job_accounting.json``
+files in the log directory when the pipeline finishes.
+
 Dealing with stdout from tasks
 ------------------------------
 
@@ -381,8 +502,10 @@ import uuid
 import inspect
 import traceback
 import string
+import threading
 from collections import Iterator
 from cStringIO import StringIO
+from multiprocessing.pool import ThreadPool
 from bcftbx.utils import mkdir
 from bcftbx.utils import AttributeDictionary
 from auto_process_ngs.applications import Command
@@ -430,17 +553,198 @@ class FileCollector(Iterator):
             self._idx = None
             raise StopIteration
 
+class OutputStream(object):
+    """
+    Class for task outputs which become available incrementally
+
+    An OutputStream holds a collection of items (for
+    example, pairs of Fastq files produced by a task)
+    which are added one at a time as they become
+    available. The stream is closed once no more items
+    will be added.
+
+    Other tasks can subscribe to the stream in order to
+    be notified as each item is added, and when the
+    stream is closed.
+    """
+    def __init__(self,task=None):
+        """
+        Create a new OutputStream instance
+
+        Arguments:
+          task (PipelineTask): optional, the task which
+            produces the items in the stream
+        """
+        self.task = task
+        self._items = []
+        self._closed = False
+        self._subscribers = []
+        self._lock = threading.RLock()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def closed(self):
+        """
+        Check if the stream has been closed
+        """
+        return self._closed
+
+    def add(self,item):
+        """
+        Add an item to the stream
+
+        Subscribers are notified of the new item.
+
+        Arguments:
+          item (object): item to add
+        """
+        with self._lock:
+            if self._closed:
+                raise Exception("Can't add item to closed stream")
+            self._items.append(item)
+            for on_item,on_close in self._subscribers:
+                on_item(item)
+
+    def close(self):
+        """
+        Close the stream to new items
+
+        Subscribers are notified that the stream has
+        been closed. Closing a stream which is already
+        closed does nothing.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for on_item,on_close in self._subscribers:
+                on_close(self)
+
+    def subscribe(self,on_item,on_close):
+        """
+        Register functions to be notified of changes to the stream
+
+        ``on_item(item)`` is invoked for each item in the
+        stream (including any that were added before
+        subscribing), and ``on_close(stream)`` is invoked
+        once the stream is closed (including if it was
+        already closed before subscribing).
+
+        Arguments:
+          on_item (function): function to invoke for
+            each item
+          on_close (function): function to invoke when
+            the stream is closed
+        """
+        with self._lock:
+            self._subscribers.append((on_item,on_close))
+            for item in self._items:
+                on_item(item)
+            if self._closed:
+                on_close(self)
+
 # Capture stdout from a function call - see
 # http://stackoverflow.com/a/16571630/579925
 class Capturing(list):
     def __enter__(self):
-        self._stdout = sys.stdout
-        sys.stdout = self._stringio = StringIO()
+        self._stringio = StringIO()
+        _THREAD_STDOUT.push(self._stringio)
         return self
     def __exit__(self,*args):
+        _THREAD_STDOUT.pop()
         self.extend(self._stringio.getvalue().splitlines())
         del self._stringio    # free up some memory
-        sys.stdout = self._stdout
+
+class ThreadStdout(object):
+    """
+    Internal: redirect stdout on a per-thread basis
+
+    While at least one thread is capturing output, an
+    instance of this class replaces ``sys.stdout`` and
+    sends writes to the buffer most recently pushed by
+    the writing thread (or to the original stdout for
+    threads which aren't capturing).
+
+    This allows task methods to be invoked concurrently
+    from different threads without their output being
+    mixed up.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stdout = None
+        self._nbuffers = 0
+    def push(self,fp):
+        with self._lock:
+            if not self._nbuffers:
+                self._stdout = sys.stdout
+                sys.stdout = self
+            self._nbuffers += 1
+        try:
+            self._local.buffers.append(fp)
+        except AttributeError:
+            self._local.buffers = [fp]
+    def pop(self):
+        fp = self._local.buffers.pop()
+        with self._lock:
+            self._nbuffers -= 1
+            if not self._nbuffers:
+                sys.stdout = self._stdout
+                self._stdout = None
+        return fp
+    def _target(self):
+        try:
+            return self._local.buffers[-1]
+        except (AttributeError,IndexError):
+            return self._stdout if self._stdout is not None \
+                else sys.__stdout__
+    def write(self,s):
+        self._target().write(s)
+    def __getattr__(self,attr):
+        return getattr(self._target(),attr)
+
+class WorkingDirectory(object):
+    """
+    Internal: switch working directory in a thread-safe manner
+
+    The working directory is process-wide, so threads which
+    need to run in a different directory must take turns.
+    Threads which need the same directory share it; the
+    original directory is restored once the last of them
+    has released it.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._dirn = None
+        self._original_dirn = None
+        self._count = 0
+    def acquire(self,dirn):
+        with self._condition:
+            while self._count and self._dirn != dirn:
+                self._condition.wait()
+            if not self._count:
+                self._original_dirn = os.getcwd()
+                os.chdir(dirn)
+                self._dirn = dirn
+            self._count += 1
+    def release(self):
+        with self._condition:
+            self._count -= 1
+            if not self._count:
+                os.chdir(self._original_dirn)
+                self._dirn = None
+                self._original_dirn = None
+                self._condition.notify_all()
+
+# Shared instances for use by tasks
+_THREAD_STDOUT = ThreadStdout()
+_WORKING_DIR = WorkingDirectory()
 
 class Pipeline(object):
     """
@@ -477,6 +781,7 @@ class Pipeline(object):
         self._pending = []
         self._running = []
         self._finished = []
+        self._requires = dict()
         self._scheduler = None
 
     def __del__(self):
@@ -509,14 +814,16 @@ class Pipeline(object):
         self.stop_scheduler()
         return 1
 
-    def start_scheduler(self,runner=None,max_concurrent=1):
+    def start_scheduler(self,runner=None,max_concurrent=1,
+                        accounting_dir=None):
         """
         Internal: instantiate and start local scheduler
         """
         if self._scheduler is None:
             sched = SimpleScheduler(runner=runner,
                                     max_concurrent=max_concurrent,
-                                    reporter=SchedulerReporter())
+                                    reporter=SchedulerReporter(),
+                                    accounting_dir=accounting_dir)
             sched.start()
             self._scheduler = sched
         return self._scheduler
@@ -545,6 +852,7 @@ class Pipeline(object):
             PipelineTask for valid options)
         """
         self._pending.append((task,requires,kws))
+        self._requires[task.name()] = [r.name() for r in requires]
         self.report("Adding task '%s'" % task.name())
         if requires:
             for req in requires:
@@ -554,10 +862,24 @@ class Pipeline(object):
         return task
 
     def run(self,working_dir=None,log_dir=None,scripts_dir=None,
-            sched=None,default_runner=None,max_jobs=1):
+            sched=None,default_runner=None,max_jobs=1,
+            max_setup_threads=4,poll_interval=5):
         """
         Run the tasks in the pipeline
 
+        Tasks which are ready to run are started in order of
+        priority, with those on the critical path through
+        the pipeline (i.e. the longest chain of dependent
+        tasks) started first. Task durations recorded from
+        previous runs using the same log directory are used
+        to estimate the critical path, if available.
+
+        Tasks are started (i.e. their 'setup' methods are
+        invoked and their commands submitted) concurrently
+        in a pool of threads, and the pipeline checks for
+        new tasks to start as soon as a running task
+        completes.
+
         Arguments:
           working_dir (str): optional path to a working
             directory (defaults to the current directory)
@@ -573,6 +895,12 @@ class Pipeline(object):
             concurrent jobs in scheduler (defaults to 1;
             ignored if a scheduler is provided via 'sched'
             argument)
+          max_setup_threads (int): optional maximum number
+            of tasks which can be started concurrently
+            (defaults to 4)
+          poll_interval (float): optional maximum time in
+            seconds to wait between checks on running tasks
+            (defaults to 5)
         """
         # Execute the pipeline
         self.report("Started")
@@ -581,11 +909,6 @@ class Pipeline(object):
             working_dir = os.getcwd()
         working_dir = os.path.abspath(working_dir)
         self.report("Working directory: %s" % working_dir)
-        # Deal with scheduler
-        if sched is None:
-            # Create and start a scheduler
-            sched = self.start_scheduler(runner=default_runner,
-                                         max_concurrent=max_jobs)
         # Deal with log directory
         if log_dir is None:
             log_dir = "%s.logs" % self._id
@@ -594,6 +917,12 @@ class Pipeline(object):
         if not os.path.exists(log_dir):
             os.mkdir(log_dir)
         self.report("Log directory: %s" % log_dir)
+        # Deal with scheduler
+        if sched is None:
+            # Create and start a scheduler
+            sched = self.start_scheduler(runner=default_runner,
+                                         max_concurrent=max_jobs,
+                                         accounting_dir=log_dir)
         # Deal with scripts directory
         if scripts_dir is None:
             scripts_dir = "%s.scripts" % self._id
@@ -602,9 +931,46 @@ class Pipeline(object):
         if not os.path.exists(scripts_dir):
             os.mkdir(scripts_dir)
         self.report("Scripts directory: %s" % scripts_dir)
+        # Prioritise the tasks using durations from previous runs
+        tasks = [t[0] for t in self._pending]
+        durations_file = os.path.join(log_dir,
+                                      "%s.durations" %
+                                      sanitize_name(self._name))
+        durations = load_task_durations(durations_file)
+        if durations:
+            default_duration = sum(durations.values())/len(durations)
+        else:
+            default_duration = 1.0
+        graph = critical_path(
+            [t.name() for t in tasks],
+            self._requires,
+            dict([(t.name(),durations.get(sanitize_name(t._name),
+                                          default_duration))
+                  for t in tasks]))
+        self._pending = sorted(self._pending,
+                               key=lambda t: -graph.remaining[t[0].name()])
+        # Set up the thread pool for starting tasks
+        wakeup = threading.Event()
+        start_failures = []
+        pool = ThreadPool(processes=max_setup_threads)
+        def start_task(task,kws):
+            # Internal: start task running (invoked in pool)
+            try:
+                task.run(sched=sched,
+                         log_dir=log_dir,
+                         scripts_dir=scripts_dir,
+                         **kws)
+            except Exception as ex:
+                self.report("Failed to start task '%s': %s" %
+                            (task.name(),ex))
+                logger.critical("Failed to start task '%s': %s" %
+                                (task.name(),ex))
+                start_failures.append(task)
+            wakeup.set()
         # Run while there are still pending or running tasks
         update = True
         while self._pending or self._running:
+            wakeup.clear()
             # Report the current running and pending tasks
             if update:
                 if self._running:
@@ -621,6 +987,8 @@ class Pipeline(object):
             # Check for running tasks that have completed
             running = []
             failed = []
+            while start_failures:
+                failed.append(start_failures.pop())
             for task in self._running:
                 if task.completed:
                     self.report("finished %s"
@@ -633,6 +1001,14 @@ class Pipeline(object):
                 else:
                     running.append(task)
             self._running = running
+            # Check for tasks that have failed
+            if failed:
+                self.report("Following tasks failed:")
+                for task in failed:
+                    self.report("- %s" % task.name())
+                pool.close()
+                pool.join()
+                return self.terminate()
             # Check for pending tasks that can start
             pending = []
             for task,requirements,kws in self._pending:
@@ -642,9 +1018,16 @@ class Pipeline(object):
                     run_task = True
                 else:
                     # Check requirements
+                    # NB tasks which stream their outputs to this
+                    # one only need to have started
+                    streaming_from = [stream.task for stream in
+                                      task.input_streams()]
+                    started = self._running + self._finished
                     run_task = reduce(lambda x,y:
-                                      x and y.completed
-                                      and y.exit_code == 0,
+                                      x and
+                                      ((y.completed and y.exit_code == 0)
+                                       or (y in streaming_from and
+                                           y in started)),
                                       requirements,True)
                 if run_task:
                     self.report("started %s" % task.name())
@@ -652,31 +1035,35 @@ class Pipeline(object):
                         kws['runner'] = default_runner
                     if 'working_dir' not in kws:
                         kws['working_dir'] = working_dir
-                    try:
-                        task.run(sched=sched,
-                                 log_dir=log_dir,
-                                 scripts_dir=scripts_dir,
-                                 **kws)
-                    except Exception as ex:
-                        self.report("Failed to start task '%s': %s" %
-                                    (task.name(),ex))
-                        logger.critical("Failed to start task '%s': %s" %
-                                        (task.name(),ex))
-                        failed.append(task)
+                    task.add_completion_callback(lambda t: wakeup.set())
+                    pool.apply_async(start_task,(task,kws))
                     self._running.append(task)
                     update = True
                 else:
                     pending.append((task,requirements,kws))
             self._pending = pending
-            # Check for tasks that have failed
-            if failed:
-                self.report("Following tasks failed:")
-                for task in failed:
-                    self.report("- %s" % task.name())
-                return self.terminate()
-            # Pause before checking again
+            # Wait for a task to finish before checking again
             if not update:
-                time.sleep(5)
+                wakeup.wait(poll_interval)
+        pool.close()
+        pool.join()
+        # Store the task durations for future runs
+        for task in tasks:
+            durations[sanitize_name(task._name)] = task.duration
+        save_task_durations(durations_file,durations)
+        # Report the critical path and slack for each task
+        graph = critical_path([t.name() for t in tasks],
+                              self._requires,
+                              dict([(t.name(),t.duration) for t in tasks]))
+        self.report("Critical path (%.1fs):" % graph.length)
+        for name in graph.path:
+            self.report("- %s (%.1fs)" % (name,graph.durations[name]))
+        self.report("Slack for each task:")
+        for task in tasks:
+            self.report("- %s: %.1fs (ran for %.1fs)" %
+                        (task.name(),
+                         graph.slack[task.name()],
+                         graph.durations[task.name()]))
         # Finished
         self.report("Completed")
         return 0
@@ -720,11 +1107,24 @@ class PipelineTask(object):
         self._completed = False
         self._stdout_files = []
         self._exit_code = 0
+        # Timings and notifications
+        self._start_time = None
+        self._end_time = None
+        self._completion_callbacks = []
         # Working directory
         self._working_dir = None
         # Running jobs
         self._jobs = []
         self._groups = []
+        # Streamed outputs and inputs
+        self._stream = None
+        self._lock = threading.RLock()
+        self._njobs = 0
+        self._nrunning_jobs = 0
+        self._nopen_streams = 0
+        # Limit on number of jobs running at once
+        self._max_concurrent_jobs = None
+        self._queued_commands = []
         # Deal with subclass arguments
         try:
             self._callargs = inspect.getcallargs(self.init,*args,**kws)
@@ -766,6 +1166,36 @@ class PipelineTask(object):
         else:
             return self._exit_code
 
+    @property
+    def duration(self):
+        """
+        Get the time taken for the task to run
+
+        Returns:
+          Float: time in seconds between the task starting
+            and completing, or 'None' if task hasn't
+            completed.
+        """
+        if self._start_time is None or self._end_time is None:
+            return None
+        return self._end_time - self._start_time
+
+    @property
+    def stream(self):
+        """
+        Get the streamed outputs from the task
+
+        Returns:
+          OutputStream: stream which items are added to
+            as commands with associated stream items
+            complete (see the ``add_cmd`` method); the
+            stream is closed once the task has finished.
+        """
+        with self._lock:
+            if self._stream is None:
+                self._stream = OutputStream(self)
+            return self._stream
+
     @property
     def stdout(self):
         """
@@ -808,8 +1238,8 @@ class PipelineTask(object):
         if message:
             self.report("failed: %s" % message)
         self.report("failed: exit code set to %s" % exit_code)
-        self._completed = True
         self._exit_code = exit_code
+        self._mark_completed()
 
     def report(self,s):
         """
@@ -829,8 +1259,7 @@ class PipelineTask(object):
         """
         # Switch to working directory, if defined
         if self._working_dir is not None:
-            current_dir = os.getcwd()
-            os.chdir(self._working_dir)
+            _WORKING_DIR.acquire(self._working_dir)
         # Invoke the requested method
         try:
             with Capturing() as output:
@@ -850,7 +1279,7 @@ class PipelineTask(object):
             self._exit_code += 1
         # Switch back to original directory
         if self._working_dir is not None:
-            os.chdir(current_dir)
+            _WORKING_DIR.release()
 
     def task_completed(self,name,jobs,sched):
         """
@@ -887,11 +1316,37 @@ class PipelineTask(object):
         else:
             # Execute 'finish', if implemented
             self.invoke(self.finish)
+        # Close the output stream
+        self.stream.close()
         # Flag job as completed
-        self._completed = True
+        self._mark_completed()
         self.report("%s completed" % self._name)
 
-    def add_cmd(self,pipeline_job):
+    def _mark_completed(self):
+        """
+        Internal: flag the task as completed and notify listeners
+        """
+        if self._end_time is None:
+            self._end_time = time.time()
+        self._completed = True
+        for callback in self._completion_callbacks:
+            callback(self)
+
+    def add_completion_callback(self,callback):
+        """
+        Register a function to be invoked when the task completes
+
+        The function will be invoked as ``callback(task)``;
+        note that it may be invoked from the scheduler
+        thread, and may be invoked more than once (e.g.
+        if the task explicitly fails before completing).
+
+        Arguments:
+          callback (function): function to invoke
+        """
+        self._completion_callbacks.append(callback)
+
+    def add_cmd(self,pipeline_job,stream_item=None):
         """
         Add a PipelineCommand to the task
 
@@ -899,8 +1354,147 @@ class PipelineTask(object):
            pipeline_job (PipelineCommand): a PipelineCommand
              instance to be executed by the task when it
              runs
+           stream_item (object): optional, if set then
+             this item will be added to the task's output
+             stream as soon as the command completes
+             successfully
         """
-        self._commands.append(pipeline_job)
+        if stream_item is None:
+            stream_items = []
+        else:
+            stream_items = [stream_item]
+        self._commands.append((pipeline_job,stream_items))
+
+    def input_streams(self):
+        """
+        Return the output streams of other tasks used as inputs
+
+        Returns:
+          List: OutputStream instances which were supplied
+            as arguments to the task.
+        """
+        return [arg for arg in self._callargs.values()
+                if isinstance(arg,OutputStream)]
+
+    def stream_item_completed(self,name,jobs,sched,stream_items=()):
+        """
+        Internal: callback method
+
+        This is a callback method which is invoked when a
+        scheduled job for a command with associated stream
+        items finishes; the items are added to the output
+        stream if the job completed successfully
+
+        Arguments:
+          name (str): name for the callback
+          jobs (list): list of SchedulerJob instances
+          sched (SimpleScheduler): scheduler instance
+          stream_items (list): items to add to the
+            output stream
+        """
+        for job in jobs:
+            if job.exit_code != 0:
+                return
+        for stream_item in stream_items:
+            self.stream.add(stream_item)
+
+    def item_job_completed(self,name,jobs,sched,stream_items=()):
+        """
+        Internal: callback method
+
+        This is a callback method which is invoked when a
+        job started for an item from an input stream
+        finishes
+
+        Arguments:
+          name (str): name for the callback
+          jobs (list): list of SchedulerJob instances
+          sched (SimpleScheduler): scheduler instance
+          stream_items (list): items to add to the
+            output stream
+        """
+        with self._lock:
+            for job in jobs:
+                if job.exit_code != 0:
+                    self._exit_code += 1
+                self._stdout_files.append(job.log)
+            if self._exit_code == 0:
+                for stream_item in stream_items:
+                    self.stream.add(stream_item)
+            self._nrunning_jobs -= 1
+            self._submit_queued_commands()
+            self._check_streaming_finished()
+
+    def _input_item(self,item):
+        """
+        Internal: handle a new item from an input stream
+        """
+        with self._lock:
+            if self.completed:
+                return
+            self._commands = []
+            self.invoke(self.setup_item,(item,),{})
+            self._submit_item_commands()
+
+    def _input_stream_closed(self,stream):
+        """
+        Internal: handle an input stream being closed
+        """
+        with self._lock:
+            self._nopen_streams -= 1
+            self._check_streaming_finished()
+
+    def _check_streaming_finished(self):
+        """
+        Internal: finish the task once all input items are done
+        """
+        if self.completed:
+            return
+        if self._nopen_streams == 0 and self._nrunning_jobs == 0 and \
+           not self._queued_commands:
+            self.finish_task()
+
+    def _submit_item_commands(self):
+        """
+        Internal: submit commands for items from input streams
+
+        Each command is submitted as a separate job with
+        its own callback. If a limit has been set on the
+        number of concurrent jobs then commands beyond the
+        limit are queued, and are submitted as earlier jobs
+        from the task complete.
+        """
+        self._queued_commands.extend(self._commands)
+        self._commands = []
+        self._submit_queued_commands()
+
+    def _submit_queued_commands(self):
+        """
+        Internal: submit queued commands up to the job limit
+        """
+        max_jobs = self._max_concurrent_jobs
+        while self._queued_commands:
+            if max_jobs and self._nrunning_jobs >= max_jobs:
+                return
+            command,stream_items = self._queued_commands.pop(0)
+            self.report("%s" % command.cmd())
+            script_file = command.make_wrapper_script(
+                scripts_dir=self._scripts_dir)
+            self.report("wrapper script %s" % script_file)
+            name = "%s#%s" % (self.name(),self._njobs)
+            self._njobs += 1
+            self._nrunning_jobs += 1
+            callback = lambda name,jobs,sched,items=stream_items: \
+                       self.item_job_completed(name,jobs,sched,
+                                               stream_items=items)
+            job = self._sched.submit(Command('/bin/bash',script_file),
+                                     wd=self._working_dir,
+                                     name=name,
+                                     runner=self._runner,
+                                     log_dir=self._log_dir,
+                                     wait_for=list(self._wait_for),
+                                     callbacks=(callback,))
+            self._jobs.append(job)
 
     def run(self,sched=None,runner=None,working_dir=None,log_dir=None,
             scripts_dir=None,wait_for=(),async=True):
@@ -927,6 +1521,7 @@ class PipelineTask(object):
             completed
         """
         # Initialise
+        self._start_time = time.time()
         if working_dir is None:
             working_dir = os.getcwd()
         self._working_dir = os.path.abspath(working_dir)
@@ -936,14 +1531,42 @@ class PipelineTask(object):
             log_dir = self._working_dir
         # Do setup
         self.invoke(self.setup)
+        # Deal with streamed inputs
+        streams = self.input_streams()
+        if streams:
+            with self._lock:
+                self._sched = sched
+                self._runner = runner
+                self._log_dir = log_dir
+                self._scripts_dir = scripts_dir
+                self._wait_for = wait_for
+                if self._exit_code != 0:
+                    self.finish_task()
+                    return self
+                # Submit any commands from setup
+                self._submit_item_commands()
+                self._nopen_streams = len(streams)
+            # Handle items from streams as they arrive
+            # NB don't hold the lock here, as the streams will
+            # also need it when notifying the task
+            for stream in streams:
+                stream.subscribe(self._input_item,
+                                 self._input_stream_closed)
+            if not async:
+                # Wait for all items to complete before returning
+                while not self.completed:
+                    time.sleep(5)
+            return self
         # Generate commands to run
         cmds = []
-        for command in self._commands:
+        stream_items = []
+        for command,items in self._commands:
             self.report("%s" % command.cmd())
             script_file = command.make_wrapper_script(scripts_dir=scripts_dir)
             cmd = Command('/bin/bash',script_file)
             self.report("wrapper script %s" % script_file)
             cmds.append(cmd)
+            stream_items.append(items)
         # Run the commands
         if cmds:
             use_group = (len(cmds)!=1)
@@ -958,6 +1581,7 @@ class PipelineTask(object):
                               runner=runner,
                               log_dir=log_dir,
                               wait_for=wait_for)
+                    self._stream_on_completion(sched,name,stream_items[j])
                 group.close()
                 callback_name = group.name
                 callback_function = self.task_completed
@@ -975,6 +1599,7 @@ class PipelineTask(object):
                 callback_name = job.name
                 callback_function = self.task_completed
                 self._jobs.append(job)
+                self._stream_on_completion(sched,name,stream_items[0])
             # Set up a callback which the scheduler will invoke
             # in background when the jobs complete
             sched.callback("%s" % self._name,
@@ -989,12 +1614,32 @@ class PipelineTask(object):
             self.finish_task()
         return self
 
+    def _stream_on_completion(self,sched,name,stream_items):
+        """
+        Internal: add items to output stream when a job completes
+
+        Arguments:
+          sched (SimpleScheduler): scheduler instance
+          name (str): name of the job
+          stream_items (list): items to add to the output
+            stream (does nothing if this is empty)
+        """
+        if not stream_items:
+            return
+        sched.callback("%s.stream" % name,
+                       lambda name,jobs,sched,items=stream_items:
+                       self.stream_item_completed(name,jobs,sched,
+                                                  stream_items=items),
+                       wait_for=(name,))
+
     def terminate(self):
         """
         Internal: terminate the task
         """
         if self.completed:
             return
+        with self._lock:
+            self._queued_commands = []
         for group in self._groups:
             for job in group.jobs:
                 job.terminate()
@@ -1005,11 +1650,232 @@ class PipelineTask(object):
         pass
     def setup(self):
         raise NotImplementedError("Subclass must implement 'setup' method")
+    def setup_item(self,item):
+        raise NotImplementedError("Subclass must implement 'setup_item' "
+                                  "method")
     def finish(self):
         raise NotImplementedError("Subclass must implement 'finish' method")
     def output(self):
         raise NotImplementedError("Subclass must implement 'output' method")
 
+class PipelineMapTask(PipelineTask):
+    """
+    Task which runs a command for each item in a set of inputs
+
+    The task can be used directly, by supplying the input
+    items along with functions which generate the command
+    and (optionally) the output for each item, for example:
+
+    >>> gzip_files = PipelineMapTask(
+    ...     "Compress files",files,
+    ...     lambda f: PipelineCommandWrapper("Gzip","gzip",f),
+    ...     output=lambda f: "%s.gz" % f)
+
+    Alternatively it can be subclassed, in which case the
+    subclass should implement the 'map_command' method (and
+    optionally the 'map_items', 'map_output', 'setup' and
+    'finish' methods).
+
+    The input items can either be an iterable (e.g. a list)
+    or an OutputStream from another task. Commands for
+    consecutive items can be grouped into 'chunks' which are
+    run sequentially within a single job (by setting the
+    'chunk_size' argument), and the number of jobs from the
+    task which run at the same time can be limited (by
+    setting the 'max_concurrent' argument).
+
+    The outputs for each item are added to the task's output
+    stream as soon as the job for that item completes; once
+    the task has finished the list returned by 'output'
+    contains the outputs for all items, in the same order
+    as the inputs.
+    """
+    def __init__(self,_name,*args,**kws):
+        """
+        Create a new PipelineMapTask instance
+
+        Arguments:
+          name (str): an arbitrary user-friendly name for the
+            task instance
+          args (List): list of arguments to be supplied to
+            the subclass (must match those defined in the
+            'init' method)
+          kws (Dictionary): dictionary of keyword-value pairs
+            to be supplied to the subclass (must match those
+            defined in the 'init' method)
+        """
+        self._outputs = list()
+        self._item_outputs = list()
+        self._chunk = list()
+        self._items_stream = None
+        PipelineTask.__init__(self,_name,*args,**kws)
+
+    def init(self,items,command,output=None,chunk_size=1,
+             max_concurrent=None):
+        """
+        Initialise the map task
+
+        Arguments:
+          items (iterable): input items (or an OutputStream
+            from another task)
+          command (function): function which takes an item
+            and returns a PipelineCommand to run for that
+            item (or None if nothing needs to be run)
+          output (function): optional, function which takes
+            an item and returns the corresponding output (or
+            None if there is no output for that item)
+          chunk_size (int): optional, number of items to run
+            within each job (default: 1)
+          max_concurrent (int): optional, maximum number of
+            jobs from the task to run at the same time
+            (default: no limit)
+        """
+        pass
+
+    def map_items(self):
+        """
+        Return the input items for the task
+
+        Can be overridden by subclasses (by default returns
+        the 'items' argument).
+        """
+        # NB can't use 'self.args.items' as this clashes with
+        # the dictionary method of the same name
+        return self._callargs['items']
+
+    def map_command(self,item):
+        """
+        Return the command to run for an input item
+
+        Can be overridden by subclasses (by default invokes
+        the 'command' argument).
+
+        Arguments:
+          item (object): input item
+
+        Returns:
+          PipelineCommand: command to run for the item, or
+            None if nothing needs to be run (in which case
+            the output for the item is made available
+            immediately).
+        """
+        return self.args.command(item)
+
+    def map_output(self,item):
+        """
+        Return the output for an input item
+
+        Can be overridden by subclasses (by default invokes
+        the 'output' argument, if set).
+
+        Arguments:
+          item (object): input item
+
+        Returns:
+          Object: output for the item, or None if there is
+            no output.
+        """
+        output = self._callargs.get('output')
+        if output is None:
+            return None
+        return output(item)
+
+    def setup(self):
+        pass
+
+    def setup_item(self,item):
+        """
+        Internal: add the command for an input item to a chunk
+        """
+        command = self.map_command(item)
+        output = self.map_output(item)
+        self._item_outputs.append(output)
+        if command is None:
+            if output is not None:
+                self.stream.add(output)
+            return
+        self._chunk.append((command,output))
+        chunk_size = self._callargs.get('chunk_size',1)
+        if len(self._chunk) >= max(1,chunk_size):
+            self._add_chunk()
+
+    def output(self):
+        """
+        Return the outputs for the input items
+
+        Returns:
+          List: outputs for each input item (in the same
+            order as the inputs), populated once the task
+            has completed successfully.
+        """
+        return self._outputs
+
+    def input_streams(self):
+        """
+        Return the streams which supply the input items
+        """
+        if self._items_stream is not None:
+            return [self._items_stream]
+        return PipelineTask.input_streams(self)
+
+    def run(self,*args,**kws):
+        """
+        Run the task
+
+        Input items which are not supplied as an OutputStream
+        are placed into a closed stream, so that all inputs
+        are handled in the same way.
+
+        Arguments:
+          args (List): arguments for 'PipelineTask.run'
+          kws (Dictionary): keyword arguments for
+            'PipelineTask.run'
+        """
+        items = self.map_items()
+        if not isinstance(items,OutputStream):
+            self._items_stream = OutputStream()
+            for item in items:
+                self._items_stream.add(item)
+            self._items_stream.close()
+        self._max_concurrent_jobs = self._callargs.get('max_concurrent')
+        return PipelineTask.run(self,*args,**kws)
+
+    def finish_task(self):
+        """
+        Internal: collect the outputs and finish the task
+        """
+        if self._exit_code == 0:
+            self._outputs.extend([output for output in self._item_outputs
+                                  if output is not None])
+        PipelineTask.finish_task(self)
+
+    def _input_stream_closed(self,stream):
+        """
+        Internal: submit any partial chunk once inputs are done
+        """
+        with self._lock:
+            if self._nopen_streams == 1 and not self.completed:
+                self._commands = []
+                self._add_chunk()
+                self._submit_item_commands()
+            PipelineTask._input_stream_closed(self,stream)
+
+    def _add_chunk(self):
+        """
+        Internal: add the current chunk of commands to the task
+        """
+        if not self._chunk:
+            return
+        commands = [command for command,output in self._chunk]
+        outputs = [output for command,output in self._chunk
+                   if output is not None]
+        if len(commands) == 1:
+            command = commands[0]
+        else:
+            command = PipelineCommandChunk(*commands)
+        self._commands.append((command,outputs))
+        self._chunk = []
+
 class PipelineCommand(object):
     """
     Base class for constructing program command lines
@@ -1151,6 +2017,87 @@ class PipelineCommandWrapper(PipelineCommand):
         """
         return self._cmd
 
+class PipelineCommandChunk(PipelineCommand):
+    """
+    Class for running a set of commands one after another
+
+    The commands are run sequentially from a single
+    wrapper script; each command is topped and tailed with
+    the standard set of comment lines (so the output looks
+    the same as if each command had been run in a separate
+    job). All commands are run even if an earlier one
+    fails, and the script exits with a non-zero status if
+    any of them failed.
+    """
+    def __init__(self,*commands):
+        """
+        Create a new PipelineCommandChunk instance
+
+        Arguments:
+          commands (List): PipelineCommand instances to
+            run within the chunk
+        """
+        PipelineCommand.__init__(self,*commands)
+        self._name = "%s (chunk of %d)" % (commands[0]._name,
+                                           len(commands))
+
+    def init(self,*commands):
+        """
+        Internal: store the commands
+        """
+        self._commands = commands
+
+    def cmd(self):
+        """
+        Internal: implement the 'cmd' method
+
+        Returns a Command with the individual command lines
+        separated by semicolons (nb this is only used for
+        reporting; the chunk is run via its wrapper script).
+        """
+        cmd = Command(str(self._commands[0].cmd()))
+        for command in self._commands[1:]:
+            cmd.add_args(';',str(command.cmd()))
+        return cmd
+
+    def make_wrapper_script(self,scripts_dir=None,shell="/bin/bash"):
+        """
+        Generate a uniquely-named wrapper script to run the commands
+
+        Arguments:
+          scripts_dir (str): path of directory to write
+            the wrapper scripts to
+          shell (str): shell to use (defaults to '/bin/bash')
+
+        Returns:
+          String: name of the wrapper script.
+        """
+        if scripts_dir is None:
+            scripts_dir = os.getcwd()
+        script_file = os.path.join(scripts_dir,"%s.%s.sh" % (self.name(),
+                                                             uuid.uuid4()))
+        script = ["#!%s" % shell,
+                  "nfailed=0"]
+        for command in self._commands:
+            script.extend(["echo \"#### COMMAND %s\"" % command._name,
+                           "echo \"#### HOSTNAME $HOSTNAME\"",
+                           "echo \"#### USER $USER\"",
+                           "echo \"#### START $(date)\"",
+                           str(command.cmd()),
+                           "exit_code=$?",
+                           "echo \"#### END $(date)\"",
+                           "echo \"#### EXIT_CODE $exit_code\"",
+                           "if [ $exit_code -ne 0 ] ; then",
+                           "  nfailed=$((nfailed+1))",
+                           "fi"])
+        script.extend(["if [ $nfailed -ne 0 ] ; then",
+                       "  exit 1",
+                       "fi",
+                       "exit 0"])
+        with open(script_file,'w') as fp:
+            fp.write('\n'.join(script))
+        return script_file
+
 ######################################################################
 # Generic pipeline functions
 ######################################################################
@@ -1175,6 +2122,120 @@ def sanitize_name(s):
             name.append(c)
     return ''.join(name)
 
+def critical_path(tasks,requires,durations):
+    """
+    Find the critical path through a set of dependent tasks
+
+    The critical path is the chain of dependent tasks
+    which takes the longest time to complete, and so
+    determines the minimum time required to run all the
+    tasks (assuming that there are no limits on how many
+    tasks can run concurrently).
+
+    The 'slack' for a task is the time by which it could
+    be delayed without delaying the completion of all
+    the tasks; tasks on the critical path have zero
+    slack.
+
+    Arguments:
+      tasks (list): list of task names
+      requires (dict): mapping of task names to lists
+        of the names of the tasks that they depend on
+      durations (dict): mapping of task names to the
+        (estimated or actual) time taken by each task
+
+    Returns:
+      AttributeDictionary: object with the following
+        properties: 'path' (list of task names on the
+        critical path, in order), 'length' (total time
+        for the critical path), 'durations' (mapping of
+        task names to durations), 'remaining' (mapping
+        of task names to the longest time from the start
+        of each task to the end of the pipeline), and
+        'slack' (mapping of task names to slack times).
+    """
+    durations = dict([(t,float(durations.get(t) or 0.0)) for t in tasks])
+    requires = dict([(t,[r for r in requires.get(t,()) if r in durations])
+                     for t in tasks])
+    dependents = dict([(t,[]) for t in tasks])
+    for t in tasks:
+        for r in requires[t]:
+            dependents[r].append(t)
+    # Order tasks so that requirements come before dependents
+    ordered = []
+    visited = set()
+    def visit(t):
+        if t in visited:
+            return
+        visited.add(t)
+        for r in requires[t]:
+            visit(r)
+        ordered.append(t)
+    for t in tasks:
+        visit(t)
+    # Earliest start times
+    start = dict()
+    for t in ordered:
+        start[t] = max([start[r] + durations[r] for r in requires[t]] +
+                       [0.0])
+    # Longest times from the start of each task to the end
+    remaining = dict()
+    for t in ordered[::-1]:
+        remaining[t] = durations[t] + \
+                       max([remaining[d] for d in dependents[t]] + [0.0])
+    length = max([remaining[t] for t in tasks] + [0.0])
+    slack = dict([(t,length - start[t] - remaining[t]) for t in tasks])
+    # Walk the critical path from the longest starting task
+    path = []
+    candidates = [t for t in ordered if not requires[t]]
+    while candidates:
+        t = max(candidates,key=lambda x: remaining[x])
+        path.append(t)
+        candidates = dependents[t]
+    return AttributeDictionary(path=path,
+                               length=length,
+                               durations=durations,
+                               remaining=remaining,
+                               slack=slack)
+
+def load_task_durations(filen):
+    """
+    Load task durations recorded by a previous pipeline run
+
+    Arguments:
+      filen (str): path to the durations file
+
+    Returns:
+      Dictionary: mapping of (sanitized) task names to
+        durations in seconds (empty if the file doesn't
+        exist).
+    """
+    durations = dict()
+    if not os.path.exists(filen):
+        return durations
+    with open(filen,'r') as fp:
+        for line in fp:
+            try:
+                name,duration = line.rstrip('\n').split('\t')
+                durations[name] = float(duration)
+            except ValueError:
+                logger.warning("%s: ignoring bad line: %s" % (filen,line))
+    return durations
+
+def save_task_durations(filen,durations):
+    """
+    Write task durations to file for future pipeline runs
+
+    Arguments:
+      filen (str): path to the durations file
+      durations (dict): mapping of task names to
+        durations in seconds
+    """
+    with open(filen,'w') as fp:
+        for name in sorted(durations):
+            if durations[name] is not None:
+                fp.write("%s\t%.3f\n" % (name,durations[name]))
+
 def collect_files(dirn,pattern):
     """
     Return names of files in a directory which match a glob pattern
@@ -2,7 +2,10 @@
 #
 # fastq screens library
 import os
+from collections import OrderedDict
+import numpy as np
 from bcftbx.TabFile import TabFile
+from .fastqc import FastqcOutputCache
 
 """
 Example screen file for v0.4.1:
@@ -41,6 +44,13 @@ SpR6	89393	89393	100.00	0	0.00	0	0.00	0	0.00	0	0.00
 
 """
 
+# Percentage columns stored by FastqscreenData (in order)
+SCREEN_MAPPINGS = ('%Unmapped',
+                   '%One_hit_one_library',
+                   '%Multiple_hits_one_library',
+                   '%One_hit_multiple_libraries',
+                   '%Multiple_hits_multiple_libraries',)
+
 class Fastqscreen(TabFile):
     """
     Class representing data from a FastqScreen run
@@ -139,3 +149,167 @@ class Fastqscreen(TabFile):
         Percentage of reads with no hits on any library
         """
         return self._no_hits
+
+class FastqscreenData(object):
+    """
+    Compact representation of data from a FastqScreen run
+
+    The percentages for each library are stored as a
+    NumPy float array (with the values in the same order
+    as the column names in SCREEN_MAPPINGS), which can be
+    accessed by library name:
+
+    >>> screen = FastqscreenData('PB1_model_organisms_screen.txt')
+    >>> screen['hg19']
+    array([ 98.1 ,   0.02,   0.27,   0.55,   1.06])
+
+    Outputs from older and newer versions of fastq_screen
+    (which use 'Library' and 'Genome' respectively) are
+    both handled, with the 'Genome' columns mapped to
+    the equivalent 'Library' columns.
+    """
+    def __init__(self,screen_file):
+        """
+        Create a new FastqscreenData instance
+
+        Arguments:
+          screen_file (str): path to a ...screen.txt file
+            from FastqScreen
+        """
+        self._screen_file = os.path.abspath(screen_file)
+        self._version = None
+        self._no_hits = None
+        self._libraries = []
+        columns = None
+        values = []
+        # Read in data
+        with open(self._screen_file,'r') as fp:
+            for line in fp:
+                line = line.strip()
+                if line.startswith('#Fastq_screen version:'):
+                    self._version = line.split()[2]
+                elif line.startswith('Library') or \
+                     line.startswith('Genome'):
+                    header = [c.replace('genomes','libraries').\
+                              replace('genome','library')
+                              for c in line.split()]
+                    columns = [header.index(m) for m in SCREEN_MAPPINGS]
+                elif line.startswith('%Hit_no_libraries:') or \
+                     line.startswith('%Hit_no_genomes:'):
+                    self._no_hits = float(line.split()[-1])
+                elif not line or \
+                     line.startswith('#') or \
+                     line.startswith('%'):
+                    continue
+                else:
+                    fields = line.split('\t')
+                    self._libraries.append(fields[0])
+                    values.append([float(fields[i]) for i in columns])
+        self._values = np.array(values,dtype=float).\
+                       reshape((len(values),len(SCREEN_MAPPINGS)))
+        self._index = dict([(library,i) for i,library
+                            in enumerate(self._libraries)])
+
+    def __getitem__(self,library):
+        return self._values[self._index[library]]
+
+    def __contains__(self,library):
+        return (library in self._index)
+
+    def __iter__(self):
+        return iter(self._libraries)
+
+    def __len__(self):
+        return len(self._libraries)
+
+    @property
+    def txt(self):
+        """
+        Path of the fastq_screen.txt file
+        """
+        return self._screen_file
+
+    @property
+    def png(self):
+        """
+        Path of the fastq_screen.png file
+        """
+        return os.path.splitext(self._screen_file)[0]+'.png'
+
+    @property
+    def version(self):
+        """
+        Version of fastq_screen which produced the screens
+        """
+        return self._version
+
+    @property
+    def libraries(self):
+        """
+        List of library names used in the screen
+        """
+        return list(self._libraries)
+
+    @property
+    def no_hits(self):
+        """
+        Percentage of reads with no hits on any library
+        """
+        return self._no_hits
+
+    @property
+    def values(self):
+        """
+        2D array of percentages (one row per library)
+        """
+        return self._values
+
+    @property
+    def data(self):
+        """
+        Dictionary mapping library names to arrays of percentages
+        """
+        return OrderedDict([(library,self._values[i])
+                            for i,library in enumerate(self._libraries)])
+
+    def column(self,mapping):
+        """
+        Return array of percentages for a mapping for all libraries
+
+        Arguments:
+          mapping (str): one of the column names in
+            SCREEN_MAPPINGS (e.g. '%One_hit_one_library')
+        """
+        return self._values[:,SCREEN_MAPPINGS.index(mapping)]
+
+# Process-wide cache of parsed FastqScreen outputs
+_fastq_screen_cache = FastqcOutputCache()
+
+def get_fastq_screen_data(screen_file):
+    """
+    Return FastqscreenData instance for a file from the cache
+
+    Arguments:
+      screen_file (str): path to a ...screen.txt file
+
+    Returns:
+      FastqscreenData: instance for the file (which may
+        have been returned by a previous call).
+    """
+    return _fastq_screen_cache.get(FastqscreenData,screen_file)
+
+def get_fastq_screens(screen_files):
+    """
+    Return FastqscreenData instances for multiple files
+
+    Arguments:
+      screen_files (list): list of paths to ...screen.txt
+        files
+
+    Returns:
+      OrderedDict: mapping of each path to the associated
+        FastqscreenData instance (in the same order as
+        the input list).
+    """
+    return OrderedDict([(screen_file,get_fastq_screen_data(screen_file))
+                        for screen_file in screen_files])
@@ -2,7 +2,7 @@
 #
 # Fastq statistics utilities
 from bcftbx.FASTQFile import FastqIterator
-from .fastqc import FastqcData
+from .fastqc import get_fastqc_data
 
 class FastqQualityStats:
     """
@@ -134,7 +134,8 @@ class FastqQualityStats:
             ``fastqc_data.txt`` file
 
         """
-        for line in FastqcData(fastqc_data).data('Per base sequence quality'):
+        fastqc_data = get_fastqc_data(fastqc_data)
+        for line in fastqc_data.data('Per base sequence quality'):
             if line.startswith('#'):
                 continue
             i,mean,median,q25,q75,p10,p90 = line.strip().split('\t')
@@ -2,6 +2,9 @@
 #
 # fastqc library
 import os
+import errno
+import threading
+from collections import OrderedDict
 from bcftbx.TabFile import TabFile
 from bcftbx.htmlpagewriter import PNGBase64Encoder
 from ..docwriter import Table
@@ -45,6 +48,10 @@ rcentile
 
 """
 
+# Maximum number of parsed FastQC output files to keep
+# in the process-wide cache
+FASTQC_CACHE_SIZE = 256
+
 class Fastqc:
     """
     Wrapper class for handling outputs from FastQC
@@ -52,6 +59,12 @@ class Fastqc:
     The ``Fastqc`` object gives access to various
     aspects of the outputs of the FastQC program.
 
+    The ``summary.txt`` and ``fastqc_data.txt`` files
+    are only read when they are first needed, and are
+    shared with other instances via the process-wide
+    cache (see ``get_fastqc_summary`` and
+    ``get_fastqc_data``).
+
     """
     # Base names for plots in the 'Images' subdir
     plot_names = ('adapter_content',
@@ -75,12 +88,17 @@ class Fastqc:
 
         """
         self._fastqc_dir = os.path.abspath(fastqc_dir)
-        self._fastqc_summary = FastqcSummary(
-            summary_file=os.path.join(self._fastqc_dir,
-                                      'summary.txt'))
-        self._fastqc_data = FastqcData(
-            os.path.join(self._fastqc_dir,
-                         'fastqc_data.txt'))
+        self._summary_file = os.path.join(self._fastqc_dir,
+                                          'summary.txt')
+        self._data_file = os.path.join(self._fastqc_dir,
+                                       'fastqc_data.txt')
+        # Check the output files exist (contents are
+        # loaded on demand)
+        for f in (self._summary_file,self._data_file):
+            if not os.path.isfile(f):
+                raise IOError(errno.ENOENT,"No such file",f)
+        self._fastqc_summary = None
+        self._fastqc_data = None
         self._html_report = self._fastqc_dir + '.html'
         self._zip = self._fastqc_dir + '.zip'
 
@@ -106,6 +124,8 @@ class Fastqc:
         Return a FastqcSummary instance
 
         """
+        if self._fastqc_summary is None:
+            self._fastqc_summary = get_fastqc_summary(self._summary_file)
         return self._fastqc_summary
 
     @property
@@ -114,6 +134,8 @@ class Fastqc:
         Return a FastqcData instance
 
         """
+        if self._fastqc_data is None:
+            self._fastqc_data = get_fastqc_data(self._data_file)
         return self._fastqc_data
 
     def plot(self,module,inline=False):
@@ -250,8 +272,14 @@ class FastqcData:
     """
     Class representing data from a Fastqc data file
 
-    Reads in the data from a ``fastqc_data.txt`` file
-    and makes it available programmatically.
+    Makes the data from a ``fastqc_data.txt`` file
+    available programmatically.
+
+    The file is only read when the data are first
+    accessed: an index of the start and end positions
+    of each module is built, and the data for a module
+    are only read from the file when that module is
+    requested.
 
     To create a new FastqcData instance:
 
@@ -261,6 +289,10 @@ class FastqcData:
 
     >>> nreads = fqc.basic_statistics('Total Sequences')
 
+    To get the values from a column in a module:
+
+    >>> means = fqc.column('Per base sequence quality','Mean')
+
     """
     def __init__(self,data_file):
         """
@@ -273,28 +305,55 @@ class FastqcData:
         """
         self._data_file = os.path.abspath(data_file)
         self._fastqc_version = None
+        self._index = None
         self._modules = {}
-        if data_file:
-            fastqc_module = None
-            with open(data_file,'r') as fp:
-                for line in fp:
-                    line = line.strip()
-                    if fastqc_module is None:
-                        if line.startswith('##FastQC'):
-                            self._fastqc_version = line.split()[-1]
-                        elif line.startswith('>>'):
-                            fastqc_module = line.split('\t')[0][2:]
-                            self._modules[fastqc_module] = []
-                    elif line.startswith('>>END_MODULE'):
-                        fastqc_module = None
-                    else:
-                        self._modules[fastqc_module].append(line)
+        self._tables = {}
+        self._basic_statistics = None
+
+    def _load_index(self):
+        """
+        Internal: build the index of modules in the file
+
+        For each module the index stores a tuple
+        (status,start,end), where 'start' and 'end' are the
+        byte offsets of the module data (i.e. excluding the
+        '>>' lines which delimit the module).
+        """
+        if self._index is not None:
+            return
+        index = OrderedDict()
+        fastqc_module = None
+        offset = 0
+        with open(self._data_file,'rb') as fp:
+            for line in fp:
+                if fastqc_module is None:
+                    if line.startswith('##FastQC'):
+                        self._fastqc_version = line.split()[-1]
+                    elif line.startswith('>>'):
+                        fields = line.strip().split('\t')
+                        try:
+                            status = fields[1]
+                        except IndexError:
+                            status = None
+                        fastqc_module = (fields[0][2:],status,
+                                         offset+len(line))
+                elif line.startswith('>>END_MODULE'):
+                    name,status,start = fastqc_module
+                    index[name] = (status,start,offset)
+                    fastqc_module = None
+                offset += len(line)
+        if fastqc_module is not None:
+            # Unterminated module at end of file
+            name,status,start = fastqc_module
+            index[name] = (status,start,offset)
+        self._index = index
 
     @property
     def version(self):
         """
         FastQC version number
         """
+        self._load_index()
         return self._fastqc_version
 
     @property
@@ -305,12 +364,120 @@ class FastqcData:
         """
         return self._data_file
 
+    @property
+    def modules(self):
+        """
+        List of the names of the modules in the file
+        """
+        self._load_index()
+        return list(self._index.keys())
+
+    def module_status(self,module):
+        """
+        Return the status for a module
+
+        Arguments:
+          module (str): name of the module (e.g.
+            'Per base sequence quality')
+
+        Returns:
+          String: status of the module (e.g. 'pass',
+            'warn' or 'fail'), or None if the module is
+            not present.
+        """
+        self._load_index()
+        try:
+            return self._index[module][0]
+        except KeyError:
+            return None
+
     def data(self,module):
         """
+        Return the raw data lines for a module
+
+        Arguments:
+          module (str): name of the module (e.g.
+            'Per base sequence quality')
+
+        Returns:
+          List: lines of data for the module (with
+            leading and trailing whitespace removed),
+            or None if the module is not present.
+        """
+        self._load_index()
+        if module not in self._index:
+            return None
+        if module not in self._modules:
+            status,start,end = self._index[module]
+            with open(self._data_file,'rb') as fp:
+                fp.seek(start)
+                data = fp.read(end-start)
+            self._modules[module] = [line.strip()
+                                     for line in data.splitlines()]
+        return self._modules[module]
+
+    def table(self,module):
+        """
+        Return the tabulated data for a module
+
+        The column names are taken from the last comment
+        line (i.e. starting with '#') before the data, and
+        the values are converted to integers or floats
+        where possible.
+
+        Arguments:
+          module (str): name of the module (e.g.
+            'Per base sequence quality')
+
+        Returns:
+          Tuple: (columns,rows) where 'columns' is a list
+            of column names and 'rows' is a list of lists
+            of values; or None if the module is not
+            present.
+        """
+        if module not in self._tables:
+            lines = self.data(module)
+            if lines is None:
+                return None
+            columns = []
+            rows = []
+            for line in lines:
+                if not line:
+                    continue
+                if line.startswith('#'):
+                    if not rows:
+                        columns = line[1:].split('\t')
+                    continue
+                rows.append([_typed_value(x) for x in line.split('\t')])
+            self._tables[module] = (columns,rows)
+        return self._tables[module]
+
+    def column(self,module,name):
+        """
+        Return the values from a column in a module
+
+        Arguments:
+          module (str): name of the module (e.g.
+            'Per base sequence quality')
+          name (str): name of the column (e.g. 'Mean')
+
+        Returns:
+          List: values from the column (converted to
+            integers or floats where possible).
+
+        Raises:
+          KeyError: if the module or column is not found.
         """
-        if module in self._modules:
-            return self._modules[module]
-        return None
+        table = self.table(module)
+        if table is None:
+            raise KeyError("No module '%s'" % module)
+        columns,rows = table
+        try:
+            i = columns.index(name)
+        except ValueError:
+            raise KeyError("No column '%s' in module '%s'" %
+                           (name,module))
+        return [row[i] if i < len(row) else None for row in rows]
 
     def basic_statistics(self,measure):
         """
@@ -337,8 +504,134 @@ class FastqcData:
           KeyError: if measure is not found.
 
         """
-        for line in self.data('Basic Statistics'):
-            key,value = line.split('\t')
-            if key == measure:
-                return value
-        raise KeyError("No key '%s'" % key)
+        if self._basic_statistics is None:
+            basic_statistics = dict()
+            for line in self.data('Basic Statistics'):
+                key,value = line.split('\t')
+                basic_statistics[key] = value
+            self._basic_statistics = basic_statistics
+        try:
+            return self._basic_statistics[measure]
+        except KeyError:
+            raise KeyError("No key '%s'" % measure)
+
+class FastqcOutputCache(object):
+    """
+    Cache of parsed FastQC output files
+
+    Instances of classes such as FastqcData and
+    FastqcSummary are stored against the path, size and
+    modification time of the file they were created
+    from, so that repeated requests for the same file
+    return the same (already parsed) instance. When the
+    cache is full the least recently used entry is
+    discarded.
+
+    The module maintains a single process-wide cache
+    which is used by ``get_fastqc_data`` and
+    ``get_fastqc_summary``.
+    """
+    def __init__(self,maxsize=FASTQC_CACHE_SIZE):
+        """
+        Create a new FastqcOutputCache instance
+
+        Arguments:
+          maxsize (int): maximum number of entries to
+            store in the cache
+        """
+        self._maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self,cls,filen):
+        """
+        Fetch the instance of a class for a file
+
+        Arguments:
+          cls (class): class to return an instance of
+            (e.g. FastqcData); will be instantiated with
+            the file path if not already in the cache
+          filen (str): path to the file
+
+        Returns:
+          Object: instance of 'cls' for the file.
+        """
+        filen = os.path.abspath(filen)
+        try:
+            st = os.stat(filen)
+        except OSError:
+            # Let the class handle the missing file
+            return cls(filen)
+        key = (cls.__name__,filen,st.st_size,st.st_mtime)
+        with self._lock:
+            try:
+                obj = self._cache.pop(key)
+                self._cache[key] = obj
+                return obj
+            except KeyError:
+                pass
+        obj = cls(filen)
+        with self._lock:
+            self._cache[key] = obj
+            while len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+        return obj
+
+    def clear(self):
+        """
+        Remove all entries from the cache
+        """
+        with self._lock:
+            self._cache.clear()
+
+# Process-wide cache of parsed FastQC outputs
+_fastqc_cache = FastqcOutputCache()
+
+def get_fastqc_data(data_file):
+    """
+    Return FastqcData instance for a file from the cache
+
+    Arguments:
+      data_file (str): path to a ``fastqc_data.txt`` file
+
+    Returns:
+      FastqcData: instance for the file (which may have
+        been returned by a previous call).
+    """
+    return _fastqc_cache.get(FastqcData,data_file)
+
+def get_fastqc_summary(summary_file):
+    """
+    Return FastqcSummary instance for a file from the cache
+
+    Arguments:
+      summary_file (str): path to a ``summary.txt`` file
+
+    Returns:
+      FastqcSummary: instance for the file (which may have
+        been returned by a previous call).
+    """
+    return _fastqc_cache.get(FastqcSummary,summary_file)
+
+def clear_fastqc_cache():
+    """
+    Remove all entries from the process-wide FastQC cache
+    """
+    _fastqc_cache.clear()
+
+def _typed_value(value):
+    """
+    Internal: convert a FastQC data value to int or float
+
+    Returns the original string if it can't be converted.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
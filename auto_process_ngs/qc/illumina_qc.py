@@ -4,31 +4,47 @@
 
 import sys
 import os
+import shutil
+from collections import OrderedDict
+import hashlib
+import tempfile
+import json
 import logging
 import time
+from multiprocessing import Pool
 from bcftbx.IlluminaData import IlluminaFastq
 from bcftbx.IlluminaData import cmp_sample_names
 from bcftbx.TabFile import TabFile
+from bcftbx.Md5sum import md5sum
 from bcftbx.qc.report import strip_ngs_extensions
 from bcftbx.utils import extract_prefix
 from bcftbx.utils import extract_index
 from ..docwriter import Document
+from ..docwriter import Section
 from ..docwriter import Table
 from ..docwriter import Img
 from ..docwriter import Link
 from ..docwriter import Target
 from .fastqc import Fastqc
-from .fastq_screen import Fastqscreen
+from .fastq_screen import get_fastq_screen_data
+from .fastq_screen import get_fastq_screens
 from .plots import uscreenplot
 from .plots import ufastqcplot
 from .plots import uboxplot
 from .plots import encode_png
+from .plots import MicroplotCache
+from .plots import MICROPLOT_CACHE_DIR
 from .. import get_version
 
 FASTQ_SCREENS = ('model_organisms',
                  'other_organisms',
                  'rRNA',)
 
+QC_MANIFEST = "qc.manifest"
+
+REPORT_CACHE_DIR = "report_cache"
+REPORT_CACHE_VERSION = 2
+
 # Module specific logger
 logger = logging.getLogger(__name__)
 
@@ -83,14 +99,48 @@ class QCReporter:
         """
         if qc_dir is None:
             qc_dir = self._project.qc_dir
+        verifier = QCVerifier(qc_dir)
         verified = True
         for sample in self._samples:
-            if not sample.verify(qc_dir):
+            if not sample.verify(qc_dir,verifier=verifier):
                 verified = False
         return verified
 
+    def fastq_screens(self,qc_dir=None):
+        """
+        Load the FastqScreen outputs for all Fastqs in the project
+
+        Arguments:
+          qc_dir (str): path to the QC output dir
+
+        Returns:
+          OrderedDict: mapping of each Fastq to an OrderedDict
+            which maps the screen names to the associated
+            FastqscreenData instances (screens with missing
+            outputs are omitted).
+        """
+        if qc_dir is None:
+            qc_dir = self._project.qc_dir
+        screen_files = OrderedDict()
+        for sample in self._samples:
+            for fq_pair in sample.fastq_pairs:
+                for fq in fq_pair.fastqs:
+                    screen_files[fq] = OrderedDict()
+                    for name in FASTQ_SCREENS:
+                        txt = os.path.join(qc_dir,
+                                           fastq_screen_output(fq,name)[1])
+                        if os.path.exists(txt):
+                            screen_files[fq][name] = txt
+        screens = get_fastq_screens([txt for fq in screen_files
+                                     for txt in screen_files[fq].values()])
+        for fq in screen_files:
+            for name in screen_files[fq]:
+                screen_files[fq][name] = screens[screen_files[fq][name]]
+        return screen_files
+
     def report(self,title=None,filename=None,qc_dir=None,
-               relative_links=False):
+               relative_links=False,nprocessors=1,inline_images=True,
+               incremental=False):
         """
         Report the QC for the project
 
@@ -104,6 +154,22 @@ class QCReporter:
           relative_links (boolean): optional, if set to True
             then use relative paths for links in the report
             (default is to use absolute paths)
+          nprocessors (int): optional, if greater than 1 then
+            generate the report sections for each Fastq using
+            a pool of this many processes (default is to
+            generate them serially)
+          inline_images (boolean): optional, if set to False
+            then the FastQC and FastqScreen plots are written
+            to an 'assets' directory alongside the report (see
+            'report_assets_dir') and linked to from the report,
+            instead of being embedded in the HTML (microplots
+            are always embedded)
+          incremental (boolean): optional, if set to True
+            then reuse the rendered sections for samples
+            whose QC outputs haven't changed since the
+            report was last generated (see 'ReportCache'),
+            and only generate sections for new or updated
+            samples (default is to generate all sections)
 
         Returns:
           String: filename of the HTML report.
@@ -114,11 +180,27 @@ class QCReporter:
             title = "%s: QC report" % self.name
         if filename is None:
             filename = "%s.qc_report.html" % self.name
+        if qc_dir is None:
+            qc_dir = self._project.qc_dir
         # Use relative paths for links
         if relative_links:
             relpath = os.path.dirname(filename)
         else:
             relpath = None
+        # Directory for images
+        if inline_images:
+            assets = None
+        else:
+            assets = ReportAssets(report_assets_dir(filename),
+                                  relpath=os.path.dirname(
+                                      os.path.abspath(filename)))
+        # Cache for rendered samples
+        if incremental:
+            report_cache = ReportCache(os.path.join(qc_dir,
+                                                    REPORT_CACHE_DIR),
+                                       filename)
+        else:
+            report_cache = None
         # Initialise report
         report = Document(title=title)
         # Styles
@@ -157,6 +239,11 @@ class QCReporter:
                             " float: left;\n"
                             "}")
         report.add_css_rule(".clear { clear: both; }")
+        if not inline_images:
+            # Allow browser to defer rendering of samples
+            # which are not visible
+            report.add_css_rule(".sample { content-visibility: auto;\n"
+                                "          contain-intrinsic-size: 1000px; }")
         report.add_css_rule("table.metadata { margin: 10 10;\n"
                             "          border: solid 1px grey;\n"
                             "          background-color: white;\n"
@@ -247,12 +334,38 @@ class QCReporter:
                                    fastqc_r2='FastQC',boxplot_r2='Boxplot',
                                    screens_r2='Screens')
         # Write entries for samples, fastqs etc
+        # NB the sections for each Fastq are created empty and
+        # are populated afterwards (possibly in parallel)
+        fastq_reports = []
+        rendered_samples = []
         current_sample = None
         for i,sample in enumerate(self._samples):
             logger.debug("Reporting sample #%3d: %s " % (i+1,sample.name))
             sample_name = sample.name
+            # Check for cached version of the sample
+            fingerprint = None
+            if report_cache:
+                fingerprint = report_cache.fingerprint(
+                    sample,qc_dir,
+                    paired_end=self.paired_end,
+                    relpath=relpath,
+                    assets_dir=(assets.assets_dir if assets else None))
+                cached = report_cache.get(sample_name,fingerprint)
+                if cached is not None:
+                    logger.debug("Using cached report for sample %s" %
+                                 sample_name)
+                    report.add_section(
+                        section=CachedSection(cached['html']))
+                    for row in cached['rows']:
+                        summary_tbl.add_row(**row)
+                    continue
             sample_report = report.add_section("Sample: %s" % sample_name,
                                                name="sample_%s" % sample_name)
+            sample_rows = []
+            sample_assets = []
+            rendered_samples.append((sample_name,fingerprint,
+                                     sample_report,sample_rows,
+                                     sample_assets))
             sample_report.add_css_classes('sample')
             if self.paired_end:
                 sample_report.add("%d fastq R1/R2 pairs" %
@@ -266,6 +379,7 @@ class QCReporter:
                                                           sample_report))
                 else:
                     idx = summary_tbl.add_row(sample="&nbsp;")
+                sample_rows.append(idx)
                 # Container for fastqs
                 fqs_report = sample_report.add_subsection()
                 fqs_report.add_css_classes('fastqs')
@@ -277,8 +391,8 @@ class QCReporter:
                     fq_r2 = None
                 if self.paired_end:
                     # Create subsections for R1 and R2
-                    fqr1_report = fqs_report.add_subsection(fq_r1)
-                    fqr2_report = fqs_report.add_subsection(fq_r2)
+                    fqr1_report = Section(fq_r1,level=fqs_report.level+1)
+                    fqr2_report = Section(fq_r2,level=fqs_report.level+1)
                     # Add classes
                     fqr1_report.add_css_classes('fastq_r1')
                     fqr2_report.add_css_classes('fastq_r2')
@@ -287,177 +401,80 @@ class QCReporter:
                                           "%s<br />%s" %
                                           (Link(fq_r1,fqr1_report),
                                            Link(fq_r2,fqr2_report)))
+                    fastq_reports.append((fqs_report,idx,sample_assets,
+                                          (fq_r1,'r1',fqr1_report),
+                                          (fq_r2,'r2',fqr2_report)))
                 else:
                     # Create subsection for R1 only
-                    fqr1_report = fqs_report.add_subsection(fq_r1)
+                    fqr1_report = Section(fq_r1,level=fqs_report.level+1)
                     # Add classes
                     fqr1_report.add_css_classes('fastq_r1')
                     # Add entry to summary table
                     summary_tbl.set_value(idx,'fastq',Link(fq_r1,
                                                            fqr1_report))
-                self._report_fastq(fq_r1,'r1',summary_tbl,idx,
-                                   fqr1_report,qc_dir=qc_dir,
-                                   relpath=relpath)
-                if self.paired_end:
-                    self._report_fastq(fq_r2,'r2',summary_tbl,idx,
-                                       fqr2_report,qc_dir=qc_dir,
-                                       relpath=relpath)
+                    fastq_reports.append((fqs_report,idx,sample_assets,
+                                          (fq_r1,'r1',fqr1_report)))
                 # Reset sample name for remaining pairs
                 sample_name = None
-                # Add an empty section to clear HTML floats
-                clear = fqs_report.add_subsection()
-                clear.add_css_classes("clear")
+        # Generate the reports for each Fastq
+        fastqs = []
+        for fastq_report in fastq_reports:
+            for fq,read_id,fq_report in fastq_report[3:]:
+                fastqs.append((fq,read_id,fq_report,qc_dir,relpath,
+                               assets))
+        if nprocessors > 1 and len(fastqs) > 1:
+            logger.debug("Reporting %d Fastqs using %d processes" %
+                         (len(fastqs),nprocessors))
+            # Split into one chunk of Fastqs per process
+            chunk_size = (len(fastqs) + nprocessors - 1)/nprocessors
+            chunks = [fastqs[i:i+chunk_size]
+                      for i in xrange(0,len(fastqs),chunk_size)]
+            pool = Pool(nprocessors)
+            try:
+                results = pool.map(_report_fastqs_worker,chunks)
+            finally:
+                pool.close()
+                pool.join()
+            results = [result for chunk in results for result in chunk]
+        else:
+            results = _report_fastqs_worker(fastqs)
+        # Assemble the reports in order
+        results = iter(results)
+        for fastq_report in fastq_reports:
+            fqs_report,idx,sample_assets = fastq_report[0:3]
+            for _ in fastq_report[3:]:
+                fq_report,summary_values,fq_assets = results.next()
+                fqs_report.add_subsection(section=fq_report)
+                for key in summary_values:
+                    summary_tbl.set_value(idx,key,summary_values[key])
+                sample_assets.extend(fq_assets)
+            # Add an empty section to clear HTML floats
+            clear = fqs_report.add_subsection()
+            clear.add_css_classes("clear")
+        # Store the newly rendered samples
+        if report_cache:
+            for sample_name,fingerprint,sample_report,sample_rows,\
+                sample_assets in rendered_samples:
+                rows = []
+                for idx in sample_rows:
+                    row = dict()
+                    for col in summary_tbl.columns:
+                        value = summary_tbl.get_value(idx,col)
+                        if value is not None:
+                            row[col] = _rendered_value(value)
+                    rows.append(row)
+                report_cache.put(sample_name,fingerprint,
+                                 sample_report.html(),rows,
+                                 sample_assets)
+            # Drop entries for samples which have been removed
+            report_cache.prune([sample.name for sample in self._samples])
+        # Evict microplots for QC outputs which have changed
+        MicroplotCache(os.path.join(qc_dir,MICROPLOT_CACHE_DIR)).prune()
         # Write the report
         report.write(filename)
         # Return the output filename
         return filename
 
-    def _report_fastq(self,fq,read_id,summary,idx,report,
-                      qc_dir=None,relpath=None):
-        """
-        Generate report section for a Fastq file
-
-        Arguments:
-          fq (str): Fastq file that is being reported
-          read_id (str): either 'r1' or 'r2'
-          summary (Table): summary table object
-          idx (integer): row index for summary table
-          report (Section): container for the report
-          qc_dir (str): path to the QC output dir
-
-        """
-        # Report FastQC results
-        fastqc_report = report.add_subsection("FastQC")
-        if qc_dir is None:
-            qc_dir = self._project.qc_dir
-        try:
-            # Locate FastQC outputs
-            fastqc = Fastqc(os.path.join(qc_dir,fastqc_output(fq)[0]))
-            # FastQC quality boxplot
-            fastqc_report.add("Per base sequence quality boxplot:")
-            boxplot = Img(fastqc.quality_boxplot(inline=True),
-                          height=250,
-                          width=480,
-                          href=fastqc.summary.link_to_module(
-                              'Per base sequence quality',
-                              relpath=relpath),
-                          name="boxplot_%s" % fq)
-            fastqc_report.add(boxplot)
-            try:
-                summary.set_value(idx,'boxplot_%s' % read_id,
-                                  Img(uboxplot(fastqc.data.path,inline=True),
-                                      href=boxplot))
-            except Exception,ex:
-                logger.error("Failed to generate boxplot for %s: %s"
-                             % (fq,ex))
-            # FastQC summary table
-            fastqc_report.add("FastQC summary:")
-            fastqc_tbl = Target("fastqc_%s" % fq)
-            fastqc_report.add(fastqc_tbl,
-                              fastqc.summary.html_table(relpath=relpath))
-            if relpath:
-                fastqc_html_report = os.path.relpath(fastqc.html_report,relpath)
-            else:
-                fastqc_html_report = fastqc.html_report
-            fastqc_report.add("%s for %s" % (Link("Full FastQC report",
-                                                  fastqc_html_report),
-                                             fq))
-            # Populate line in main Fastqs summary table
-            if read_id == 'r1':
-                nreads = fastqc.data.basic_statistics('Total Sequences')
-                summary.set_value(idx,'reads',pretty_print_reads(nreads))
-            try:
-                summary.set_value(idx,'fastqc_%s' % read_id,
-                                  Img(ufastqcplot(
-                                      fastqc.summary.path,inline=True),
-                                      href=fastqc_tbl))
-            except Exception,ex:
-                logger.error("Failed to generate Fastqc microplot for %s: %s"
-                             % (fq,ex))
-        except Exception,ex:
-            # Unable to get the FastQC data
-            logger.warning("Unable to load FastQC data for %s: %s" %
-                           (fq,ex))
-            # Add placeholders for missing data
-            if read_id == 'r1':
-                summary.set_value(idx,'reads','-')
-            fastqc_report.add("!!!No FastQC data available!!!")
-        # Report fastq_screen outputs
-        screens_report = report.add_subsection("Screens")
-        fastq_screens = Target("fastq_screens_%s" % fq)
-        screens_report.add(fastq_screens)
-        screen_files = []
-        fastq_screen_txt = []
-        for name in FASTQ_SCREENS:
-            description = name.replace('_',' ').title()
-            png,txt = fastq_screen_output(fq,name)
-            png = os.path.join(qc_dir,png)
-            txt = os.path.join(qc_dir,txt)
-            if relpath:
-                png_href = os.path.relpath(png,relpath)
-                txt_href = os.path.relpath(txt,relpath)
-            else:
-                png_href = png
-                txt_href = txt
-            screens_report.add(description)
-            if os.path.exists(png):
-                screens_report.add(Img(encode_png(png),
-                                       height=250,
-                                       href=png_href))
-            else:
-                logger.warning("Unable to find screen PNG: %s" % png)
-                screens_report.add("!!!No FastqScreen plot available!!!")
-            if os.path.exists(txt):
-                screen_files.append(txt)
-                fastq_screen_txt.append(
-                    Link(description,txt_href).html())
-            else:
-                logger.warning("Unable to find raw screen data: %s" % txt)
-                screens_report.add("!!!No FastqScreen data available!!!")
-        screens_report.add("Raw screen data: " +
-                           " | ".join(fastq_screen_txt))
-        try:
-            summary.set_value(idx,'screens_%s' % read_id,
-                              Img(uscreenplot(screen_files,inline=True),
-                                  href=fastq_screens))
-        except Exception,ex:
-            logger.error("Failed to generate microscreen plots for %s: %s"
-                         % (fq,ex))
-        # Program versions
-        versions = report.add_subsection("Program versions")
-        versions.add(self._program_versions(fq,qc_dir=qc_dir))
-
-    def _program_versions(self,fastq,qc_dir=None):
-        """
-        """
-        # Program versions table
-        tbl = Table(("Program","Version"))
-        tbl.add_css_classes("programs","summary")
-        if qc_dir is None:
-            qc_dir = self._project.qc_dir
-        # Fetch the version info
-        try:
-            fastqc_version = Fastqc(
-                os.path.join(qc_dir,
-                             fastqc_output(fastq)[0])).version
-        except Exception,ex:
-            logger.error("Unable to get Fastqc version for %s: %s"
-                         % (fastq,ex))
-            fastqc_version = "?"
-        try:
-            fastq_screen_version = Fastqscreen(
-                os.path.join(qc_dir,
-                             fastq_screen_output(fastq,
-                                                 FASTQ_SCREENS[0])[1])).version
-        except Exception,ex:
-            logger.error("Unable to get Fastq_screen version for %s: %s"
-                         % (fastq,ex))
-            fastq_screen_version = "?"
-        # Add to table
-        tbl.add_row(Program='fastqc',Version=fastqc_version)
-        tbl.add_row(Program='fastq_screen',Version=fastq_screen_version)
-        return tbl
-
 class QCSample:
     """
     Class describing QC results for an AnalysisSample
@@ -482,16 +499,24 @@ class QCSample:
     def fastq_pairs(self):
         return self._fastq_pairs
 
-    def verify(self,qc_dir):
+    def verify(self,qc_dir,verifier=None):
         """
         Check QC products for this sample
 
         Checks that fastq_screens and FastQC files were found.
         Returns True if the QC products are present, False
         otherwise.
+
+        Arguments:
+          qc_dir (str): path to the location of the QC
+            output directory
+          verifier (QCVerifier): optional, verifier for
+            the QC directory to use for the checks
         """
+        if verifier is None:
+            verifier = QCVerifier(qc_dir)
         for fq_pair in self.fastq_pairs:
-            if not fq_pair.verify(qc_dir):
+            if not fq_pair.verify(qc_dir,verifier=verifier):
                 return False
         return True
 
@@ -542,7 +567,7 @@ class FastqSet:
         return filter(lambda fq: fq is not None,
                       self._fastqs)
 
-    def verify(self,qc_dir):
+    def verify(self,qc_dir,verifier=None):
         """
         Check QC products for this Fastq pair
 
@@ -553,20 +578,735 @@ class FastqSet:
         Arguments:
           qc_dir (str): path to the location of the QC
             output directory
+          verifier (QCVerifier): optional, verifier for
+            the QC directory to use for the checks
 
         """
+        if verifier is None:
+            verifier = QCVerifier(qc_dir)
         for fq in self._fastqs:
             if fq is None:
                 continue
-            present,missing = check_qc_outputs(fq,qc_dir)
-            if missing:
+            if not verifier.verify(fq):
                 return False
         return True
 
+class QCVerifier(object):
+    """
+    Class for checking QC products for multiple Fastqs
+
+    The contents of the QC directory are listed once
+    (on first use), and the expected QC products for
+    each Fastq are then checked against this listing,
+    rather than checking for each product individually
+    on the file system.
+
+    If the QC directory has a manifest file then the
+    expected QC products are taken from the manifest,
+    and the products for any Fastq which has changed
+    since the manifest was written are treated as
+    missing.
+
+    Example usage:
+
+    >>> verifier = QCVerifier('/data/PJB/qc')
+    >>> verifier.verify('PJB1_S1_R1_001.fastq.gz')
+    True
+    >>> verifier.missing_outputs(fastqs)
+    OrderedDict([('PJB2_S2_R1_001.fastq.gz',['/data/PJB/qc/...']),...])
+
+    If the contents of the QC directory change (for
+    example after running QC jobs) then the 'refresh'
+    method should be invoked before any further checks.
+    """
+    def __init__(self,qc_dir):
+        """
+        Create a new QCVerifier instance
+
+        Arguments:
+          qc_dir (str): path to the QC directory
+        """
+        self._qc_dir = qc_dir
+        self._contents = None
+        self._manifest = None
+
+    @property
+    def qc_dir(self):
+        """
+        Return the path to the QC directory
+        """
+        return self._qc_dir
+
+    @property
+    def manifest(self):
+        """
+        Return the QCManifest for the QC directory
+        """
+        if self._manifest is None:
+            self._manifest = QCManifest(self._qc_dir)
+        return self._manifest
+
+    @property
+    def contents(self):
+        """
+        Return the set of names in the QC directory
+        """
+        if self._contents is None:
+            try:
+                self._contents = set(os.listdir(self._qc_dir))
+            except OSError as ex:
+                logger.debug("Unable to list QC directory %s: %s" %
+                             (self._qc_dir,ex))
+                self._contents = set()
+        return self._contents
+
+    def refresh(self):
+        """
+        Discard the listing of the QC directory
+
+        The directory listing and the manifest will be
+        read again on the next check.
+        """
+        self._contents = None
+        self._manifest = None
+
+    def check(self,fastq):
+        """
+        Return lists of present and missing QC products for Fastq
+
+        Arguments:
+          fastq (str): name of Fastq file
+
+        Returns:
+          Tuple: tuple of the form (present,missing) where
+            present, missing are lists of paths to associated
+            QC products which are present in the QC dir, or
+            are missing (i.e. the same as 'check_qc_outputs').
+        """
+        present = []
+        missing = []
+        contents = self.contents
+        if self.manifest.is_stale(fastq):
+            contents = set()
+        for output in self.manifest.expected_outputs(fastq):
+            if os.path.basename(output) in contents:
+                present.append(output)
+            else:
+                missing.append(output)
+        return (present,missing)
+
+    def verify(self,fastq):
+        """
+        Check if all the QC products are present for a Fastq
+
+        Arguments:
+          fastq (str): name of Fastq file
+
+        Returns:
+          Boolean: True if all products are present,
+            False if not.
+        """
+        present,missing = self.check(fastq)
+        return (not missing)
+
+    def missing_outputs(self,fastqs):
+        """
+        Return the missing QC products for a set of Fastqs
+
+        Arguments:
+          fastqs (list): list of Fastq files
+
+        Returns:
+          OrderedDict: mapping of each Fastq with missing
+            QC products to a list of the missing products,
+            in the same order as the input list (Fastqs
+            with no missing products are not included).
+        """
+        missing_outputs = OrderedDict()
+        for fastq in fastqs:
+            present,missing = self.check(fastq)
+            if missing:
+                missing_outputs[fastq] = missing
+        return missing_outputs
+
+class QCManifest(object):
+    """
+    Class for handling the QC manifest file for a QC directory
+
+    The manifest records each Fastq which has been set
+    up for QC in the directory, along with its expected
+    QC products and a signature for the Fastq (size,
+    modification time and optionally the MD5 checksum)
+    at the time it was added, plus the version of the
+    QC script.
+
+    The manifest is a tab-delimited file with header
+    lines starting with '#', and one line per Fastq
+    of the form:
+
+    FASTQ  SIZE  MTIME  MD5  OUTPUT1,OUTPUT2,...
+
+    where FASTQ is the Fastq basename, outputs are names
+    relative to the QC directory, and MD5 is '.' if the
+    checksum wasn't computed.
+
+    Example usage:
+
+    >>> manifest = QCManifest('/data/PJB/qc')
+    >>> manifest.add('/data/PJB/fastqs/PJB1_S1_R1_001.fastq.gz')
+    >>> manifest.version = '1.3.1'
+    >>> manifest.save()
+
+    For Fastqs which aren't in the manifest the expected
+    outputs are derived from the Fastq name (i.e. as
+    for 'expected_qc_outputs').
+
+    Entries should only be added or updated once the QC
+    for the Fastq has completed and been verified (see
+    the 'update' method), so that a Fastq which has
+    changed since its QC was run can be detected via
+    'is_stale'.
+    """
+    def __init__(self,qc_dir):
+        """
+        Create a new QCManifest instance
+
+        The manifest file is loaded if it exists.
+
+        Arguments:
+          qc_dir (str): path to the QC directory
+        """
+        self._qc_dir = qc_dir
+        self._filen = os.path.join(qc_dir,QC_MANIFEST)
+        self._fastqs = OrderedDict()
+        self.version = None
+        if os.path.exists(self._filen):
+            self.load()
+
+    @property
+    def path(self):
+        """
+        Return the path to the manifest file
+        """
+        return self._filen
+
+    @property
+    def fastqs(self):
+        """
+        Return list of the Fastq basenames in the manifest
+        """
+        return list(self._fastqs.keys())
+
+    def __contains__(self,fastq):
+        return (os.path.basename(fastq) in self._fastqs)
+
+    def __len__(self):
+        return len(self._fastqs)
+
+    def load(self):
+        """
+        Load the data from the manifest file
+        """
+        self._fastqs = OrderedDict()
+        with open(self._filen,'r') as fp:
+            for line in fp:
+                line = line.rstrip('\n')
+                if not line:
+                    continue
+                if line.startswith('#'):
+                    if line.startswith('#QC script version\t'):
+                        self.version = line.split('\t')[1]
+                    continue
+                fastq,size,mtime,checksum,outputs = line.split('\t')
+                self._fastqs[fastq] = (int(size),
+                                       int(mtime),
+                                       (checksum if checksum != '.'
+                                        else None),
+                                       tuple(outputs.split(',')))
+
+    def save(self):
+        """
+        Write the data to the manifest file
+
+        The file is written to a temporary file first
+        and then moved into place.
+        """
+        fd,tmp = tempfile.mkstemp(dir=self._qc_dir,
+                                  prefix=".%s." % QC_MANIFEST)
+        with os.fdopen(fd,'w') as fp:
+            fp.write("#QC script version\t%s\n" %
+                     (self.version if self.version else '.'))
+            fp.write("#Fastq\tSize\tMtime\tMD5\tOutputs\n")
+            for fastq in self._fastqs:
+                size,mtime,checksum,outputs = self._fastqs[fastq]
+                fp.write("%s\t%d\t%d\t%s\t%s\n" %
+                         (fastq,
+                          size,
+                          mtime,
+                          (checksum if checksum else '.'),
+                          ','.join(outputs)))
+        os.chmod(tmp,0664)
+        os.rename(tmp,self._filen)
+
+    def add(self,fastq,checksum=False):
+        """
+        Add (or update) the entry for a Fastq
+
+        Arguments:
+          fastq (str): path to the Fastq file
+          checksum (bool): if True then also compute
+            and store the MD5 checksum for the Fastq
+            (default is to only store the size and
+            modification time)
+        """
+        st = os.stat(fastq)
+        outputs = [os.path.basename(f)
+                   for f in expected_qc_outputs(fastq,self._qc_dir)]
+        self._fastqs[os.path.basename(fastq)] = (
+            st.st_size,
+            int(st.st_mtime),
+            (md5sum(fastq) if checksum else None),
+            tuple(outputs))
+
+    def update(self,fastq,checksum=False):
+        """
+        Update the entry for a Fastq if its QC is complete
+
+        The entry is only updated if all the expected QC
+        products for the Fastq are present (so outputs
+        from a failed or incomplete QC run are never
+        recorded as being up to date).
+
+        Arguments:
+          fastq (str): path to the Fastq file
+          checksum (bool): if True then also compute
+            and store the MD5 checksum for the Fastq
+
+        Returns:
+          Boolean: True if the entry was updated, False
+            if QC products are missing.
+        """
+        present,missing = check_qc_outputs(fastq,self._qc_dir)
+        if missing:
+            return False
+        self.add(fastq,checksum=checksum)
+        return True
+
+    def clear_outputs(self,fastq):
+        """
+        Remove the existing QC products for a Fastq
+
+        Used to remove outputs which are out of date
+        (e.g. because the Fastq has been regenerated)
+        before QC is run again, so that they aren't
+        picked up by the QC script or the verification.
+
+        Arguments:
+          fastq (str): path to the Fastq file
+        """
+        for output in self.expected_outputs(fastq):
+            if os.path.isdir(output) and not os.path.islink(output):
+                shutil.rmtree(output)
+            elif os.path.lexists(output):
+                os.remove(output)
+
+    def expected_outputs(self,fastq):
+        """
+        Return list of expected QC products for a Fastq
+
+        Arguments:
+          fastq (str): name of Fastq file
+
+        Returns:
+          List: list of paths to the expected associated
+            QC products.
+        """
+        try:
+            outputs = self._fastqs[os.path.basename(fastq)][3]
+        except KeyError:
+            return expected_qc_outputs(fastq,self._qc_dir)
+        return [os.path.join(self._qc_dir,f) for f in outputs]
+
+    def is_stale(self,fastq):
+        """
+        Check if a Fastq has changed since it was added
+
+        Compares the size and modification time of the
+        Fastq against the values in the manifest.
+
+        Arguments:
+          fastq (str): path to the Fastq file
+
+        Returns:
+          Boolean: True if the Fastq is in the manifest
+            and has changed, False otherwise (including
+            if the Fastq can't be accessed).
+        """
+        try:
+            size,mtime,checksum,outputs = \
+                self._fastqs[os.path.basename(fastq)]
+        except KeyError:
+            return False
+        try:
+            st = os.stat(fastq)
+        except OSError:
+            return False
+        return (st.st_size != size or int(st.st_mtime) != mtime)
+
+    def stale_fastqs(self,fastqs):
+        """
+        Return the Fastqs which have changed since being added
+
+        Arguments:
+          fastqs (list): list of Fastq files
+
+        Returns:
+          List: Fastqs from the input list for which
+            'is_stale' returns True.
+        """
+        return filter(self.is_stale,fastqs)
+
+class ReportAssets(object):
+    """
+    Class for storing images for a QC report as external files
+
+    Images are copied to the assets directory under names
+    derived from the SHA1 digest of their contents, so each
+    distinct image is only stored once (and isn't copied
+    again if the report is regenerated).
+
+    Example usage:
+
+    >>> assets = ReportAssets('/data/PJB/qc_report_assets',
+    ...                       relpath='/data/PJB')
+    >>> assets.add('/data/PJB/qc/PJB1_fastqc/Images/per_base_quality.png')
+    'qc_report_assets/5c1d....png'
+    """
+    def __init__(self,assets_dir,relpath=None):
+        """
+        Create a new ReportAssets instance
+
+        Arguments:
+          assets_dir (str): path to the directory to
+            store the images in (will be created if
+            it doesn't already exist)
+          relpath (str): optional, if set then the
+            paths returned by 'add' will be relative
+            to this directory (otherwise they will be
+            absolute paths)
+        """
+        self._assets_dir = os.path.abspath(assets_dir)
+        self._relpath = relpath
+        self._files = []
+
+    @property
+    def assets_dir(self):
+        """
+        Return the path to the assets directory
+        """
+        return self._assets_dir
+
+    @property
+    def relpath(self):
+        """
+        Return the path that returned paths are relative to
+        """
+        return self._relpath
+
+    @property
+    def files(self):
+        """
+        Return list of the paths of files added by this instance
+        """
+        return [f for f in self._files]
+
+    def add(self,filen):
+        """
+        Add a file to the assets directory
+
+        Arguments:
+          filen (str): path to the file to add
+
+        Returns:
+          String: path to the copy of the file in the
+            assets directory (relative to 'relpath', if
+            this was set).
+        """
+        # Generate the name from the file contents
+        digest = hashlib.sha1()
+        with open(filen,'rb') as fp:
+            for block in iter(lambda: fp.read(1024*1024),''):
+                digest.update(block)
+        ext = os.path.splitext(filen)[1]
+        asset = os.path.join(self._assets_dir,
+                             "%s%s" % (digest.hexdigest(),ext))
+        # Copy the file, if not already present
+        if not os.path.exists(asset):
+            if not os.path.isdir(self._assets_dir):
+                try:
+                    os.makedirs(self._assets_dir)
+                except OSError:
+                    # May have been created by another process
+                    if not os.path.isdir(self._assets_dir):
+                        raise
+            # Copy to a temporary file and move into place,
+            # so other processes never see a partial file
+            fp,tmp_asset = tempfile.mkstemp(suffix=".tmp",
+                                            dir=self._assets_dir)
+            os.close(fp)
+            shutil.copyfile(filen,tmp_asset)
+            os.chmod(tmp_asset,0644)
+            os.rename(tmp_asset,asset)
+        if asset not in self._files:
+            self._files.append(asset)
+        # Return the path
+        if self._relpath:
+            return os.path.relpath(asset,self._relpath)
+        return asset
+
+class ReportCache(object):
+    """
+    Cache of rendered sample sections for a QC report
+
+    For each sample the cache stores the rendered HTML
+    for the sample's section of the report and its rows
+    in the summary table, along with a fingerprint of the
+    inputs that they were generated from (i.e. the QC
+    outputs for the sample's Fastqs plus the report
+    settings). The cached data are only reused if the
+    fingerprint hasn't changed.
+
+    Each sample is stored as a JSON file in the cache
+    directory, under a name derived from the path to the
+    report and the sample name.
+
+    Example usage:
+
+    >>> cache = ReportCache('/data/PJB/qc/report_cache',
+    ...                     '/data/PJB/qc_report.html')
+    >>> fingerprint = cache.fingerprint(sample,'/data/PJB/qc')
+    >>> cached = cache.get(sample.name,fingerprint)
+    """
+    def __init__(self,cache_dir,report_html):
+        """
+        Create a new ReportCache instance
+
+        Arguments:
+          cache_dir (str): path to the directory to
+            store cached sections in (will be created
+            when the first section is stored, if it
+            doesn't already exist)
+          report_html (str): path to the HTML report
+            that the sections are rendered for
+        """
+        self._cache_dir = os.path.abspath(cache_dir)
+        self._report_html = os.path.abspath(report_html)
+        self._read_only = False
+
+    @property
+    def cache_dir(self):
+        """
+        Return the path to the cache directory
+        """
+        return self._cache_dir
+
+    def fingerprint(self,sample,qc_dir,**params):
+        """
+        Generate the fingerprint for a sample
+
+        Arguments:
+          sample (QCSample): sample to generate the
+            fingerprint for
+          qc_dir (str): path to the QC output dir
+          params (mapping): additional parameters which
+            affect the rendering of the sample
+
+        Returns:
+          String: the fingerprint for the sample.
+        """
+        fingerprint = [REPORT_CACHE_VERSION,
+                       get_version(),
+                       os.path.abspath(qc_dir),
+                       sample.name,
+                       sorted(params.items())]
+        for fq_pair in sample.fastq_pairs:
+            for fq in fq_pair.fastqs:
+                outputs = expected_qc_outputs(fq,qc_dir)
+                fastqc_dir = os.path.join(qc_dir,fastqc_output(fq)[0])
+                outputs.extend([os.path.join(fastqc_dir,f)
+                                for f in ('fastqc_data.txt',
+                                          'summary.txt')])
+                stats = []
+                for output in outputs:
+                    try:
+                        st = os.stat(output)
+                        stats.append((st.st_size,st.st_mtime))
+                    except OSError:
+                        stats.append(None)
+                fingerprint.append((fq,stats))
+        return hashlib.sha1(repr(fingerprint)).hexdigest()
+
+    def path(self,sample_name):
+        """
+        Return the path to the cache file for a sample
+        """
+        key = hashlib.sha1("%s\t%s" % (self._report_html,
+                                       sample_name)).hexdigest()
+        return os.path.join(self._cache_dir,"%s.json" % key)
+
+    def get(self,sample_name,fingerprint):
+        """
+        Fetch the cached data for a sample
+
+        Arguments:
+          sample_name (str): name of the sample
+          fingerprint (str): current fingerprint for
+            the sample (see 'fingerprint')
+
+        Returns:
+          Dictionary: with keys 'html' (the rendered
+            sample section) and 'rows' (list of
+            dictionaries with the rendered values for
+            the summary table rows), or None if the
+            sample isn't in the cache, the fingerprint
+            doesn't match, or any of the external
+            images used by the section are missing.
+        """
+        try:
+            with open(self.path(sample_name),'r') as fp:
+                cached = json.load(fp)
+        except (IOError,ValueError):
+            return None
+        if cached.get('fingerprint') != fingerprint:
+            return None
+        for asset in cached.get('assets',[]):
+            if not os.path.exists(asset):
+                return None
+        return dict(html=_utf8(cached['html']),
+                    rows=[dict([(str(key),_utf8(row[key]))
+                                for key in row])
+                          for row in cached['rows']])
+
+    def put(self,sample_name,fingerprint,html,rows,assets=()):
+        """
+        Store the rendered data for a sample
+
+        The data are written to a temporary file which is
+        then moved into place. Failure to store the data
+        is not fatal (but no further attempts will be made
+        to store data in the cache).
+
+        Arguments:
+          sample_name (str): name of the sample
+          fingerprint (str): fingerprint for the sample
+          html (str): rendered HTML for the sample section
+          rows (list): list of dictionaries with the
+            rendered values for the sample's rows in the
+            summary table
+          assets (list): paths to external images used
+            by the sample section
+        """
+        if self._read_only:
+            return
+        try:
+            if not os.path.isdir(self._cache_dir):
+                try:
+                    os.makedirs(self._cache_dir)
+                except OSError:
+                    # May have been created by another process
+                    if not os.path.isdir(self._cache_dir):
+                        raise
+            fp,tmp = tempfile.mkstemp(suffix=".tmp",dir=self._cache_dir)
+            with os.fdopen(fp,'w') as fp:
+                json.dump(dict(fingerprint=fingerprint,
+                               report=self._report_html,
+                               sample=sample_name,
+                               html=html,
+                               rows=rows,
+                               assets=list(assets)),fp)
+            os.rename(tmp,self.path(sample_name))
+        except Exception as ex:
+            logger.warning("Unable to write to report cache %s: %s" %
+                           (self._cache_dir,ex))
+            self._read_only = True
+
+    def prune(self,sample_names):
+        """
+        Remove cached data for samples no longer in the report
+
+        Removes the entries for the report which don't
+        belong to any of the specified samples, along with
+        any entries from older versions of the cache which
+        don't record the report they belong to. Entries for
+        other reports sharing the cache directory are kept.
+
+        Arguments:
+          sample_names (list): names of the samples which
+            are currently in the report
+        """
+        if not os.path.isdir(self._cache_dir):
+            return
+        keep = set([self.path(name) for name in sample_names])
+        for f in os.listdir(self._cache_dir):
+            cache_file = os.path.join(self._cache_dir,f)
+            if not f.endswith(".json") or cache_file in keep:
+                continue
+            try:
+                with open(cache_file,'r') as fp:
+                    report = json.load(fp).get('report')
+            except (IOError,ValueError):
+                report = None
+            if report not in (None,self._report_html):
+                continue
+            logger.debug("Removing stale report cache entry %s" %
+                         cache_file)
+            try:
+                os.remove(cache_file)
+            except OSError as ex:
+                logger.warning("Unable to remove report cache entry "
+                               "%s: %s" % (cache_file,ex))
+
+class CachedSection(object):
+    """
+    Document section with previously rendered content
+
+    Can be added to a docwriter Document or Section in
+    place of a Section, and renders as the stored HTML.
+    """
+    def __init__(self,html):
+        """
+        Create a new CachedSection instance
+
+        Arguments:
+          html (str): the rendered HTML for the section
+        """
+        self._html = html
+
+    def html(self):
+        """
+        Return the rendered HTML
+        """
+        return self._html
+
 #######################################################################
 # Functions
 #######################################################################
 
+def report_assets_dir(report_html):
+    """
+    Return path to the assets directory for a QC report
+
+    For example for 'qc_report.html' the assets
+    directory will be 'qc_report_assets'.
+
+    Arguments:
+      report_html (str): path to the HTML QC report
+
+    Returns:
+      String: path to the assets directory.
+    """
+    return "%s_assets" % os.path.splitext(report_html)[0]
+
 def get_fastq_pairs(sample):
     """
     Return pairs of Fastqs for an AnalysisSample instance
@@ -687,6 +1427,37 @@ def check_qc_outputs(fastq,qc_dir):
             missing.append(output)
     return (present,missing)
 
+def update_qc_manifests(qc_jobs):
+    """
+    Update QC manifests for Fastqs once their QC jobs complete
+
+    The manifest entry for each Fastq is only updated if
+    its QC job finished successfully and all the expected
+    QC products are present; each updated manifest is then
+    saved.
+
+    Arguments:
+      qc_jobs (list): list of tuples (manifest,fastq,job)
+        where 'manifest' is the QCManifest for the QC
+        directory, and 'job' is the completed scheduler
+        job which ran the QC for 'fastq'
+    """
+    updated = []
+    for manifest,fastq,job in qc_jobs:
+        if job.exit_code != 0:
+            logger.warning("%s: QC job failed (exit code %s), not "
+                           "updating QC manifest" %
+                           (os.path.basename(fastq),job.exit_code))
+            continue
+        if not manifest.update(fastq):
+            logger.warning("%s: missing QC outputs, not updating QC "
+                           "manifest" % os.path.basename(fastq))
+            continue
+        if not [m for m in updated if m is manifest]:
+            updated.append(manifest)
+    for manifest in updated:
+        manifest.save()
+
 def pretty_print_reads(n):
     """
     Print the number of reads with commas at each thousand
@@ -710,3 +1481,246 @@ def pretty_print_reads(n):
         n = n[3:]
     if n: n0.append(n)
     return (','.join(n0))[::-1]
+
+def report_fastq(fq,read_id,report,qc_dir,relpath=None,assets=None):
+    """
+    Generate report section for a Fastq file
+
+    Arguments:
+      fq (str): Fastq file that is being reported
+      read_id (str): either 'r1' or 'r2'
+      report (Section): container for the report
+      qc_dir (str): path to the QC output dir
+      relpath (str): if set then links in the report
+        will be relative to this path
+      assets (ReportAssets): if set then the FastQC and
+        FastqScreen plots will be added to these assets
+        and linked to, rather than embedded in the report
+
+    Returns:
+      Dictionary: values to set in the row for the Fastq
+        in the summary table, keyed by column name.
+    """
+    summary = dict()
+    # Cache for microplots
+    cache = MicroplotCache(os.path.join(qc_dir,MICROPLOT_CACHE_DIR))
+    # Report FastQC results
+    fastqc_report = report.add_subsection("FastQC")
+    try:
+        # Locate FastQC outputs
+        fastqc = Fastqc(os.path.join(qc_dir,fastqc_output(fq)[0]))
+        # FastQC quality boxplot
+        fastqc_report.add("Per base sequence quality boxplot:")
+        if assets:
+            boxplot_src = fastqc.quality_boxplot()
+            if boxplot_src is not None:
+                boxplot_src = assets.add(boxplot_src)
+        else:
+            boxplot_src = fastqc.quality_boxplot(inline=True)
+        boxplot = Img(boxplot_src,
+                      height=250,
+                      width=480,
+                      href=fastqc.summary.link_to_module(
+                          'Per base sequence quality',
+                          relpath=relpath),
+                      name="boxplot_%s" % fq,
+                      lazy=bool(assets))
+        fastqc_report.add(boxplot)
+        try:
+            summary['boxplot_%s' % read_id] = \
+                Img(uboxplot(fastqc.data.path,inline=True,cache=cache),
+                    href=boxplot)
+        except Exception,ex:
+            logger.error("Failed to generate boxplot for %s: %s"
+                         % (fq,ex))
+        # FastQC summary table
+        fastqc_report.add("FastQC summary:")
+        fastqc_tbl = Target("fastqc_%s" % fq)
+        fastqc_report.add(fastqc_tbl,
+                          fastqc.summary.html_table(relpath=relpath))
+        if relpath:
+            fastqc_html_report = os.path.relpath(fastqc.html_report,relpath)
+        else:
+            fastqc_html_report = fastqc.html_report
+        fastqc_report.add("%s for %s" % (Link("Full FastQC report",
+                                              fastqc_html_report),
+                                         fq))
+        # Populate line in main Fastqs summary table
+        if read_id == 'r1':
+            nreads = fastqc.data.basic_statistics('Total Sequences')
+            summary['reads'] = pretty_print_reads(nreads)
+        try:
+            summary['fastqc_%s' % read_id] = \
+                Img(ufastqcplot(fastqc.summary.path,inline=True,
+                                cache=cache),
+                    href=fastqc_tbl)
+        except Exception,ex:
+            logger.error("Failed to generate Fastqc microplot for %s: %s"
+                         % (fq,ex))
+    except Exception,ex:
+        # Unable to get the FastQC data
+        logger.warning("Unable to load FastQC data for %s: %s" %
+                       (fq,ex))
+        # Add placeholders for missing data
+        if read_id == 'r1':
+            summary['reads'] = '-'
+        fastqc_report.add("!!!No FastQC data available!!!")
+    # Report fastq_screen outputs
+    screens_report = report.add_subsection("Screens")
+    fastq_screens = Target("fastq_screens_%s" % fq)
+    screens_report.add(fastq_screens)
+    screen_files = []
+    fastq_screen_txt = []
+    for name in FASTQ_SCREENS:
+        description = name.replace('_',' ').title()
+        png,txt = fastq_screen_output(fq,name)
+        png = os.path.join(qc_dir,png)
+        txt = os.path.join(qc_dir,txt)
+        if relpath:
+            png_href = os.path.relpath(png,relpath)
+            txt_href = os.path.relpath(txt,relpath)
+        else:
+            png_href = png
+            txt_href = txt
+        screens_report.add(description)
+        if os.path.exists(png):
+            if assets:
+                screens_report.add(Img(assets.add(png),
+                                       height=250,
+                                       href=png_href,
+                                       lazy=True))
+            else:
+                screens_report.add(Img(encode_png(png),
+                                       height=250,
+                                       href=png_href))
+        else:
+            logger.warning("Unable to find screen PNG: %s" % png)
+            screens_report.add("!!!No FastqScreen plot available!!!")
+        if os.path.exists(txt):
+            screen_files.append(txt)
+            fastq_screen_txt.append(
+                Link(description,txt_href).html())
+        else:
+            logger.warning("Unable to find raw screen data: %s" % txt)
+            screens_report.add("!!!No FastqScreen data available!!!")
+    screens_report.add("Raw screen data: " +
+                       " | ".join(fastq_screen_txt))
+    try:
+        summary['screens_%s' % read_id] = \
+            Img(uscreenplot(screen_files,inline=True,cache=cache),
+                href=fastq_screens)
+    except Exception,ex:
+        logger.error("Failed to generate microscreen plots for %s: %s"
+                     % (fq,ex))
+    # Program versions
+    versions = report.add_subsection("Program versions")
+    versions.add(program_versions(fq,qc_dir))
+    return summary
+
+def program_versions(fastq,qc_dir):
+    """
+    Generate table of program versions for a Fastq file
+
+    Arguments:
+      fastq (str): Fastq file that is being reported
+      qc_dir (str): path to the QC output dir
+
+    Returns:
+      Table: table listing the versions of the QC
+        programs used for the Fastq.
+    """
+    # Program versions table
+    tbl = Table(("Program","Version"))
+    tbl.add_css_classes("programs","summary")
+    # Fetch the version info
+    try:
+        fastqc_version = Fastqc(
+            os.path.join(qc_dir,
+                         fastqc_output(fastq)[0])).version
+    except Exception,ex:
+        logger.error("Unable to get Fastqc version for %s: %s"
+                     % (fastq,ex))
+        fastqc_version = "?"
+    try:
+        fastq_screen_version = get_fastq_screen_data(
+            os.path.join(qc_dir,
+                         fastq_screen_output(fastq,
+                                             FASTQ_SCREENS[0])[1])).version
+    except Exception,ex:
+        logger.error("Unable to get Fastq_screen version for %s: %s"
+                     % (fastq,ex))
+        fastq_screen_version = "?"
+    # Add to table
+    tbl.add_row(Program='fastqc',Version=fastqc_version)
+    tbl.add_row(Program='fastq_screen',Version=fastq_screen_version)
+    return tbl
+
+def _report_fastq_worker(args):
+    """
+    Internal: generate report section for a Fastq file
+
+    Wrapper for 'report_fastq' which can be used with
+    'multiprocessing.Pool.map'.
+
+    Arguments:
+      args (tuple): tuple of (fq,read_id,report,qc_dir,
+        relpath,assets), where 'report' is the Section to
+        populate
+
+    Returns:
+      Tuple: the populated Section, the dictionary of
+        summary values returned by 'report_fastq', and
+        the list of external images used by the section.
+    """
+    fq,read_id,report,qc_dir,relpath,assets = args
+    if assets is not None:
+        # Use a new instance to track the images for
+        # this Fastq only
+        assets = ReportAssets(assets.assets_dir,relpath=assets.relpath)
+    summary = report_fastq(fq,read_id,report,qc_dir,relpath=relpath,
+                           assets=assets)
+    return (report,summary,(assets.files if assets else []))
+
+def _report_fastqs_worker(fastqs):
+    """
+    Internal: generate report sections for a set of Fastqs
+
+    Loads the FastqScreen outputs for all the Fastqs in
+    a single batch (so they are available from the cache
+    when each Fastq is reported), then invokes
+    '_report_fastq_worker' for each Fastq in turn.
+
+    Arguments:
+      fastqs (list): list of argument tuples for
+        '_report_fastq_worker'
+
+    Returns:
+      List: list of the tuples returned by
+        '_report_fastq_worker', in the same order as the
+        input list.
+    """
+    screen_files = []
+    for fq,read_id,report,qc_dir,relpath,assets in fastqs:
+        for name in FASTQ_SCREENS:
+            txt = os.path.join(qc_dir,fastq_screen_output(fq,name)[1])
+            if os.path.exists(txt):
+                screen_files.append(txt)
+    get_fastq_screens(screen_files)
+    return [_report_fastq_worker(args) for args in fastqs]
+
+def _rendered_value(value):
+    """
+    Internal: render a table value as it would appear in HTML
+    """
+    try:
+        return value.html()
+    except AttributeError:
+        return value
+
+def _utf8(value):
+    """
+    Internal: convert unicode values (e.g. from JSON) to str
+    """
+    if isinstance(value,unicode):
+        return value.encode('utf-8')
+    return value
@@ -2,15 +2,22 @@
 #
 # QC plot generation
 import os
+import io
+import base64
+import hashlib
 import tempfile
+import json
 import logging
-from math import ceil
+import numpy as np
 from matplotlib import pyplot as plt
 from PIL import Image
+from PIL import ImageColor
 from bcftbx.htmlpagewriter import PNGBase64Encoder
 from .fastqc import FastqcData
 from .fastqc import FastqcSummary
-from .fastq_screen import Fastqscreen
+from .fastqc import get_fastqc_summary
+from .fastq_screen import SCREEN_MAPPINGS
+from .fastq_screen import get_fastq_screen_data
 from .fastq_stats import FastqQualityStats
 
 # Module specific logger
@@ -40,6 +47,226 @@ HEX_COLORS = {
     'red': '#FF0000',
 }
 
+# Default name for microplot cache subdirectory
+MICROPLOT_CACHE_DIR = "microplot_cache"
+
+# Version for microplot cache entries (should be updated
+# whenever the appearance of the microplots changes, to
+# invalidate existing entries)
+MICROPLOT_CACHE_VERSION = 1
+
+class MicroplotCache(object):
+    """
+    Persistent cache for 'micro-plot' PNGs
+
+    Each microplot is stored as a PNG file in the cache
+    directory, under a key derived from the type of plot,
+    the path, size and modification time of each of the
+    source files used to generate it, and any other
+    parameters that affect its appearance. So a plot is
+    only regenerated if the source data or the parameters
+    change.
+
+    The size and modification time of the source files
+    are also recorded alongside each PNG, so that plots
+    whose source files have since changed or been removed
+    can be evicted from the cache using 'prune'.
+
+    Example usage:
+
+    >>> cache = MicroplotCache('/data/PJB/qc/microplot_cache')
+    >>> uboxplot('/data/PJB/qc/PJB1_fastqc/fastqc_data.txt',
+    ...          inline=True,cache=cache)
+    >>> cache.prune()
+    """
+    def __init__(self,cache_dir):
+        """
+        Create a new MicroplotCache instance
+
+        Arguments:
+          cache_dir (str): path to the directory to
+            store cached plots in (will be created when
+            the first plot is stored, if it doesn't
+            already exist)
+        """
+        self._cache_dir = os.path.abspath(cache_dir)
+        self._read_only = False
+
+    @property
+    def cache_dir(self):
+        """
+        Return the path to the cache directory
+        """
+        return self._cache_dir
+
+    def key(self,plot,source_files=(),**params):
+        """
+        Generate the cache key for a plot
+
+        Arguments:
+          plot (str): name of the plot type
+          source_files (list): paths to the files the
+            plot is generated from
+          params (mapping): additional parameters which
+            affect the appearance of the plot
+
+        Returns:
+          String: the key for the plot.
+
+        Raises:
+          OSError: if one of the source files doesn't
+            exist.
+        """
+        fingerprint = [MICROPLOT_CACHE_VERSION,plot]
+        for source_file in source_files:
+            st = os.stat(source_file)
+            fingerprint.append((os.path.abspath(source_file),
+                                st.st_size,
+                                st.st_mtime))
+        fingerprint.append(sorted(params.items()))
+        return hashlib.sha1(repr(fingerprint)).hexdigest()
+
+    def path(self,key):
+        """
+        Return the path to the cached PNG for a key
+        """
+        return os.path.join(self._cache_dir,"%s.png" % key)
+
+    def sources_path(self,key):
+        """
+        Return the path to the source file data for a key
+        """
+        return os.path.join(self._cache_dir,"%s.json" % key)
+
+    def get(self,key):
+        """
+        Fetch the PNG data for a key
+
+        Arguments:
+          key (str): key for the plot
+
+        Returns:
+          String: the PNG data, or None if the plot is
+            not in the cache.
+        """
+        try:
+            with open(self.path(key),'rb') as fp:
+                return fp.read()
+        except IOError:
+            return None
+
+    def put(self,key,png,source_files=()):
+        """
+        Store the PNG data for a key
+
+        The data are written to a temporary file which is
+        then moved into place, so other processes sharing
+        the cache never see a partial PNG. Failure to
+        store the data is not fatal (but no further
+        attempts will be made to store data in the
+        cache).
+
+        Arguments:
+          key (str): key for the plot
+          png (str): PNG data for the plot
+          source_files (list): paths to the files the
+            plot was generated from (used by 'prune')
+        """
+        if self._read_only:
+            return
+        try:
+            if not os.path.isdir(self._cache_dir):
+                try:
+                    os.makedirs(self._cache_dir)
+                except OSError:
+                    # May have been created by another process
+                    if not os.path.isdir(self._cache_dir):
+                        raise
+            sources = []
+            for source_file in source_files:
+                st = os.stat(source_file)
+                sources.append((os.path.abspath(source_file),
+                                st.st_size,
+                                st.st_mtime))
+            fp,tmp_json = tempfile.mkstemp(suffix=".tmp",
+                                           dir=self._cache_dir)
+            with os.fdopen(fp,'w') as fpp:
+                json.dump(dict(sources=sources),fpp)
+            os.rename(tmp_json,self.sources_path(key))
+            fp,tmp_png = tempfile.mkstemp(suffix=".tmp",
+                                          dir=self._cache_dir)
+            with os.fdopen(fp,'wb') as fpp:
+                fpp.write(png)
+            os.rename(tmp_png,self.path(key))
+        except (IOError,OSError) as ex:
+            logger.warning("Failed to cache microplot in %s: %s" %
+                           (self._cache_dir,ex))
+            self._read_only = True
+
+    def prune(self):
+        """
+        Remove plots with missing or modified source files
+
+        Plots are evicted from the cache if any of the
+        source files they were generated from no longer
+        exist, or have a different size or modification
+        time to when the plot was stored. Plots with no
+        record of their source files (e.g. those stored by
+        older versions of the cache) are also removed.
+
+        Returns:
+          Integer: number of plots removed from the
+            cache.
+        """
+        if not os.path.isdir(self._cache_dir):
+            return 0
+        nremoved = 0
+        for f in os.listdir(self._cache_dir):
+            key,ext = os.path.splitext(f)
+            if ext == ".json":
+                if not os.path.exists(self.path(key)):
+                    # Sources without a PNG
+                    self._remove(self.sources_path(key))
+                continue
+            elif ext != ".png":
+                continue
+            if self._is_stale(key):
+                logger.debug("Evicting microplot %s from cache" % key)
+                self._remove(self.path(key))
+                self._remove(self.sources_path(key))
+                nremoved += 1
+        return nremoved
+
+    def _is_stale(self,key):
+        """
+        Internal: check if the source files for a plot changed
+        """
+        try:
+            with open(self.sources_path(key),'r') as fp:
+                sources = json.load(fp)['sources']
+        except (IOError,ValueError,KeyError):
+            return True
+        for source_file,size,mtime in sources:
+            try:
+                st = os.stat(source_file)
+            except OSError:
+                return True
+            if st.st_size != size or st.st_mtime != mtime:
+                return True
+        return False
+
+    def _remove(self,filen):
+        """
+        Internal: remove a file from the cache
+        """
+        try:
+            os.remove(filen)
+        except OSError as ex:
+            # May have been removed by another process
+            if os.path.exists(filen):
+                logger.warning("Failed to remove %s from microplot "
+                               "cache: %s" % (filen,ex))
+
 def encode_png(png_file):
     """
     Return Base64 encoded string for a PNG
@@ -47,6 +274,16 @@ def encode_png(png_file):
     return "data:image/png;base64," + \
         PNGBase64Encoder().encodePNG(png_file)
 
+def encode_png_data(png):
+    """
+    Return Base64 encoded string for PNG data
+
+    Arguments:
+      png (str): PNG data (e.g. as read from a PNG
+        file)
+    """
+    return "data:image/png;base64," + base64.b64encode(png)
+
 def screenplot(screen_files,outfile,threshold=None):
     """
     Generate plot of FastqScreen outputs
@@ -60,42 +297,42 @@ def screenplot(screen_files,outfile,threshold=None):
 
     """
     # Read in the screen data
-    screens = []
-    for screen_file in screen_files:
-        screens.append(Fastqscreen(screen_file))
+    screens = [get_fastq_screen_data(f) for f in screen_files]
     nscreens = len(screens)
     # Plot the data
     plt.figure(1)
-    for i,screen_data in enumerate(screens):
+    for i,screen in enumerate(screens):
         # Create a sub-plot
         plt.subplot(nscreens,1,i+1)
         # Filter on threshold
+        libraries = screen.libraries
+        values = screen.values
         if threshold:
-            screen_data = filter(lambda x: float(x['%Unmapped'])
-                                 <= (100.0-threshold),
-                                 screen_data)
+            keep = (screen.column('%Unmapped') <= (100.0-threshold))
+            libraries = [lib for lib,k in zip(libraries,keep) if k]
+            values = values[keep]
         # Make a stacked bar chart
         plt.grid(True)
-        x = xrange(len(screen_data))
+        x = xrange(len(libraries))
         for mapping,color in (('%Multiple_hits_multiple_libraries','#800000'),
                               ('%One_hit_multiple_libraries','#000099'),
                               ('%Multiple_hits_one_library','r'),
                               ('%One_hit_one_library','b'),):
-            data = [r[mapping] for r in screen_data]
+            data = values[:,SCREEN_MAPPINGS.index(mapping)]
             plt.barh(x,data,color=color,label=mapping)
         # Add the library names
-        plt.yticks([x+0.5 for x in xrange(len(screen_data))],
-                   [r['Library'] for r in screen_data])
+        plt.yticks([x+0.5 for x in xrange(len(libraries))],
+                   libraries)
         # Set axis limits on current plot
         plt.gca().set_xlim([0,100])
-        plt.gca().set_ylim([0,len(screen_data)])
+        plt.gca().set_ylim([0,len(libraries)])
         # Only set legend for last plot
         if i == 0:
             plt.legend(loc=4)
     # Write out plot
     plt.savefig(outfile)
     
-def uscreenplot(screen_files,outfile=None,inline=None):
+def uscreenplot(screen_files,outfile=None,inline=None,cache=None):
     """
     Generate 'micro-plot' of FastqScreen outputs
 
@@ -103,22 +340,30 @@ def uscreenplot(screen_files,outfile=None,inline=None):
       screen_files (list): list of paths to one or more
         ...screen.txt files from FastqScreen
       outfile (str): path to output file
+      inline (boolean): if True then returns the PNG
+        as base64 encoded string rather than as a file
+      cache (MicroplotCache): optional, cache to fetch
+        the plot from (and store it in if not present)
+
+    """
+    png = _cached_png(cache,'uscreenplot',screen_files,{},
+                      lambda: _png_data(_uscreenplot_image(screen_files)))
+    return _output_png(png,outfile,inline)
 
+def _uscreenplot_image(screen_files):
     """
-    # Mappings
-    mappings = ('%One_hit_one_library',
-                '%Multiple_hits_one_library',
-                '%One_hit_multiple_libraries',
-                '%Multiple_hits_multiple_libraries',)
-    # Colours
+    Internal: generate image for FastqScreen 'micro-plot'
+
+    Returns a PIL Image instance.
+    """
+    # Colours for the mappings (i.e. the columns in
+    # SCREEN_MAPPINGS after '%Unmapped')
     colors = (RGB_COLORS['blue'],
               RGB_COLORS['navyblue'],
               RGB_COLORS['red'],
               RGB_COLORS['maroon'])
     # Read in the screen data
-    screens = []
-    for screen_file in screen_files:
-        screens.append(Fastqscreen(screen_file))
+    screens = [get_fastq_screen_data(f) for f in screen_files]
     nscreens = len(screens)
     # Make a small stacked bar chart
     bbox_color = (145,145,145)
@@ -126,69 +371,50 @@ def uscreenplot(screen_files,outfile=None,inline=None):
     width = nscreens*50
     n_libraries_max = max([len(s) for s in screens])
     height = (n_libraries_max + 1)*(barwidth + 1)
-    img = Image.new('RGB',(width,height),"white")
-    pixels = img.load()
+    pixels = _new_pixel_array(width,height,RGB_COLORS['white'])
     # Process each screen in turn
     for nscreen,screen in enumerate(screens):
         xorigin = nscreen*50
         xend = xorigin+50-1
         yend = height-1
         # Draw a box around the plot
-        for i in xrange(xorigin,xorigin+50):
-            pixels[i,0] = bbox_color
-            pixels[i,yend] = bbox_color
-        for j in xrange(height):
-            pixels[xorigin,j] = bbox_color
-            pixels[xend,j] = bbox_color
+        pixels[0,xorigin:xorigin+50] = bbox_color
+        pixels[yend,xorigin:xorigin+50] = bbox_color
+        pixels[:,xorigin] = bbox_color
+        pixels[:,xend] = bbox_color
+        # Percentages mapped for all libraries, the total
+        # percentage for each stack, and bar lengths in pixels
+        # (rounded up to nearest pixel so that non-zero
+        # percentages are always represented)
+        mapped = screen.values[:,1:]
+        total_percents = mapped.sum(axis=1)
+        npxs = np.ceil(mapped/2.0).astype(int)
         # Draw the stacked bars for each library
-        for n,library in enumerate(screen.libraries):
-            data = filter(lambda x: x['Library'] == library,screen)[0]
+        for n in xrange(len(screen)):
             x = xorigin
             y = n*(barwidth+1) + 1
-            # Get the total percentage for the stack
-            total_percent = sum([data[m] for m in mappings])
-            if total_percent > 2.0:
+            if total_percents[n] > 2.0:
                 # Plot the stack as-is
-                for mapping,rgb in zip(mappings,colors):
-                    # Round up to nearest pixel (so that non-zero
-                    # percentages are always represented)
-                    npx = int(ceil(data[mapping]/2.0))
-                    for i in xrange(x,x+npx):
-                        for j in xrange(y,y+barwidth):
-                            pixels[i,j] = rgb
+                for npx,rgb in zip(npxs[n],colors):
+                    if npx > 0:
+                        pixels[y:y+barwidth,x:x+npx] = rgb
                     x += npx
-            elif total_percent > 0.25:
+            elif total_percents[n] > 0.25:
                 # Small non-zero values can't be represented
-                # accurately so just plot a placeholder
-                max_mapped = 0.0
-                for mapping,rgb in zip(mappings,colors):
-                    if data[mapping] > max_mapped:
-                        max_rgb = rgb
-                for j in xrange(y,y+barwidth):
-                    pixels[xorigin,j] = max_rgb
+                # accurately so just plot a placeholder using
+                # the colour of the last non-zero mapping
+                max_rgb = colors[np.nonzero(mapped[n])[0][-1]]
+                pixels[y:y+barwidth,xorigin] = max_rgb
         # Add 'no hits'
         x = xorigin
         y = n_libraries_max*(barwidth+1) + 1
         npx = int(screen.no_hits/2.0)
-        for i in xrange(x,x+npx):
-            for j in xrange(y,y+barwidth):
-                pixels[i,j] = bbox_color
-    # Output the plot to file
-    fp,tmp_plot = tempfile.mkstemp(".ufastqscreen.png")
-    img.save(tmp_plot)
-    os.fdopen(fp).close()
-    if inline:
-        encoded_plot = encode_png(tmp_plot)
-    if outfile is not None:
-        os.rename(tmp_plot,outfile)
-    os.remove(tmp_plot)
-    if inline:
-        return encoded_plot
-    else:
-        return outfile
+        if npx > 0:
+            pixels[y:y+barwidth,x:x+npx] = bbox_color
+    return Image.fromarray(pixels,'RGB')
 
 def uboxplot(fastqc_data=None,fastq=None,
-             outfile=None,inline=None):
+             outfile=None,inline=None,cache=None):
     """
     Generate FASTQ per-base quality 'micro-boxplot'
 
@@ -198,11 +424,34 @@ def uboxplot(fastqc_data=None,fastq=None,
     Arguments:
        fastqc_data (str): path to a ``fastqc_data.txt``
         file
+       fastq (str): path to a Fastq file (used if
+        ``fastqc_data`` is not supplied)
        outfile (str): path to output file
+       inline (boolean): if True then returns the PNG
+        as base64 encoded string rather than as a file
+       cache (MicroplotCache): optional, cache to fetch
+        the plot from (and store it in if not present)
 
     Returns:
        String: path to output PNG file
 
+    """
+    if fastqc_data is not None:
+        source_files = (fastqc_data,)
+    elif fastq is not None:
+        source_files = (fastq,)
+    else:
+        raise Exception("supply path to fastqc_data.txt or fastq file")
+    png = _cached_png(cache,'uboxplot',source_files,{},
+                      lambda: _png_data(_uboxplot_image(
+                          fastqc_data=fastqc_data,fastq=fastq)))
+    return _output_png(png,outfile,inline)
+
+def _uboxplot_image(fastqc_data=None,fastq=None):
+    """
+    Internal: generate image for 'micro-boxplot'
+
+    Returns a PIL Image instance.
     """
     # Boxplots need: mean, median, 25/75th and 10/90th quantiles
     # for each base
@@ -219,66 +468,42 @@ def uboxplot(fastqc_data=None,fastq=None,
         fastq_stats.from_fastq(fastq)
     else:
         raise Exception("supply path to fastqc_data.txt or fastq file")
-    # To generate a bitmap in Python see:
-    # http://stackoverflow.com/questions/20304438/how-can-i-use-the-python-imaging-library-to-create-a-bitmap
-    #
-    # Initialise output image instance
-    img = Image.new('RGB',(fastq_stats.nbases,height),"white")
-    pixels = img.load()
+    # Initialise pixel array (NB rows are indexed by
+    # quality, so quality 'q' is at row 'max_qual-q')
+    nbases = fastq_stats.nbases
+    pixels = _new_pixel_array(nbases,height,RGB_COLORS['white'])
     # Create colour bands for different quality ranges
-    for i in xrange(0,fastq_stats.nbases,2):
-        for j in xrange(0,20):
-            pixels[i,max_qual-j-1] = (230,175,175)
-        for j in xrange(20,30):
-            pixels[i,max_qual-j-1] = (230,215,175)
-        for j in xrange(30,max_qual):
-            pixels[i,max_qual-j-1] = (175,230,175)
+    # (every other base position)
+    pixels[max_qual-20:max_qual,0::2] = (230,175,175)
+    pixels[max_qual-30:max_qual-20,0::2] = (230,215,175)
+    pixels[0:max_qual-30,0::2] = (175,230,175)
     # Draw a box around the outside
     box_color = RGB_COLORS['grey']
-    for i in xrange(fastq_stats.nbases):
-        pixels[i,0] = box_color
-        pixels[i,height-1] = box_color
-    for j in xrange(height):
-        pixels[0,j] = box_color
-        pixels[fastq_stats.nbases-1,j] = box_color
+    pixels[0,:] = box_color
+    pixels[height-1,:] = box_color
+    pixels[:,0] = box_color
+    pixels[:,nbases-1] = box_color
     # For each base position determine stats
-    for i in xrange(fastq_stats.nbases):
-        #print "Position: %d" % i
-        try:
-            for j in xrange(fastq_stats.p10[i],fastq_stats.p90[i]):
-                # 10th-90th percentile coloured cyan
-                pixels[i,max_qual-j] = RGB_COLORS['grey']
-        except TypeError:
-            pass
-        try:
-            for j in xrange(fastq_stats.q25[i],fastq_stats.q75[i]):
-                # Interquartile range coloured yellow
-                pixels[i,max_qual-j] = RGB_COLORS['darkyellow1']
-        except TypeError:
-            pass
+    for i in xrange(nbases):
+        # 10th-90th percentile coloured grey
+        _fill_quality_range(pixels,i,max_qual,
+                            fastq_stats.p10[i],fastq_stats.p90[i],
+                            RGB_COLORS['grey'])
+        # Interquartile range coloured yellow
+        _fill_quality_range(pixels,i,max_qual,
+                            fastq_stats.q25[i],fastq_stats.q75[i],
+                            RGB_COLORS['darkyellow1'])
         # Median coloured red
         try:
             median = int(fastq_stats.median[i])
-            pixels[i,max_qual-median] = RGB_COLORS['red']
+            pixels[max_qual-median,i] = RGB_COLORS['red']
         except TypeError:
             pass
-        # Mean coloured black
-        pixels[i,max_qual-int(fastq_stats.mean[i])] = RGB_COLORS['blue']
-    # Output the plot to file
-    fp,tmp_plot = tempfile.mkstemp(".uboxplot.png")
-    img.save(tmp_plot)
-    os.fdopen(fp).close()
-    if inline:
-        encoded_plot = encode_png(tmp_plot)
-    if outfile is not None:
-        os.rename(tmp_plot,outfile)
-    os.remove(tmp_plot)
-    if inline:
-        return encoded_plot
-    else:
-        return outfile
+        # Mean coloured blue
+        pixels[max_qual-int(fastq_stats.mean[i]),i] = RGB_COLORS['blue']
+    return Image.fromarray(pixels,'RGB')
 
-def ufastqcplot(summary_file,outfile=None,inline=False):
+def ufastqcplot(summary_file,outfile=None,inline=False,cache=None):
     """
     Make a 'micro' summary plot of FastQC output
 
@@ -304,7 +529,21 @@ def ufastqcplot(summary_file,outfile=None,inline=False):
       summary_file (str): path to a FastQC
         'summary.txt' output file
       outfile (str): path for the output PNG
+      inline (boolean): if True then returns the PNG
+        as base64 encoded string rather than as a file
+      cache (MicroplotCache): optional, cache to fetch
+        the plot from (and store it in if not present)
 
+    """
+    png = _cached_png(cache,'ufastqcplot',(summary_file,),{},
+                      lambda: _png_data(_ufastqcplot_image(summary_file)))
+    return _output_png(png,outfile,inline)
+
+def _ufastqcplot_image(summary_file):
+    """
+    Internal: generate image for FastQC summary 'micro-plot'
+
+    Returns a PIL Image instance.
     """
     status_codes = {
         'PASS' : { 'index': 0,
@@ -320,11 +559,10 @@ def ufastqcplot(summary_file,outfile=None,inline=False):
                    'rgb': RGB_COLORS['red'],
                    'hex': HEX_COLORS['red'] },
         }
-    fastqc_summary = FastqcSummary(summary_file)
+    fastqc_summary = get_fastqc_summary(summary_file)
     # Initialise output image instance
     nmodules = len(fastqc_summary.modules)
-    img = Image.new('RGB',(30,4*nmodules),"white")
-    pixels = img.load()
+    pixels = _new_pixel_array(30,4*nmodules,RGB_COLORS['white'])
     # For each test: put a mark depending on the status
     for im,m in enumerate(fastqc_summary.modules):
         code = status_codes[fastqc_summary.status(m)]
@@ -332,26 +570,11 @@ def ufastqcplot(summary_file,outfile=None,inline=False):
         x = code['index']*10 + 1
         #y = 4*nmodules - im*4 - 3
         y = im*4 + 1
-        for i in xrange(x,x+8):
-            for j in xrange(y,y+3):
-                #print "%d %d" % (i,j)
-                pixels[i,j] = code['rgb']
-    # Output the plot to file
-    fp,tmp_plot = tempfile.mkstemp(".ufastqc.png")
-    img.save(tmp_plot)
-    os.fdopen(fp).close()
-    if inline:
-        encoded_plot = encode_png(tmp_plot)
-    if outfile is not None:
-        os.rename(tmp_plot,outfile)
-    os.remove(tmp_plot)
-    if inline:
-        return encoded_plot
-    else:
-        return outfile
+        pixels[y:y+3,x:x+8] = code['rgb']
+    return Image.fromarray(pixels,'RGB')
 
 def ustackedbar(data,outfile=None,inline=False,bbox=True,
-                height=20,length=100,colors=None):
+                height=20,length=100,colors=None,cache=None):
     """
     Make a 'micro' stacked bar chart
 
@@ -369,14 +592,33 @@ def ustackedbar(data,outfile=None,inline=False,bbox=True,
       height (int): height of the bar in pixels
       length (int): length of the bar in pixels
       colors (List): list or tuple of color values
+      cache (MicroplotCache): optional, cache to fetch
+        the plot from (and store it in if not present)
+    """
+    params = dict(data=tuple(data),
+                  bbox=bbox,
+                  height=height,
+                  length=length,
+                  colors=None if colors is None else tuple(colors))
+    png = _cached_png(cache,'ustackedbar',(),params,
+                      lambda: _png_data(_ustackedbar_image(
+                          data,bbox=bbox,height=height,length=length,
+                          colors=colors)))
+    return _output_png(png,outfile,inline)
+
+def _ustackedbar_image(data,bbox=True,height=20,length=100,
+                       colors=None):
+    """
+    Internal: generate image for 'micro' stacked bar chart
+
+    Returns a PIL Image instance.
     """
     # Initialise
     bgcolor = "black"
     if colors is None:
         colors = sorted(list(RGB_COLORS.keys()))
-    # Create the image
-    img = Image.new('RGB',(length,height),bgcolor)
-    pixels = img.load()
+    # Create the pixel array
+    pixels = _new_pixel_array(length,height,RGB_COLORS[bgcolor])
     # Normalise the data
     total = float(sum(data))
     ndata = [int(float(d)/total*float(length)) for d in data]
@@ -389,29 +631,124 @@ def ustackedbar(data,outfile=None,inline=False,bbox=True,
         try:
             color = RGB_COLORS[color]
         except KeyError:
-            pass
-        for i in xrange(p,p+d):
-             for j in xrange(height):
-                pixels[i,j] = color
+            if isinstance(color,basestring):
+                color = ImageColor.getrgb(color)
+        if d > 0:
+            pixels[:,p:p+d] = color
         p += d
     # Overlay a bounding box
     if bbox:
-        for i in xrange(0,length):
-            pixels[i,0] = RGB_COLORS[bgcolor]
-            pixels[i,height-1] = RGB_COLORS[bgcolor]
-        for j in xrange(0,height):
-            pixels[0,j] = RGB_COLORS[bgcolor]
-            pixels[length-1,j] = RGB_COLORS[bgcolor]
-    # Output the plot to file
-    fp,tmp_plot = tempfile.mkstemp(".ubar.png")
-    img.save(tmp_plot)
-    os.fdopen(fp).close()
-    if inline:
-        encoded_plot = encode_png(tmp_plot)
+        pixels[0,:] = RGB_COLORS[bgcolor]
+        pixels[height-1,:] = RGB_COLORS[bgcolor]
+        pixels[:,0] = RGB_COLORS[bgcolor]
+        pixels[:,length-1] = RGB_COLORS[bgcolor]
+    return Image.fromarray(pixels,'RGB')
+
+def _new_pixel_array(width,height,color):
+    """
+    Internal: create a new array of RGB pixel values
+
+    The array has dimensions (height,width,3) (i.e. it is
+    indexed as [y,x]) and can be converted to a PIL Image
+    instance using 'Image.fromarray'.
+
+    Arguments:
+      width (int): width of the image in pixels
+      height (int): height of the image in pixels
+      color (tuple): RGB tuple for the initial colour of
+        all the pixels
+    """
+    pixels = np.empty((height,width,3),dtype=np.uint8)
+    pixels[:,:] = color
+    return pixels
+
+def _fill_quality_range(pixels,i,max_qual,start,end,color):
+    """
+    Internal: colour a range of qualities for a base position
+
+    Colours the pixels for qualities from 'start' up to
+    (but not including) 'end' in column 'i' of the pixel
+    array for a 'micro-boxplot'. Nothing is coloured if
+    either of the limits is None.
+    """
+    try:
+        if end <= start:
+            return
+        pixels[max_qual-end+1:max_qual-start+1,i] = color
+    except TypeError:
+        pass
+
+def _png_data(img):
+    """
+    Internal: return PNG data for an image
+
+    The image is rendered in memory rather than via
+    a temporary file.
+
+    Arguments:
+      img (Image): PIL Image instance
+    """
+    buf = io.BytesIO()
+    img.save(buf,format='PNG')
+    return buf.getvalue()
+
+def _cached_png(cache,plot,source_files,params,render):
+    """
+    Internal: fetch PNG data for a plot from a cache
+
+    If the plot isn't already in the cache then it is
+    generated by calling the supplied function, and
+    added to the cache.
+
+    Arguments:
+      cache (MicroplotCache): cache to use (if None then
+        the plot is always generated)
+      plot (str): name of the plot type
+      source_files (list): paths to the files the plot
+        is generated from
+      params (dict): additional parameters which affect
+        the appearance of the plot
+      render (function): function which returns the PNG
+        data for the plot
+
+    Returns:
+      String: the PNG data.
+    """
+    if cache is None:
+        return render()
+    try:
+        key = cache.key(plot,source_files,**params)
+    except OSError as ex:
+        # Source files not found, so let the plotting
+        # function deal with it
+        logger.debug("Unable to generate cache key for %s: %s" %
+                     (plot,ex))
+        return render()
+    png = cache.get(key)
+    if png is None:
+        png = render()
+        cache.put(key,png,source_files)
+    return png
+
+def _output_png(png,outfile=None,inline=False):
+    """
+    Internal: output PNG data for a plot
+
+    Arguments:
+      png (str): PNG data
+      outfile (str): if set then write the PNG data to
+        this file
+      inline (boolean): if True then return the PNG as
+        a base64 encoded string
+
+    Returns:
+      String: either the base64 encoded PNG (if 'inline'
+        is True) or the path to the output file.
+    """
     if outfile is not None:
-        os.rename(tmp_plot,outfile)
-    os.remove(tmp_plot)
+        with open(outfile,'wb') as fp:
+            fp.write(png)
     if inline:
-        return encoded_plot
+        return encode_png_data(png)
     else:
         return outfile
@@ -122,6 +122,8 @@ class Settings(object):
         self.qc['fastq_screen_subset'] = config.getint('qc',
                                                        'fastq_screen_subset',
                                                        100000)
+        self.qc['incremental_reports'] = config.getboolean(
+            'qc','incremental_reports',True)
         # Sequencing platform-specific defaults
         self.add_section('platform')
         for section in filter(lambda x: x.startswith('platform:'),
@@ -182,6 +184,8 @@ class Settings(object):
         self.archive['log'] = config.get('archive','log',None)
         self.archive['group'] = config.get('archive','group',None)
         self.archive['chmod'] = config.get('archive','chmod',None)
+        self.archive['checksum'] = config.get('archive','checksum','md5')
+        self.archive['nprocessors'] = config.getint('archive','nprocessors',1)
         # Information for uploading QC reports
         # dirn should be a directory in the form [[user@]host:]path]
         self.add_section('qc_web_server')
@@ -191,6 +195,8 @@ class Settings(object):
             'qc_web_server','use_hierarchy')
         self.qc_web_server['exclude_zip_files'] = config.getboolean(
             'qc_web_server','exclude_zip_files')
+        self.qc_web_server['max_transfers'] = config.getint(
+            'qc_web_server','max_transfers',4)
 
     def get_bcl2fastq_config(self,section,config):
         """
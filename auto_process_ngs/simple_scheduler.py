@@ -27,14 +27,31 @@ __version__ = "0.0.15"
 
 import bcftbx.JobRunner as JobRunner
 from bcftbx.Pipeline import Job
+from auto_process_ngs import job_accounting
 import time
 import os
 import sys
 import re
+import uuid
 import threading
 import Queue
 import logging
 
+#######################################################################
+# Module data
+#######################################################################
+
+# Delay (in seconds) before fetching the resource usage for a
+# completed Grid Engine job, and the number of attempts to make
+# ('qacct' often has no record for a job which has only just
+# finished)
+QACCT_DELAY = 15
+QACCT_ATTEMPTS = 4
+
+# Maximum time (in seconds) to wait for outstanding resource
+# usage queries when the scheduler is stopped
+QACCT_TIMEOUT = 90
+
 #######################################################################
 # Classes
 #######################################################################
@@ -69,7 +86,8 @@ class SimpleScheduler(threading.Thread):
                  max_concurrent=None,
                  poll_interval=5,
                  job_interval=0.1,
-                 max_restarts=1):
+                 max_restarts=1,
+                 accounting_dir=None):
         """Create a new SimpleScheduler instance
 
         Arguments:
@@ -87,6 +105,10 @@ class SimpleScheduler(threading.Thread):
             jobs that are in an error state up to this many times. Set to
             zero to turn off restarting jobs in error states (they will
             be terminated instead). (default: 1)
+          accounting_dir: optional, if set then resource usage for
+            the completed jobs will be written to 'job_accounting.csv'
+            and 'job_accounting.json' files in this directory when
+            the scheduler is stopped
 
         """
 
@@ -122,8 +144,16 @@ class SimpleScheduler(threading.Thread):
         self.__groups = dict()
         # Handle callbacks
         self.__callbacks = []
+        # Lock for updates from multiple threads
+        self.__lock = threading.RLock()
         # Flag controlling whether scheduler is active
         self.__active = False
+        # Job accounting
+        self.__accounting_dir = accounting_dir
+        self.__accounting_reported = False
+        self.__accounting_queue = Queue.Queue()
+        self.__accounting_fetcher = None
+        self.__accounting_pending = 0
         # Default reporter
         if reporter is None:
             reporter = default_scheduler_reporter()
@@ -132,8 +162,114 @@ class SimpleScheduler(threading.Thread):
     def stop(self):
         """Stop the scheduler
 
+        Also reports the resource usage for the jobs which have
+        completed, and writes it to the accounting directory (if
+        one was specified). If the resource usage is still being
+        fetched for any Grid Engine jobs then waits for this to
+        finish first (up to a maximum of QACCT_TIMEOUT seconds).
+
         """
         self.__active = False
+        self.__wait_for_accounting()
+        self.report_accounting()
+
+    def report_accounting(self):
+        """Report resource usage for completed jobs
+
+        Writes a summary table via the reporter and, if an
+        accounting directory was specified, writes the data to
+        CSV and JSON files in that directory. Does nothing if
+        the accounting has already been reported.
+
+        The resource usage for Grid Engine jobs is fetched in
+        the background as each job completes, so this doesn't
+        block; jobs where it hasn't been fetched yet only
+        report the wall time (see 'stop', which waits for
+        outstanding fetches before reporting).
+
+        """
+        with self.__lock:
+            if self.__accounting_reported:
+                return
+            self.__accounting_reported = True
+        jobs = [job for job in self.__jobs.values()
+                if job.completed]
+        if not jobs:
+            return
+        jobs.sort(key=lambda job: job.job_number)
+        self.__reporter.accounting_summary(jobs)
+        if self.__accounting_dir is not None:
+            try:
+                job_accounting.write_accounting_csv(
+                    os.path.join(self.__accounting_dir,
+                                 "job_accounting.csv"),jobs)
+                job_accounting.write_accounting_json(
+                    os.path.join(self.__accounting_dir,
+                                 "job_accounting.json"),jobs)
+            except Exception,ex:
+                logging.error("Failed to write job accounting to %s: %s" %
+                              (self.__accounting_dir,ex))
+
+    def fetch_accounting(self,job):
+        """Queue fetching the resource usage for a completed job
+
+        For jobs which need to query the job runner for their
+        resource usage (i.e. Grid Engine jobs), the query is
+        made in a background thread after a short delay, and
+        retried if no data is available yet. Other jobs are
+        ignored.
+
+        Arguments:
+          job: SchedulerJob instance which has completed
+
+        """
+        if not job.fetches_accounting:
+            return
+        with self.__lock:
+            self.__accounting_pending += 1
+            if self.__accounting_fetcher is None:
+                self.__accounting_fetcher = threading.Thread(
+                    target=self.__fetch_accounting)
+                self.__accounting_fetcher.setDaemon(1)
+                self.__accounting_fetcher.start()
+        self.__accounting_queue.put((job,1,time.time()+QACCT_DELAY))
+
+    def __fetch_accounting(self):
+        """Internal: fetch resource usage for queued jobs
+
+        """
+        while True:
+            job,attempt,fetch_time = self.__accounting_queue.get()
+            delay = fetch_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            if not job.fetch_accounting():
+                if attempt < QACCT_ATTEMPTS:
+                    self.__accounting_queue.put((job,attempt+1,
+                                                 time.time()+QACCT_DELAY))
+                    continue
+                logging.debug("Unable to fetch resource usage for job "
+                              "#%s (id %s)" % (job.job_number,job.job_id))
+            with self.__lock:
+                self.__accounting_pending -= 1
+
+    def __wait_for_accounting(self):
+        """Internal: wait for outstanding resource usage fetches
+
+        """
+        if not self.__accounting_pending:
+            return
+        logging.debug("Waiting for resource usage for %d job(s)" %
+                      self.__accounting_pending)
+        timeout = time.time() + QACCT_TIMEOUT
+        try:
+            while self.__accounting_pending and time.time() < timeout:
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            pass
+        if self.__accounting_pending:
+            logging.warning("Resource usage not available for %d job(s)" %
+                            self.__accounting_pending)
 
     @property
     def n_waiting(self):
@@ -161,8 +297,9 @@ class SimpleScheduler(threading.Thread):
         """Internal: increment and return job count
 
         """
-        self.__job_count += 1
-        return self.__job_count
+        with self.__lock:
+            self.__job_count += 1
+            return self.__job_count
 
     @property
     def default_runner(self):
@@ -406,7 +543,8 @@ class SimpleScheduler(threading.Thread):
         if self.has_name(name):
             raise Exception,"Name '%s' already assigned" % name
         new_callback = SchedulerCallback(name,callback,wait_for=wait_for)
-        self.__callbacks.append(new_callback)
+        with self.__lock:
+            self.__callbacks.append(new_callback)
         return new_callback
 
     def run(self):
@@ -458,9 +596,11 @@ class SimpleScheduler(threading.Thread):
                                                          job.job_id))
                             self.__reporter.job_end(job)
                             self.__finished_names.append(job.job_name)
+                            self.fetch_accounting(job)
                         report_status = True
                 else:
                     self.__reporter.job_end(job)
+                    self.fetch_accounting(job)
                     logging.debug("Job #%s (id %s) completed \"%s\"" % (job.job_number,
                                                                         job.job_id,
                                                                         job))
@@ -491,8 +631,14 @@ class SimpleScheduler(threading.Thread):
             # Update the list of groups
             self.__active_groups = updated_groups
             # Handle callbacks
+            # NB callbacks can be added from other threads while
+            # these are being checked, so take the current list
+            # and then merge in any new ones afterwards
+            with self.__lock:
+                callbacks = self.__callbacks
+                self.__callbacks = []
             updated_callback_list = []
-            for callback in self.__callbacks:
+            for callback in callbacks:
                 logging.debug("Checking %s" % callback.callback_name)
                 logging.debug("Waiting_for: %s" % callback.waiting_for)
                 invoke_callback = True
@@ -511,7 +657,8 @@ class SimpleScheduler(threading.Thread):
                     callback.invoke(tuple(callback_jobs),self)
                 else:
                     updated_callback_list.append(callback)
-            self.__callbacks = updated_callback_list
+            with self.__lock:
+                self.__callbacks = updated_callback_list + self.__callbacks
             # Add submitted jobs to the waiting list
             while not self.__submitted.empty():
                 job = self.__submitted.get()
@@ -749,6 +896,8 @@ class SchedulerJob(Job):
             working_dir = os.path.abspath(working_dir)
         Job.__init__(self,runner,name,working_dir,args[0],args[1:])
         self._restarts = 0
+        self._accounting_file = None
+        self._accounting = None
 
     @property 
     def name(self):
@@ -794,11 +943,142 @@ class SchedulerJob(Job):
         """
         return self.exit_status
 
+    @property
+    def accounting(self):
+        """Return resource usage for a completed job
+
+        For jobs run using a SimpleJobRunner the resource usage
+        is read from the file written by the accounting wrapper;
+        for jobs run using a GEJobRunner it is the data fetched
+        by 'fetch_accounting' (which isn't invoked here, as
+        'qacct' can be slow). If neither are available then
+        only the wall time is reported.
+
+        Returns a dictionary with the keys 'wall_time', 'cpu_time'
+        (both in seconds), 'max_rss', 'read_bytes' and
+        'write_bytes' (all in bytes); values which couldn't be
+        determined are None. Returns None if the job hasn't
+        completed.
+
+        """
+        if not self.completed:
+            return None
+        if self._accounting is not None:
+            return self._accounting
+        accounting = None
+        if self._accounting_file is not None:
+            accounting = job_accounting.read_accounting_file(
+                self._accounting_file)
+        accounting = self._fill_accounting(accounting)
+        if not self.fetches_accounting:
+            self._accounting = accounting
+        return accounting
+
+    @property
+    def fetches_accounting(self):
+        """Check if resource usage must be fetched from the runner
+
+        Returns True if the job was run using a GEJobRunner
+        (so the resource usage has to be fetched using
+        'fetch_accounting'), False otherwise.
+
+        """
+        return isinstance(self.runner,JobRunner.GEJobRunner)
+
+    def fetch_accounting(self):
+        """Fetch the resource usage for a completed job
+
+        Queries the job runner for the resource usage and
+        stores it for subsequent calls to 'accounting'. This
+        can block (e.g. while 'qacct' runs), and should
+        normally be invoked by the scheduler in a separate
+        thread (see 'SimpleScheduler.fetch_accounting').
+
+        Returns:
+          Boolean: True if the resource usage was fetched
+            (or doesn't need to be), False if it isn't
+            available (yet).
+
+        """
+        if not self.fetches_accounting:
+            return True
+        if not self.completed:
+            return False
+        accounting = job_accounting.qacct(self.job_id)
+        if accounting is None:
+            return False
+        self._accounting = self._fill_accounting(accounting)
+        return True
+
+    def _fill_accounting(self,accounting):
+        """Internal: fill in missing resource usage values
+
+        """
+        if accounting is None:
+            accounting = dict([(field,None) for field in
+                               job_accounting.ACCOUNTING_FIELDS])
+        if accounting['wall_time'] is None:
+            try:
+                accounting['wall_time'] = self.end_time - \
+                                          self.start_time
+            except TypeError:
+                pass
+        return accounting
+
+    @property
+    def wall_time(self):
+        """Return wall time (in seconds) for completed job
+
+        """
+        return self._accounting_value('wall_time')
+
+    @property
+    def cpu_time(self):
+        """Return CPU time (user plus system, in seconds)
+
+        """
+        return self._accounting_value('cpu_time')
+
+    @property
+    def max_rss(self):
+        """Return maximum resident set size (in bytes)
+
+        """
+        return self._accounting_value('max_rss')
+
+    @property
+    def read_bytes(self):
+        """Return number of bytes read from disk
+
+        """
+        return self._accounting_value('read_bytes')
+
+    @property
+    def write_bytes(self):
+        """Return number of bytes written to disk
+
+        """
+        return self._accounting_value('write_bytes')
+
+    def _accounting_value(self,field):
+        """Internal: return a value from the job accounting
+
+        """
+        try:
+            return self.accounting[field]
+        except TypeError:
+            # Job hasn't completed
+            return None
+
     def start(self):
         """Start the job running
 
         Overrides the 'start' method in the base 'Job' class.
 
+        For jobs run using a SimpleJobRunner, the command is
+        run via the 'job_accounting' wrapper in order to
+        record its resource usage.
+
         Returns:
           Id for job
 
@@ -806,7 +1086,21 @@ class SchedulerJob(Job):
         if self.log_dir is not None:
             runner_log_dir = self.runner.log_dir
             self.runner.set_log_dir(self.log_dir)
-        job_id = Job.start(self)
+        script,args = self.script,self.args
+        if isinstance(self.runner,JobRunner.SimpleJobRunner):
+            self._accounting_file = os.path.join(
+                (self.log_dir or self.runner.log_dir or self.working_dir),
+                "job%s.%s.accounting.json" % (self.job_number,
+                                              uuid.uuid4()))
+            self._accounting = None
+            self.script = sys.executable
+            self.args = [os.path.splitext(job_accounting.__file__)[0]+'.py',
+                         self._accounting_file,
+                         script] + list(args)
+        try:
+            job_id = Job.start(self)
+        finally:
+            self.script,self.args = script,args
         if self.log_dir is not None:
             self.runner.set_log_dir(runner_log_dir)
         return job_id
@@ -949,6 +1243,7 @@ class SchedulerReporter:
     group_added       Group is created    group_name, group_id, time_stamp
     group_end         Group completes     as 'group_added'
     scheduler_status  Need status         n_running, n_waiting, n_finished
+    accounting_summary Scheduler stops    table, n_jobs, time_stamp
 
     An example template string for a job could be:
 
@@ -976,7 +1271,8 @@ class SchedulerReporter:
                                 'group_added',
                                 'group_start',
                                 'group_end',
-                                'scheduler_status']
+                                'scheduler_status',
+                                'accounting_summary']
         self.__templates = {}
         self.__fp = fp
         for name in args:
@@ -1082,6 +1378,20 @@ class SchedulerReporter:
         """
         self._report('group_end',**self._group_dict(group))
 
+    def accounting_summary(self,jobs):
+        """Write report of resource usage for completed jobs
+
+        Arguments:
+          jobs: list of SchedulerJob instances
+
+        """
+        if 'accounting_summary' not in self.__templates:
+            return
+        self._report('accounting_summary',
+                     table=job_accounting.format_accounting_table(jobs),
+                     n_jobs=len(jobs),
+                     time_stamp=date_and_time())
+
     def set_template(self,name,template):
         """Associate a template string with an operation
 
@@ -1146,7 +1456,8 @@ def default_scheduler_reporter():
         job_end="Job completed: #%(job_number)d (%(job_id)s): \"%(job_name)s\" (%(time_stamp)s)",
 
         group_added="Group has been added: #%(group_id)d: \"%(group_name)s\" (%(time_stamp)s)",
-        group_end="Group completed: #%(group_id)d: \"%(group_name)s\" (%(time_stamp)s)"
+        group_end="Group completed: #%(group_id)d: \"%(group_name)s\" (%(time_stamp)s)",
+        accounting_summary="Resource usage for %(n_jobs)d completed jobs (%(time_stamp)s):\n%(table)s"
     )
 
 #######################################################################
@@ -572,9 +572,6 @@ def run_cellranger_count(fastq_dir,
         job_end=  "SCHEDULER: Finished #%(job_number)d: %(job_name)s"
     )
     sched_reporter = SchedulerReporter()
-    sched = SimpleScheduler(max_concurrent=max_jobs,
-                            reporter=sched_reporter)
-    sched.start()
 
     # Make a log directory
     if not dry_run:
@@ -585,6 +582,13 @@ def run_cellranger_count(fastq_dir,
                                       full_path=True)
         mkdirs(log_dir)
 
+    # Start the scheduler
+    sched = SimpleScheduler(max_concurrent=max_jobs,
+                            reporter=sched_reporter,
+                            accounting_dir=(log_dir if not dry_run
+                                            else None))
+    sched.start()
+
     # Submit the cellranger count jobs
     jobs = []
     for project in projects:
@@ -11,6 +11,7 @@ import grp
 from auto_process_ngs.auto_processor import AutoProcess
 from auto_process_ngs.mock import MockAnalysisDirFactory
 from auto_process_ngs.commands.archive_cmd import archive
+from auto_process_ngs.checksums import read_manifest
 
 # Unit tests
 
@@ -86,6 +87,84 @@ class TestArchiveCommand(unittest.TestCase):
         for f in files:
             f = os.path.join(staging_dir,f)
             self.assertTrue(os.path.exists(f))
+        # Check checksum manifest
+        manifest = os.path.join(staging_dir,"archive.manifest")
+        self.assertTrue(os.path.exists(manifest))
+        algorithm,entries = read_manifest(manifest)
+        self.assertEqual(algorithm,'md5')
+        self.assertTrue("metadata.info" in [e[0] for e in entries])
+
+    def test_archive_to_staging_parallel(self):
+        """archive: test copying to staging archive dir in parallel
+        """
+        # Make a mock auto-process directory
+        mockdir = MockAnalysisDirFactory.bcl2fastq2(
+            '170901_M00879_0087_000000000-AGEW9',
+            'miseq',
+            metadata={ "instrument_datestamp": "170901" },
+            top_dir=self.dirn)
+        mockdir.create()
+        # Make a mock archive directory
+        archive_dir = os.path.join(self.dirn,"archive")
+        final_dir = os.path.join(archive_dir,
+                                 "2017",
+                                 "miseq")
+        os.makedirs(final_dir)
+        self.assertTrue(os.path.isdir(final_dir))
+        self.assertEqual(len(os.listdir(final_dir)),0)
+        # Make autoprocess instance and set required metadata
+        ap = AutoProcess(analysis_dir=mockdir.dirn)
+        ap.set_metadata("source","testing")
+        ap.set_metadata("run_number","87")
+        # Do archiving op
+        status = archive(ap,
+                         archive_dir=archive_dir,
+                         year='2017',platform='miseq',
+                         read_only_fastqs=False,
+                         parallel=True,
+                         final=False)
+        self.assertEqual(status,0)
+        # Check that staging dir exists
+        staging_dir = os.path.join(
+            final_dir,
+            "__170901_M00879_0087_000000000-AGEW9_analysis.pending")
+        self.assertTrue(os.path.exists(staging_dir))
+        self.assertEqual(len(os.listdir(final_dir)),1)
+        # Check contents
+        dirs = ("AB","CDE","logs","undetermined")
+        for d in dirs:
+            d = os.path.join(staging_dir,d)
+            self.assertTrue(os.path.exists(d))
+        files = ("auto_process.info",
+                 "custom_SampleSheet.csv",
+                 "metadata.info",
+                 "projects.info",
+                 "SampleSheet.orig.csv")
+        for f in files:
+            f = os.path.join(staging_dir,f)
+            self.assertTrue(os.path.exists(f))
+        # Check checkpoints were recorded in the staging dir
+        checkpoint_file = os.path.join(staging_dir,"archive.checkpoint")
+        self.assertTrue(os.path.exists(checkpoint_file))
+        self.assertFalse(os.path.exists(
+            os.path.join(mockdir.dirn,"archive.checkpoint")))
+        with open(checkpoint_file,'r') as fp:
+            partitions = [line.split('\t')[0] for line in fp]
+        self.assertEqual(partitions,["AB","CDE","undetermined"])
+        # Remove a staged partition
+        shutil.rmtree(os.path.join(staging_dir,"CDE"))
+        # Repeat archiving op (unchanged partitions are skipped
+        # but missing partitions are copied again)
+        status = archive(ap,
+                         archive_dir=archive_dir,
+                         year='2017',platform='miseq',
+                         read_only_fastqs=False,
+                         parallel=True,
+                         final=False)
+        self.assertEqual(status,0)
+        for d in dirs:
+            d = os.path.join(staging_dir,d)
+            self.assertTrue(os.path.exists(d))
 
     def test_archive_to_staging_set_group(self):
         """archive: test copying to staging archive dir and set group
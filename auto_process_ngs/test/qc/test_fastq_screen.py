@@ -3,9 +3,13 @@
 #######################################################################
 
 import unittest
+import os
 import tempfile
 
 from auto_process_ngs.qc.fastq_screen import Fastqscreen
+from auto_process_ngs.qc.fastq_screen import FastqscreenData
+from auto_process_ngs.qc.fastq_screen import get_fastq_screen_data
+from auto_process_ngs.qc.fastq_screen import get_fastq_screens
 
 class TestFastqscreen_v0_4_1(unittest.TestCase):
     def setUp(self):
@@ -42,6 +46,22 @@ SpR6	100.00	0.00	0.00	0.00	0.00
                                            'ecoli','saccer','PhiX','Vectors',
                                            'SpR6'])
         self.assertEqual(screen.no_hits,30.80)
+    def test_fastqscreendata_v0_4_1(self):
+        """FastqscreenData handles output from v0.4.1
+        """
+        screen = FastqscreenData(self.fastq_screen_txt)
+        self.assertEqual(screen.version,'0.4.1')
+        self.assertEqual(screen.txt,self.fastq_screen_txt)
+        self.assertEqual(screen.libraries,['hg19','mm9','rn4','dm3','ws200',
+                                           'ecoli','saccer','PhiX','Vectors',
+                                           'SpR6'])
+        self.assertEqual(len(screen),10)
+        self.assertEqual(screen.no_hits,30.80)
+        self.assertEqual(list(screen['hg19']),[98.10,0.02,0.27,0.55,1.06])
+        self.assertEqual(list(screen['ecoli']),[96.52,0.43,3.05,0.00,0.00])
+        self.assertEqual(screen.values.shape,(10,5))
+        self.assertEqual(screen.column('%Unmapped')[0],98.10)
+        self.assertEqual(list(screen.data.keys()),screen.libraries)
 
 class TestFastqscreen_v0_4_2(unittest.TestCase):
     def setUp(self):
@@ -78,6 +98,22 @@ SpR6	89393	89393	100.00	0	0.00	0	0.00	0	0.00	0	0.00
                                            'ecoli','saccer','PhiX','Vectors',
                                            'SpR6'])
         self.assertEqual(screen.no_hits,99.73)
+    def test_fastqscreendata_v0_4_2(self):
+        """FastqscreenData handles output from v0.4.2
+        """
+        screen = FastqscreenData(self.fastq_screen_txt)
+        self.assertEqual(screen.version,'0.4.2')
+        self.assertEqual(screen.txt,self.fastq_screen_txt)
+        self.assertEqual(screen.libraries,['hg19','mm9','rn4','dm3','ws200',
+                                           'ecoli','saccer','PhiX','Vectors',
+                                           'SpR6'])
+        self.assertEqual(len(screen),10)
+        self.assertEqual(screen.no_hits,99.73)
+        self.assertEqual(list(screen['hg19']),[99.80,0.00,0.00,0.01,0.19])
+        self.assertEqual(list(screen['ecoli']),[100.00,0.00,0.00,0.00,0.00])
+        self.assertEqual(screen.values.shape,(10,5))
+        self.assertEqual(screen.column('%Unmapped')[0],99.80)
+        self.assertEqual(list(screen.data.keys()),screen.libraries)
 
 
 
@@ -116,3 +152,52 @@ SpR6	597781	597781	100.00	0	0.00	0	0.00	0	0.00	0	0.00
                                            'ecoli','saccer','PhiX','Vectors',
                                            'SpR6'])
         self.assertEqual(screen.no_hits,19.80)
+    def test_fastqscreendata_v0_5_2(self):
+        """FastqscreenData handles output from v0.5.2
+        """
+        screen = FastqscreenData(self.fastq_screen_txt)
+        self.assertEqual(screen.version,'0.5.2')
+        self.assertEqual(screen.txt,self.fastq_screen_txt)
+        self.assertEqual(screen.libraries,['hg19','mm9','rn4','dm3','ws200',
+                                           'ecoli','saccer','PhiX','Vectors',
+                                           'SpR6'])
+        self.assertEqual(len(screen),10)
+        self.assertEqual(screen.no_hits,19.80)
+        self.assertEqual(list(screen['hg19']),[19.80,67.89,12.13,0.10,0.08])
+        self.assertEqual(list(screen['ecoli']),[100.00,0.00,0.00,0.00,0.00])
+        self.assertEqual(screen.values.shape,(10,5))
+        self.assertEqual(screen.column('%Unmapped')[0],19.80)
+        self.assertEqual(list(screen.data.keys()),screen.libraries)
+
+class TestGetFastqScreens(unittest.TestCase):
+    def setUp(self):
+        screen_text = """#Fastq_screen version: 0.4.1
+Library	%Unmapped	%One_hit_one_library	%Multiple_hits_one_library	%One_hit_multiple_libraries	%Multiple_hits_multiple_libraries
+hg19	98.10	0.02	0.27	0.55	1.06
+mm9	35.92	47.46	10.18	3.56	2.88
+
+%Hit_no_libraries: 30.80
+"""
+        self.screen_files = []
+        for i in xrange(2):
+            with tempfile.NamedTemporaryFile(delete=False) as fp:
+                self.screen_files.append(fp.name)
+                fp.write(screen_text)
+    def tearDown(self):
+        for f in self.screen_files:
+            try:
+                os.remove(f)
+            except Exception:
+                pass
+    def test_get_fastq_screen_data(self):
+        screen = get_fastq_screen_data(self.screen_files[0])
+        self.assertTrue(isinstance(screen,FastqscreenData))
+        self.assertEqual(screen.libraries,['hg19','mm9'])
+        self.assertTrue(get_fastq_screen_data(self.screen_files[0]) is screen)
+    def test_get_fastq_screens(self):
+        screens = get_fastq_screens(self.screen_files)
+        self.assertEqual(list(screens.keys()),self.screen_files)
+        for f in self.screen_files:
+            self.assertEqual(screens[f].txt,f)
+            self.assertEqual(list(screens[f]['mm9']),
+                             [35.92,47.46,10.18,3.56,2.88])
@@ -0,0 +1,137 @@
+#######################################################################
+# Unit tests for qc/fastqc.py
+#######################################################################
+
+import unittest
+import os
+import tempfile
+import shutil
+
+from auto_process_ngs.mockqc import MockQCOutputs
+from auto_process_ngs.qc.fastqc import Fastqc
+from auto_process_ngs.qc.fastqc import FastqcData
+from auto_process_ngs.qc.fastqc import FastqcOutputCache
+from auto_process_ngs.qc.fastqc import get_fastqc_data
+from auto_process_ngs.qc.fastqc import get_fastqc_summary
+from auto_process_ngs.qc.fastqc import clear_fastqc_cache
+
+class TestFastqcData(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_FastqcData')
+        MockQCOutputs.fastqc_v0_11_2('PJB1_S1_R1_001.fastq.gz',self.wd)
+        self.fastqc_data = os.path.join(self.wd,
+                                        'PJB1_S1_R1_001_fastqc',
+                                        'fastqc_data.txt')
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def test_fastqcdata_version(self):
+        self.assertEqual(FastqcData(self.fastqc_data).version,'0.11.3')
+    def test_fastqcdata_modules(self):
+        fqc = FastqcData(self.fastqc_data)
+        self.assertEqual(fqc.modules[0:2],
+                         ['Basic Statistics','Per base sequence quality'])
+        self.assertEqual(fqc.module_status('Basic Statistics'),'pass')
+        self.assertEqual(fqc.module_status('Per base sequence quality'),
+                         'fail')
+        self.assertEqual(fqc.module_status('Nonexistent module'),None)
+    def test_fastqcdata_data(self):
+        fqc = FastqcData(self.fastqc_data)
+        data = fqc.data('Basic Statistics')
+        self.assertEqual(len(data),8)
+        self.assertEqual(data[0],'#Measure\tValue')
+        self.assertEqual(data[2:],
+                         ['File type\tConventional base calls',
+                          'Encoding\tSanger / Illumina 1.9',
+                          'Total Sequences\t10',
+                          'Sequences flagged as poor quality\t0',
+                          'Sequence length\t250',
+                          '%GC\t51'])
+        self.assertEqual(fqc.data('Nonexistent module'),None)
+    def test_fastqcdata_basic_statistics(self):
+        fqc = FastqcData(self.fastqc_data)
+        self.assertEqual(fqc.basic_statistics('Total Sequences'),'10')
+        self.assertEqual(fqc.basic_statistics('%GC'),'51')
+        self.assertRaises(KeyError,fqc.basic_statistics,'Nonexistent')
+    def test_fastqcdata_table_and_column(self):
+        fqc = FastqcData(self.fastqc_data)
+        columns,rows = fqc.table('Per base sequence quality')
+        self.assertEqual(columns,['Base','Mean','Median',
+                                  'Lower Quartile','Upper Quartile',
+                                  '10th Percentile','90th Percentile'])
+        self.assertEqual(rows[0],[1,27.6,0.0,0.0,0.0,0.0,0.0])
+        self.assertEqual(fqc.column('Per base sequence quality',
+                                    'Mean')[0],27.6)
+        self.assertEqual(len(fqc.column('Per base sequence quality',
+                                        'Mean')),len(rows))
+        self.assertEqual(fqc.table('Nonexistent module'),None)
+        self.assertRaises(KeyError,
+                          fqc.column,'Per base sequence quality',
+                          'Nonexistent column')
+    def test_fastqcdata_missing_file(self):
+        fqc = FastqcData(os.path.join(self.wd,'missing.txt'))
+        self.assertRaises(IOError,fqc.data,'Basic Statistics')
+
+class TestFastqc(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_Fastqc')
+        MockQCOutputs.fastqc_v0_11_2('PJB1_S1_R1_001.fastq.gz',self.wd)
+        self.fastqc_dir = os.path.join(self.wd,'PJB1_S1_R1_001_fastqc')
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def test_fastqc(self):
+        fastqc = Fastqc(self.fastqc_dir)
+        self.assertEqual(fastqc.version,'0.11.3')
+        self.assertEqual(fastqc.summary.status('Basic Statistics'),'PASS')
+        self.assertEqual(fastqc.data.basic_statistics('Total Sequences'),
+                         '10')
+    def test_fastqc_missing_outputs(self):
+        self.assertRaises(IOError,
+                          Fastqc,
+                          os.path.join(self.wd,'missing_fastqc'))
+
+class TestFastqcOutputCache(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_FastqcOutputCache')
+        MockQCOutputs.fastqc_v0_11_2('PJB1_S1_R1_001.fastq.gz',self.wd)
+        MockQCOutputs.fastqc_v0_11_2('PJB1_S1_R2_001.fastq.gz',self.wd)
+        self.fastqc_data = [os.path.join(self.wd,
+                                         'PJB1_S1_R%d_001_fastqc' % r,
+                                         'fastqc_data.txt')
+                            for r in (1,2)]
+        clear_fastqc_cache()
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+        clear_fastqc_cache()
+    def test_get_fastqc_data(self):
+        fqc = get_fastqc_data(self.fastqc_data[0])
+        self.assertTrue(isinstance(fqc,FastqcData))
+        self.assertTrue(get_fastqc_data(self.fastqc_data[0]) is fqc)
+        self.assertFalse(get_fastqc_data(self.fastqc_data[1]) is fqc)
+    def test_get_fastqc_data_modified_file(self):
+        fqc = get_fastqc_data(self.fastqc_data[0])
+        st = os.stat(self.fastqc_data[0])
+        os.utime(self.fastqc_data[0],(st.st_atime,st.st_mtime+10))
+        self.assertFalse(get_fastqc_data(self.fastqc_data[0]) is fqc)
+    def test_get_fastqc_summary(self):
+        summary_file = os.path.join(os.path.dirname(self.fastqc_data[0]),
+                                    'summary.txt')
+        summary = get_fastqc_summary(summary_file)
+        self.assertEqual(summary.status('Basic Statistics'),'PASS')
+        self.assertTrue(get_fastqc_summary(summary_file) is summary)
+    def test_fastqcoutputcache_maxsize(self):
+        cache = FastqcOutputCache(maxsize=1)
+        fqc1 = cache.get(FastqcData,self.fastqc_data[0])
+        self.assertEqual(len(cache),1)
+        fqc2 = cache.get(FastqcData,self.fastqc_data[1])
+        self.assertEqual(len(cache),1)
+        self.assertTrue(cache.get(FastqcData,self.fastqc_data[1]) is fqc2)
+        self.assertFalse(cache.get(FastqcData,self.fastqc_data[0]) is fqc1)
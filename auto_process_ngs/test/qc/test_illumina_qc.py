@@ -13,7 +13,14 @@ from auto_process_ngs.utils import AnalysisProject
 from auto_process_ngs.utils import AnalysisSample
 from auto_process_ngs.qc.illumina_qc import QCReporter
 from auto_process_ngs.qc.illumina_qc import FastqSet
+from auto_process_ngs.qc.illumina_qc import QCVerifier
+from auto_process_ngs.qc.illumina_qc import QCManifest
+from auto_process_ngs.qc.illumina_qc import ReportAssets
+from auto_process_ngs.qc.illumina_qc import ReportCache
 from auto_process_ngs.qc.illumina_qc import get_fastq_pairs
+from auto_process_ngs.qc.illumina_qc import report_assets_dir
+from auto_process_ngs.qc.illumina_qc import expected_qc_outputs
+from auto_process_ngs.qc.illumina_qc import update_qc_manifests
 
 class TestQCReporter(unittest.TestCase):
     def setUp(self):
@@ -67,6 +74,21 @@ class TestQCReporter(unittest.TestCase):
         reporter.report(filename=os.path.join(self.wd,'report.PE.html'))
         self.assertTrue(os.path.exists(
             os.path.join(self.wd,'report.PE.html')))
+    def test_qcreporter_fastq_screens(self):
+        analysis_dir = self._make_analysis_project(paired_end=True)
+        project = AnalysisProject('PJB',analysis_dir)
+        reporter = QCReporter(project)
+        screens = reporter.fastq_screens()
+        self.assertEqual([os.path.basename(fq) for fq in screens],
+                         ['PJB1_S1_R1_001.fastq.gz',
+                          'PJB1_S1_R2_001.fastq.gz',
+                          'PJB2_S2_R1_001.fastq.gz',
+                          'PJB2_S2_R2_001.fastq.gz'])
+        for fq in screens:
+            self.assertEqual(list(screens[fq].keys()),
+                             ['model_organisms','other_organisms','rRNA'])
+            for name in screens[fq]:
+                self.assertTrue(len(screens[fq][name]) > 0)
     def test_qcreporter_single_end(self):
         analysis_dir = self._make_analysis_project(paired_end=False)
         project = AnalysisProject('PJB',analysis_dir)
@@ -77,6 +99,200 @@ class TestQCReporter(unittest.TestCase):
         reporter.report(filename=os.path.join(self.wd,'report.SE.html'))
         self.assertTrue(os.path.exists(
             os.path.join(self.wd,'report.SE.html')))
+    def test_qcreporter_paired_end_multiple_processors(self):
+        analysis_dir = self._make_analysis_project(paired_end=True)
+        project = AnalysisProject('PJB',analysis_dir)
+        reporter = QCReporter(project)
+        self.assertTrue(reporter.verify())
+        reporter.report(filename=os.path.join(self.wd,'report.serial.html'))
+        reporter.report(filename=os.path.join(self.wd,'report.parallel.html'),
+                        nprocessors=2)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.wd,'report.parallel.html')))
+        # Reports should be the same (apart from the timestamp)
+        reports = []
+        for name in ('report.serial.html','report.parallel.html'):
+            with open(os.path.join(self.wd,name),'r') as fp:
+                reports.append([line for line in fp
+                                if not line.startswith(
+                                        "<p>Report generated by ")])
+        self.assertEqual(reports[0],reports[1])
+    def test_qcreporter_paired_end_external_images(self):
+        analysis_dir = self._make_analysis_project(paired_end=True)
+        project = AnalysisProject('PJB',analysis_dir)
+        reporter = QCReporter(project)
+        self.assertTrue(reporter.verify())
+        reporter.report(filename=os.path.join(self.wd,'report.PE.html'),
+                        inline_images=False)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.wd,'report.PE.html')))
+        self.assertTrue(os.path.isdir(
+            os.path.join(self.wd,'report.PE_assets')))
+        with open(os.path.join(self.wd,'report.PE.html'),'r') as fp:
+            html = fp.read()
+        self.assertTrue("src='report.PE_assets/" in html)
+    def test_qcreporter_paired_end_incremental(self):
+        analysis_dir = self._make_analysis_project(paired_end=True)
+        project = AnalysisProject('PJB',analysis_dir)
+        reporter = QCReporter(project)
+        self.assertTrue(reporter.verify())
+        qc_dir = os.path.join(analysis_dir,'qc')
+        reporter.report(filename=os.path.join(self.wd,'report.full.html'))
+        # Generate incrementally twice (the second time all
+        # samples will be taken from the cache)
+        for i in xrange(2):
+            reporter.report(filename=os.path.join(self.wd,
+                                                  'report.incr.html'),
+                            incremental=True)
+            self.assertEqual(len(os.listdir(
+                os.path.join(qc_dir,'report_cache'))),2)
+            # Reports should be the same (apart from the timestamp)
+            reports = []
+            for name in ('report.full.html','report.incr.html'):
+                with open(os.path.join(self.wd,name),'r') as fp:
+                    reports.append([line for line in fp
+                                    if not line.startswith(
+                                            "<p>Report generated by ")])
+            self.assertEqual(reports[0],reports[1])
+
+class TestReportCache(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_ReportCache')
+        self.qc_dir = os.path.join(self.wd,'qc')
+        os.mkdir(self.qc_dir)
+        self.cache_dir = os.path.join(self.qc_dir,'report_cache')
+        self.report_html = os.path.join(self.wd,'qc_report.html')
+        # Mock sample
+        class MockSample(object):
+            name = 'PJB1'
+            fastq_pairs = [FastqSet('/data/PJB/PJB1_S1_R1_001.fastq.gz',
+                                    '/data/PJB/PJB1_S1_R2_001.fastq.gz')]
+        self.sample = MockSample()
+        for fq in self.sample.fastq_pairs[0].fastqs:
+            MockQCOutputs.fastqc_v0_11_2(fq,self.qc_dir)
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def test_reportcache_put_and_get(self):
+        cache = ReportCache(self.cache_dir,self.report_html)
+        fingerprint = cache.fingerprint(self.sample,self.qc_dir)
+        self.assertEqual(cache.get('PJB1',fingerprint),None)
+        self.assertFalse(os.path.exists(self.cache_dir))
+        cache.put('PJB1',fingerprint,"<div>PJB1</div>",
+                  [{'sample':"<a href='#sample_PJB1'>PJB1</a>"}])
+        self.assertTrue(os.path.isdir(self.cache_dir))
+        # New cache instance for the same report
+        cached = ReportCache(self.cache_dir,
+                             self.report_html).get('PJB1',fingerprint)
+        self.assertEqual(cached['html'],"<div>PJB1</div>")
+        self.assertEqual(cached['rows'],
+                         [{'sample':"<a href='#sample_PJB1'>PJB1</a>"}])
+        self.assertTrue(isinstance(cached['html'],str))
+        # Different report
+        self.assertEqual(ReportCache(self.cache_dir,
+                                     os.path.join(self.wd,'other.html')).\
+                         get('PJB1',fingerprint),None)
+        # Different fingerprint
+        self.assertEqual(cache.get('PJB1','abc'),None)
+    def test_reportcache_fingerprint(self):
+        cache = ReportCache(self.cache_dir,self.report_html)
+        fingerprint = cache.fingerprint(self.sample,self.qc_dir,
+                                        paired_end=True)
+        self.assertEqual(cache.fingerprint(self.sample,self.qc_dir,
+                                           paired_end=True),fingerprint)
+        # Different parameters
+        self.assertNotEqual(cache.fingerprint(self.sample,self.qc_dir,
+                                              paired_end=False),fingerprint)
+        # Adding QC outputs changes the fingerprint
+        MockQCOutputs.fastq_screen_v0_9_2(
+            self.sample.fastq_pairs[0].r1,self.qc_dir,'model_organisms')
+        self.assertNotEqual(cache.fingerprint(self.sample,self.qc_dir,
+                                              paired_end=True),fingerprint)
+    def test_reportcache_missing_assets(self):
+        cache = ReportCache(self.cache_dir,self.report_html)
+        fingerprint = cache.fingerprint(self.sample,self.qc_dir)
+        asset = os.path.join(self.wd,'asset.png')
+        with open(asset,'w') as fp:
+            fp.write("PNG")
+        cache.put('PJB1',fingerprint,"<div>PJB1</div>",[],assets=[asset])
+        self.assertNotEqual(cache.get('PJB1',fingerprint),None)
+        os.remove(asset)
+        self.assertEqual(cache.get('PJB1',fingerprint),None)
+    def test_reportcache_prune(self):
+        cache = ReportCache(self.cache_dir,self.report_html)
+        other = ReportCache(self.cache_dir,
+                            os.path.join(self.wd,'other.html'))
+        for name in ('PJB1','PJB2'):
+            cache.put(name,'abc',"<div>%s</div>" % name,[])
+            other.put(name,'abc',"<div>%s</div>" % name,[])
+        cache.prune(['PJB1'])
+        self.assertNotEqual(cache.get('PJB1','abc'),None)
+        self.assertEqual(cache.get('PJB2','abc'),None)
+        self.assertFalse(os.path.exists(cache.path('PJB2')))
+        # Entries for other reports are kept
+        self.assertNotEqual(other.get('PJB1','abc'),None)
+        self.assertNotEqual(other.get('PJB2','abc'),None)
+
+class TestReportAssets(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_ReportAssets')
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def _make_file(self,name,content):
+        filen = os.path.join(self.wd,name)
+        with open(filen,'w') as fp:
+            fp.write(content)
+        return filen
+    def test_reportassets_add(self):
+        png1 = self._make_file('plot1.png',"PNG data 1")
+        png2 = self._make_file('plot2.png',"PNG data 2")
+        assets_dir = os.path.join(self.wd,'assets')
+        assets = ReportAssets(assets_dir)
+        asset1 = assets.add(png1)
+        self.assertTrue(os.path.isabs(asset1))
+        self.assertEqual(os.path.dirname(asset1),assets_dir)
+        self.assertTrue(asset1.endswith('.png'))
+        self.assertEqual(open(asset1,'r').read(),"PNG data 1")
+        asset2 = assets.add(png2)
+        self.assertNotEqual(asset1,asset2)
+        self.assertEqual(len(os.listdir(assets_dir)),2)
+    def test_reportassets_add_duplicates(self):
+        png1 = self._make_file('plot1.png',"PNG data")
+        png2 = self._make_file('plot2.png',"PNG data")
+        assets_dir = os.path.join(self.wd,'assets')
+        assets = ReportAssets(assets_dir)
+        self.assertEqual(assets.add(png1),assets.add(png2))
+        self.assertEqual(len(os.listdir(assets_dir)),1)
+    def test_reportassets_files(self):
+        png1 = self._make_file('plot1.png',"PNG data 1")
+        png2 = self._make_file('plot2.png',"PNG data 2")
+        assets = ReportAssets(os.path.join(self.wd,'assets'),
+                              relpath=self.wd)
+        self.assertEqual(assets.files,[])
+        asset1 = assets.add(png1)
+        asset2 = assets.add(png2)
+        assets.add(png1)
+        self.assertEqual(assets.files,[os.path.join(self.wd,asset1),
+                                       os.path.join(self.wd,asset2)])
+    def test_reportassets_add_relpath(self):
+        png = self._make_file('plot.png',"PNG data")
+        assets = ReportAssets(os.path.join(self.wd,'assets'),
+                              relpath=self.wd)
+        asset = assets.add(png)
+        self.assertEqual(os.path.dirname(asset),'assets')
+        self.assertTrue(os.path.exists(os.path.join(self.wd,asset)))
+
+class TestReportAssetsDirFunction(unittest.TestCase):
+    def test_report_assets_dir(self):
+        self.assertEqual(report_assets_dir('/data/PJB/qc_report.html'),
+                         '/data/PJB/qc_report_assets')
+        self.assertEqual(report_assets_dir('qc_report.html'),
+                         'qc_report_assets')
 
 class TestFastqSet(unittest.TestCase):
     def test_fastqset_PE(self):
@@ -110,6 +326,195 @@ class TestFastqSet(unittest.TestCase):
         self.assertEqual(fqset.fastqs,
                          ['/data/PB/PB1_ATTAGG_L001_R1_001.fastq'])
 
+class TestQCVerifier(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_QCVerifier')
+        self.qc_dir = os.path.join(self.wd,'qc')
+        os.mkdir(self.qc_dir)
+        self.fastqs = ['/data/PJB/PJB1_S1_R1_001.fastq.gz',
+                       '/data/PJB/PJB2_S2_R1_001.fastq.gz']
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def _make_qc_outputs(self,fastq,screens=True):
+        MockQCOutputs.fastqc_v0_11_2(fastq,self.qc_dir)
+        if screens:
+            for screen in ('model_organisms','other_organisms','rRNA'):
+                MockQCOutputs.fastq_screen_v0_9_2(fastq,self.qc_dir,screen)
+    def test_qcverifier_all_outputs_present(self):
+        for fq in self.fastqs:
+            self._make_qc_outputs(fq)
+        verifier = QCVerifier(self.qc_dir)
+        for fq in self.fastqs:
+            self.assertTrue(verifier.verify(fq))
+            present,missing = verifier.check(fq)
+            self.assertEqual(len(present),9)
+            self.assertEqual(missing,[])
+        self.assertEqual(verifier.missing_outputs(self.fastqs),{})
+    def test_qcverifier_missing_outputs(self):
+        self._make_qc_outputs(self.fastqs[0])
+        self._make_qc_outputs(self.fastqs[1],screens=False)
+        verifier = QCVerifier(self.qc_dir)
+        self.assertTrue(verifier.verify(self.fastqs[0]))
+        self.assertFalse(verifier.verify(self.fastqs[1]))
+        missing_outputs = verifier.missing_outputs(self.fastqs)
+        self.assertEqual(list(missing_outputs.keys()),[self.fastqs[1]])
+        self.assertEqual(
+            missing_outputs[self.fastqs[1]],
+            [os.path.join(self.qc_dir,"PJB2_S2_R1_001_%s_screen.%s" %
+                          (screen,ext))
+             for screen in ('model_organisms','other_organisms','rRNA')
+             for ext in ('png','txt')])
+    def test_qcverifier_missing_qc_dir(self):
+        verifier = QCVerifier(os.path.join(self.wd,'missing'))
+        self.assertFalse(verifier.verify(self.fastqs[0]))
+        self.assertEqual(list(verifier.missing_outputs(self.fastqs).keys()),
+                         self.fastqs)
+    def test_qcverifier_refresh(self):
+        verifier = QCVerifier(self.qc_dir)
+        self.assertFalse(verifier.verify(self.fastqs[0]))
+        self._make_qc_outputs(self.fastqs[0])
+        # Directory listing is not updated until refresh
+        self.assertFalse(verifier.verify(self.fastqs[0]))
+        verifier.refresh()
+        self.assertTrue(verifier.verify(self.fastqs[0]))
+
+class TestQCManifest(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_QCManifest')
+        self.qc_dir = os.path.join(self.wd,'qc')
+        os.mkdir(self.qc_dir)
+        # Fastqs
+        self.fastqs = []
+        for fq in ('PJB1_S1_R1_001.fastq.gz','PJB2_S2_R1_001.fastq.gz'):
+            fastq = os.path.join(self.wd,fq)
+            with open(fastq,'w') as fp:
+                fp.write("@read\nACGT\n+\nIIII\n")
+            self.fastqs.append(fastq)
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def _modify_fastq(self,fastq):
+        with open(fastq,'a') as fp:
+            fp.write("@read2\nACGT\n+\nIIII\n")
+    def test_qcmanifest_new(self):
+        manifest = QCManifest(self.qc_dir)
+        self.assertEqual(manifest.path,
+                         os.path.join(self.qc_dir,'qc.manifest'))
+        self.assertEqual(manifest.version,None)
+        self.assertEqual(manifest.fastqs,[])
+        self.assertEqual(len(manifest),0)
+        self.assertFalse(self.fastqs[0] in manifest)
+        self.assertFalse(os.path.exists(manifest.path))
+    def test_qcmanifest_add_save_and_load(self):
+        manifest = QCManifest(self.qc_dir)
+        manifest.version = '1.3.1'
+        for fq in self.fastqs:
+            manifest.add(fq)
+        manifest.save()
+        self.assertTrue(os.path.exists(manifest.path))
+        # Reload
+        manifest = QCManifest(self.qc_dir)
+        self.assertEqual(manifest.version,'1.3.1')
+        self.assertEqual(manifest.fastqs,['PJB1_S1_R1_001.fastq.gz',
+                                          'PJB2_S2_R1_001.fastq.gz'])
+        self.assertTrue(self.fastqs[0] in manifest)
+        self.assertEqual(manifest.expected_outputs(self.fastqs[0]),
+                         expected_qc_outputs(self.fastqs[0],self.qc_dir))
+    def test_qcmanifest_expected_outputs_fastq_not_in_manifest(self):
+        manifest = QCManifest(self.qc_dir)
+        self.assertEqual(manifest.expected_outputs(self.fastqs[0]),
+                         expected_qc_outputs(self.fastqs[0],self.qc_dir))
+    def test_qcmanifest_is_stale(self):
+        manifest = QCManifest(self.qc_dir)
+        manifest.add(self.fastqs[0])
+        manifest.save()
+        manifest = QCManifest(self.qc_dir)
+        self.assertFalse(manifest.is_stale(self.fastqs[0]))
+        # Fastq not in manifest
+        self.assertFalse(manifest.is_stale(self.fastqs[1]))
+        # Fastq modified since being added
+        self._modify_fastq(self.fastqs[0])
+        self.assertTrue(manifest.is_stale(self.fastqs[0]))
+        self.assertEqual(manifest.stale_fastqs(self.fastqs),
+                         [self.fastqs[0]])
+        # Updating the entry clears the stale status
+        manifest.add(self.fastqs[0])
+        self.assertFalse(manifest.is_stale(self.fastqs[0]))
+    def test_qcmanifest_checksum(self):
+        manifest = QCManifest(self.qc_dir)
+        manifest.add(self.fastqs[0],checksum=True)
+        manifest.add(self.fastqs[1])
+        manifest.save()
+        with open(manifest.path,'r') as fp:
+            lines = [l.rstrip('\n').split('\t') for l in fp
+                     if not l.startswith('#')]
+        self.assertEqual(len(lines[0][3]),32)
+        self.assertEqual(lines[1][3],'.')
+    def test_qcverifier_with_stale_fastq(self):
+        for fq in self.fastqs:
+            MockQCOutputs.fastqc_v0_11_2(fq,self.qc_dir)
+            for screen in ('model_organisms','other_organisms','rRNA'):
+                MockQCOutputs.fastq_screen_v0_9_2(fq,self.qc_dir,screen)
+        manifest = QCManifest(self.qc_dir)
+        for fq in self.fastqs:
+            manifest.add(fq)
+        manifest.save()
+        self._modify_fastq(self.fastqs[1])
+        verifier = QCVerifier(self.qc_dir)
+        self.assertTrue(verifier.verify(self.fastqs[0]))
+        self.assertFalse(verifier.verify(self.fastqs[1]))
+        self.assertEqual(list(verifier.missing_outputs(self.fastqs).keys()),
+                         [self.fastqs[1]])
+
+    def test_qcmanifest_update(self):
+        manifest = QCManifest(self.qc_dir)
+        # No QC outputs so entry isn't updated
+        self.assertFalse(manifest.update(self.fastqs[0]))
+        self.assertFalse(self.fastqs[0] in manifest)
+        # Entry is added once QC outputs are present
+        MockQCOutputs.fastqc_v0_11_2(self.fastqs[0],self.qc_dir)
+        for screen in ('model_organisms','other_organisms','rRNA'):
+            MockQCOutputs.fastq_screen_v0_9_2(self.fastqs[0],
+                                              self.qc_dir,screen)
+        self.assertTrue(manifest.update(self.fastqs[0]))
+        self.assertTrue(self.fastqs[0] in manifest)
+        self.assertFalse(manifest.is_stale(self.fastqs[0]))
+    def test_qcmanifest_clear_outputs(self):
+        MockQCOutputs.fastqc_v0_11_2(self.fastqs[0],self.qc_dir)
+        for screen in ('model_organisms','other_organisms','rRNA'):
+            MockQCOutputs.fastq_screen_v0_9_2(self.fastqs[0],
+                                              self.qc_dir,screen)
+        manifest = QCManifest(self.qc_dir)
+        manifest.clear_outputs(self.fastqs[0])
+        for output in expected_qc_outputs(self.fastqs[0],self.qc_dir):
+            self.assertFalse(os.path.exists(output))
+    def test_update_qc_manifests(self):
+        class MockJob(object):
+            def __init__(self,exit_code):
+                self.exit_code = exit_code
+        for fq in self.fastqs:
+            MockQCOutputs.fastqc_v0_11_2(fq,self.qc_dir)
+            for screen in ('model_organisms','other_organisms','rRNA'):
+                MockQCOutputs.fastq_screen_v0_9_2(fq,self.qc_dir,screen)
+        manifest = QCManifest(self.qc_dir)
+        for fq in self.fastqs:
+            manifest.add(fq)
+        manifest.save()
+        # Regenerate the Fastqs and rerun QC, with the
+        # job for the second Fastq failing
+        for fq in self.fastqs:
+            self._modify_fastq(fq)
+        update_qc_manifests([(manifest,self.fastqs[0],MockJob(0)),
+                             (manifest,self.fastqs[1],MockJob(1))])
+        manifest = QCManifest(self.qc_dir)
+        self.assertFalse(manifest.is_stale(self.fastqs[0]))
+        self.assertTrue(manifest.is_stale(self.fastqs[1]))
+
 class TestGetFastqPairsFunction(unittest.TestCase):
     def test_get_fastq_pairs_paired_end(self):
         s = AnalysisSample('PB1')
@@ -0,0 +1,172 @@
+#######################################################################
+# Unit tests for qc/plots.py
+#######################################################################
+
+import unittest
+import os
+import tempfile
+import shutil
+from PIL import Image
+
+from auto_process_ngs.mockqc import MockQCOutputs
+from auto_process_ngs.qc.plots import MicroplotCache
+from auto_process_ngs.qc.plots import ufastqcplot
+from auto_process_ngs.qc.plots import ustackedbar
+
+class TestMicroplotCache(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_MicroplotCache')
+        self.cache_dir = os.path.join(self.wd,'microplot_cache')
+        # Source file
+        self.source_file = os.path.join(self.wd,'source.txt')
+        with open(self.source_file,'w') as fp:
+            fp.write("Some data\n")
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def test_microplotcache_put_and_get(self):
+        cache = MicroplotCache(self.cache_dir)
+        key = cache.key('uplot',(self.source_file,))
+        self.assertEqual(cache.get(key),None)
+        self.assertFalse(os.path.exists(self.cache_dir))
+        cache.put(key,"PNG data")
+        self.assertTrue(os.path.isdir(self.cache_dir))
+        self.assertEqual(cache.get(key),"PNG data")
+        # New cache instance using same directory
+        self.assertEqual(MicroplotCache(self.cache_dir).get(key),
+                         "PNG data")
+    def test_microplotcache_key(self):
+        cache = MicroplotCache(self.cache_dir)
+        key = cache.key('uplot',(self.source_file,),height=10)
+        # Same inputs give same key
+        self.assertEqual(cache.key('uplot',(self.source_file,),height=10),
+                         key)
+        # Different plot type or parameters give different keys
+        self.assertNotEqual(cache.key('uplot2',(self.source_file,),
+                                      height=10),key)
+        self.assertNotEqual(cache.key('uplot',(self.source_file,),
+                                      height=20),key)
+        # Modifying the source file changes the key
+        with open(self.source_file,'a') as fp:
+            fp.write("More data\n")
+        self.assertNotEqual(cache.key('uplot',(self.source_file,),
+                                      height=10),key)
+    def test_microplotcache_prune(self):
+        cache = MicroplotCache(self.cache_dir)
+        # Additional source files
+        modified_file = os.path.join(self.wd,'modified.txt')
+        removed_file = os.path.join(self.wd,'removed.txt')
+        for f in (modified_file,removed_file):
+            with open(f,'w') as fp:
+                fp.write("Some data\n")
+        keys = dict()
+        for f in (self.source_file,modified_file,removed_file):
+            keys[f] = cache.key('uplot',(f,))
+            cache.put(keys[f],"PNG data",(f,))
+        # Entry with no source files
+        no_sources = cache.key('uplot',(),height=10)
+        cache.put(no_sources,"PNG data")
+        # Entry with no record of source files
+        legacy = cache.key('uplot2',(self.source_file,))
+        with open(cache.path(legacy),'wb') as fp:
+            fp.write("PNG data")
+        # Only the entry with no record of its sources is removed
+        self.assertEqual(cache.prune(),1)
+        self.assertEqual(cache.get(legacy),None)
+        # Modify and remove source files
+        with open(modified_file,'a') as fp:
+            fp.write("More data\n")
+        os.remove(removed_file)
+        self.assertEqual(cache.prune(),2)
+        self.assertEqual(cache.get(keys[self.source_file]),"PNG data")
+        self.assertEqual(cache.get(no_sources),"PNG data")
+        self.assertEqual(cache.get(keys[modified_file]),None)
+        self.assertEqual(cache.get(keys[removed_file]),None)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         sorted(["%s.%s" % (key,ext)
+                                 for key in (keys[self.source_file],
+                                             no_sources)
+                                 for ext in ('png','json')]))
+    def test_microplotcache_key_missing_source_file(self):
+        cache = MicroplotCache(self.cache_dir)
+        self.assertRaises(OSError,
+                          cache.key,
+                          'uplot',
+                          (os.path.join(self.wd,'missing.txt'),))
+
+class TestMicroplotsWithCache(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_microplots')
+        self.cache = MicroplotCache(os.path.join(self.wd,'microplot_cache'))
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def _cached_pngs(self):
+        # Internal: list the PNGs in the cache
+        return [f for f in os.listdir(self.cache.cache_dir)
+                if f.endswith('.png')]
+    def test_ufastqcplot_with_cache(self):
+        MockQCOutputs.fastqc_v0_11_2('PJB1_S1_R1_001.fastq.gz',self.wd)
+        summary_file = os.path.join(self.wd,
+                                    'PJB1_S1_R1_001_fastqc',
+                                    'summary.txt')
+        plot = ufastqcplot(summary_file,inline=True)
+        self.assertTrue(plot.startswith("data:image/png;base64,"))
+        # Plot is added to the cache
+        self.assertEqual(ufastqcplot(summary_file,inline=True,
+                                     cache=self.cache),plot)
+        self.assertEqual(len(self._cached_pngs()),1)
+        # Cached plot is reused
+        self.assertEqual(ufastqcplot(summary_file,inline=True,
+                                     cache=self.cache),plot)
+        self.assertEqual(len(self._cached_pngs()),1)
+    def test_ustackedbar_with_cache(self):
+        plot = ustackedbar((10,20,30),inline=True)
+        self.assertEqual(ustackedbar((10,20,30),inline=True,
+                                     cache=self.cache),plot)
+        self.assertEqual(ustackedbar((10,20,30),inline=True,
+                                     cache=self.cache),plot)
+        self.assertEqual(len(self._cached_pngs()),1)
+        # Different data gives new plot
+        ustackedbar((30,20,10),inline=True,cache=self.cache)
+        self.assertEqual(len(self._cached_pngs()),2)
+    def test_ustackedbar_to_file(self):
+        outfile = os.path.join(self.wd,'ubar.png')
+        self.assertEqual(ustackedbar((10,20,30),outfile=outfile),
+                         outfile)
+        self.assertTrue(os.path.exists(outfile))
+
+class TestUStackedBar(unittest.TestCase):
+    def setUp(self):
+        # Temporary working dir
+        self.wd = tempfile.mkdtemp(suffix='.test_ustackedbar')
+    def tearDown(self):
+        # Remove temporary working dir
+        if os.path.isdir(self.wd):
+            shutil.rmtree(self.wd)
+    def test_ustackedbar_pixels(self):
+        outfile = ustackedbar((25,75),
+                              outfile=os.path.join(self.wd,'ubar.png'),
+                              length=20,height=5,
+                              colors=('red','white'),
+                              bbox=True)
+        img = Image.open(outfile)
+        self.assertEqual(img.size,(20,5))
+        self.assertEqual(img.mode,'RGB')
+        # Bounding box
+        for i in xrange(20):
+            self.assertEqual(img.getpixel((i,0)),(0,0,0))
+            self.assertEqual(img.getpixel((i,4)),(0,0,0))
+        for j in xrange(5):
+            self.assertEqual(img.getpixel((0,j)),(0,0,0))
+            self.assertEqual(img.getpixel((19,j)),(0,0,0))
+        # Bars
+        for j in xrange(1,4):
+            for i in xrange(1,5):
+                self.assertEqual(img.getpixel((i,j)),(255,0,0))
+            for i in xrange(5,19):
+                self.assertEqual(img.getpixel((i,j)),(255,255,255))
@@ -160,6 +160,11 @@ class TestGeneral(unittest.TestCase):
                          ['rsync','-av','from','to'])
         self.assertEqual(general.rsync('from','user@remote.com:to').command_line,
                          ['rsync','-av','-e','ssh','from','user@remote.com:to'])
+        self.assertEqual(general.rsync('from','to',
+                                       chmod='ugo-w',
+                                       chown=':mygroup').command_line,
+                         ['rsync','-av','--chmod=ugo-w','--chown=:mygroup',
+                          'from','to'])
 
     def test_make(self):
         """Construct 'make' command lines
@@ -288,6 +288,50 @@ class TestAutoProcessGetAnalysisProjectsMethod(unittest.TestCase):
             matched_projects = [x for x in projects if x.name == p]
             self.assertEqual(len(matched_projects),1)
 
+    def test_with_project_dirs_sharing_prefix(self):
+        """AutoProcess.get_analysis_projects: project dirs sharing prefix
+        """
+        # Make an auto-process directory
+        mockdir = MockAnalysisDirFactory.bcl2fastq2(
+            '160621_K00879_0087_000000000-AGEW9',
+            'hiseq',
+            metadata={ "run_number": 87,
+                       "source": "local" },
+            top_dir=self.dirn)
+        mockdir.create()
+        # Add extra directories with names starting with
+        # the project names
+        os.mkdir(os.path.join(mockdir.dirn,"AB_old"))
+        os.mkdir(os.path.join(mockdir.dirn,"CDE_old"))
+        # List the projects
+        projects = AutoProcess(mockdir.dirn).get_analysis_projects()
+        expected = ('AB','CDE','undetermined')
+        self.assertEqual(len(projects),len(expected))
+        for p in projects:
+            self.assertTrue(isinstance(p,AnalysisProject))
+            self.assertTrue(p.name in expected)
+            self.assertEqual(p.dirn,os.path.join(mockdir.dirn,p.name))
+
+    def test_with_ambiguous_project_dirs(self):
+        """AutoProcess.get_analysis_projects: ambiguous project dirs
+        """
+        # Make an auto-process directory
+        mockdir = MockAnalysisDirFactory.bcl2fastq2(
+            '160621_K00879_0087_000000000-AGEW9',
+            'hiseq',
+            metadata={ "run_number": 87,
+                       "source": "local" },
+            top_dir=self.dirn)
+        mockdir.create(no_project_dirs=True)
+        # Make multiple directories starting with a project
+        # name but without an exact match
+        os.mkdir(os.path.join(mockdir.dirn,"AB_1"))
+        os.mkdir(os.path.join(mockdir.dirn,"AB_2"))
+        # Listing the projects should raise an exception
+        self.assertRaises(Exception,
+                          AutoProcess(mockdir.dirn).get_analysis_projects,
+                          "AB")
+
 class TestAutoProcessGetAnalysisProjectsFromDirsMethod(unittest.TestCase):
     """
     Tests for the 'get_analysis_projects_from_dirs' method
@@ -0,0 +1,142 @@
+#######################################################################
+# Tests for checksums.py module
+#######################################################################
+
+import unittest
+import os
+import tempfile
+import shutil
+from auto_process_ngs.checksums import *
+
+class TestChecksum(unittest.TestCase):
+    """Tests for the checksum function
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(suffix='.test_checksum')
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+    def test_checksum_md5(self):
+        """checksum: compute MD5 checksum for a file
+        """
+        filen = os.path.join(self.wd,"test.txt")
+        with open(filen,'w') as fp:
+            fp.write("This is a test file\n")
+        self.assertEqual(checksum(filen),
+                         "5dd39cab1c53c2c77cd352983f9641e1")
+        self.assertEqual(checksum(filen,blocksize=4),
+                         "5dd39cab1c53c2c77cd352983f9641e1")
+    def test_checksum_unsupported_algorithm(self):
+        """checksum: raise exception for unsupported algorithm
+        """
+        filen = os.path.join(self.wd,"test.txt")
+        with open(filen,'w') as fp:
+            fp.write("This is a test file\n")
+        self.assertRaises(Exception,checksum,filen,algorithm='sha999')
+
+class TestManifest(unittest.TestCase):
+    """Tests for generating, writing and verifying manifests
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp(suffix='.test_manifest')
+        self.src = os.path.join(self.wd,"src")
+        for d in ("PJB/fastqs","logs"):
+            os.makedirs(os.path.join(self.src,d))
+        for f,content in (("PJB/fastqs/PJB1_S1_R1_001.fastq.gz","R1\n"),
+                          ("PJB/fastqs/PJB1_S1_R2_001.fastq.gz","R2\n"),
+                          ("PJB/README.info","Run\n"),
+                          ("logs/make_fastqs.log","Log\n"),):
+            with open(os.path.join(self.src,f),'w') as fp:
+                fp.write(content)
+        os.symlink("PJB/README.info",os.path.join(self.src,"README"))
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+    def _make_copy(self):
+        # Make a copy of the source directory with a manifest
+        cpy = os.path.join(self.wd,"copy")
+        shutil.copytree(self.src,cpy,symlinks=True)
+        for d,dirs,files in os.walk(self.src):
+            for f in files:
+                shutil.copystat(os.path.join(d,f),
+                                os.path.join(cpy,
+                                             os.path.relpath(d,self.src),
+                                             f))
+        write_manifest(os.path.join(cpy,MANIFEST_FILE),
+                       generate_manifest(self.src))
+        return cpy
+    def test_list_files(self):
+        """list_files: list regular files under a directory
+        """
+        self.assertEqual(list_files(self.src),
+                         ["PJB/README.info",
+                          "PJB/fastqs/PJB1_S1_R1_001.fastq.gz",
+                          "PJB/fastqs/PJB1_S1_R2_001.fastq.gz",
+                          "logs/make_fastqs.log"])
+        self.assertEqual(list_files(self.src,
+                                    exclude=("logs/make_fastqs.log",)),
+                         ["PJB/README.info",
+                          "PJB/fastqs/PJB1_S1_R1_001.fastq.gz",
+                          "PJB/fastqs/PJB1_S1_R2_001.fastq.gz"])
+    def test_write_and_read_manifest(self):
+        """write_manifest/read_manifest: manifest entries round trip
+        """
+        entries = generate_manifest(self.src,nprocessors=2)
+        self.assertEqual([e[0] for e in entries],list_files(self.src))
+        self.assertEqual(entries[0][1],4)
+        self.assertEqual(entries[0][3],
+                         checksum(os.path.join(self.src,
+                                               "PJB/README.info")))
+        manifest_file = os.path.join(self.wd,"test.manifest")
+        write_manifest(manifest_file,entries)
+        self.assertEqual(read_manifest(manifest_file),('md5',entries))
+    def test_generate_manifest_reuses_previous_checksums(self):
+        """generate_manifest: reuse checksums for unchanged files
+        """
+        previous = [(relpath,size,mtime,"previous")
+                    for relpath,size,mtime,chksum in
+                    generate_manifest(self.src)]
+        # Change the size of one of the files
+        with open(os.path.join(self.src,"PJB/README.info"),'w') as fp:
+            fp.write("Runs\n")
+        entries = generate_manifest(self.src,previous=previous)
+        self.assertEqual(entries[0][3],
+                         checksum(os.path.join(self.src,
+                                               "PJB/README.info")))
+        self.assertEqual([e[3] for e in entries[1:]],["previous"]*3)
+    def test_generate_manifest_missing_file(self):
+        """generate_manifest: omit missing files
+        """
+        files = list_files(self.src)
+        os.remove(os.path.join(self.src,"logs/make_fastqs.log"))
+        entries = generate_manifest(self.src,files=files)
+        self.assertEqual([e[0] for e in entries],files[:-1])
+    def test_verify_manifest(self):
+        """verify_manifest: all files OK
+        """
+        cpy = self._make_copy()
+        for fast in (False,True):
+            results = sorted(verify_manifest(cpy,fast=fast,nprocessors=2))
+            self.assertEqual(results,
+                             [(f,CHECKSUM_OK) for f in list_files(self.src)])
+    def test_verify_manifest_detects_problems(self):
+        """verify_manifest: detect missing, modified and extra files
+        """
+        cpy = self._make_copy()
+        os.remove(os.path.join(cpy,"logs/make_fastqs.log"))
+        with open(os.path.join(cpy,"PJB/README.info"),'w') as fp:
+            fp.write("Runs\n")
+        r1 = os.path.join(cpy,"PJB/fastqs/PJB1_S1_R1_001.fastq.gz")
+        st = os.stat(r1)
+        with open(r1,'w') as fp:
+            fp.write("XX\n")
+        os.utime(r1,(st.st_atime,st.st_mtime))
+        with open(os.path.join(cpy,"PJB/extra.txt"),'w') as fp:
+            fp.write("Extra\n")
+        expected = [("PJB/README.info",SIZE_DIFFERS),
+                    ("PJB/extra.txt",NOT_IN_MANIFEST),
+                    ("PJB/fastqs/PJB1_S1_R1_001.fastq.gz",CHECKSUM_FAILED),
+                    ("PJB/fastqs/PJB1_S1_R2_001.fastq.gz",CHECKSUM_OK),
+                    ("logs/make_fastqs.log",MISSING)]
+        self.assertEqual(sorted(verify_manifest(cpy)),expected)
+        # Fast mode can't detect the modified contents
+        expected[2] = ("PJB/fastqs/PJB1_S1_R1_001.fastq.gz",CHECKSUM_OK)
+        self.assertEqual(sorted(verify_manifest(cpy,fast=True)),expected)
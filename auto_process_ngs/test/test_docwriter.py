@@ -6,6 +6,7 @@ import unittest
 import os
 import tempfile
 import shutil
+from cStringIO import StringIO
 from auto_process_ngs.docwriter import Document
 from auto_process_ngs.docwriter import Section
 from auto_process_ngs.docwriter import Table
@@ -99,6 +100,72 @@ class TestDocument(unittest.TestCase):
                              "<h1>Test Document</h1></body>\n"
                              "</html>\n")
 
+    def test_document_write_with_css_rules(self):
+        d = Document("Test Document")
+        d.add_css_rule("h1 { color: black; }")
+        d.add_css_rule("h2 { color: grey; }")
+        outfile = os.path.join(self.dirn,"test.html")
+        d.write(outfile)
+        with open(outfile,'r') as fp:
+            html = fp.read()
+            self.assertEqual(html,
+                             "<html>\n"
+                             "<head>\n"
+                             "<title>Test Document</title>\n"
+                             "<style type=\"text/css\">\n"
+                             "h1 { color: black; }\n"
+                             "h2 { color: grey; }</style>\n"
+                             "</head>\n"
+                             "<body>\n"
+                             "<h1>Test Document</h1></body>\n"
+                             "</html>\n")
+
+    def test_document_write_to_file_object(self):
+        d = Document("Test Document")
+        s = d.add_section("Section 1")
+        s.add("Some text")
+        outfile = os.path.join(self.dirn,"test.html")
+        d.write(outfile)
+        fp = StringIO()
+        d.write(fp=fp)
+        with open(outfile,'r') as fpp:
+            self.assertEqual(fp.getvalue(),fpp.read())
+
+    def test_document_iter_html(self):
+        d = Document("Test Document")
+        s = d.add_section("Section 1")
+        t = Table(('x','y'))
+        t.add_row(x="1",y="2")
+        t.add_row(x="3")
+        s.add("Some text",t)
+        lst = List()
+        lst.add_item("Item",Link("link","#target"))
+        s.add_subsection("Section 1.1").add(lst)
+        d.add_section()
+        d.add_section("Section 2")
+        chunks = list(d.iter_html())
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks),d.html())
+        self.assertEqual(d.html(),
+                         "<h1>Test Document</h1>\n"
+                         "<div id='Section_1'>\n"
+                         "<h2>Section 1</h2>\n"
+                         "<p>Some text</p>\n"
+                         "<table>\n"
+                         "<tr><th>x</th><th>y</th></tr>\n"
+                         "<tr><td>1</td><td>2</td></tr>\n"
+                         "<tr><td>3</td><td>&nbsp;</td></tr>\n"
+                         "</table>\n"
+                         "<div id='Section_11'>\n"
+                         "<h3>Section 1.1</h3>\n"
+                         "<ul><li>Item<a href='#target'>link</a></li></ul>\n"
+                         "</div>\n"
+                         "</div>\n"
+                         "\n"
+                         "<div id='Section_2'>\n"
+                         "<h2>Section 2</h2>\n"
+                         "</div>")
+
 class TestSection(unittest.TestCase):
     """
     Tests for the Section class
@@ -350,6 +417,16 @@ class TestTable(unittest.TestCase):
                          "<tr><td>Mobile</td><td>+44 1726254</td><td>+44 1745262</td></tr>\n"
                          "</table>")
 
+    def test_table_get_value(self):
+        t = Table(('Key','Value'))
+        t.add_row(Key="Name",Value="John Doe")
+        t.add_row(Key="D.O.B")
+        self.assertEqual(t.columns,['Key','Value'])
+        self.assertEqual(t.get_value(0,"Value"),"John Doe")
+        self.assertEqual(t.get_value(1,"Key"),"D.O.B")
+        self.assertEqual(t.get_value(1,"Value"),None)
+        self.assertRaises(KeyError,t.get_value,0,"Value2")
+
     def test_table_add_css_classes(self):
         t = Table(('Key','Value'))
         t.add_row(Key="Employee name",Value="John Doe")
@@ -525,6 +602,11 @@ class TestImg(unittest.TestCase):
         self.assertEqual(img.html(),
                          "<a href='http://awesome.pix.com/'>"
                          "<img src='picture.png' /></a>")
+
+    def test_img_with_lazy_loading(self):
+        img = Img('picture.png',lazy=True)
+        self.assertEqual(img.html(),
+                         "<img src='picture.png' loading='lazy' />")
         
 class TestLink(unittest.TestCase):
     """
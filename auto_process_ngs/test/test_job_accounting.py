@@ -0,0 +1,170 @@
+#######################################################################
+# Tests for job_accounting.py module
+#######################################################################
+
+import unittest
+import os
+import sys
+import json
+import tempfile
+import shutil
+from auto_process_ngs.job_accounting import *
+
+# Example output from 'qacct -j'
+QACCT_OUTPUT = """==============================================================
+qname        serial.q
+hostname     node001.example.com
+group        users
+owner        pjb
+jobname      fastqc
+jobnumber    123456
+start_time   Thu Mar  1 10:02:11 2018
+end_time     Thu Mar  1 10:04:41 2018
+failed       0
+exit_status  0
+ru_wallclock 150s
+ru_utime     120.120s
+ru_stime     5.880s
+ru_maxrss    2048
+ru_inblock   1024
+ru_oublock   2048
+cpu          126.000s
+mem          12.345GBs
+io           0.123
+iow          0.000s
+maxvmem      1.500G
+"""
+
+class MockJob(object):
+    """Minimal stand-in for a completed SchedulerJob
+    """
+    def __init__(self,job_number,job_name,job_id,exit_code,**accounting):
+        self.job_number = job_number
+        self.job_name = job_name
+        self.job_id = job_id
+        self.exit_code = exit_code
+        for field in ACCOUNTING_FIELDS:
+            setattr(self,field,accounting.get(field))
+
+class TestRunCommand(unittest.TestCase):
+    """Tests for the run_command function
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_run_command(self):
+        """run_command: records resource usage for command
+        """
+        stats_file = os.path.join(self.wd,"stats.json")
+        exit_code = run_command(['sh','-c','exit 0'],stats_file)
+        self.assertEqual(exit_code,0)
+        self.assertTrue(os.path.exists(stats_file))
+        stats = json.load(open(stats_file,'r'))
+        self.assertEqual(stats['exit_code'],0)
+        for field in ACCOUNTING_FIELDS:
+            self.assertTrue(field in stats)
+        self.assertTrue(stats['wall_time'] >= 0)
+        self.assertTrue(stats['max_rss'] > 0)
+
+    def test_run_command_returns_exit_code(self):
+        """run_command: returns exit code from command
+        """
+        stats_file = os.path.join(self.wd,"stats.json")
+        exit_code = run_command(['sh','-c','exit 3'],stats_file)
+        self.assertEqual(exit_code,3)
+        stats = json.load(open(stats_file,'r'))
+        self.assertEqual(stats['exit_code'],3)
+
+    def test_read_accounting_file(self):
+        """read_accounting_file: read resource usage from file
+        """
+        stats_file = os.path.join(self.wd,"stats.json")
+        run_command(['sh','-c','exit 0'],stats_file)
+        accounting = read_accounting_file(stats_file)
+        self.assertEqual(sorted(accounting.keys()),
+                         sorted(ACCOUNTING_FIELDS))
+
+    def test_read_missing_accounting_file(self):
+        """read_accounting_file: returns None for missing file
+        """
+        stats_file = os.path.join(self.wd,"missing.json")
+        self.assertEqual(read_accounting_file(stats_file),None)
+
+class TestParseQacct(unittest.TestCase):
+    """Tests for the parse_qacct function
+    """
+    def test_parse_qacct(self):
+        """parse_qacct: extract resource usage from qacct output
+        """
+        accounting = parse_qacct(QACCT_OUTPUT)
+        self.assertEqual(accounting['wall_time'],150.0)
+        self.assertEqual(accounting['cpu_time'],126.0)
+        self.assertEqual(accounting['max_rss'],2048*1024)
+        self.assertEqual(accounting['read_bytes'],1024*512)
+        self.assertEqual(accounting['write_bytes'],2048*512)
+
+    def test_parse_qacct_no_maxrss(self):
+        """parse_qacct: use maxvmem when ru_maxrss is zero
+        """
+        output = QACCT_OUTPUT.replace("ru_maxrss    2048",
+                                      "ru_maxrss    0")
+        accounting = parse_qacct(output)
+        self.assertEqual(accounting['max_rss'],int(1.5*1024*1024*1024))
+
+    def test_parse_qacct_no_output(self):
+        """parse_qacct: returns None for empty output
+        """
+        self.assertEqual(parse_qacct(""),None)
+
+class TestWriteAccounting(unittest.TestCase):
+    """Tests for writing and formatting resource usage
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        self.jobs = [MockJob(1,"fastqc","1234",0,
+                             wall_time=10.0,cpu_time=8.5,
+                             max_rss=1048576,read_bytes=2097152,
+                             write_bytes=0),
+                     MockJob(2,"fastq_screen","1235",1,
+                             wall_time=2.0)]
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def test_write_accounting_csv(self):
+        """write_accounting_csv: write resource usage as CSV
+        """
+        csv_file = os.path.join(self.wd,"accounting.csv")
+        write_accounting_csv(csv_file,self.jobs)
+        self.assertEqual(open(csv_file,'r').read(),
+                         "job_number,job_name,job_id,exit_code,"
+                         "wall_time,cpu_time,max_rss,read_bytes,"
+                         "write_bytes\n"
+                         "1,\"fastqc\",1234,0,10.0,8.5,1048576,2097152,0\n"
+                         "2,\"fastq_screen\",1235,1,2.0,,,,\n")
+
+    def test_write_accounting_json(self):
+        """write_accounting_json: write resource usage as JSON
+        """
+        json_file = os.path.join(self.wd,"accounting.json")
+        write_accounting_json(json_file,self.jobs)
+        data = json.load(open(json_file,'r'))
+        self.assertEqual(len(data),2)
+        self.assertEqual(data[0]['job_name'],"fastqc")
+        self.assertEqual(data[0]['max_rss'],1048576)
+        self.assertEqual(data[1]['exit_code'],1)
+        self.assertEqual(data[1]['cpu_time'],None)
+
+    def test_format_accounting_table(self):
+        """format_accounting_table: format resource usage as table
+        """
+        table = format_accounting_table(self.jobs).split('\n')
+        self.assertEqual(len(table),3)
+        self.assertEqual(table[1].split(),
+                         ['1','fastqc','0','10.0','8.5','1.0','2.0','0.0'])
+        self.assertEqual(table[2].split(),
+                         ['2','fastq_screen','1','2.0',
+                          'n/a','n/a','n/a','n/a'])
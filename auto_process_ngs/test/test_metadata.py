@@ -142,6 +142,77 @@ class TestMetadataDict(unittest.TestCase):
         self.assertEqual(metadata.valediction,'goodbye')
         self.assertEqual(metadata.chit_chat,'stuff')
 
+    def test_save_unchanged_data(self):
+        """Check that saving unchanged data doesn't rewrite file
+        """
+        self.metadata_file = tempfile.mkstemp()[1]
+        metadata = MetadataDict(attributes={'salutation':'Salutation',
+                                            'valediction': 'Valediction'})
+        metadata['salutation'] = "hello"
+        self.assertTrue(metadata.modified)
+        metadata.save(self.metadata_file)
+        self.assertFalse(metadata.modified)
+        inode = os.stat(self.metadata_file).st_ino
+        # Reload and save again
+        metadata2 = MetadataDict(attributes={'salutation':'Salutation',
+                                             'valediction': 'Valediction'},
+                                 filen=self.metadata_file)
+        self.assertFalse(metadata2.modified)
+        metadata2['salutation'] = "hello"
+        self.assertFalse(metadata2.modified)
+        metadata2.save()
+        self.assertEqual(os.stat(self.metadata_file).st_ino,inode)
+        # Update a value and save
+        metadata2['valediction'] = "goodbye"
+        self.assertTrue(metadata2.modified)
+        metadata2.save()
+        self.assertNotEqual(os.stat(self.metadata_file).st_ino,inode)
+        self.assertEqual(open(self.metadata_file,'rU').read(),
+                         "Salutation\thello\nValediction\tgoodbye\n")
+
+    def test_save_rewrites_nonstandard_file(self):
+        """Check that saving data loaded from nonstandard file rewrites it
+        """
+        self.metadata_file = tempfile.mkstemp()[1]
+        with open(self.metadata_file,'w') as fp:
+            fp.write("Valediction\tgoodbye\nSalutation\tY\n")
+        metadata = MetadataDict(attributes={'salutation':'Salutation',
+                                            'valediction': 'Valediction'},
+                                filen=self.metadata_file)
+        self.assertTrue(metadata.modified)
+        metadata.save()
+        self.assertEqual(open(self.metadata_file,'rU').read(),
+                         "Salutation\tY\nValediction\tgoodbye\n")
+
+    def test_save_keeps_file_permissions(self):
+        """Check that saving data keeps permissions on existing file
+        """
+        self.metadata_file = tempfile.mkstemp()[1]
+        os.chmod(self.metadata_file,0640)
+        metadata = MetadataDict(attributes={'salutation':'Salutation',
+                                            'valediction': 'Valediction'})
+        metadata['salutation'] = "hello"
+        metadata.save(self.metadata_file)
+        self.assertEqual(os.stat(self.metadata_file).st_mode & 0777,0640)
+
+    def test_save_keeps_file_group(self):
+        """Check that saving data keeps group of existing file
+        """
+        self.metadata_file = tempfile.mkstemp()[1]
+        gid = os.stat(self.metadata_file).st_gid
+        if os.getuid() == 0:
+            other_gids = [gid+1]
+        else:
+            other_gids = [g for g in os.getgroups() if g != gid]
+        if not other_gids:
+            raise unittest.SkipTest("No other group available")
+        os.chown(self.metadata_file,-1,other_gids[0])
+        metadata = MetadataDict(attributes={'salutation':'Salutation',
+                                            'valediction': 'Valediction'})
+        metadata['salutation'] = "hello"
+        metadata.save(self.metadata_file)
+        self.assertEqual(os.stat(self.metadata_file).st_gid,other_gids[0])
+
 class TestAnalysisDirParameters(unittest.TestCase):
     """Tests for the AnalysisDirParameters class
     """
@@ -346,6 +417,50 @@ class TestProjectMetadataFile(unittest.TestCase):
         self.assertEqual(project[5],"Yeast")
         self.assertEqual(project[6],"Marley")
 
+    def test_update_multiple_projects(self):
+        """Update the data for multiple projects
+        """
+        # Make new 'file' and add project
+        metadata = ProjectMetadataFile()
+        metadata.add_project('Charlie',['C1','C2'],
+                             user="Charlie P",
+                             library_type="RNA-seq",
+                             organism="Yeast",
+                             PI="Marley")
+        # Update existing project and add a new one
+        metadata.update_projects([('Charlie',
+                                   dict(sample_names=['C01','C02'])),
+                                  ('Farley',
+                                   dict(sample_names=['F3','F4'],
+                                        user="Farley G"))])
+        self.assertEqual(len(metadata),2)
+        project = metadata.lookup("Project","Charlie")[0]
+        self.assertEqual(project[1],"C01,C02")
+        self.assertEqual(project[2],"Charlie P")
+        project = metadata.lookup("Project","Farley")[0]
+        self.assertEqual(project[1],"F3,F4")
+        self.assertEqual(project[2],"Farley G")
+        self.assertEqual(project[3],".")
+
+    def test_get_project_data(self):
+        """Fetch the data for a project
+        """
+        contents = "#Project\tSamples\tUser\tLibrary\tSC_Platform\tOrganism\tPI\tComments\nCharlie\tC1-2\tCharlie P\tRNA-seq\t.\tYeast\tMarley\t.\nFarley\tF3-4\tFarley G\tChIP-seq\t.\tMouse\tHarley\tSqueak!\n"
+        open(self.metadata_file,'w').write(contents)
+        metadata = ProjectMetadataFile(self.metadata_file)
+        self.assertTrue("Farley" in metadata)
+        project = metadata.project("Farley")
+        self.assertEqual(project.project_name,"Farley")
+        self.assertEqual(project.sample_names,"F3-4")
+        self.assertEqual(project.user,"Farley G")
+        self.assertEqual(project.library_type,"ChIP-seq")
+        self.assertEqual(project.sc_platform,None)
+        self.assertEqual(project.organism,"Mouse")
+        self.assertEqual(project.PI,"Harley")
+        self.assertEqual(project.comments,"Squeak!")
+        self.assertRaises(Exception,metadata.project,"Marley")
+        self.assertEqual(metadata.lookup("Project","Marley"),[])
+
 class TestAnalysisProjectInfo(unittest.TestCase):
     """Tests for the AnalysisDirMetadata class
     """
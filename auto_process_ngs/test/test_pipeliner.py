@@ -15,7 +15,12 @@ from auto_process_ngs.pipeliner import Pipeline
 from auto_process_ngs.pipeliner import PipelineTask
 from auto_process_ngs.pipeliner import PipelineCommand
 from auto_process_ngs.pipeliner import PipelineCommandWrapper
+from auto_process_ngs.pipeliner import PipelineMapTask
+from auto_process_ngs.pipeliner import PipelineCommandChunk
 from auto_process_ngs.pipeliner import FileCollector
+from auto_process_ngs.pipeliner import OutputStream
+from auto_process_ngs.pipeliner import critical_path
+from auto_process_ngs.pipeliner import load_task_durations
 
 # Unit tests
 
@@ -212,6 +217,150 @@ class TestPipeline(unittest.TestCase):
         self.assertEqual(task2.exit_code,1)
         self.assertEqual(task3.output(),[])
 
+    def test_pipeline_records_task_durations(self):
+        """
+        Pipeline: check task durations are recorded in the log dir
+        """
+        # Define a reusable task
+        # Appends item to a list
+        class Append(PipelineTask):
+            def init(self,l,s):
+                self.l = list()
+            def setup(self):
+                for item in self.args.l:
+                    self.l.append(item)
+                self.l.append(self.args.s)
+            def output(self):
+                return self.l
+        # Build the pipeline
+        ppl = Pipeline(name="Record durations")
+        task1 = Append("Append 1",(),"item1")
+        task2 = Append("Append 2",task1.output(),"item2")
+        task3 = Append("Append 3",task1.output(),"item3")
+        ppl.add_task(task2,requires=(task1,))
+        ppl.add_task(task3,requires=(task1,))
+        # Run the pipeline
+        exit_status = ppl.run(working_dir=self.working_dir,
+                              log_dir="logs",
+                              poll_interval=0.5)
+        # Check the outputs
+        self.assertEqual(exit_status,0)
+        self.assertEqual(task2.output(),["item1","item2"])
+        self.assertEqual(task3.output(),["item1","item3"])
+        # Check the durations were recorded
+        durations_file = os.path.join(self.working_dir,
+                                      "logs",
+                                      "record_durations.durations")
+        self.assertTrue(os.path.exists(durations_file))
+        durations = load_task_durations(durations_file)
+        self.assertEqual(sorted(durations.keys()),
+                         ["append_1","append_2","append_3"])
+        for name in durations:
+            self.assertTrue(durations[name] >= 0.0)
+
+    def test_pipeline_with_streamed_outputs(self):
+        """
+        Pipeline: run pipeline with outputs streamed between tasks
+        """
+        # Define a task which makes files
+        class MakeFiles(PipelineTask):
+            def init(self,filenames):
+                pass
+            def setup(self):
+                for f in self.args.filenames:
+                    self.add_cmd(
+                        PipelineCommandWrapper(
+                            "Make file",
+                            "echo",f,">",f),
+                        stream_item=f)
+            def output(self):
+                return self.stream
+        # Define a task which copies files
+        class CopyFiles(PipelineTask):
+            def init(self,files):
+                self.setup_invocations = 0
+            def setup(self):
+                self.setup_invocations += 1
+            def setup_item(self,f):
+                self.add_cmd(
+                    PipelineCommandWrapper(
+                        "Copy file",
+                        "cp",f,"%s.copy" % f),
+                    stream_item="%s.copy" % f)
+            def output(self):
+                return self.stream
+        # Build the pipeline
+        ppl = Pipeline()
+        task1 = MakeFiles("Make files",("file1","file2","file3"))
+        task2 = CopyFiles("Copy files",task1.output())
+        task3 = CopyFiles("Copy the copies",task2.output())
+        ppl.add_task(task2,requires=(task1,))
+        ppl.add_task(task3,requires=(task2,))
+        # Run the pipeline
+        exit_status = ppl.run(working_dir=self.working_dir,
+                              max_jobs=2,
+                              poll_interval=0.5)
+        # Check the outputs
+        self.assertEqual(exit_status,0)
+        self.assertEqual(task2.setup_invocations,1)
+        self.assertEqual(task3.setup_invocations,1)
+        self.assertTrue(task1.output().closed)
+        self.assertTrue(task2.output().closed)
+        self.assertTrue(task3.output().closed)
+        self.assertEqual(sorted(list(task3.output())),
+                         ["file1.copy.copy",
+                          "file2.copy.copy",
+                          "file3.copy.copy"])
+        for f in ("file1.copy.copy",
+                  "file2.copy.copy",
+                  "file3.copy.copy"):
+            self.assertTrue(os.path.exists(
+                os.path.join(self.working_dir,f)))
+
+    def test_pipeline_with_map_task(self):
+        """
+        Pipeline: run pipeline with map task on streamed outputs
+        """
+        # Define a task which makes files
+        class MakeFiles(PipelineTask):
+            def init(self,filenames):
+                pass
+            def setup(self):
+                for f in self.args.filenames:
+                    self.add_cmd(
+                        PipelineCommandWrapper(
+                            "Make file",
+                            "echo",f,">",f),
+                        stream_item=f)
+            def output(self):
+                return self.stream
+        # Build the pipeline
+        ppl = Pipeline()
+        filenames = ("file1","file2","file3","file4","file5")
+        task1 = MakeFiles("Make files",filenames)
+        task2 = PipelineMapTask(
+            "Copy files",task1.output(),
+            lambda f: PipelineCommandWrapper("Copy file",
+                                             "cp",f,"%s.copy" % f),
+            output=lambda f: "%s.copy" % f,
+            chunk_size=2,
+            max_concurrent=1)
+        ppl.add_task(task2,requires=(task1,))
+        # Run the pipeline
+        exit_status = ppl.run(working_dir=self.working_dir,
+                              max_jobs=2,
+                              poll_interval=0.5)
+        # Check the outputs
+        self.assertEqual(exit_status,0)
+        self.assertTrue(task2.stream.closed)
+        self.assertEqual(sorted(list(task2.stream)),
+                         ["%s.copy" % f for f in filenames])
+        self.assertEqual(sorted(task2.output()),
+                         ["%s.copy" % f for f in filenames])
+        for f in filenames:
+            self.assertTrue(os.path.exists(
+                os.path.join(self.working_dir,"%s.copy" % f)))
+
 class TestPipelineTask(unittest.TestCase):
 
     def setUp(self):
@@ -483,6 +632,186 @@ class TestPipelineTask(unittest.TestCase):
         self.assertEqual(task.output(),None)
         self.assertEqual(task.stdout,"")
 
+class TestPipelineMapTask(unittest.TestCase):
+
+    def setUp(self):
+        # Set up a scheduler
+        self.sched = SimpleScheduler(poll_interval=0.5)
+        self.sched.start()
+        # Make a temporary working dir
+        self.working_dir = tempfile.mkdtemp(
+            suffix='TestPipelineMapTask')
+
+    def tearDown(self):
+        # Stop the scheduler
+        if self.sched is not None:
+            self.sched.stop()
+        # Remove temp dir
+        if os.path.exists(self.working_dir):
+            shutil.rmtree(self.working_dir)
+
+    def test_pipelinemaptask(self):
+        """
+        PipelineMapTask: run command for each item in a list
+        """
+        # Make a task instance
+        items = ["a","b","c","d","e"]
+        task = PipelineMapTask(
+            "Echo items",items,
+            lambda s: PipelineCommandWrapper("Echo item","echo",s),
+            output=lambda s: s.upper())
+        # Check initial state
+        self.assertFalse(task.completed)
+        self.assertEqual(task.exit_code,None)
+        self.assertEqual(task.output(),[])
+        # Run the task
+        task.run(sched=self.sched,
+                 working_dir=self.working_dir,
+                 async=False)
+        # Check final state
+        self.assertTrue(task.completed)
+        self.assertEqual(task.exit_code,0)
+        self.assertEqual(task.output(),["A","B","C","D","E"])
+        self.assertEqual(sorted(list(task.stream)),
+                         ["A","B","C","D","E"])
+        self.assertEqual(len(task._jobs),5)
+
+    def test_pipelinemaptask_max_concurrent(self):
+        """
+        PipelineMapTask: limit the number of concurrent jobs
+        """
+        # Script which logs an item after a delay
+        script = os.path.join(self.working_dir,"log_item.sh")
+        with open(script,'w') as fp:
+            fp.write("sleep $2\necho $1 >>$3\n")
+        # Make a task instance where the first item is slow
+        items = ["a","b","c","d"]
+        log_file = os.path.join(self.working_dir,"items.log")
+        task = PipelineMapTask(
+            "Log items",items,
+            lambda s: PipelineCommandWrapper(
+                "Log item","sh",script,s,
+                (6 if s == "a" else 0),log_file),
+            output=lambda s: s.upper(),
+            max_concurrent=2)
+        # Run the task
+        task.run(sched=self.sched,
+                 working_dir=self.working_dir,
+                 async=False)
+        # Check final state
+        self.assertTrue(task.completed)
+        self.assertEqual(task.exit_code,0)
+        self.assertEqual(task.output(),["A","B","C","D"])
+        self.assertEqual(len(task._jobs),4)
+        # Remaining items weren't held up by the slow item
+        with open(log_file,'r') as fp:
+            self.assertEqual(fp.read().split(),["b","c","d","a"])
+
+    def test_pipelinemaptask_chunks(self):
+        """
+        PipelineMapTask: run commands for items in chunks
+        """
+        # Make a task instance
+        items = ["a","b","c","d","e"]
+        task = PipelineMapTask(
+            "Echo items",items,
+            lambda s: PipelineCommandWrapper("Echo item","echo",s),
+            output=lambda s: s.upper(),
+            chunk_size=2,
+            max_concurrent=2)
+        # Run the task
+        task.run(sched=self.sched,
+                 working_dir=self.working_dir,
+                 async=False)
+        # Check final state
+        self.assertTrue(task.completed)
+        self.assertEqual(task.exit_code,0)
+        self.assertEqual(task.output(),["A","B","C","D","E"])
+        self.assertEqual(len(task._jobs),3)
+        # Check the stdout has an entry for each item
+        stdout = task.stdout.split("\n")
+        self.assertEqual(len([line for line in stdout
+                              if line == "#### EXIT_CODE 0"]),5)
+        self.assertEqual(sorted([line for line in stdout
+                                 if not line.startswith("#### ")
+                                 and line]),
+                         ["a","b","c","d","e"])
+
+    def test_pipelinemaptask_no_commands(self):
+        """
+        PipelineMapTask: items which don't need a command
+        """
+        # Make a task instance
+        items = ["a","b","c"]
+        task = PipelineMapTask(
+            "Echo items",items,
+            lambda s: None,
+            output=lambda s: s.upper())
+        # Run the task
+        task.run(sched=self.sched,
+                 working_dir=self.working_dir,
+                 async=False)
+        # Check final state
+        self.assertTrue(task.completed)
+        self.assertEqual(task.exit_code,0)
+        self.assertEqual(task.output(),["A","B","C"])
+        self.assertEqual(len(task._jobs),0)
+
+    def test_pipelinemaptask_with_failing_command(self):
+        """
+        PipelineMapTask: handle failing command within a chunk
+        """
+        # Make a task instance
+        items = ["a","b","c"]
+        task = PipelineMapTask(
+            "List items",items,
+            lambda s: PipelineCommandWrapper("List item","ls",s),
+            output=lambda s: s,
+            chunk_size=3)
+        # Run the task
+        task.run(sched=self.sched,
+                 working_dir=self.working_dir,
+                 async=False)
+        # Check final state
+        self.assertTrue(task.completed)
+        self.assertNotEqual(task.exit_code,0)
+        self.assertEqual(task.output(),[])
+        self.assertEqual(list(task.stream),[])
+
+    def test_pipelinemaptask_subclass(self):
+        """
+        PipelineMapTask: subclass with map methods
+        """
+        # Define a map task
+        class TouchFiles(PipelineMapTask):
+            def init(self,names,out_dir,chunk_size=1):
+                pass
+            def setup(self):
+                os.mkdir(self.args.out_dir)
+            def map_items(self):
+                return self.args.names
+            def map_command(self,name):
+                return PipelineCommandWrapper(
+                    "Touch file","touch",self.map_output(name))
+            def map_output(self,name):
+                return os.path.join(self.args.out_dir,name)
+        # Make a task instance
+        out_dir = os.path.join(self.working_dir,"out")
+        task = TouchFiles("Touch files",["x","y","z"],out_dir,
+                          chunk_size=2)
+        # Run the task
+        task.run(sched=self.sched,
+                 working_dir=self.working_dir,
+                 async=False)
+        # Check final state
+        self.assertTrue(task.completed)
+        self.assertEqual(task.exit_code,0)
+        self.assertEqual(task.output(),
+                         [os.path.join(out_dir,name)
+                          for name in ("x","y","z")])
+        for f in task.output():
+            self.assertTrue(os.path.exists(f))
+
 class TestPipelineCommand(unittest.TestCase):
 
     def setUp(self):
@@ -540,6 +869,97 @@ class TestPipelineCommandWrapper(unittest.TestCase):
         cmd.add_args("there")
         self.assertEqual(str(cmd.cmd()),"echo hello there")
 
+class TestPipelineCommandChunk(unittest.TestCase):
+
+    def setUp(self):
+        # Make a temporary working dir
+        self.working_dir = tempfile.mkdtemp(
+            suffix='TestPipelineCommandChunk')
+
+    def tearDown(self):
+        # Remove temp dir
+        if os.path.exists(self.working_dir):
+            shutil.rmtree(self.working_dir)
+
+    def test_pipelinecommandchunk(self):
+        # Make a chunk of commands
+        chunk = PipelineCommandChunk(
+            PipelineCommandWrapper("Echo text","echo","hello"),
+            PipelineCommandWrapper("Echo text","echo","there"))
+        # Check name and command
+        self.assertEqual(chunk.name(),"echo_text__chunk_of_2_")
+        self.assertEqual(str(chunk.cmd()),"echo hello ; echo there")
+        # Check wrapper script file
+        script_file = chunk.make_wrapper_script(
+            scripts_dir=self.working_dir)
+        self.assertTrue(os.path.isfile(script_file))
+        self.assertEqual(os.path.dirname(script_file),
+                         self.working_dir)
+        self.assertEqual(open(script_file,'r').read(),
+                         "#!/bin/bash\n"
+                         "nfailed=0\n"
+                         "echo \"#### COMMAND Echo text\"\n"
+                         "echo \"#### HOSTNAME $HOSTNAME\"\n"
+                         "echo \"#### USER $USER\"\n"
+                         "echo \"#### START $(date)\"\n"
+                         "echo hello\n"
+                         "exit_code=$?\n"
+                         "echo \"#### END $(date)\"\n"
+                         "echo \"#### EXIT_CODE $exit_code\"\n"
+                         "if [ $exit_code -ne 0 ] ; then\n"
+                         "  nfailed=$((nfailed+1))\n"
+                         "fi\n"
+                         "echo \"#### COMMAND Echo text\"\n"
+                         "echo \"#### HOSTNAME $HOSTNAME\"\n"
+                         "echo \"#### USER $USER\"\n"
+                         "echo \"#### START $(date)\"\n"
+                         "echo there\n"
+                         "exit_code=$?\n"
+                         "echo \"#### END $(date)\"\n"
+                         "echo \"#### EXIT_CODE $exit_code\"\n"
+                         "if [ $exit_code -ne 0 ] ; then\n"
+                         "  nfailed=$((nfailed+1))\n"
+                         "fi\n"
+                         "if [ $nfailed -ne 0 ] ; then\n"
+                         "  exit 1\n"
+                         "fi\n"
+                         "exit 0")
+
+class TestOutputStream(unittest.TestCase):
+
+    def test_outputstream(self):
+        """
+        OutputStream: add items, subscribe and close
+        """
+        # Record notifications from the stream
+        items = []
+        closed = []
+        # Make a stream and add an item
+        stream = OutputStream()
+        self.assertFalse(stream.closed)
+        stream.add("item1")
+        self.assertEqual(list(stream),["item1"])
+        # Subscribe and check existing item is notified
+        stream.subscribe(lambda x: items.append(x),
+                         lambda s: closed.append(s))
+        self.assertEqual(items,["item1"])
+        self.assertEqual(closed,[])
+        # Add another item
+        stream.add("item2")
+        self.assertEqual(len(stream),2)
+        self.assertEqual(list(stream),["item1","item2"])
+        self.assertEqual(items,["item1","item2"])
+        # Close the stream
+        stream.close()
+        self.assertTrue(stream.closed)
+        self.assertEqual(closed,[stream])
+        self.assertRaises(Exception,stream.add,"item3")
+        # Subscribe to closed stream
+        stream.subscribe(lambda x: items.append(x),
+                         lambda s: closed.append(s))
+        self.assertEqual(items,["item1","item2","item1","item2"])
+        self.assertEqual(closed,[stream,stream])
+
 class TestFileCollector(unittest.TestCase):
 
     def setUp(self):
@@ -575,3 +995,44 @@ class TestFileCollector(unittest.TestCase):
         self.assertEqual(list(txt_files),
                          [os.path.join(self.working_dir,"test1.txt")])
 
+
+class TestCriticalPath(unittest.TestCase):
+
+    def test_critical_path(self):
+        """
+        critical_path: find critical path and slack for tasks
+        """
+        # Diamond-shaped set of tasks with a dangling task
+        #   a -> b -> d
+        #   a -> c -> d
+        #   e
+        tasks = ['a','b','c','d','e']
+        requires = { 'b': ['a'],
+                     'c': ['a'],
+                     'd': ['b','c'], }
+        durations = { 'a': 1.0,
+                      'b': 5.0,
+                      'c': 2.0,
+                      'd': 1.0,
+                      'e': 3.0 }
+        graph = critical_path(tasks,requires,durations)
+        self.assertEqual(graph.path,['a','b','d'])
+        self.assertEqual(graph.length,7.0)
+        self.assertEqual(graph.remaining,{ 'a': 7.0,
+                                           'b': 6.0,
+                                           'c': 3.0,
+                                           'd': 1.0,
+                                           'e': 3.0 })
+        self.assertEqual(graph.slack,{ 'a': 0.0,
+                                       'b': 0.0,
+                                       'c': 3.0,
+                                       'd': 0.0,
+                                       'e': 4.0 })
+
+    def test_critical_path_no_tasks(self):
+        """
+        critical_path: handle empty set of tasks
+        """
+        graph = critical_path([],{},{})
+        self.assertEqual(graph.path,[])
+        self.assertEqual(graph.length,0.0)
@@ -30,6 +30,8 @@ class TestSettings(unittest.TestCase):
         self.assertEqual(s.platform.nextseq.no_lane_splitting,True)
         # Fastq_stats
         self.assertEqual(s.fastq_stats.nprocessors,1)
+        # QC
+        self.assertEqual(s.qc.incremental_reports,True)
         # Job-specific runners
         self.assertTrue(isinstance(s.runners.bcl2fastq,SimpleJobRunner))
         self.assertTrue(isinstance(s.runners.qc,SimpleJobRunner))
@@ -39,9 +41,12 @@ class TestSettings(unittest.TestCase):
         self.assertEqual(s.archive.log,None)
         self.assertEqual(s.archive.group,None)
         self.assertEqual(s.archive.chmod,None)
+        self.assertEqual(s.archive.checksum,'md5')
+        self.assertEqual(s.archive.nprocessors,1)
         # QC reporting
         self.assertEqual(s.qc_web_server.dirn,None)
         self.assertEqual(s.qc_web_server.url,None)
+        self.assertEqual(s.qc_web_server.max_transfers,4)
     def test_get_item(self):
         sample_settings_file = os.path.join(get_config_dir(),
                                             'settings.ini.sample')
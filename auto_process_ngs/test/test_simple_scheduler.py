@@ -12,6 +12,7 @@ import shutil
 from bcftbx.JobRunner import BaseJobRunner
 from bcftbx.JobRunner import SimpleJobRunner
 from auto_process_ngs.simple_scheduler import *
+import auto_process_ngs.simple_scheduler as simple_scheduler
 
 class MockJobRunner(BaseJobRunner):
     """Mock job runner implementation of BaseJobRunner
@@ -880,6 +881,141 @@ class TestSchedulerJob(unittest.TestCase):
         self.assertFalse(job.is_running)
         self.assertTrue(job.completed)
 
+    def test_scheduler_job_accounting(self):
+        """Get resource usage for SchedulerJob run with SimpleJobRunner
+        """
+        self.log_dir = tempfile.mkdtemp()
+        job = SchedulerJob(
+            SimpleJobRunner(log_dir=self.log_dir),
+            ['sh','-c','echo hello; exit 0'])
+        self.assertEqual(job.accounting,None)
+        self.assertEqual(job.wall_time,None)
+        job.start()
+        job.wait(poll_interval=0.01,timeout=10)
+        self.assertTrue(job.completed)
+        self.assertEqual(job.exit_code,0)
+        self.assertEqual(open(job.log,'r').read(),"hello\n")
+        self.assertTrue(job.wall_time >= 0)
+        self.assertTrue(job.cpu_time >= 0)
+        self.assertTrue(job.max_rss > 0)
+        self.assertNotEqual(job.read_bytes,None)
+        self.assertNotEqual(job.write_bytes,None)
+
+    def test_scheduler_job_accounting_exit_code(self):
+        """Exit code is preserved for SchedulerJob with accounting
+        """
+        self.log_dir = tempfile.mkdtemp()
+        job = SchedulerJob(
+            SimpleJobRunner(log_dir=self.log_dir),
+            ['sh','-c','exit 2'])
+        job.start()
+        job.wait(poll_interval=0.01,timeout=10)
+        self.assertEqual(job.exit_code,2)
+        self.assertNotEqual(job.cpu_time,None)
+
+    def test_scheduler_writes_accounting(self):
+        """SimpleScheduler writes job accounting files when stopped
+        """
+        self.log_dir = tempfile.mkdtemp()
+        fp = cStringIO.StringIO()
+        sched = SimpleScheduler(
+            runner=SimpleJobRunner(log_dir=self.log_dir),
+            reporter=SchedulerReporter(
+                fp=fp,
+                accounting_summary="%(n_jobs)d jobs\n%(table)s"),
+            poll_interval=0.01,
+            accounting_dir=self.log_dir)
+        sched.start()
+        job1 = sched.submit(['sh','-c','exit 0'],name='job1')
+        job2 = sched.submit(['sh','-c','exit 1'],name='job2')
+        job1.wait(poll_interval=0.01,timeout=10)
+        job2.wait(poll_interval=0.01,timeout=10)
+        sched.stop()
+        self.assertTrue(fp.getvalue().startswith("2 jobs\n"))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.log_dir,"job_accounting.csv")))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.log_dir,"job_accounting.json")))
+        csv = open(os.path.join(self.log_dir,
+                                "job_accounting.csv")).read().split('\n')
+        self.assertEqual(len(csv),4) # header + 2 jobs + trailing newline
+        self.assertTrue(csv[1].startswith('1,"job1",'))
+        self.assertTrue(csv[2].startswith('2,"job2",'))
+
+    def test_scheduler_fetches_accounting_in_background(self):
+        """SimpleScheduler fetches job accounting in the background
+        """
+        class MockGEJob(object):
+            job_number = 1
+            job_id = "1"
+            fetches_accounting = True
+            def __init__(self):
+                self.attempts = 0
+            def fetch_accounting(self):
+                # Fail on the first attempt
+                self.attempts += 1
+                return (self.attempts > 1)
+        qacct_delay = simple_scheduler.QACCT_DELAY
+        simple_scheduler.QACCT_DELAY = 0.01
+        try:
+            sched = SimpleScheduler()
+            job = MockGEJob()
+            sched.fetch_accounting(job)
+            for i in range(500):
+                if job.attempts > 1:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(job.attempts,2)
+        finally:
+            simple_scheduler.QACCT_DELAY = qacct_delay
+
+    def test_scheduler_waits_for_accounting_when_stopped(self):
+        """SimpleScheduler waits for background job accounting when stopped
+        """
+        self.log_dir = tempfile.mkdtemp()
+        # Mock 'qacct' which only returns the resource usage
+        # (after a delay) once the scheduler is being stopped
+        stopping = []
+        def mock_qacct(job_id):
+            if not stopping:
+                return None
+            time.sleep(0.5)
+            return dict(wall_time=10.0,
+                        cpu_time=123.0,
+                        max_rss=None,
+                        read_bytes=None,
+                        write_bytes=None)
+        qacct = simple_scheduler.job_accounting.qacct
+        qacct_delay = simple_scheduler.QACCT_DELAY
+        qacct_attempts = simple_scheduler.QACCT_ATTEMPTS
+        fetches_accounting = SchedulerJob.fetches_accounting
+        simple_scheduler.job_accounting.qacct = mock_qacct
+        simple_scheduler.QACCT_DELAY = 0.01
+        simple_scheduler.QACCT_ATTEMPTS = 1000
+        SchedulerJob.fetches_accounting = property(lambda self: True)
+        try:
+            sched = SimpleScheduler(
+                runner=SimpleJobRunner(log_dir=self.log_dir),
+                poll_interval=0.01,
+                accounting_dir=self.log_dir)
+            sched.start()
+            job = sched.submit(['sh','-c','exit 0'],name='job1')
+            sched.wait()
+            stopping.append(True)
+            sched.stop()
+            self.assertEqual(job.cpu_time,123.0)
+            csv = open(os.path.join(self.log_dir,
+                                    "job_accounting.csv")).read()
+            self.assertTrue("123" in csv)
+            json = open(os.path.join(self.log_dir,
+                                     "job_accounting.json")).read()
+            self.assertTrue("123" in json)
+        finally:
+            simple_scheduler.job_accounting.qacct = qacct
+            simple_scheduler.QACCT_DELAY = qacct_delay
+            simple_scheduler.QACCT_ATTEMPTS = qacct_attempts
+            SchedulerJob.fetches_accounting = fetches_accounting
+
 class TestSchedulerReporter(unittest.TestCase):
     """Unit tests for SchedulerReporter class
 
@@ -6,10 +6,12 @@ import unittest
 import tempfile
 import shutil
 import zipfile
+import time
 from bcftbx.JobRunner import SimpleJobRunner,GEJobRunner
 from bcftbx.utils import find_program
 from auto_process_ngs.mock import MockAnalysisDirFactory
 from auto_process_ngs.mock import MockAnalysisProject
+from auto_process_ngs.mockqc import MockQCOutputs
 from auto_process_ngs.applications import Command
 from auto_process_ngs.utils import *
 
@@ -288,6 +290,147 @@ class TestAnalysisFastq(unittest.TestCase):
         self.assertFalse(fq.is_index_read)
         self.assertEqual(str(fq),'NH1_ChIP-seq_Gli1_ACAGTG_L003_R2_001')
 
+    def test_modifying_instance_doesnt_affect_other_instances(self):
+        """Modifying an instance doesn't affect others for the same name
+        """
+        fq1 = AnalysisFastq('/data/PJB/PJB1_S1_L001_R1_001.fastq.gz')
+        fq1.read_number = 2
+        self.assertEqual(str(fq1),'PJB1_S1_L001_R2_001')
+        fq2 = AnalysisFastq('/data/PJB/PJB1_S1_L001_R1_001.fastq.gz')
+        self.assertEqual(fq2.read_number,1)
+        self.assertEqual(str(fq2),'PJB1_S1_L001_R1_001')
+
+class TestParseFastqName(unittest.TestCase):
+    """Tests for the parse_fastq_name function
+
+    """
+    def setUp(self):
+        clear_fastq_name_cache()
+
+    def tearDown(self):
+        clear_fastq_name_cache()
+
+    def test_parse_fastq_name(self):
+        """parse_fastq_name: extract components of Fastq name
+        """
+        name = parse_fastq_name('/data/PJB/PJB1_S1_L001_I1_001.fastq.gz')
+        self.assertEqual(name.basename,'PJB1_S1_L001_I1_001')
+        self.assertEqual(name.extension,'.fastq.gz')
+        self.assertEqual(name.sample_name,'PJB1')
+        self.assertEqual(name.sample_number,1)
+        self.assertEqual(name.barcode_sequence,None)
+        self.assertEqual(name.lane_number,1)
+        self.assertEqual(name.read_number,1)
+        self.assertEqual(name.set_number,1)
+        self.assertTrue(name.is_index_read)
+        self.assertEqual(name.delimiter,'_')
+
+    def test_parse_fastq_name_is_memoised(self):
+        """parse_fastq_name: repeated names return the same object
+        """
+        name = parse_fastq_name('/data/PJB/PJB1_S1_R1_001.fastq.gz')
+        self.assertTrue(
+            parse_fastq_name('/data/PJB/PJB1_S1_R1_001.fastq.gz') is name)
+        self.assertTrue(
+            parse_fastq_name('/copy/PJB1_S1_R1_001.fastq.gz') is name)
+        self.assertFalse(
+            parse_fastq_name('/data/PJB/PJB1_S1_R2_001.fastq.gz') is name)
+        clear_fastq_name_cache()
+        self.assertFalse(
+            parse_fastq_name('/data/PJB/PJB1_S1_R1_001.fastq.gz') is name)
+
+    def test_parse_fastq_name_is_immutable(self):
+        """parse_fastq_name: returned object can't be modified
+        """
+        name = parse_fastq_name('PJB1_S1_R1_001.fastq.gz')
+        self.assertRaises(AttributeError,setattr,name,'read_number',2)
+
+class TestDirectoryIndex(unittest.TestCase):
+    """Tests for the DirectoryIndex class
+
+    """
+    def setUp(self):
+        self.dirn = tempfile.mkdtemp(suffix='TestDirectoryIndex')
+        os.mkdir(os.path.join(self.dirn,'fastqs'))
+        os.mkdir(os.path.join(self.dirn,'qc'))
+        for f in ('README.info',
+                  'fastqs/PJB1_S1_R1_001.fastq.gz',
+                  'fastqs/PJB1_S1_R2_001.fastq.gz',
+                  'fastqs/PJB1_S1_R1_001.fastq',
+                  'fastqs/PJB1_S1.md5'):
+            open(os.path.join(self.dirn,f),'w').close()
+        os.symlink(os.path.join(self.dirn,'README.info'),
+                   os.path.join(self.dirn,'README.link'))
+
+    def tearDown(self):
+        # Remove the temporary test directory
+        shutil.rmtree(self.dirn)
+
+    def _set_mtime(self,dirn,mtime):
+        # Set the modification time for a directory
+        os.utime(dirn,(mtime,mtime))
+
+    def test_list_dirs_and_files(self):
+        """DirectoryIndex: list subdirectories and files
+        """
+        index = DirectoryIndex()
+        self.assertEqual(index.list_dirs(self.dirn),['fastqs','qc'])
+        self.assertEqual(index.list_dirs(self.dirn,startswith='q'),['qc'])
+        self.assertEqual(index.list_dirs(self.dirn,matches='fastqs'),
+                         ['fastqs'])
+        self.assertEqual(index.list_files(self.dirn),
+                         ['README.info','README.link'])
+        self.assertEqual(index.list_dirs(os.path.join(self.dirn,'missing')),
+                         [])
+
+    def test_fastqs(self):
+        """DirectoryIndex: list Fastq files
+        """
+        index = DirectoryIndex()
+        fastqs_dir = os.path.join(self.dirn,'fastqs')
+        self.assertEqual(index.fastqs(fastqs_dir),
+                         ['PJB1_S1_R1_001.fastq.gz',
+                          'PJB1_S1_R2_001.fastq.gz'])
+        for fq in ('PJB1_S1_R1_001.fastq.gz','PJB1_S1_R2_001.fastq.gz'):
+            os.remove(os.path.join(fastqs_dir,fq))
+        self.assertEqual(index.fastqs(fastqs_dir),['PJB1_S1_R1_001.fastq'])
+        self.assertEqual(index.fastqs(self.dirn),[])
+
+    def test_file_types(self):
+        """DirectoryIndex: check file types
+        """
+        index = DirectoryIndex()
+        readme = os.path.join(self.dirn,'README.info')
+        link = os.path.join(self.dirn,'README.link')
+        fastqs_dir = os.path.join(self.dirn,'fastqs')
+        self.assertTrue(index.isfile(readme))
+        self.assertFalse(index.islink(readme))
+        self.assertTrue(index.isfile(link))
+        self.assertTrue(index.islink(link))
+        self.assertTrue(index.isdir(fastqs_dir))
+        self.assertFalse(index.isfile(fastqs_dir))
+        self.assertFalse(index.isfile(os.path.join(self.dirn,'missing')))
+
+    def test_cached_listing(self):
+        """DirectoryIndex: listings are cached until directory changes
+        """
+        index = DirectoryIndex()
+        mtime = time.time() - 60
+        self._set_mtime(self.dirn,mtime)
+        self.assertEqual(index.list_dirs(self.dirn),['fastqs','qc'])
+        # Add a directory but restore the timestamp, so
+        # the cached listing is still used
+        os.mkdir(os.path.join(self.dirn,'qc.new'))
+        self._set_mtime(self.dirn,mtime)
+        self.assertEqual(index.list_dirs(self.dirn),['fastqs','qc'])
+        # Explicit refresh picks up the change
+        index.refresh(self.dirn)
+        self.assertEqual(index.list_dirs(self.dirn),['fastqs','qc','qc.new'])
+        # Updated timestamp also picks up changes
+        os.rmdir(os.path.join(self.dirn,'qc.new'))
+        self._set_mtime(self.dirn,mtime - 60)
+        self.assertEqual(index.list_dirs(self.dirn),['fastqs','qc'])
+
 class TestAnalysisDir(unittest.TestCase):
     """Tests for the AnalysisDir class
 
@@ -416,6 +559,107 @@ class TestAnalysisProject(unittest.TestCase):
         self.assertEqual(project.info.samples,None)
         self.assertEqual(project.fastq_dirs,[])
 
+    def test_analysis_project_fastqs_loaded_on_demand(self):
+        """Check AnalysisProject locates Fastqs on first access
+        """
+        MockAnalysisProject('PJB',
+                            ('PJB1_S1_R1_001.fastq.gz',
+                             'PJB1_S1_R2_001.fastq.gz',),
+                            metadata={ 'User': 'Peter Briggs',
+                                       'PI': 'Peter Briggs',
+                                       'Primary fastqs': 'fastqs',
+                                       'Paired_end': 'Y' }).create(
+                                           top_dir=self.dirn)
+        dirn = os.path.join(self.dirn,'PJB')
+        project = AnalysisProject('PJB',dirn)
+        # Metadata is available before Fastqs are located
+        self.assertEqual(project.info.user,'Peter Briggs')
+        self.assertEqual(project.info.PI,'Peter Briggs')
+        # Fastqs added after creation but before first access
+        # are picked up
+        for fq in ('PJB2_S2_R1_001.fastq.gz','PJB2_S2_R2_001.fastq.gz'):
+            open(os.path.join(dirn,'fastqs',fq),'w').close()
+        self.assertEqual([s.name for s in project.samples],['PJB1','PJB2'])
+        self.assertEqual(project.fastq_dir,os.path.join(dirn,'fastqs'))
+        self.assertEqual(project.fastq_dirs,['fastqs'])
+        self.assertTrue(project.info.paired_end)
+        self.assertEqual(project.qc_dir,os.path.join(dirn,'qc'))
+
+    def test_analysis_project_info_without_derived_items(self):
+        """Check AnalysisProject metadata doesn't require Fastqs to be located
+        """
+        MockAnalysisProject('PJB',
+                            ('PJB1_S1_R1_001.fastq.gz',
+                             'PJB1_S1_R2_001.fastq.gz',),
+                            metadata={ 'User': 'Peter Briggs',
+                                       'PI': 'Peter Briggs' }).create(
+                                           top_dir=self.dirn)
+        dirn = os.path.join(self.dirn,'PJB')
+        project = AnalysisProject('PJB',dirn)
+        # Reading metadata doesn't locate the Fastqs
+        self.assertEqual(project.info.user,'Peter Briggs')
+        self.assertEqual(project.info['PI'],'Peter Briggs')
+        # Fastqs added after metadata was read are picked up
+        for fq in ('PJB2_S2_R1_001.fastq.gz','PJB2_S2_R2_001.fastq.gz'):
+            open(os.path.join(dirn,'fastqs',fq),'w').close()
+        # Items derived from the Fastqs are set when read
+        self.assertTrue(project.info.paired_end)
+        self.assertEqual(project.info['primary_fastq_dir'],'fastqs')
+        self.assertEqual([s.name for s in project.samples],['PJB1','PJB2'])
+
+    def test_analysis_project_refresh(self):
+        """Check AnalysisProject picks up changes on refresh
+        """
+        self.make_mock_project_dir(
+            'PJB',
+            ('PJB1_S1_R1_001.fastq.gz',
+             'PJB1_S1_R2_001.fastq.gz',),
+            fastq_dir='fastqs.cutadapt',
+            primary_fastq_dir='fastqs')
+        dirn = os.path.join(self.dirn,'PJB')
+        os.mkdir(os.path.join(dirn,'fastqs'))
+        for fq in ('PJB1_S1_R1_001.fastq.gz','PJB1_S1_R2_001.fastq.gz'):
+            open(os.path.join(dirn,'fastqs',fq),'w').close()
+        project = AnalysisProject('PJB',dirn,fastq_dir='fastqs.cutadapt')
+        self.assertEqual([s.name for s in project.samples],['PJB1'])
+        # Add a sample
+        for fq in ('PJB2_S2_R1_001.fastq.gz','PJB2_S2_R2_001.fastq.gz'):
+            open(os.path.join(dirn,'fastqs.cutadapt',fq),'w').close()
+        self.assertEqual([s.name for s in project.samples],['PJB1'])
+        # Refresh picks up new sample and keeps active fastq dir
+        project.refresh()
+        self.assertEqual([s.name for s in project.samples],['PJB1','PJB2'])
+        self.assertEqual(project.fastq_dir,
+                         os.path.join(dirn,'fastqs.cutadapt'))
+        self.assertEqual(project.info.primary_fastq_dir,'fastqs')
+
+    def test_get_sample_and_get_samples(self):
+        """Check AnalysisProject sample lookup by name and pattern
+        """
+        self.make_mock_project_dir(
+            'PJB',
+            ('PJB1_S1_R1_001.fastq.gz',
+             'PJB1_S1_R2_001.fastq.gz',
+             'PJB2_S2_R1_001.fastq.gz',
+             'PJB2_S2_R2_001.fastq.gz',
+             'PJB10_S3_R1_001.fastq.gz',
+             'PJB10_S3_R2_001.fastq.gz',
+             'IJD1_S4_R1_001.fastq.gz',
+             'IJD1_S4_R2_001.fastq.gz',))
+        project = AnalysisProject('PJB',os.path.join(self.dirn,'PJB'))
+        self.assertEqual(project.get_sample('PJB2').name,'PJB2')
+        self.assertEqual(len(project.get_sample('PJB2').fastq),2)
+        self.assertRaises(KeyError,project.get_sample,'PJB3')
+        names = lambda samples: [s.name for s in samples]
+        self.assertEqual(names(project.get_samples('*')),
+                         names(project.samples))
+        self.assertEqual(names(project.get_samples('PJB1')),['PJB1'])
+        self.assertEqual(sorted(names(project.get_samples('PJB1*'))),
+                         ['PJB1','PJB10'])
+        self.assertEqual(sorted(names(project.get_samples('PJB2,IJD*'))),
+                         ['IJD1','PJB2'])
+        self.assertEqual(project.get_samples('XYZ'),[])
+
     def test_create_single_end_analysis_project(self):
         """Check creation of new single-end AnalysisProject directory
         """
@@ -1044,6 +1288,33 @@ class TestAnalysisSample(unittest.TestCase):
         self.assertTrue(sample.paired_end)
         self.assertEqual(str(sample),'PJB1-B')
 
+    def test_analysis_sample_verify_qc(self):
+        """Check AnalysisSample.verify_qc
+        """
+        wd = tempfile.mkdtemp(suffix='.test_analysis_sample_verify_qc')
+        try:
+            qc_dir = os.path.join(wd,'qc')
+            os.mkdir(qc_dir)
+            fq_r1 = '/run/PJB/fastqs/PJB1-B_S1_R1_001.fastq.gz'
+            fq_r2 = '/run/PJB/fastqs/PJB1-B_S1_R2_001.fastq.gz'
+            sample = AnalysisSample('PJB1-B')
+            sample.add_fastq(fq_r1)
+            sample.add_fastq(fq_r2)
+            # Only R1 has QC outputs
+            MockQCOutputs.fastqc_v0_11_2(fq_r1,qc_dir)
+            for screen in ('model_organisms','other_organisms','rRNA'):
+                MockQCOutputs.fastq_screen_v0_9_2(fq_r1,qc_dir,screen)
+            self.assertTrue(sample.verify_qc(qc_dir,fq_r1))
+            self.assertFalse(sample.verify_qc(qc_dir,fq_r2))
+            # Using a shared verifier
+            verifier = QCVerifier(qc_dir)
+            self.assertTrue(sample.verify_qc(qc_dir,fq_r1,
+                                             verifier=verifier))
+            self.assertFalse(sample.verify_qc(qc_dir,fq_r2,
+                                              verifier=verifier))
+        finally:
+            shutil.rmtree(wd)
+
 class TestZipArchive(unittest.TestCase):
     """
     Tests for the ZipArchive class
@@ -1107,6 +1378,78 @@ class TestZipArchive(unittest.TestCase):
                             "'%s' in zip file but shouldn't be"
                             % name)
 
+    def test_update_zip_archive(self):
+        """ZipArchive: update an existing zip archive
+        """
+        # Make an example directory to zip up
+        src_dir = os.path.join(self.dirn,'source')
+        os.mkdir(src_dir)
+        for name in ('test1','test2','test3'):
+            with open(os.path.join(src_dir,name),'w') as fp:
+                fp.write("This is %s\n" % name)
+        # Create the initial zip archive
+        zip_filename = os.path.join(self.dirn,'test.zip')
+        z = ZipArchive(zip_filename,relpath=self.dirn)
+        for name in ('test1','test2','test3'):
+            z.add(os.path.join(src_dir,name))
+        z.close()
+        # Update one file, add a new file and drop another
+        with open(os.path.join(src_dir,'test2'),'w') as fp:
+            fp.write("This is updated test2\n")
+        st = os.stat(os.path.join(src_dir,'test2'))
+        os.utime(os.path.join(src_dir,'test2'),
+                 (st.st_atime,st.st_mtime+10))
+        with open(os.path.join(src_dir,'test4'),'w') as fp:
+            fp.write("This is test4\n")
+        z = ZipArchive(zip_filename,relpath=self.dirn,update=True)
+        for name in ('test1','test2','test4'):
+            z.add(os.path.join(src_dir,name))
+        z.close()
+        # Check the contents
+        zf = zipfile.ZipFile(zip_filename)
+        self.assertEqual(sorted(zf.namelist()),
+                         ['source/test1','source/test2','source/test4'])
+        self.assertEqual(zf.read('source/test1'),"This is test1\n")
+        self.assertEqual(zf.read('source/test2'),"This is updated test2\n")
+        self.assertEqual(zf.read('source/test4'),"This is test4\n")
+        self.assertEqual(zf.testzip(),None)
+        # No temporary files left behind
+        self.assertEqual(sorted(os.listdir(self.dirn)),
+                         ['source','test.zip'])
+
+    def test_update_zip_archive_append_only(self):
+        """ZipArchive: update appends new files without rebuilding
+        """
+        # Make an example directory to zip up
+        src_dir = os.path.join(self.dirn,'source')
+        os.mkdir(src_dir)
+        for name in ('test1','test2'):
+            with open(os.path.join(src_dir,name),'w') as fp:
+                fp.write("This is %s\n" % name)
+        # Create the initial zip archive
+        zip_filename = os.path.join(self.dirn,'test.zip')
+        z = ZipArchive(zip_filename,relpath=self.dirn)
+        for name in ('test1','test2'):
+            z.add(os.path.join(src_dir,name))
+        z.close()
+        inode = os.stat(zip_filename).st_ino
+        # Add a new file
+        with open(os.path.join(src_dir,'test3'),'w') as fp:
+            fp.write("This is test3\n")
+        z = ZipArchive(zip_filename,relpath=self.dirn,update=True)
+        for name in ('test1','test2','test3'):
+            z.add(os.path.join(src_dir,name))
+        z.close()
+        # Archive was appended to rather than replaced
+        self.assertEqual(os.stat(zip_filename).st_ino,inode)
+        # Check the contents
+        zf = zipfile.ZipFile(zip_filename)
+        self.assertEqual(sorted(zf.namelist()),
+                         ['source/test1','source/test2','source/test3'])
+        self.assertEqual(zf.read('source/test1'),"This is test1\n")
+        self.assertEqual(zf.read('source/test3'),"This is test3\n")
+        self.assertEqual(zf.testzip(),None)
+
 class TestOutputFiles(unittest.TestCase):
     """
     Tests for the OutputFiles class
@@ -1397,6 +1740,37 @@ class TestGetNumberedSubdir(unittest.TestCase):
                                 full_path=True),
             os.path.join(self.wd,"001_test"))
 
+class TestNameMatcher(unittest.TestCase):
+    """Tests for the name_matcher function
+
+    """
+    def test_name_matcher_exact_names(self):
+        """name_matcher: match exact names
+        """
+        matches = name_matcher('PJB')
+        self.assertTrue(matches('PJB'))
+        self.assertFalse(matches('PJB1'))
+        self.assertFalse(matches('IJD'))
+
+    def test_name_matcher_trailing_wildcard(self):
+        """name_matcher: match names with trailing wildcard
+        """
+        matches = name_matcher('PJB*')
+        self.assertTrue(matches('PJB'))
+        self.assertTrue(matches('PJB1'))
+        self.assertFalse(matches('IJD'))
+        self.assertTrue(name_matcher('*')('IJD'))
+
+    def test_name_matcher_multiple_patterns(self):
+        """name_matcher: match names against multiple patterns
+        """
+        matches = name_matcher('PJB,IJD*')
+        self.assertTrue(matches('PJB'))
+        self.assertFalse(matches('PJB1'))
+        self.assertTrue(matches('IJD'))
+        self.assertTrue(matches('IJD1'))
+        self.assertFalse(matches('KJR'))
+
 class TestFindExecutables(unittest.TestCase):
     """
     Tests for the find_executables function
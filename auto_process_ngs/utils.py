@@ -21,7 +21,9 @@ tree at some point.
 Classes:
 
 - BaseFastqAttrs
+- FastqName:
 - AnalysisFastq:
+- DirectoryIndex:
 - AnalysisDir:
 - AnalysisProject:
 - AnalysisSample:
@@ -34,6 +36,9 @@ Functions:
 - bases_mask_is_paired_end:
 - split_user_host_dir:
 - get_numbered_subdir:
+- parse_fastq_name:
+- clear_fastq_name_cache:
+- name_matcher:
 - find_executables:
 - parse_version:
 - pretty_print_rows:
@@ -49,19 +54,26 @@ Functions:
 
 import sys
 import os
+import re
+import stat
 import fnmatch
+import bisect
 import logging
 import zipfile
+import copy
+import time
 import pydoc
 import tempfile
 import operator
+import threading
 import applications
 import bcftbx.IlluminaData as IlluminaData
 import bcftbx.JobRunner as JobRunner
-import bcftbx.Pipeline as Pipeline
 import bcftbx.utils as bcf_utils
 from bcftbx.qc.report import strip_ngs_extensions
 from bcftbx.Md5sum import md5sum
+from collections import namedtuple
+from collections import OrderedDict
 from .metadata import AnalysisDirMetadata
 from .metadata import AnalysisDirParameters
 from .metadata import AnalysisProjectInfo
@@ -70,11 +82,28 @@ from .metadata import AnalysisProjectQCDirInfo
 from qc.illumina_qc import QCReporter
 from qc.illumina_qc import QCSample
 from qc.illumina_qc import expected_qc_outputs
-from qc.illumina_qc import check_qc_outputs
+from qc.illumina_qc import QCManifest
+from qc.illumina_qc import report_assets_dir
+from qc.illumina_qc import QCVerifier
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        # Fall back to listdir/lstat (see DirectoryIndex)
+        scandir = None
 
 # Module specific logger
 logger = logging.getLogger(__name__)
 
+# Maximum number of parsed Fastq names to keep in the
+# process-wide cache (see 'parse_fastq_name')
+FASTQ_NAME_CACHE_SIZE = 100000
+
+# Matches barcode sequences e.g. ATTGCT or ATTGCT-CCTAAG
+BARCODE_SEQUENCE = re.compile(r"^[ACGTN\-]*\Z")
+
 #######################################################################
 # Classes
 #######################################################################
@@ -99,6 +128,16 @@ class BaseFastqAttrs(object):
     Subclasses should process the supplied Fastq name and set
     these attributes appropriately.
     """
+    __slots__ = ('fastq',
+                 'basename',
+                 'extension',
+                 'sample_name',
+                 'sample_number',
+                 'barcode_sequence',
+                 'lane_number',
+                 'read_number',
+                 'set_number',
+                 'is_index_read',)
     def __init__(self,fastq):
         # Store name
         self.fastq = fastq
@@ -118,6 +157,26 @@ class BaseFastqAttrs(object):
     def __repr__(self):
         return self.basename
 
+class FastqName(namedtuple('FastqName',
+                           ('basename',
+                            'extension',
+                            'sample_name',
+                            'sample_number',
+                            'barcode_sequence',
+                            'lane_number',
+                            'read_number',
+                            'set_number',
+                            'is_index_read',
+                            'delimiter',))):
+    """
+    Immutable components of a parsed Fastq file name
+
+    Instances are returned by the 'parse_fastq_name'
+    function and provide the same attributes as
+    AnalysisFastq (except 'fastq').
+    """
+    __slots__ = ()
+
 class AnalysisFastq(BaseFastqAttrs):
     """Class for extracting information about Fastq files
 
@@ -203,6 +262,8 @@ class AnalysisFastq(BaseFastqAttrs):
 
     """
 
+    __slots__ = ('delimiter',)
+
     def __init__(self,fastq):
         """Create and populate a new AnalysisFastq object
 
@@ -210,108 +271,21 @@ class AnalysisFastq(BaseFastqAttrs):
           fastq: name of the fastq.gz (optionally can include leading path)
 
         """
-        BaseFastqAttrs.__init__(self,fastq)
-        # Base name for sample (no leading path or extension)
-        fastq_base = self.basename
-        # Determine if it's a non-standard (dot-separated) name
-        #
-        # These are names of the form e.g.
-        # NH1.2.r2
-        # or
-        # NH1_ChIP-seq.ACAGTG.r2
-        if fastq_base.count('.') > 0:
-            self.delimiter = '.'
-            fields = fastq_base.split('.')
-            field = fields[-1]
-            if len(field) == 2 and field.startswith('r'):
-                # Read number
-                self.read_number = int(field[1])
-                fields = fields[:-1]
-                field = fields[-1]
-            if len(fields) > 1:
-                # Barcode sequence
-                is_tag = True
-                for f in field.split('-'):
-                    for c in f:
-                        is_tag = is_tag and c in 'ACGTN'
-                if is_tag:
-                    self.barcode_sequence = field
-                    fields = fields[:-1]
-                    field = fields[-1]
-            # Remaining fields are the sample name
-            self.sample_name = '.'.join(fields)
-            assert(self.sample_name != '')
-            return
-        # Some form of Illumina-derived name
-        #
-        # Full Illumina-style names are e.g.
-        # NH1_ChIP-seq_Gli1_ACAGTG_L001_R1_001
-        # or
-        # NH1_ChIP-seq_Gli1_S4_L003_R2_001
-        #
-        # We have shorter name formats where redundant parts are
-        # omitted, the patterns are:
-        # NAME          e.g. NH1_ChIP-seq_Gli1
-        # NAME+LANE     e.g. NH1_ChIP-seq_Gli1_L001
-        # NAME+TAG      e.g. NH1_ChIP-seq_Gli1_ACAGTG
-        # NAME+TAG+LANE e.g. NH1_ChIP-seq_Gli1_ACAGTG_L001
-        #
-        # Also read number (i.e. R1 or R2) is appended but only for
-        # paired end samples
-        #
-        # The set number is never included, except for full names
-        fields = fastq_base.split('_')
-        self.delimiter = '_'
-        # Deal with set number first e.g. 001
-        field = fields[-1]
-        ##logger.debug("Test for set number %s" % field)
-        if len(field) == 3 and field.isdigit():
-            self.set_number = int(field)
-            fields = fields[:-1]
-        # Deal with trailing read number e.g. R1
-        field = fields[-1]
-        ##logger.debug("Test for read number %s" % field)
-        if len(field) == 2:
-            if field.startswith('R'):
-                self.read_number = int(field[1])
-                fields = fields[:-1]
-            elif field.startswith('I'):
-                self.read_number = int(field[1])
-                self.is_index_read = True
-                fields = fields[:-1]
-        # Deal with trailing lane number e.g. L001
-        field = fields[-1]
-        ##logger.debug("Test for lane number %s" % field)
-        if len(field) == 4 and field.startswith('L') and field[1:].isdigit():
-            self.lane_number = int(field[1:])
-            fields = fields[:-1]
-        # Deal with trailing index tag e.g. ATTGCT or ATTGCT-CCTAAG
-        field = fields[-1]
-        ##logger.debug("Test for barcode sequence %s" % field)
-        if len(fields) > 1:
-            # This mustn't be the last field: if it is then it's
-            # not the tag - it's the name
-            is_tag = True
-            for f in field.split('-'):
-                for c in f:
-                    is_tag = is_tag and c in 'ACGTN'
-            if is_tag:
-                self.barcode_sequence = field
-                fields = fields[:-1]
-                ##logger.debug("Identified barcode sequence as %s" % self.barcode_sequence)
-            else:
-                # Alternatively might be the sample number
-                if field.startswith('S'):
-                    try:
-                        if field[1:].isdigit():
-                            self.sample_number = int(field[1:])
-                            fields = fields[:-1]
-                    except IndexError:
-                        pass
-        # What's left is the name
-        ##logger.debug("Remaining fields: %s" % fields)
-        self.sample_name = '_'.join(fields)
-        assert(self.sample_name != '')
+        # Store name
+        self.fastq = fastq
+        # Components are taken from the (memoised) parsed name;
+        # they're copied so that the instance can be modified
+        # without affecting the cached values
+        (self.basename,
+         self.extension,
+         self.sample_name,
+         self.sample_number,
+         self.barcode_sequence,
+         self.lane_number,
+         self.read_number,
+         self.set_number,
+         self.is_index_read,
+         self.delimiter) = parse_fastq_name(fastq)
 
     def __repr__(self):
         """Implement __repr__ built-in
@@ -336,6 +310,265 @@ class AnalysisFastq(BaseFastqAttrs):
             fq.append("%03d" % self.set_number)
         return self.delimiter.join(fq)
 
+class DirectoryIndex(object):
+    """
+    Class caching the contents of directories
+
+    Each directory is scanned at most once (using 'scandir'
+    where available) and its entries are cached, along with
+    their types (directory, file or symlink) and the list of
+    Fastq files that it contains.
+
+    Cached listings are revalidated against the modification
+    time of the directory on each access, so entries which
+    are added, removed or renamed are picked up without an
+    explicit refresh; listings of directories which were
+    modified within the resolution of the timestamp are not
+    cached.
+
+    Example usage:
+
+    >>> index = DirectoryIndex()
+    >>> index.list_dirs("/runs/170901_M00879_0087_000000000-AGEW9")
+    >>> index.fastqs("/runs/170901_M00879_0087_000000000-AGEW9/PJB/fastqs")
+
+    A single index can be shared between 'AnalysisDir' and
+    'AnalysisProject' instances (via their 'dir_index'
+    arguments) so that the same directories are not
+    rescanned by each.
+    """
+    # Timestamp resolution (seconds) for cached listings
+    MTIME_RESOLUTION = 2
+
+    def __init__(self):
+        """
+        Create a new DirectoryIndex instance
+        """
+        self._listings = {}
+
+    def _listing(self,dirn):
+        """
+        Internal: return the cached listing for a directory
+
+        The listing is a dictionary where the keys are the
+        entry names and the values are tuples of flags
+        '(is_dir,is_file,is_link)'.
+
+        Arguments:
+          dirn (str): path to the directory
+
+        Returns:
+          Dictionary: the listing for the directory, or None
+            if the directory doesn't exist.
+        """
+        dirn = os.path.abspath(dirn)
+        try:
+            st = os.stat(dirn)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISDIR(st.st_mode):
+            self._listings.pop(dirn,None)
+            return None
+        mtime = st.st_mtime
+        try:
+            listing = self._listings[dirn]
+            if listing['mtime'] == mtime:
+                return listing
+        except KeyError:
+            pass
+        logger.debug("Scanning %s" % dirn)
+        listing = { 'mtime': mtime,
+                    'entries': self._scan(dirn),
+                    'fastqs': None }
+        if time.time() - mtime > self.MTIME_RESOLUTION:
+            self._listings[dirn] = listing
+        else:
+            # Recently modified so don't trust the timestamp
+            self._listings.pop(dirn,None)
+        return listing
+
+    def _scan(self,dirn):
+        """
+        Internal: scan a directory and return the entries
+
+        Arguments:
+          dirn (str): path to the directory
+
+        Returns:
+          Dictionary: mapping of entry names to tuples of
+            flags '(is_dir,is_file,is_link)'.
+        """
+        entries = {}
+        if scandir is not None:
+            for entry in scandir(dirn):
+                try:
+                    is_dir = entry.is_dir()
+                    is_file = entry.is_file()
+                except OSError:
+                    is_dir = is_file = False
+                entries[entry.name] = (is_dir,is_file,entry.is_symlink())
+            return entries
+        for name in os.listdir(dirn):
+            path = os.path.join(dirn,name)
+            try:
+                st = os.lstat(path)
+                is_link = stat.S_ISLNK(st.st_mode)
+                if is_link:
+                    st = os.stat(path)
+            except OSError:
+                entries[name] = (False,False,True)
+                continue
+            entries[name] = (stat.S_ISDIR(st.st_mode),
+                             stat.S_ISREG(st.st_mode),
+                             is_link)
+        return entries
+
+    def list_dirs(self,dirn,matches=None,startswith=None):
+        """
+        Return the subdirectories of a directory
+
+        Equivalent to 'bcftbx.utils.list_dirs' (including
+        the 'matches' and 'startswith' filters).
+
+        Arguments:
+          dirn (str): path to the directory
+          matches (str): if specified then only return the
+            subdirectory with this name
+          startswith (str): if specified then only return
+            the subdirectories with names starting with this
+            string
+
+        Returns:
+          List: sorted list of subdirectory names (empty if
+            'dirn' doesn't exist).
+        """
+        listing = self._listing(dirn)
+        if listing is None:
+            return []
+        dirs = []
+        for name,(is_dir,is_file,is_link) in listing['entries'].iteritems():
+            if not is_dir:
+                continue
+            if matches is not None and name != matches:
+                continue
+            if startswith is not None and not name.startswith(startswith):
+                continue
+            dirs.append(name)
+        dirs.sort()
+        return dirs
+
+    def list_files(self,dirn):
+        """
+        Return the files in a directory
+
+        Arguments:
+          dirn (str): path to the directory
+
+        Returns:
+          List: sorted list of the names of the entries
+            which aren't directories (empty if 'dirn'
+            doesn't exist).
+        """
+        listing = self._listing(dirn)
+        if listing is None:
+            return []
+        return sorted([name for name,(is_dir,is_file,is_link)
+                       in listing['entries'].iteritems()
+                       if not is_dir])
+
+    def fastqs(self,dirn):
+        """
+        Return the Fastq files in a directory
+
+        If the directory contains any '.fastq.gz' files
+        then only these are returned; otherwise any '.fastq'
+        files are returned.
+
+        Arguments:
+          dirn (str): path to the directory
+
+        Returns:
+          List: sorted list of Fastq file names (empty if
+            'dirn' doesn't exist).
+        """
+        listing = self._listing(dirn)
+        if listing is None:
+            return []
+        if listing['fastqs'] is None:
+            files = self.list_files(dirn)
+            fastqs = filter(lambda f: f.endswith('.fastq.gz'),files)
+            if not fastqs:
+                fastqs = filter(lambda f: f.endswith('.fastq'),files)
+            listing['fastqs'] = fastqs
+        return [fq for fq in listing['fastqs']]
+
+    def isdir(self,path):
+        """
+        Check if a path is a directory
+
+        The path is checked against the listing of its
+        parent directory.
+
+        Arguments:
+          path (str): path to check
+        """
+        return self._flags(path)[0]
+
+    def isfile(self,path):
+        """
+        Check if a path is a regular file
+
+        The path is checked against the listing of its
+        parent directory.
+
+        Arguments:
+          path (str): path to check
+        """
+        return self._flags(path)[1]
+
+    def islink(self,path):
+        """
+        Check if a path is a symbolic link
+
+        The path is checked against the listing of its
+        parent directory.
+
+        Arguments:
+          path (str): path to check
+        """
+        return self._flags(path)[2]
+
+    def _flags(self,path):
+        """
+        Internal: return the flags for a path
+
+        Returns:
+          Tuple: '(is_dir,is_file,is_link)' for the path
+            (all False if the path doesn't exist).
+        """
+        dirn,name = os.path.split(os.path.abspath(path))
+        listing = self._listing(dirn)
+        if listing is None:
+            return (False,False,False)
+        return listing['entries'].get(name,(False,False,False))
+
+    def refresh(self,dirn=None):
+        """
+        Discard cached listings
+
+        Arguments:
+          dirn (str): if specified then only discard the
+            listings for this directory and any directories
+            below it (default is to discard all listings)
+        """
+        if dirn is None:
+            self._listings = {}
+            return
+        dirn = os.path.abspath(dirn)
+        for d in self._listings.keys():
+            if d == dirn or d.startswith(dirn+os.sep):
+                del(self._listings[d])
+
 class AnalysisDir:
     """Class describing an analysis directory
 
@@ -347,15 +580,22 @@ class AnalysisDir:
     outputs from the CASAVA or bclToFastq processing software.
 
     """
-    def __init__(self,analysis_dir):
+    def __init__(self,analysis_dir,dir_index=None):
         """Create a new AnalysisDir instance for a specified directory
 
         Arguments:
           analysis_dir: name (and path) to analysis directory
+          dir_index: optional, DirectoryIndex instance to use
+            when examining the directory contents (a new index
+            is created if one isn't supplied)
 
         """
         # Store location
         self._analysis_dir = os.path.abspath(analysis_dir)
+        # Directory contents
+        if dir_index is None:
+            dir_index = DirectoryIndex()
+        self.dir_index = dir_index
         self._name = os.path.basename(analysis_dir)
         self._bcl2fastq_dirs = []
         self._project_dirs = []
@@ -410,7 +650,7 @@ class AnalysisDir:
                 self.run_name)
         # Look for outputs from bclToFastq and analysis projects
         logger.debug("Examining subdirectories of %s" % self._analysis_dir)
-        for dirn in bcf_utils.list_dirs(self._analysis_dir):
+        for dirn in self.dir_index.list_dirs(self._analysis_dir):
             # Look for sequencing data
             try:
                 data = IlluminaData.IlluminaData(self._analysis_dir,
@@ -426,7 +666,8 @@ class AnalysisDir:
                                 "subdir '%s' as CASAVA/bcl2fastq output "
                                 "(ignored): %s" % (dirn,ex))
             # Look for analysis data
-            data = AnalysisProject(dirn,os.path.join(self._analysis_dir,dirn))
+            data = AnalysisProject(dirn,os.path.join(self._analysis_dir,dirn),
+                                   dir_index=self.dir_index)
             if data.is_analysis_dir:
                 if dirn == 'undetermined':
                     logger.debug("- %s: undetermined indexes" % dirn)
@@ -492,7 +733,7 @@ class AnalysisDir:
                               projects)
         return projects
         
-class AnalysisProject:
+class AnalysisProject(object):
     """Class describing an analysis project
 
     Conceptually an analysis project consists of a set of samples
@@ -547,11 +788,22 @@ class AnalysisProject:
     the project directory (by default this is the 'fastqs' subdirectory
     of the project directory). It can be changed using the
     'set_primary_fastq_dir' method.
+
+    The metadata in 'info' is loaded when the AnalysisProject
+    is created; however the project directory isn't scanned for
+    Fastqs (and the samples aren't assembled) until one of the
+    Fastq- or sample-related properties is first accessed. (The
+    'paired_end' and 'primary_fastq_dir' items in 'info' are
+    updated from the Fastqs at the same point, or on first
+    access to 'info' if these items aren't already set in the
+    project metadata file.) Use the 'refresh' method to discard
+    the loaded data and pick up changes to the directory
+    contents.
     """
     def __init__(self,name,dirn,user=None,PI=None,library_type=None,
                  single_cell_platform=None,organism=None,run=None,
                  comments=None,platform=None,fastq_attrs=None,
-                 fastq_dir=None):
+                 fastq_dir=None,dir_index=None):
         """Create a new AnalysisProject instance
 
         Arguments:
@@ -577,53 +829,111 @@ class AnalysisProject:
             holding the set of Fastq files to load; defaults to
             'fastq' (if present) or to the top-level of the project
             directory (if absent).
+          dir_index: optional, DirectoryIndex instance to use when
+            locating the Fastq files and QC directories (a new
+            index is created if one isn't supplied).
         """
         self.name = name
         self.dirn = os.path.abspath(dirn)
-        self.fastq_dir = None
-        self.fastq_dirs = []
-        self.fastq_format = None
-        self.samples = []
-        self.info = AnalysisProjectInfo()
+        self._fastq_dir = None
+        self._fastq_dirs = []
+        self._fastq_format = None
+        self._samples = []
+        self._sample_index = {}
+        self._info = _AnalysisProjectInfo(self._ensure_populated)
         self.info_file = os.path.join(self.dirn,"README.info")
+        # Directory contents
+        if dir_index is None:
+            dir_index = DirectoryIndex()
+        self.dir_index = dir_index
         # Function to use for getting Fastq information
         if fastq_attrs is None:
             self.fastq_attrs = AnalysisFastq
         else:
             self.fastq_attrs = fastq_attrs
-        # Populate from the directory contents
-        self.populate(fastq_dir=fastq_dir)
+        # Load metadata (Fastqs are located on demand)
+        self._populated = False
+        self._load_info()
+        self._requested_fastq_dir = fastq_dir
         # (Re)set metadata
         if run is not None:
-            self.info['run'] = run
+            self._info['run'] = run
         if user is not None:
-            self.info['user'] = user
+            self._info['user'] = user
         if PI is not None:
-            self.info['PI'] = PI
+            self._info['PI'] = PI
         if library_type is not None:
-            self.info['library_type'] = library_type
+            self._info['library_type'] = library_type
         if single_cell_platform is not None:
-            self.info['single_cell_platform'] = single_cell_platform
+            self._info['single_cell_platform'] = single_cell_platform
         if organism is not None:
-            self.info['organism'] = organism
+            self._info['organism'] = organism
         if platform is not None:
-            self.info['platform'] = platform
+            self._info['platform'] = platform
         if comments is not None:
-            self.info['comments'] = comments
+            self._info['comments'] = comments
 
     def populate(self,fastq_dir=None):
         """Populate data structure from directory contents
 
         """
+        self._load_info()
+        self._populate_fastqs(fastq_dir=fastq_dir)
+
+    def refresh(self):
+        """
+        Discard loaded data and reload from the directory
+
+        Reloads the project metadata; the Fastqs (for the
+        currently active fastq directory) are located again
+        on next access.
+        """
+        fastq_dir = self._requested_fastq_dir
+        if self._populated and self._fastq_dir is not None:
+            fastq_dir = os.path.relpath(self._fastq_dir,self.dirn)
+        self.dir_index.refresh(self.dirn)
+        self._fastq_dir = None
+        self._fastq_dirs = []
+        self._fastq_format = None
+        self._samples = []
+        self._sample_index = {}
+        self._populated = False
+        self._requested_fastq_dir = fastq_dir
+        self._load_info()
+
+    def _load_info(self):
+        """
+        Internal: load the metadata from the info file, if present
+        """
+        if not os.path.exists(self.dirn):
+            # Nothing to do, yet
+            return
+        if self.dir_index.isfile(self.info_file):
+            self._info.load(self.info_file)
+
+    def _ensure_populated(self):
+        """
+        Internal: locate Fastqs and samples if not already done
+        """
+        if not self._populated:
+            self._populate_fastqs(fastq_dir=self._requested_fastq_dir)
+
+    def _populate_fastqs(self,fastq_dir=None):
+        """
+        Internal: locate Fastqs and assemble samples
+
+        Arguments:
+          fastq_dir (str): subdirectory holding the Fastqs
+            to load (defaults to the primary fastq dir)
+        """
+        self._populated = True
+        self._requested_fastq_dir = fastq_dir
         if not os.path.exists(self.dirn):
             # Nothing to do, yet
             return
-        # Get data from info file, if present
-        if os.path.isfile(self.info_file):
-            self.info.load(self.info_file)
         # Identify possible fastq subdirectories
         fastq_dirs = []
-        for d in bcf_utils.list_dirs(self.dirn):
+        for d in self.dir_index.list_dirs(self.dirn):
             fq_dir = os.path.join(self.dirn,d)
             fastqs = self.find_fastqs(fq_dir)
             if fastqs:
@@ -631,52 +941,54 @@ class AnalysisProject:
         # Also check top-level dir
         if self.find_fastqs(self.dirn):
             fastq_dirs.append('.')
-        self.fastq_dirs = fastq_dirs
+        self._fastq_dirs = fastq_dirs
         logger.debug("Possible fastq dirs: %s" %
-                     ','.join(self.fastq_dirs))
+                     ','.join(self._fastq_dirs))
         # Set primary fastq file directory
-        if not self.fastq_dirs:
+        if not self._fastq_dirs:
             logger.debug("No fastq dirs located for %s" % self.dirn)
             return
-        if self.info.primary_fastq_dir is None:
-            if 'fastqs' in self.fastq_dirs:
-                self.info['primary_fastq_dir'] = 'fastqs'
+        if self._info.primary_fastq_dir is None:
+            if 'fastqs' in self._fastq_dirs:
+                self._info['primary_fastq_dir'] = 'fastqs'
             else:
-                self.info['primary_fastq_dir'] = self.fastq_dirs[0]
+                self._info['primary_fastq_dir'] = self._fastq_dirs[0]
         if fastq_dir is None:
-            fastq_dir = self.info.primary_fastq_dir
+            fastq_dir = self._info.primary_fastq_dir
         else:
-            if fastq_dir not in self.fastq_dirs:
+            if fastq_dir not in self._fastq_dirs:
                 logger.warning("Requested fastqs dir '%s' not in list "
                                "of possible dirs %s" %
                                (fastq_dir,
-                                ', '.join(self.fastq_dirs)))
-        self.fastq_dir = os.path.normpath(
+                                ', '.join(self._fastq_dirs)))
+        self._fastq_dir = os.path.normpath(
             os.path.join(self.dirn,fastq_dir))
         # Collect fastq files
-        fastqs = self.find_fastqs(self.fastq_dir)
+        fastqs = self.find_fastqs(self._fastq_dir)
         if fastqs:
-            self.fastq_format = self.determine_fastq_format(fastqs[0])
+            self._fastq_format = self.determine_fastq_format(fastqs[0])
         logger.debug("Assigning fastqs to samples...")
-        self.samples = []
+        self._samples = []
+        self._sample_index = {}
         for fq in fastqs:
             name = self.fastq_attrs(fq).sample_name
             try:
-                sample = self.get_sample(name)
+                sample = self._sample_index[name]
             except KeyError:
                 sample = AnalysisSample(name,
                                         fastq_attrs=self.fastq_attrs)
-                self.samples.append(sample)
+                self._samples.append(sample)
+                self._sample_index[name] = sample
             sample.add_fastq(os.path.normpath(
-                os.path.join(self.fastq_dir,fq)))
+                os.path.join(self._fastq_dir,fq)))
         logger.debug("Listing samples and files:")
-        for sample in self.samples:
+        for sample in self._samples:
             logger.debug("* %s: %s" % (sample.name,sample.fastq))
         # Set paired_end flag for project
         paired_end = True
-        for sample in self.samples:
+        for sample in self._samples:
             paired_end = (paired_end and sample.paired_end)
-        self.info['paired_end'] = paired_end
+        self._info['paired_end'] = paired_end
         # Set the QC output dir
         self.use_qc_dir('qc')
 
@@ -685,15 +997,9 @@ class AnalysisProject:
         Return list of Fastq files found in directory
         """
         logger.debug("Searching '%s' for fastqs" % dirn)
-        fastq_tuples = Pipeline.GetFastqGzFiles(dirn)
-        if not fastq_tuples:
-            logger.debug("No fastq.gz files found")
-            fastq_tuples = Pipeline.GetFastqFiles(dirn)
-            if not fastq_tuples:
-                logger.debug("No fastq files found")
-        # Unpack tuples
-        # see https://stackoverflow.com/a/952952/579925
-        fastqs = [item for sublist in fastq_tuples for item in sublist]
+        fastqs = self.dir_index.fastqs(dirn)
+        if not fastqs:
+            logger.debug("No fastq files found")
         return fastqs
 
     def determine_fastq_format(self,fastq):
@@ -824,6 +1130,7 @@ class AnalysisProject:
             is assumed to be relative to the analysis
             project directory.
         """
+        self._ensure_populated()
         self._qc_dir = qc_dir
         if not os.path.isabs(self._qc_dir):
             self._qc_dir = os.path.join(self.dirn,
@@ -986,6 +1293,50 @@ class AnalysisProject:
             samples_description += ")"
         return samples_description
 
+    @property
+    def info(self):
+        """Return the metadata for the project
+
+        Items which are derived from the Fastqs (i.e.
+        'paired_end' and 'primary_fastq_dir') are only
+        determined if they're not set in the info file
+        and are actually read.
+
+        """
+        return self._info
+
+    @property
+    def fastq_dirs(self):
+        """Return list of subdirectories with fastq files
+
+        """
+        self._ensure_populated()
+        return self._fastq_dirs
+
+    @property
+    def fastq_dir(self):
+        """Return directory with the 'active' fastq file set
+
+        """
+        self._ensure_populated()
+        return self._fastq_dir
+
+    @property
+    def fastq_format(self):
+        """Return format of the fastq files ('fastqgz' or 'fastq')
+
+        """
+        self._ensure_populated()
+        return self._fastq_format
+
+    @property
+    def samples(self):
+        """Return list of AnalysisSample objects
+
+        """
+        self._ensure_populated()
+        return self._samples
+
     @property
     def exists(self):
         """Check if analysis project directory already exists
@@ -998,6 +1349,15 @@ class AnalysisProject:
         """Determine if directory really is an analysis project
 
         """
+        if not self._populated:
+            # Check for Fastqs without assembling the samples
+            fastq_dir = self._requested_fastq_dir
+            if fastq_dir is None:
+                fastq_dir = self._info.primary_fastq_dir
+            if fastq_dir is not None and \
+               not os.path.dirname(os.path.normpath(fastq_dir)):
+                return bool(self.find_fastqs(os.path.join(self.dirn,
+                                                          fastq_dir)))
         return len(self.samples) > 0
 
     @property
@@ -1005,6 +1365,7 @@ class AnalysisProject:
         """
         Return path to default QC outputs directory
         """
+        self._ensure_populated()
         return self._qc_dir
 
     @property
@@ -1012,11 +1373,7 @@ class AnalysisProject:
         """
         List QC output directories
         """
-        qc_dirs = []
-        for d in bcf_utils.list_dirs(self.dirn):
-            if d.startswith("qc"):
-                qc_dirs.append(d)
-        return qc_dirs
+        return self.dir_index.list_dirs(self.dirn,startswith="qc")
 
     @property
     def qc(self):
@@ -1026,7 +1383,8 @@ class AnalysisProject:
         return QCReporter(self)
 
     def qc_report(self,title=None,report_html=None,qc_dir=None,
-                  force=False):
+                  force=False,nprocessors=1,inline_images=True,
+                  incremental=False):
         """
         Report QC outputs for project
 
@@ -1040,13 +1398,25 @@ class AnalysisProject:
           force (bool): if True then force reports to be
             regenerated (by default reports will not be
             regenerated if they already exist)
+          nprocessors (int): number of processes to use
+            when generating the HTML report (default: 1)
+          inline_images (bool): if False then write the
+            plots to an assets directory alongside the
+            HTML report (which is also added to the zip
+            file) rather than embedding them in the report
+            (default is to embed the plots)
+          incremental (bool): if True then only regenerate
+            the report sections for samples with new or
+            updated QC outputs, and only add new or changed
+            files to the existing zip archive (default is
+            to regenerate the reports from scratch)
 
         Returns:
           String: name of zip file, or None if there was a
             problem.
         """
         if qc_dir is None:
-            qc_dir = self._qc_dir
+            qc_dir = self.qc_dir
         elif not os.path.isabs(qc_dir):
             qc_dir = os.path.join(self.dirn,qc_dir)
         if not (force or self.verify_qc(qc_dir=qc_dir)):
@@ -1067,7 +1437,10 @@ class AnalysisProject:
             self.qc.report(title=title,
                            filename=report_html,
                            qc_dir=qc_dir,
-                           relative_links=True)
+                           relative_links=True,
+                           nprocessors=nprocessors,
+                           inline_images=inline_images,
+                           incremental=incremental)
         except Exception as ex:
             logger.error("Exception trying to generate QC report "
                          "for %s: %s" % (self.name,ex))
@@ -1089,21 +1462,28 @@ class AnalysisProject:
                                   prefix="%s.%s.%s" %
                                   (zip_name,
                                    self.name,
-                                   analysis_dir))
+                                   analysis_dir),
+                                  update=incremental)
             # Add the HTML report
             zip_file.add_file(report_html)
+            # Add the images referenced by the report
+            assets_dir = report_assets_dir(report_html)
+            if not inline_images and os.path.isdir(assets_dir):
+                zip_file.add(assets_dir)
             # Add the FastQC and screen files
+            manifest = QCManifest(qc_dir)
             for sample in self.qc.samples:
                 for fastqs in sample.fastq_pairs:
                     for fq in fastqs:
                         logger.debug("Adding QC outputs for %s" % fq)
-                        for f in expected_qc_outputs(fq,qc_dir):
+                        for f in manifest.expected_outputs(fq):
                             if f.endswith('.zip'):
                                 # Exclude .zip file
                                 continue
                             if os.path.exists(f):
                                 zip_file.add(f)
             # Finished
+            zip_file.close()
             return report_zip
         except Exception as ex:
             logger.error("Exception trying to generate zip archive "
@@ -1152,7 +1532,7 @@ class AnalysisProject:
             if QC couldn't be verified.
         """
         if qc_dir is None:
-            qc_dir = self._qc_dir
+            qc_dir = self.qc_dir
         elif not os.path.isabs(qc_dir):
             qc_dir = os.path.join(self.dirn,qc_dir)
         try:
@@ -1171,8 +1551,14 @@ class AnalysisProject:
           KeyError exception if no match is found.
 
         """
-        for sample in self.samples:
-            if sample.name == name: return sample
+        samples = self.samples
+        try:
+            return self._sample_index[name]
+        except KeyError:
+            # Fall back to checking samples which weren't
+            # added when the project was populated
+            for sample in samples:
+                if sample.name == name: return sample
         raise KeyError, "No matching sample for '%s'" % name
 
     def get_samples(self,pattern):
@@ -1186,11 +1572,8 @@ class AnalysisProject:
           pattern (or an empty list if no names match).
 
         """
-        samples = []
-        for sample in self.samples:
-            if bcf_utils.name_matches(sample.name,pattern):
-                samples.append(sample)
-        return samples
+        matches = name_matcher(pattern)
+        return [sample for sample in self.samples if matches(sample.name)]
 
     def prettyPrintSamples(self):
         """Return a nicely formatted string describing the sample names
@@ -1200,6 +1583,57 @@ class AnalysisProject:
         """
         return bcf_utils.pretty_print_names(self.samples)
 
+class _AnalysisProjectInfo(AnalysisProjectInfo):
+    """
+    Internal: metadata for an AnalysisProject
+
+    Extends AnalysisProjectInfo so that the items which
+    are derived from the project's Fastqs are only
+    determined on demand: if 'paired_end' or
+    'primary_fastq_dir' are read when they haven't been
+    set then the supplied function (which is expected to
+    locate the Fastqs and set these items) is invoked
+    first. The derived items are also set before the
+    metadata is saved.
+    """
+    # Items derived from the Fastqs
+    DERIVED_ITEMS = ('paired_end','primary_fastq_dir',)
+
+    def __init__(self,derive):
+        """
+        Create a new _AnalysisProjectInfo instance
+
+        Arguments:
+          derive (function): function to invoke (with no
+            arguments) to set the derived items
+        """
+        AnalysisProjectInfo.__init__(self)
+        self._derive = derive
+
+    def __getitem__(self,key):
+        self._derive_item(key)
+        return AnalysisProjectInfo.__getitem__(self,key)
+
+    def __getattr__(self,attr):
+        self._derive_item(attr)
+        return AnalysisProjectInfo.__getattr__(self,attr)
+
+    def save(self,filen=None):
+        """
+        Set the derived items before saving to file
+        """
+        for key in self.DERIVED_ITEMS:
+            self._derive_item(key)
+        AnalysisProjectInfo.save(self,filen=filen)
+
+    def _derive_item(self,key):
+        """
+        Internal: set derived item if it hasn't been set
+        """
+        if key in self.DERIVED_ITEMS and \
+           AnalysisProjectInfo.__getitem__(self,key) is None:
+            self._derive()
+
 class AnalysisSample:
     """Class describing an analysis sample
 
@@ -1231,6 +1665,8 @@ class AnalysisSample:
         self.name = name
         self.fastq = []
         self.paired_end = False
+        # R1/R2 fastqs partitioned by read number
+        self._fastqs_by_read = {}
         # Function to use for getting Fastq information
         if fastq_attrs is None:
             self.fastq_attrs = AnalysisFastq
@@ -1245,14 +1681,26 @@ class AnalysisSample:
 
         """
         assert(os.path.isabs(fastq))
-        self.fastq.append(fastq)
-        # Sort fastq's into order
-        self.fastq.sort()
+        # Insert fastq in sorted order
+        bisect.insort(self.fastq,fastq)
+        fq = self.fastq_attrs(fastq)
         # Check paired-end status
-        if not self.paired_end:
-            fq = self.fastq_attrs(fastq)
-            if fq.read_number == 2:
-                self.paired_end = True
+        if fq.read_number == 2:
+            self.paired_end = True
+        # Store by read number (excluding index reads)
+        if fq.is_index_read:
+            logger.debug("Rejecting index read %s" % fastq)
+            return
+        if fq.read_number is None:
+            logger.debug("Unable to determine read number for %s,"
+                         "assume R1" % fastq)
+            read_number = 1
+        else:
+            read_number = fq.read_number
+        try:
+            bisect.insort(self._fastqs_by_read[read_number],fastq)
+        except KeyError:
+            self._fastqs_by_read[read_number] = [fastq]
 
     def fastq_subset(self,read_number=None):
         """Return a subset of fastq files from the sample
@@ -1267,24 +1715,9 @@ class AnalysisSample:
           List of full paths to fastq files matching the selection criteria.
 
         """
-        # Build list of fastqs that match the selection criteria
-        fastqs = []
-        for fastq in self.fastq:
-            fq = self.fastq_attrs(fastq)
-            if fq.is_index_read:
-                logger.debug("Rejecting index read %s" % fastq)
-                continue
-            if fq.read_number is None:
-                logger.debug("Unable to determine read number for %s,"
-                             "assume R1" % fastq)
-                fq_read_number = 1
-            else:
-                fq_read_number = fq.read_number
-            if fq_read_number == read_number:
-                fastqs.append(fastq)
-        # Sort into dictionary order and return
-        fastqs.sort()
-        return fastqs
+        # Fastqs are partitioned by read number (and kept in
+        # dictionary order) as they are added
+        return [fq for fq in self._fastqs_by_read.get(read_number,[])]
 
     @property
     def fastqs_are_symlinks(self):
@@ -1305,21 +1738,23 @@ class AnalysisSample:
         """
         return QCSample(self)
 
-    def verify_qc(self,qc_dir,fastq):
+    def verify_qc(self,qc_dir,fastq,verifier=None):
         """Check if QC completed for a fastq file
 
         Arguments:
           qc_dir: name of the QC directory
           fastq : fastq file to get the QC information for
+          verifier: optional, QCVerifier for the QC directory
+            to use for the check (e.g. to share a single
+            listing of the directory between samples)
 
         Returns:
           True if QC completed correctly, False otherwise.
 
         """
-        present,missing = check_qc_outputs(fastq,qc_dir)
-        if missing:
-            return False
-        return True
+        if verifier is None:
+            verifier = QCVerifier(qc_dir)
+        return verifier.verify(fastq)
 
     def __repr__(self):
         """Implement __repr__ built-in
@@ -1467,8 +1902,22 @@ class ZipArchive(object):
     >>> z.add('/data/dir2/') # Add a directory and all contents
     >>> z.close()  # to write the archive
 
+    If 'update' is specified and the zip file already
+    exists then the existing archive is updated when
+    'close' is invoked, rather than being overwritten:
+    members for files which haven't changed (i.e. which
+    have the same size and timestamp) are left as they
+    are, and new files are appended to the archive.
+
+    Zip files can't be modified in place, so if any
+    existing members have changed, or any existing
+    members are not added again, then the archive is
+    rebuilt instead: unchanged members are copied from
+    the existing archive into a temporary file, which
+    then replaces the original.
     """
-    def __init__(self,zip_file,contents=None,relpath=None,prefix=None):
+    def __init__(self,zip_file,contents=None,relpath=None,prefix=None,
+                 update=False):
         """
         Make an new zip archive instance
 
@@ -1483,10 +1932,29 @@ class ZipArchive(object):
             will be prepended to the names of the items written
             to the archive. The prepending takes place after the
             relpath argument has been applied
+          update (bool): optional, if True then update an
+            existing zip file with new and changed members
+            (default is to overwrite any existing zip file)
 
         """
-        self._zipfile = zipfile.ZipFile(zip_file,'w',
-                                        allowZip64=True)
+        self._closed = False
+        self._zip_file = os.path.abspath(zip_file)
+        self._zipfile = None
+        self._members = None
+        self._files = []
+        if update and os.path.exists(self._zip_file):
+            try:
+                with zipfile.ZipFile(self._zip_file,'r',
+                                     allowZip64=True) as z:
+                    self._members = dict([(zinfo.filename,zinfo)
+                                          for zinfo in z.infolist()])
+            except zipfile.BadZipfile as ex:
+                logger.warning("Unable to update existing zip file "
+                               "'%s' (will be overwritten): %s" %
+                               (self._zip_file,ex))
+        if self._members is None:
+            self._zipfile = zipfile.ZipFile(self._zip_file,'w',
+                                            allowZip64=True)
         self._relpath = relpath
         self._prefix = prefix
         if contents is not None:
@@ -1518,7 +1986,72 @@ class ZipArchive(object):
             zip_pth = filen
         if self._prefix:
             zip_pth = os.path.join(self._prefix,zip_pth)
-        self._zipfile.write(filen,zip_pth)
+        if self._members is not None:
+            # Defer until the archive is closed
+            self._files.append((filen,zip_pth))
+        else:
+            self._zipfile.write(filen,zip_pth)
+
+    def _is_unchanged(self,zinfo,filen):
+        """
+        Internal: check if existing member matches a file
+
+        Compares the size and the timestamp (to the
+        two second resolution stored in zip files).
+        """
+        st = os.stat(filen)
+        date_time = list(time.localtime(st.st_mtime)[0:6])
+        date_time[5] = (date_time[5]//2)*2
+        return (zinfo.file_size == st.st_size and
+                tuple(zinfo.date_time) == tuple(date_time))
+
+    def _update(self):
+        """
+        Internal: update the existing archive
+
+        Appends new members if all the existing members
+        are unchanged, otherwise rebuilds the archive.
+        """
+        new_files = []
+        unchanged = set()
+        for filen,zip_pth in self._files:
+            try:
+                zinfo = self._members[zip_pth]
+            except KeyError:
+                new_files.append((filen,zip_pth))
+                continue
+            if self._is_unchanged(zinfo,filen):
+                unchanged.add(zip_pth)
+        if len(unchanged) == len(self._members) and \
+           len(unchanged) + len(new_files) == len(self._files):
+            # Nothing replaced or removed, append new members
+            if new_files:
+                with zipfile.ZipFile(self._zip_file,'a',
+                                     allowZip64=True) as z:
+                    for filen,zip_pth in new_files:
+                        z.write(filen,zip_pth)
+            return
+        # Rebuild the archive in a temporary file
+        logger.debug("Rebuilding zip file '%s'" % self._zip_file)
+        fp,tmp_zip = tempfile.mkstemp(suffix=".tmp",
+                                      dir=os.path.dirname(self._zip_file))
+        os.close(fp)
+        try:
+            with zipfile.ZipFile(self._zip_file,'r',
+                                 allowZip64=True) as existing:
+                with zipfile.ZipFile(tmp_zip,'w',allowZip64=True) as z:
+                    for filen,zip_pth in self._files:
+                        if zip_pth in unchanged:
+                            zinfo = self._members[zip_pth]
+                            z.writestr(copy.copy(zinfo),
+                                       existing.read(zinfo))
+                        else:
+                            z.write(filen,zip_pth)
+            os.chmod(tmp_zip,os.stat(self._zip_file).st_mode & 0777)
+            os.rename(tmp_zip,self._zip_file)
+        except Exception:
+            os.remove(tmp_zip)
+            raise
 
     def add_dir(self,dirn):
         """
@@ -1532,10 +2065,17 @@ class ZipArchive(object):
                 self.add_file(f)
 
     def close(self):
-        self._zipfile.close()
+        if self._closed:
+            return
+        self._closed = True
+        if self._zipfile is not None:
+            self._zipfile.close()
+        else:
+            self._update()
 
     def __del__(self):
-        self.close()
+        if hasattr(self,'_closed'):
+            self.close()
 
 class ProgressChecker(object):
     """
@@ -1709,6 +2249,209 @@ def get_numbered_subdir(name,parent_dir=None,full_path=False):
         subdir = os.path.join(parent_dir,subdir)
     return subdir
 
+# Process-wide cache of parsed Fastq names
+_fastq_name_cache = OrderedDict()
+_fastq_name_lock = threading.Lock()
+
+def parse_fastq_name(fastq):
+    """
+    Extract the components of a Fastq file name
+
+    The name is parsed according to the rules described for
+    the AnalysisFastq class. Results are memoised against the
+    basename of the Fastq, so repeated calls for the same name
+    (including the same name with different leading paths)
+    return the same object without parsing it again. The least
+    recently used names are discarded once the cache holds
+    FASTQ_NAME_CACHE_SIZE entries.
+
+    Arguments:
+      fastq (str): name of the Fastq file (optionally can
+        include leading path)
+
+    Returns:
+      FastqName: immutable named tuple with the components
+        of the name.
+    """
+    key = os.path.basename(fastq)
+    with _fastq_name_lock:
+        try:
+            name = _fastq_name_cache.pop(key)
+            _fastq_name_cache[key] = name
+            return name
+        except KeyError:
+            pass
+    name = _parse_fastq_name(key)
+    with _fastq_name_lock:
+        _fastq_name_cache[key] = name
+        while len(_fastq_name_cache) > FASTQ_NAME_CACHE_SIZE:
+            _fastq_name_cache.popitem(last=False)
+    return name
+
+def clear_fastq_name_cache():
+    """
+    Remove all entries from the process-wide Fastq name cache
+    """
+    with _fastq_name_lock:
+        _fastq_name_cache.clear()
+
+def _parse_fastq_name(fastq):
+    """
+    Internal: parse a Fastq file name (without leading path)
+
+    Arguments:
+      fastq (str): Fastq file name
+
+    Returns:
+      FastqName: the components of the name.
+    """
+    # Basename and extension
+    basename = strip_ngs_extensions(fastq)
+    extension = fastq[len(basename):]
+    # Values derived from the name
+    sample_number = None
+    barcode_sequence = None
+    lane_number = None
+    read_number = None
+    set_number = None
+    is_index_read = False
+    # Determine if it's a non-standard (dot-separated) name
+    #
+    # These are names of the form e.g.
+    # NH1.2.r2
+    # or
+    # NH1_ChIP-seq.ACAGTG.r2
+    if '.' in basename:
+        delimiter = '.'
+        fields = basename.split('.')
+        field = fields[-1]
+        if len(field) == 2 and field.startswith('r'):
+            # Read number
+            read_number = int(field[1])
+            fields = fields[:-1]
+            field = fields[-1]
+        if len(fields) > 1:
+            # Barcode sequence
+            if BARCODE_SEQUENCE.match(field):
+                barcode_sequence = field
+                fields = fields[:-1]
+        # Remaining fields are the sample name
+        sample_name = '.'.join(fields)
+        assert(sample_name != '')
+        return FastqName(basename,extension,_intern(sample_name),
+                         sample_number,barcode_sequence,lane_number,
+                         read_number,set_number,is_index_read,
+                         delimiter)
+    # Some form of Illumina-derived name
+    #
+    # Full Illumina-style names are e.g.
+    # NH1_ChIP-seq_Gli1_ACAGTG_L001_R1_001
+    # or
+    # NH1_ChIP-seq_Gli1_S4_L003_R2_001
+    #
+    # We have shorter name formats where redundant parts are
+    # omitted, the patterns are:
+    # NAME          e.g. NH1_ChIP-seq_Gli1
+    # NAME+LANE     e.g. NH1_ChIP-seq_Gli1_L001
+    # NAME+TAG      e.g. NH1_ChIP-seq_Gli1_ACAGTG
+    # NAME+TAG+LANE e.g. NH1_ChIP-seq_Gli1_ACAGTG_L001
+    #
+    # Also read number (i.e. R1 or R2) is appended but only for
+    # paired end samples
+    #
+    # The set number is never included, except for full names
+    fields = basename.split('_')
+    delimiter = '_'
+    # Deal with set number first e.g. 001
+    field = fields[-1]
+    if len(field) == 3 and field.isdigit():
+        set_number = int(field)
+        fields = fields[:-1]
+    # Deal with trailing read number e.g. R1
+    field = fields[-1]
+    if len(field) == 2:
+        if field.startswith('R'):
+            read_number = int(field[1])
+            fields = fields[:-1]
+        elif field.startswith('I'):
+            read_number = int(field[1])
+            is_index_read = True
+            fields = fields[:-1]
+    # Deal with trailing lane number e.g. L001
+    field = fields[-1]
+    if len(field) == 4 and field.startswith('L') and field[1:].isdigit():
+        lane_number = int(field[1:])
+        fields = fields[:-1]
+    # Deal with trailing index tag e.g. ATTGCT or ATTGCT-CCTAAG
+    field = fields[-1]
+    if len(fields) > 1:
+        # This mustn't be the last field: if it is then it's
+        # not the tag - it's the name
+        if BARCODE_SEQUENCE.match(field):
+            barcode_sequence = field
+            fields = fields[:-1]
+        elif field.startswith('S') and field[1:].isdigit():
+            # Alternatively might be the sample number
+            sample_number = int(field[1:])
+            fields = fields[:-1]
+    # What's left is the name
+    sample_name = '_'.join(fields)
+    assert(sample_name != '')
+    return FastqName(basename,extension,_intern(sample_name),
+                     sample_number,barcode_sequence,lane_number,
+                     read_number,set_number,is_index_read,
+                     delimiter)
+
+def _intern(s):
+    """
+    Internal: intern a string (unicode is returned unchanged)
+    """
+    if isinstance(s,str):
+        return intern(s)
+    return s
+
+def name_matcher(pattern):
+    """
+    Return a function which matches names against a pattern
+
+    The pattern uses the same syntax as 'bcftbx.utils.name_matches'
+    (i.e. one or more comma-separated subpatterns). Subpatterns
+    which are exact names or which only have a trailing '*'
+    are matched using set lookups and string prefix tests, so
+    the returned function can be applied efficiently to large
+    numbers of names; other subpatterns fall back to using
+    'name_matches'.
+
+    Arguments:
+      pattern (str): pattern to match names against
+
+    Returns:
+      Function: function which takes a single name and
+        returns True if it matches the pattern, False if not.
+    """
+    names = set()
+    prefixes = []
+    others = []
+    for subpattern in pattern.split(','):
+        if not any([c in subpattern for c in '*?[']):
+            names.add(subpattern)
+        elif subpattern.endswith('*') and \
+             not any([c in subpattern[:-1] for c in '*?[']):
+            prefixes.append(subpattern[:-1])
+        else:
+            others.append(subpattern)
+    prefixes = tuple(prefixes)
+    def matches(name):
+        if name in names:
+            return True
+        if prefixes and name.startswith(prefixes):
+            return True
+        for subpattern in others:
+            if bcf_utils.name_matches(name,subpattern):
+                return True
+        return False
+    return matches
+
 def find_executables(names,info_func,reqs=None,paths=None):
     """
     List available executables matching list of names
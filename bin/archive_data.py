@@ -61,7 +61,8 @@ class DataArchiver:
         # Set up and start scheduler
         self._sched = simple_scheduler.SimpleScheduler(runner=self._runner,
                                                        reporter=reporter,
-                                                       max_concurrent=4)
+                                                       max_concurrent=4,
+                                                       accounting_dir=log_dir)
         self._sched.start()
 
     def add_data_dir(self,dirn):
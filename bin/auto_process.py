@@ -506,6 +506,8 @@ def add_run_qc_command(cmdparser):
     default_nthreads = __settings.qc.nprocessors
     fastq_screen_subset = __settings.qc.fastq_screen_subset
     max_concurrent_jobs = __settings.general.max_concurrent_jobs
+    default_incremental_report = ("yes" if __settings.qc.incremental_reports
+                                  else "no")
     p.add_option('--projects',action='store',
                  dest='project_pattern',default=None,
                  help="simple wildcard-based pattern specifying a subset of projects "
@@ -540,6 +542,11 @@ def add_run_qc_command(cmdparser):
     p.add_option('--report',action='store',dest='html_file',default=None,
                  help="file name for output HTML QC report (default: "
                  "<QC_DIR>_report.html)")
+    p.add_option('--incremental-report',type='choice',choices=["yes","no"],
+                 dest='incremental_report',default=default_incremental_report,
+                 help="only regenerate the report sections for samples "
+                 "with new or updated QC outputs: 'yes' or 'no' (default: "
+                 "%s)" % default_incremental_report)
     add_runner_option(p)
     add_modulefiles_option(p)
     add_debug_option(p)
@@ -583,6 +590,12 @@ def add_publish_qc_command(cmdparser):
                  dest='exclude_zip_files',default=default_exclude_zips,
                  help="exclude ZIP archives from publication; can be 'yes' "
                  "or 'no' (default: %s)" % default_exclude_zips)
+    default_max_transfers = __settings.qc_web_server.max_transfers
+    p.add_option('--max-transfers',action='store',type='int',
+                 dest='max_transfers',default=default_max_transfers,
+                 help="maximum number of concurrent copy and unzip "
+                 "operations when publishing reports (default: %s)" %
+                 default_max_transfers)
     p.add_option('--ignore-missing-qc',action='store_true',
                  dest='ignore_missing_qc',default=False,
                  help="skip projects where QC results are missing or can't be verified, "
@@ -625,9 +638,22 @@ def add_archive_command(cmdparser):
     p.add_option('--chmod',action='store',dest='chmod',default=default_chmod,
                  help="specify chmod operations for the archived files (default: "
                  "%s)" % default_chmod)
+    default_checksum = __settings.archive.checksum
+    p.add_option('--checksum',action='store',dest='checksum',
+                 default=default_checksum,
+                 choices=('md5','xxhash','none'),
+                 help="specify checksum algorithm for the archive "
+                 "manifest: 'md5' or 'xxhash', or 'none' to skip "
+                 "writing the manifest (default: %s)" %
+                 default_checksum)
     p.add_option('--final',action='store_true',dest='final',default=False,
                  help="copy data to final archive location (default is to "
                  "copy to staging area)")
+    p.add_option('--parallel',action='store_true',dest='parallel',
+                 default=False,
+                 help="copy project directories using concurrent rsync "
+                 "jobs; rerunning after a failure only recopies the "
+                 "directories which weren't copied successfully")
     p.add_option('--force',action='store_true',dest='force',default=False,
                  help="perform archiving operation even if key metadata items are "
                  "not set")
@@ -1028,6 +1054,8 @@ if __name__ == "__main__":
                                fastq_dir=options.fastq_dir,
                                qc_dir=options.qc_dir,
                                report_html=options.html_file,
+                               incremental_report=(
+                                   options.incremental_report == 'yes'),
                                runner=options.runner)
             sys.exit(retcode)
         elif cmd == 'samplesheet':
@@ -1100,6 +1128,8 @@ if __name__ == "__main__":
                                 group=options.group,
                                 perms=options.chmod,
                                 final=options.final,
+                                parallel=options.parallel,
+                                checksum=options.checksum,
                                 force=options.force,
                                 dry_run=options.dry_run)
             sys.exit(retcode)
@@ -1110,7 +1140,8 @@ if __name__ == "__main__":
                          exclude_zip_files=(options.exclude_zip_files == 'yes'),
                          ignore_missing_qc=options.ignore_missing_qc,
                          regenerate_reports=options.regenerate_reports,
-                         force=options.force)
+                         force=options.force,
+                         max_transfers=options.max_transfers)
         elif cmd == 'report':
             if options.logging:
                 mode = ReportingMode.CONCISE
@@ -18,7 +18,7 @@
 # Module metadata
 #######################################################################
 
-__version__ = "0.0.27"
+__version__ = "0.0.28"
 
 #######################################################################
 # Import modules that this module depends on
@@ -30,8 +30,30 @@ import re
 import optparse
 import logging
 import subprocess
+import stat
+from multiprocessing import Pool
 import bcf_utils
-import Md5sum
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        # Fall back to listdir/lstat (see scan_dir)
+        scandir = None
+
+#######################################################################
+# Module data
+#######################################################################
+
+# Types of directory entry
+FILE = 'file'
+DIR = 'dir'
+LINK = 'link'
+OTHER = 'other'
+
+# Size of blocks to read when comparing file contents
+COMPARE_BLOCKSIZE = 4*1024*1024
 
 #######################################################################
 # Classes
@@ -84,9 +106,14 @@ class DataDir:
           Total size for specified files/dirs in request units.
 
         """
+        if pattern is not None:
+            matcher = re.compile(pattern)
         size = 0
-        for f in self.walk(pattern=pattern):
-            size += os.lstat(f).st_size
+        if pattern is None or matcher.match(self.dir):
+            size += os.lstat(self.dir).st_size
+        for f,type_,f_size in scan_tree(self.dir):
+            if pattern is None or matcher.match(f):
+                size += f_size
         #return int(float(size)/1024)
         if human_readable:
             # Format into human-readable format
@@ -112,16 +139,13 @@ class DataDir:
         if include_dirs:
             if pattern is None or matcher.match(self.dir):
                 yield self.dir
-        for dirpath,dirnames,filenames in os.walk(self.dir):
-            if include_dirs:
-                for d in dirnames:
-                    d1 = os.path.join(dirpath,d)
-                    if pattern is None or matcher.match(d1):
-                        yield d1
-            for f in filenames:
-                f1 = os.path.join(dirpath,f)
-                if pattern is None or matcher.match(f1):
-                    yield f1
+        for f,type_,size in scan_tree(self.dir):
+            if not include_dirs:
+                # Exclude directories and links to directories
+                if type_ == DIR or (type_ == LINK and os.path.isdir(f)):
+                    continue
+            if pattern is None or matcher.match(f):
+                yield f
     def copy(self,target,dry_run=False,verbose=False):
         """Create a copy of dir using rsync
 
@@ -216,9 +240,20 @@ class DataDir:
                 users.append(user)
         users.sort()
         return users
-    def verify(self,dirn):
+    def verify(self,dirn,nprocessors=1):
         """Verify another data directory using this one as a reference
 
+        Walks both directories together (see 'compare_dirs'):
+        files are compared by size first, and the contents of
+        files with matching sizes are then compared (using up
+        to 'nprocessors' processes). Results are reported as
+        they become available.
+
+        Arguments:
+          dirn: directory to verify
+          nprocessors: number of processes to use for comparing
+            file contents (default is 1)
+
         Returns
           Counter object.
 
@@ -234,53 +269,10 @@ class DataDir:
         result.add_quantity("missing","Missing from copy")
         result.add_quantity("unreadable_ref","Unreadable reference")
         # Walk the reference directory and check against copy
-        for f in self.walk():
-            f = bcf_utils.PathInfo(f).relpath(self.dir)
-            ref = bcf_utils.PathInfo(f,basedir=self.dir)
-            cpy = bcf_utils.PathInfo(f,basedir=data_dir.dir)
-            # Check copy exists
-            if not ref.is_readable:
-                print "UNREADABLE REFERENCE: %s" % f
-                result.incr('unreadable_ref')
-            elif not cpy.exists:
-                print "MISSING: %s" % f
-                result.incr('missing')
-            elif ref.is_file:
-                # Check copy is the same type
-                if not cpy.is_file:
-                    print "TYPE DIFFERS (NOT FILE): %s" % ref.relpath(self.dir)
-                    result.incr('types_differ')
-                else:
-                    # Compare MD5sums
-                    if Md5sum.Md5Checker.md5cmp_files(ref.path,cpy.path) == \
-                       Md5sum.Md5Checker.MD5_OK:
-                        print "MD5 OK: %s" % ref.relpath(self.dir)
-                        result.incr('ok')
-                    else:
-                        print "MD5 FAILED: %s" % ref.relpath(self.dir)
-                        result.incr('md5_failed')
-            elif ref.is_link:
-                # Check copy is the same type
-                if not cpy.is_link:
-                    print "TYPE DIFFERS (NOT SYMLINK): %s" % ref.relpath(self.dir)
-                    result.incr('types_differ')
-                else:
-                    # Compare targets
-                    if bcf_utils.Symlink(cpy.path).target == \
-                       bcf_utils.Symlink(ref.path).target:
-                        print "SYMLINK OK: %s" % ref.relpath(self.dir)
-                        result.incr('ok')
-                    else:
-                        print "SYMLINK DIFFERS: %s" % ref.relpath(self.dir)
-                        result.incr('links_differ')
-            elif ref.is_dir:
-                # Check copy is the same type
-                if not cpy.is_dir:
-                    print "TYPE DIFFERS (NOT DIR): %s" % ref.relpath(self.dir)
-                    result.incr('types_differ')
-                else:
-                    print "DIR OK: %s" % ref.relpath(self.dir)
-                    result.incr('ok')
+        for f,status,message in compare_dirs(self.dir,data_dir.dir,
+                                             nprocessors=nprocessors):
+            print "%s: %s" % (message,f)
+            result.incr(status)
         # Finished
         return result
     def diff(self,dirn):
@@ -305,41 +297,10 @@ class DataDir:
         result.add_quantity("types_differ","Copy types differ from reference")
         result.add_quantity("unreadable_ref","Unreadable reference")
         # Walk the reference directory and check against copy
-        for f in self.walk():
-            f = bcf_utils.PathInfo(f).relpath(self.dir)
-            ref = bcf_utils.PathInfo(f,basedir=self.dir)
-            cpy = bcf_utils.PathInfo(f,basedir=data_dir.dir)
-            # Check copy exists
-            if not ref.is_readable:
-                print "UNREADABLE REFERENCE: %s" % f
-                result.incr('unreadable_ref')
-            elif not cpy.exists:
-                print "MISSING: %s" % f
-                result.incr('missing')
-            elif ref.is_file:
-                # Check copy is the same type
-                if not cpy.is_file:
-                    print "TYPE DIFFERS (NOT FILE): %s" % ref.relpath(self.dir)
-                    result.incr('types_differ')
-                else:
-                    print "OK: %s" % ref.relpath(self.dir)
-                    result.incr('ok')
-            elif ref.is_link:
-                # Check copy is the same type
-                if not cpy.is_link:
-                    print "TYPE DIFFERS (NOT SYMLINK): %s" % ref.relpath(self.dir)
-                    result.incr('types_differ')
-                else:
-                    print "OK: %s" % ref.relpath(self.dir)
-                    result.incr('ok')
-            elif ref.is_dir:
-                # Check copy is the same type
-                if not cpy.is_dir:
-                    print "TYPE DIFFERS (NOT DIR): %s" % ref.relpath(self.dir)
-                    result.incr('types_differ')
-                else:
-                    print "OK: %s" % ref.relpath(self.dir)
-                    result.incr('ok')
+        for f,status,message in compare_dirs(self.dir,data_dir.dir,
+                                             compare_contents=False):
+            print "%s: %s" % (message,f)
+            result.incr(status)
         # Finished
         return result
 
@@ -418,6 +379,192 @@ class Counter(bcf_utils.AttributeDictionary):
 # Functions
 #######################################################################
 
+def scan_dir(dirn):
+    """Return the entries in a directory
+
+    Uses 'scandir' where available, so that the type of each
+    entry is obtained without an additional system call.
+
+    Returns a dictionary where the keys are the entry names
+    and the values are (type,size) tuples, with 'type' one of
+    FILE, DIR, LINK or OTHER, and 'size' the size reported by
+    'lstat'. Symbolic links are not followed. If 'dirn' isn't
+    a readable directory then the dictionary will be empty.
+
+    """
+    entries = dict()
+    try:
+        if scandir is not None:
+            for entry in scandir(dirn):
+                if entry.is_symlink():
+                    type_ = LINK
+                elif entry.is_dir():
+                    type_ = DIR
+                elif entry.is_file():
+                    type_ = FILE
+                else:
+                    type_ = OTHER
+                entries[entry.name] = (type_,
+                                       entry.stat(follow_symlinks=False).st_size)
+        else:
+            for name in os.listdir(dirn):
+                st = os.lstat(os.path.join(dirn,name))
+                if stat.S_ISLNK(st.st_mode):
+                    type_ = LINK
+                elif stat.S_ISDIR(st.st_mode):
+                    type_ = DIR
+                elif stat.S_ISREG(st.st_mode):
+                    type_ = FILE
+                else:
+                    type_ = OTHER
+                entries[name] = (type_,st.st_size)
+    except OSError:
+        pass
+    return entries
+
+def scan_tree(dirn):
+    """Traverse a directory, yielding information on each entry
+
+    Yields (path,type,size) tuples for each file, directory,
+    symlink etc under 'dirn' (see 'scan_dir'). Symbolic links
+    to directories are not followed.
+
+    """
+    for name,(type_,size) in sorted(scan_dir(dirn).items()):
+        path = os.path.join(dirn,name)
+        yield (path,type_,size)
+        if type_ == DIR:
+            for item in scan_tree(path):
+                yield item
+
+def compare_dirs(ref_dir,cpy_dir,compare_contents=True,nprocessors=1):
+    """Compare a directory against a reference directory
+
+    Walks the reference and copy directories together (scanning
+    each directory in both trees exactly once), and checks
+    that each item in the reference is also present in the copy
+    with the same type. If 'compare_contents' is True then the
+    targets of symlinks are also compared, as are the contents
+    of files: files with different sizes are reported as
+    failing without being read, and files with the same sizes
+    have their contents compared block by block (stopping at
+    the first difference).
+
+    The comparisons are farmed out to 'nprocessors' processes,
+    with the directory walk proceeding in parallel, and the
+    results are yielded as they become available (so not
+    necessarily in the order that the items were found).
+
+    Yields (relpath,status,message) tuples, where 'status' is
+    one of 'ok', 'md5_failed', 'links_differ', 'types_differ',
+    'missing' or 'unreadable_ref', and 'message' is a
+    description of the result.
+
+    """
+    items = _walk_dirs(ref_dir,cpy_dir,compare_contents)
+    if nprocessors > 1:
+        pool = Pool(nprocessors)
+        try:
+            for result in pool.imap_unordered(_compare_item,items):
+                if result is not None:
+                    yield result
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for item in items:
+            result = _compare_item(item)
+            if result is not None:
+                yield result
+
+def _walk_dirs(ref_dir,cpy_dir,compare_contents,relpath='.',
+               ref_info=(DIR,0),cpy_info=None):
+    """Internal: walk reference and copy directories together
+
+    Yields tuples describing each item in the reference
+    directory and the corresponding item in the copy (if
+    any), for input to '_compare_item'.
+
+    """
+    ref_path = os.path.normpath(os.path.join(ref_dir,relpath))
+    cpy_path = os.path.normpath(os.path.join(cpy_dir,relpath))
+    if cpy_info is None and relpath == '.' and os.path.isdir(cpy_path):
+        cpy_info = (DIR,0)
+    yield (relpath,ref_path,cpy_path,ref_info,cpy_info,compare_contents)
+    if ref_info[0] != DIR:
+        return
+    ref_entries = scan_dir(ref_path)
+    if cpy_info is not None and cpy_info[0] == DIR:
+        cpy_entries = scan_dir(cpy_path)
+    else:
+        cpy_entries = dict()
+    for name in sorted(ref_entries):
+        for item in _walk_dirs(ref_dir,cpy_dir,compare_contents,
+                               os.path.normpath(os.path.join(relpath,name)),
+                               ref_entries[name],
+                               cpy_entries.get(name)):
+            yield item
+
+def _compare_item(item):
+    """Internal: compare an item against its reference
+
+    Returns a (relpath,status,message) tuple, or None if
+    the item is of a type which isn't compared.
+
+    """
+    relpath,ref_path,cpy_path,ref_info,cpy_info,compare_contents = item
+    ref_type,ref_size = ref_info
+    if ref_type in (FILE,DIR) and not os.access(ref_path,os.R_OK):
+        return (relpath,'unreadable_ref',"UNREADABLE REFERENCE")
+    if cpy_info is None:
+        return (relpath,'missing',"MISSING")
+    cpy_type,cpy_size = cpy_info
+    if ref_type == FILE:
+        if cpy_type != FILE:
+            return (relpath,'types_differ',"TYPE DIFFERS (NOT FILE)")
+        if not compare_contents:
+            return (relpath,'ok',"OK")
+        if ref_size == cpy_size and compare_files(ref_path,cpy_path):
+            return (relpath,'ok',"MD5 OK")
+        return (relpath,'md5_failed',"MD5 FAILED")
+    elif ref_type == LINK:
+        if cpy_type != LINK:
+            return (relpath,'types_differ',"TYPE DIFFERS (NOT SYMLINK)")
+        if not compare_contents:
+            return (relpath,'ok',"OK")
+        if os.readlink(ref_path) == os.readlink(cpy_path):
+            return (relpath,'ok',"SYMLINK OK")
+        return (relpath,'links_differ',"SYMLINK DIFFERS")
+    elif ref_type == DIR:
+        if cpy_type != DIR:
+            return (relpath,'types_differ',"TYPE DIFFERS (NOT DIR)")
+        if not compare_contents:
+            return (relpath,'ok',"OK")
+        return (relpath,'ok',"DIR OK")
+    return None
+
+def compare_files(file1,file2,blocksize=COMPARE_BLOCKSIZE):
+    """Check whether two files have identical contents
+
+    Reads the files in blocks of 'blocksize' bytes and stops
+    at the first difference. Returns True if the contents are
+    the same, False if they differ or if either file can't be
+    read.
+
+    """
+    try:
+        with open(file1,'rb') as fp1, open(file2,'rb') as fp2:
+            while True:
+                block1 = fp1.read(blocksize)
+                block2 = fp2.read(blocksize)
+                if block1 != block2:
+                    return False
+                if not block1:
+                    return True
+    except IOError,ex:
+        logging.debug("Failed to compare %s and %s: %s" % (file1,file2,ex))
+        return False
+
 def get_size(f):
     if os.path.isfile(f):
         return float(os.lstat(f).st_size)/1024
@@ -791,6 +938,35 @@ class TestDataDirVerify(unittest.TestCase):
         self.assertEqual(result.missing,0)
         self.assertEqual(result.unreadable_ref,0)
         self.assertEqual(result.md5_failed+result.ok,result.total())
+    def test_verify_md5sums_differ_same_size(self):
+        """DataDir.verify() confirms files with same size but different contents
+
+        """
+        # Change content of file in copy without changing the size
+        open(self.example_dir.path("icelandic/takk_fyrir"),'w').write(
+            open(self.reference.path("icelandic/takk_fyrir")).read().swapcase())
+        # Do the verification
+        ref_dir = DataDir(self.ref)
+        result = ref_dir.verify(self.wd)
+        self.assertTrue(result.total() > 0)
+        self.assertEqual(result.md5_failed,1)
+        self.assertEqual(result.md5_failed+result.ok,result.total())
+    def test_verify_multiple_processors(self):
+        """DataDir.verify() gives same results using multiple processors
+
+        """
+        # Change content of file and remove a file in copy
+        open(self.example_dir.path("icelandic/takk_fyrir"),'w').write("Thanking you")
+        os.remove(self.example_dir.path("hello"))
+        # Do the verification
+        ref_dir = DataDir(self.ref)
+        result = ref_dir.verify(self.wd)
+        result_multi = ref_dir.verify(self.wd,nprocessors=4)
+        self.assertEqual(result_multi.total(),result.total())
+        for name in ('ok','md5_failed','links_differ','types_differ',
+                     'missing','unreadable_ref'):
+            self.assertEqual(result_multi[name],result[name])
+        self.assertEqual(result_multi.md5_failed,1)
     def test_verify_symlink_targets_differ(self):
         """DataDir.verify() confirms symlinks with different targets
 
@@ -1104,6 +1280,10 @@ if __name__ == "__main__":
                      'common files, link targets for common links, and any files '
                      'or directories missing from DATA_DIR which are present in '
                      'REF_DIR')
+    group.add_option('-n','--nprocessors',action='store',type='int',
+                     dest='nprocessors',default=1,
+                     help='number of processes to use for comparing file '
+                     'contents when using --verify (default: 1)')
     group.add_option('--diff',action='store',dest='diff_dir',default=None,
                      help='check whether DATA_DIR contains files, directories and '
                      'symlinks in DIFF_DIR. Only lists missing items, not whether '
@@ -1176,7 +1356,9 @@ if __name__ == "__main__":
     if options.ref_dir is not None:
         print "Verifying %s against reference directory %s" % (data_dir.dir,
                                                                options.ref_dir)
-        result = DataDir(options.ref_dir).verify(data_dir.dir)
+        result = DataDir(options.ref_dir).verify(
+            data_dir.dir,
+            nprocessors=options.nprocessors)
         # Print report
         result.report()
         status = 0 if result.total() == result.ok else 1
@@ -155,14 +155,10 @@ def update_project_metadata(unaligned_dir,
         print "Creating new project metadata file: %s" % filen
         project_metadata = ProjectMetadataFile()
     # Populate/update
-    for project in illumina_data.projects:
-        project_name = project.name
-        sample_names = [s.name for s in project.samples]
-        if project_name not in project_metadata:
-            project_metadata.add_project(project_name,sample_names)
-        else:
-            project_metadata.update_project(project_name,
-                                            sample_names=sample_names)
+    project_metadata.update_projects(
+        [(project.name,
+          dict(sample_names=[s.name for s in project.samples]))
+         for project in illumina_data.projects])
     # Save
     project_metadata.save(filen)
 
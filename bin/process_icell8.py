@@ -33,6 +33,7 @@ from auto_process_ngs.pipeliner import Pipeline
 from auto_process_ngs.pipeliner import PipelineCommand
 from auto_process_ngs.pipeliner import PipelineCommandWrapper
 from auto_process_ngs.pipeliner import PipelineTask
+from auto_process_ngs.pipeliner import PipelineMapTask
 from auto_process_ngs.pipeliner import FileCollector
 from auto_process_ngs.fastq_utils import pair_fastqs
 from auto_process_ngs.fastq_utils import get_read_number
@@ -55,6 +56,8 @@ logger = logging.getLogger(__name__)
 ######################################################################
 
 DEFAULT_BATCH_SIZE = __settings.icell8.batch_size
+STAGE_COMPLETED = ".completed"
+STAGE_IN_PROGRESS = ".in_progress"
 
 ######################################################################
 # ICell8 pipeline commands
@@ -283,12 +286,17 @@ class TrimFastqPair(PipelineCommand):
         """
         self._fastq_pair = fastq_pair
         self._trim_dir = os.path.abspath(trim_dir)
+    def output_fastq_pair(self):
+        """
+        Return the output R1/R2 FASTQ file pair
+        """
+        return [os.path.join(self._trim_dir,
+                             strip_ext(os.path.basename(fq),'.fastq')
+                             + '.trimmed.fastq')
+                for fq in self._fastq_pair]
     def cmd(self):
         # Generate output file pair names
-        fastq_pair_out = [os.path.join(self._trim_dir,
-                                       strip_ext(os.path.basename(fq),'.fastq')
-                                       + '.trimmed.fastq')
-                          for fq in self._fastq_pair]
+        fastq_pair_out = self.output_fastq_pair()
         # Build command
         cmd = Command(
             'cutadapt',
@@ -322,12 +330,17 @@ class FilterPolyGReads(PipelineCommand):
         """
         self._fastq_pair = fastq_pair
         self._out_dir = os.path.abspath(out_dir)
+    def output_fastq_pair(self):
+        """
+        Return the output R1/R2 FASTQ file pair
+        """
+        return [os.path.join(self._out_dir,
+                             strip_ext(os.path.basename(fq),'.fastq')
+                             + '.poly_g.fastq')
+                for fq in self._fastq_pair]
     def cmd(self):
         # Generate output file pair names
-        fastq_pair_out = [os.path.join(self._out_dir,
-                                       strip_ext(os.path.basename(fq),'.fastq')
-                                       + '.poly_g.fastq')
-                          for fq in self._fastq_pair]
+        fastq_pair_out = self.output_fastq_pair()
         # Build command
         cmd = Command(
             'cutadapt',
@@ -371,6 +384,14 @@ class ContaminantFilterFastqPair(PipelineCommand):
         self._contaminants_conf = os.path.abspath(contaminants_conf)
         self._aligner = aligner
         self._threads = threads
+    def output_fastq_pair(self):
+        """
+        Return the output R1/R2 FASTQ file pair
+        """
+        return [os.path.join(self._filter_dir,
+                             strip_ext(os.path.basename(fq),'.fastq')
+                             + '.filtered.fastq')
+                for fq in self._fastq_pair]
     def cmd(self):
         # Build the command
         cmd = Command(
@@ -741,26 +762,31 @@ class FilterICell8Fastqs(PipelineTask):
         """
         pass
     def setup(self):
-        if os.path.exists(self.args.filter_dir):
+        if stage_completed(self.args.filter_dir):
             print "%s already exists" % self.args.filter_dir
+            for fastq_pair in pair_fastqs(
+                    self.output().fastqs.assigned)[0]:
+                self.stream.add(fastq_pair)
             return
-        self.tmp_filter_dir = tmp_dir(self.args.filter_dir)
+        start_stage(self.args.filter_dir)
         fastq_pairs = pair_fastqs(self.args.fastqs)[0]
         for fastq_pair in fastq_pairs:
             basename = os.path.basename(fastq_pair[0])[:-len(".r1.fastq")]
             self.add_cmd(SplitAndFilterFastqPair(
                 fastq_pair,
-                self.tmp_filter_dir,
+                self.args.filter_dir,
                 well_list=self.args.well_list,
                 basename=basename,
                 mode=self.args.mode,
                 discard_unknown_barcodes=self.args.discard_unknown_barcodes,
-                quality_filter=self.args.quality_filter))
+                quality_filter=self.args.quality_filter),
+                         stream_item=[os.path.join(
+                             self.args.filter_dir,
+                             "%s.filtered.r%d.fastq" % (basename,i))
+                                      for i in (1,2)])
     def finish(self):
         print self.stdout
-        if not os.path.exists(self.args.filter_dir):
-            print "Moving tmp dir to final location"
-            os.rename(self.tmp_filter_dir,self.args.filter_dir)
+        finish_stage(self.args.filter_dir)
     def output(self):
         """Returns object pointing to outputs
 
@@ -771,6 +797,10 @@ class FilterICell8Fastqs(PipelineTask):
         - 'patterns': object with properties which are glob-style
            patterns matching output Fastqs (see below)
 
+        In addition the Fastq pairs with assigned reads are
+        streamed via the task's 'stream' property as each
+        batch completes.
+
         The output Fastqs are:
 
         - 'assigned': Fastqs with reads assigned to known barcodes
@@ -809,7 +839,62 @@ class FilterICell8Fastqs(PipelineTask):
             fastqs=fastqs,
         )
 
-class TrimReads(PipelineTask):
+class FastqPairsMapTask(PipelineMapTask):
+    """
+    Base class for stages which process each R1/R2 Fastq pair
+
+    Runs a command for each R1/R2 Fastq pair supplied via
+    the 'fastqs' argument, writing the outputs to the
+    stage directory.
+
+    Subclasses should implement the 'stage_dir' and
+    'pair_command' methods. If the command has an
+    'output_fastq_pair' method then the output pairs are
+    streamed via the task's 'stream' property as each pair
+    completes.
+
+    If the stage has already been completed then no
+    commands are run (and the existing outputs are
+    streamed); input pairs which don't exist (e.g.
+    because a batch had no reads) are ignored.
+    """
+    def stage_dir(self):
+        """
+        Return the directory to write outputs to
+        """
+        raise NotImplementedError("Subclass must implement 'stage_dir'")
+    def pair_command(self,fastq_pair):
+        """
+        Return the PipelineCommand for a Fastq pair
+        """
+        raise NotImplementedError("Subclass must implement "
+                                  "'pair_command'")
+    def setup(self):
+        self.skip = stage_completed(self.stage_dir())
+        if self.skip:
+            print "%s already exists" % self.stage_dir()
+            return
+        start_stage(self.stage_dir())
+    def map_items(self):
+        return self.args.fastqs
+    def map_command(self,fastq_pair):
+        if not fastq_pair_exists(fastq_pair):
+            print "Missing Fastq pair %s: ignored" % fastq_pair
+            return None
+        if self.skip:
+            return None
+        return self.pair_command(fastq_pair)
+    def map_output(self,fastq_pair):
+        if not fastq_pair_exists(fastq_pair):
+            return None
+        command = self.pair_command(fastq_pair)
+        if not hasattr(command,'output_fastq_pair'):
+            return None
+        return command.output_fastq_pair()
+    def finish(self):
+        finish_stage(self.stage_dir())
+
+class TrimReads(FastqPairsMapTask):
     """
     Run 'cutadapt' with ICell8 settings
 
@@ -828,28 +913,27 @@ class TrimReads(PipelineTask):
     Output Fastqs contain the filtered and trimmed reads
     only.
     """
-    def init(self,fastqs,trim_dir):
+    def init(self,fastqs,trim_dir,chunk_size=1,
+             max_concurrent=None):
         """
         Initialise the TrimReads task
 
         Arguments:
-          fastqs (list): input Fastqs
+          fastqs (OutputStream): stream of input R1/R2
+            Fastq pairs
           trim_dir (str): destination directory to
             write output files to
+          chunk_size (int): number of Fastq pairs to
+            process in each job (default: 1)
+          max_concurrent (int): maximum number of jobs
+            from the task to run at the same time
+            (default: no limit)
         """
         pass
-    def setup(self):
-        if os.path.exists(self.args.trim_dir):
-            print "%s already exists" % self.args.trim_dir
-            return
-        self.tmp_trim_dir = tmp_dir(self.args.trim_dir)
-        fastq_pairs = pair_fastqs(self.args.fastqs)[0]
-        for fastq_pair in fastq_pairs:
-            self.add_cmd(TrimFastqPair(fastq_pair,
-                                       self.tmp_trim_dir))
-    def finish(self):
-        if not os.path.exists(self.args.trim_dir):
-            os.rename(self.tmp_trim_dir,self.args.trim_dir)
+    def stage_dir(self):
+        return self.args.trim_dir
+    def pair_command(self,fastq_pair):
+        return TrimFastqPair(fastq_pair,self.args.trim_dir)
     def output(self):
         """
         Returns object pointing to trimmed Fastq files
@@ -859,6 +943,10 @@ class TrimReads(PipelineTask):
         - pattern: glob-style pattern matching output Fastq
           file names
         - fastqs: FileCollector listing output Fastq files
+
+        In addition the trimmed Fastq pairs are streamed
+        via the task's 'stream' property as each pair
+        completes.
         """
         out_dir = self.args.trim_dir
         pattern = "*.trimmed.fastq"
@@ -867,7 +955,7 @@ class TrimReads(PipelineTask):
             fastqs=FileCollector(out_dir,pattern)
         )
 
-class GetReadsWithPolyGRegions(PipelineTask):
+class GetReadsWithPolyGRegions(FastqPairsMapTask):
     """
     Run 'cutadapt' to identify reads with poly-G regions
 
@@ -876,28 +964,28 @@ class GetReadsWithPolyGRegions(PipelineTask):
     contain poly-G regions (all other read pairs are
     discarded).
     """
-    def init(self,fastqs,poly_g_regions_dir):
+    def init(self,fastqs,poly_g_regions_dir,chunk_size=1,
+             max_concurrent=None):
         """
         Initialise the GetReadsWithPolyGRegions task
 
         Arguments:
-          fastqs (list): input Fastq files
-          out_dir (str): destination directory to
-            write output files to
+          fastqs (OutputStream): stream of input R1/R2
+            Fastq pairs
+          poly_g_regions_dir (str): destination directory
+            to write output files to
+          chunk_size (int): number of Fastq pairs to
+            process in each job (default: 1)
+          max_concurrent (int): maximum number of jobs
+            from the task to run at the same time
+            (default: no limit)
         """
         pass
-    def setup(self):
-        if os.path.exists(self.args.poly_g_regions_dir):
-            print "%s already exists" % self.args.poly_g_regions_dir
-            return
-        self.tmp_poly_g_regions_dir = tmp_dir(self.args.poly_g_regions_dir)
-        fastq_pairs = pair_fastqs(self.args.fastqs)[0]
-        for fastq_pair in fastq_pairs:
-            self.add_cmd(FilterPolyGReads(fastq_pair,
-                                          self.tmp_poly_g_regions_dir))
-    def finish(self):
-        if not os.path.exists(self.args.poly_g_regions_dir):
-            os.rename(self.tmp_poly_g_regions_dir,self.args.poly_g_regions_dir)
+    def stage_dir(self):
+        return self.args.poly_g_regions_dir
+    def pair_command(self,fastq_pair):
+        return FilterPolyGReads(fastq_pair,
+                                self.args.poly_g_regions_dir)
     def output(self):
         """
         Returns object pointing to Fastqs with poly-G regions
@@ -915,7 +1003,7 @@ class GetReadsWithPolyGRegions(PipelineTask):
             fastqs=FileCollector(out_dir,pattern)
         )
 
-class FilterContaminatedReads(PipelineTask):
+class FilterContaminatedReads(FastqPairsMapTask):
     """
     Filter 'contaminated' reads from Fastq files
 
@@ -929,12 +1017,14 @@ class FilterContaminatedReads(PipelineTask):
     mammalian genomes) are excluded.
     """
     def init(self,fastqs,filter_dir,mammalian_conf,
-             contaminants_conf,aligner=None,threads=None):
+             contaminants_conf,aligner=None,threads=None,
+             max_concurrent=None):
         """
         Initialise the FilterContaminatedReads task
 
         Arguments:
-          fastqs (list): input Fastqs
+          fastqs (OutputStream): stream of input R1/R2
+            Fastq pairs
           filter_dir (str): destination directory to
             write output files to
           mammalian_conf (str): path to FastqScreen
@@ -947,25 +1037,21 @@ class FilterContaminatedReads(PipelineTask):
           threads (int): explicitly specify number of
             threads to run FastqScreen using
             (optional)
+          max_concurrent (int): maximum number of jobs
+            from the task to run at the same time
+            (default: no limit)
         """
         pass
-    def setup(self):
-        if os.path.exists(self.args.filter_dir):
-            print "%s already exists" % self.args.filter_dir
-            return
-        self.tmp_filter_dir = tmp_dir(self.args.filter_dir)
-        fastq_pairs = pair_fastqs(self.args.fastqs)[0]
-        for fastq_pair in fastq_pairs:
-            self.add_cmd(ContaminantFilterFastqPair(
-                fastq_pair,
-                self.tmp_filter_dir,
-                self.args.mammalian_conf,
-                self.args.contaminants_conf,
-                aligner=self.args.aligner,
-                threads=self.args.threads))
-    def finish(self):
-        if not os.path.exists(self.args.filter_dir):
-            os.rename(self.tmp_filter_dir,self.args.filter_dir)
+    def stage_dir(self):
+        return self.args.filter_dir
+    def pair_command(self,fastq_pair):
+        return ContaminantFilterFastqPair(
+            fastq_pair,
+            self.args.filter_dir,
+            self.args.mammalian_conf,
+            self.args.contaminants_conf,
+            aligner=self.args.aligner,
+            threads=self.args.threads)
     def output(self):
         """
         Returns object pointing to the contaminant-filtered Fastqs
@@ -975,6 +1061,10 @@ class FilterContaminatedReads(PipelineTask):
         - pattern: glob-style pattern matching output Fastq
           file names
         - fastqs: FileCollector listing output Fastq files
+
+        In addition the filtered Fastq pairs are streamed
+        via the task's 'stream' property as each pair
+        completes.
         """
         out_dir = self.args.filter_dir
         pattern = "*.trimmed.filtered.fastq"
@@ -983,7 +1073,7 @@ class FilterContaminatedReads(PipelineTask):
             fastqs=FileCollector(out_dir,pattern)
         )
 
-class SplitByBarcodes(PipelineTask):
+class SplitByBarcodes(FastqPairsMapTask):
     """
     Given a set of Fastq files, arrange into
     R1/R2 pairs then pool read pairs and group
@@ -992,32 +1082,31 @@ class SplitByBarcodes(PipelineTask):
     Output Fastqs are named:
     ``<BASENAME>.<BARCODE>.r[1|2].fastq``.
     """
-    def init(self,fastqs,barcodes_dir):
+    def init(self,fastqs,barcodes_dir,chunk_size=1,
+             max_concurrent=None):
         """
         Initialise the SplitByBarcodes task
 
         Arguments:
-          fastqs (list): input Fastq files
+          fastqs (OutputStream): stream of input R1/R2
+            Fastq pairs
           barcodes_dir (str): destination directory
             to write output files to
+          chunk_size (int): number of Fastq pairs to
+            process in each job (default: 1)
+          max_concurrent (int): maximum number of jobs
+            from the task to run at the same time
+            (default: no limit)
         """
         pass
-    def setup(self):
-        if os.path.exists(self.args.barcodes_dir):
-            print "%s already exists" % self.args.barcodes_dir
-            return
-        self.tmp_barcodes_dir = tmp_dir(self.args.barcodes_dir)
-        fastq_pairs = pair_fastqs(self.args.fastqs)[0]
-        for fastq_pair in fastq_pairs:
-            basename = os.path.basename(fastq_pair[0])[:-len(".r1.fastq")+1]
-            self.add_cmd(SplitAndFilterFastqPair(
-                fastq_pair,
-                self.tmp_barcodes_dir,
-                basename=basename,
-                mode="barcodes"))
-    def finish(self):
-        if not os.path.exists(self.args.barcodes_dir):
-            os.rename(self.tmp_barcodes_dir,self.args.barcodes_dir)
+    def stage_dir(self):
+        return self.args.barcodes_dir
+    def pair_command(self,fastq_pair):
+        basename = os.path.basename(fastq_pair[0])[:-len(".r1.fastq")+1]
+        return SplitAndFilterFastqPair(fastq_pair,
+                                       self.args.barcodes_dir,
+                                       basename=basename,
+                                       mode="barcodes")
     def output(self):
         """
         Returns object pointing to the barcode-pooled Fastqs
@@ -1699,6 +1788,70 @@ def tmp_dir(d):
     mkdir(tmp)
     return tmp
 
+def stage_completed(d):
+    """
+    Check if the outputs in directory 'd' are complete
+
+    Used for stages which stream their outputs, and
+    so write directly into the final directory 'd'
+    rather than a temp dir (see 'start_stage' and
+    'finish_stage').
+
+    An existing directory without an 'in progress'
+    marker is also treated as complete (for example,
+    outputs from earlier versions which moved a temp
+    dir into place once the stage had finished).
+    """
+    if os.path.exists(os.path.join(d,STAGE_COMPLETED)):
+        return True
+    return (os.path.isdir(d) and
+            not os.path.exists(os.path.join(d,STAGE_IN_PROGRESS)))
+
+def start_stage(d):
+    """
+    Create a clean output directory 'd' for a stage
+
+    The directory is marked as 'in progress' until
+    'finish_stage' is called; any existing outputs
+    with this marker (i.e. from an earlier run which
+    didn't complete) are removed. Directories without
+    the marker are never removed.
+    """
+    if os.path.exists(d):
+        if not os.path.exists(os.path.join(d,STAGE_IN_PROGRESS)):
+            raise Exception("'%s': existing outputs not created by "
+                            "this pipeline, won't remove" % d)
+        print "Removing incomplete outputs in '%s'" % d
+        shutil.rmtree(d)
+    # Create and mark in a temp dir, so that the final
+    # directory never exists without the marker
+    tmp = tmp_dir(d)
+    with open(os.path.join(tmp,STAGE_IN_PROGRESS),'w') as fp:
+        fp.write("")
+    print "Creating output dir '%s'" % d
+    os.rename(tmp,d)
+    return d
+
+def finish_stage(d):
+    """
+    Mark the outputs in directory 'd' as complete
+    """
+    if not os.path.exists(os.path.join(d,STAGE_COMPLETED)):
+        with open(os.path.join(d,STAGE_COMPLETED),'w') as fp:
+            fp.write("")
+    in_progress = os.path.join(d,STAGE_IN_PROGRESS)
+    if os.path.exists(in_progress):
+        os.remove(in_progress)
+
+def fastq_pair_exists(fastq_pair):
+    """
+    Check that both Fastqs in an R1/R2 pair exist
+    """
+    for fq in fastq_pair:
+        if not os.path.exists(fq):
+            return False
+    return True
+
 def convert_to_xlsx(tsv_file,xlsx_file,title=None,freeze_header=False):
     """
     Convert a tab-delimited file to an XLSX file
@@ -1808,12 +1961,23 @@ if __name__ == "__main__":
                    help="number of reads per batch when splitting "
                    "FASTQ files for processing (default: %s)" %
                    default_batch_size)
+    p.add_argument("--chunk-size",type=int,
+                   dest="chunk_size",default=1,
+                   help="number of batches to process in each job "
+                   "for the read trimming, poly-G and barcode "
+                   "splitting stages (default: 1)")
     p.add_argument("-j","--max-jobs",type=int,
                    dest="max_jobs",
                    default= __settings.general.max_concurrent_jobs,
                    help="maxiumum number of concurrent jobs to run "
                    "(default: %d)"
                    % __settings.general.max_concurrent_jobs)
+    p.add_argument("--max-stage-jobs",type=int,
+                   dest="max_stage_jobs",default=None,
+                   help="maximum number of concurrent jobs to run "
+                   "for each of the per-batch stages (read trimming, "
+                   "poly-G, contaminant filtering and barcode "
+                   "splitting) (default: only limited by --max-jobs)")
     p.add_argument('--modulefiles',action='store',
                    dest='modulefiles',default=None,
                    help="comma-separated list of environment "
@@ -1981,6 +2145,8 @@ if __name__ == "__main__":
                     print "-- %s" % line.split('\t')[1]
             print "Fastq_screen aligner    : %s" % args.aligner
     print "Maximum concurrent jobs : %s" % max_jobs
+    if args.max_stage_jobs:
+        print "Maximum jobs per stage  : %s" % args.max_stage_jobs
     print "Stage specific settings :"
     for stage in stages:
         print "-- %s: %s (nprocs=%d)" % (stage,
@@ -2149,9 +2315,11 @@ if __name__ == "__main__":
         poly_g_dir = os.path.join(icell8_dir,"_fastqs.poly_g")
         get_poly_g_reads = GetReadsWithPolyGRegions(
             "Find reads with poly-G regions",
-            collect_filtered_fastqs.output(),
-            poly_g_dir)
-        ppl.add_task(get_poly_g_reads,requires=(collect_filtered_fastqs,))
+            filter_fastqs.stream,
+            poly_g_dir,
+            chunk_size=args.chunk_size,
+            max_concurrent=args.max_stage_jobs)
+        ppl.add_task(get_poly_g_reads,requires=(filter_fastqs,))
         collect_poly_g_fastqs = CollectFiles("Collect poly-G fastqs",
                                              poly_g_dir,
                                              get_poly_g_reads.output().pattern)
@@ -2166,12 +2334,16 @@ if __name__ == "__main__":
                      requires=(collect_poly_g_fastqs,filter_stats),
                      runner=runners['statistics'])
 
-        # Set up the cutadapt jobs as a group
+        # Set up the cutadapt jobs
+        # NB filtered batches are streamed into the trimming and
+        # subsequent stages as each one completes
         trim_dir = os.path.join(icell8_dir,"_fastqs.trim_reads")
         trim_reads = TrimReads("Read trimming",
-                               collect_filtered_fastqs.output(),
-                               trim_dir)
-        ppl.add_task(trim_reads,requires=(collect_filtered_fastqs,))
+                               filter_fastqs.stream,
+                               trim_dir,
+                               chunk_size=args.chunk_size,
+                               max_concurrent=args.max_stage_jobs)
+        ppl.add_task(trim_reads,requires=(filter_fastqs,))
         collect_trimmed_fastqs = CollectFiles("Collect trimmed fastqs",
                                               trim_dir,
                                               trim_reads.output().pattern)
@@ -2188,21 +2360,22 @@ if __name__ == "__main__":
                                           poly_g_stats),
                      runner=runners['statistics'])
 
-        # Set up the contaminant filter jobs as a group
+        # Set up the contaminant filter jobs
         if do_contaminant_filter:
             contaminant_filter_dir = os.path.join(
                 icell8_dir,
                 "_fastqs.contaminant_filter")
             contaminant_filter = FilterContaminatedReads(
                 "Contaminant filtering",
-                collect_trimmed_fastqs.output(),
+                trim_reads.stream,
                 contaminant_filter_dir,
                 args.mammalian_conf,
                 args.contaminants_conf,
                 aligner=args.aligner,
-                threads=nprocessors['contaminant_filter'])
+                threads=nprocessors['contaminant_filter'],
+                max_concurrent=args.max_stage_jobs)
             ppl.add_task(contaminant_filter,
-                         requires=(collect_trimmed_fastqs,),
+                         requires=(trim_reads,),
                          runner=runners['contaminant_filter'])
             collect_contaminant_filtered = CollectFiles(
                 "Collect contaminant-filtered fastqs",
@@ -2223,18 +2396,20 @@ if __name__ == "__main__":
                          requires=(collect_contaminant_filtered,
                                    trim_stats),
                          runner=runners['statistics'])
-            fastqs_in = collect_contaminant_filtered.output()
-            split_barcodes_requires = (collect_contaminant_filtered,)
+            fastqs_in = contaminant_filter.stream
+            split_barcodes_requires = (contaminant_filter,)
         else:
-            fastqs_in = collect_trimmed_fastqs.output()
-            split_barcodes_requires = (collect_trimmed_fastqs,)
+            fastqs_in = trim_reads.stream
+            split_barcodes_requires = (trim_reads,)
 
         # Prepare for rebatching reads by barcode and sample by splitting
         # each batch by barcode
         split_barcoded_fastqs_dir = os.path.join(icell8_dir,"_fastqs.split_barcodes")
         split_barcodes = SplitByBarcodes("Split batches by barcode",
                                          fastqs_in,
-                                         split_barcoded_fastqs_dir)
+                                         split_barcoded_fastqs_dir,
+                                         chunk_size=args.chunk_size,
+                                         max_concurrent=args.max_stage_jobs)
         ppl.add_task(split_barcodes,requires=split_barcodes_requires)
         collect_split_barcodes = CollectFiles("Collect barcode-split fastqs",
                                               split_barcoded_fastqs_dir,
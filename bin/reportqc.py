@@ -15,7 +15,9 @@ import logging
 from auto_process_ngs.utils import AnalysisProject
 from auto_process_ngs.utils import ZipArchive
 from auto_process_ngs.qc.illumina_qc import QCReporter
-from auto_process_ngs.qc.illumina_qc import expected_qc_outputs
+from auto_process_ngs.qc.illumina_qc import QCVerifier
+from auto_process_ngs.qc.illumina_qc import QCManifest
+from auto_process_ngs.qc.illumina_qc import report_assets_dir
 from auto_process_ngs import get_version
 
 # Module specific logger
@@ -47,15 +49,14 @@ def verify_qc(project,qc_dir=None):
         don't pass the verification check.
     """
     if qc_dir is None:
-        qc_dir = self.qc_dir
+        qc_dir = project.qc_dir
     fastqs = []
     for sample in project.samples:
-        for fq in sample.fastq:
-            if not sample.verify_qc(qc_dir,fq):
-                fastqs.append(fq)
-    return fastqs
+        fastqs.extend(sample.fastq)
+    return list(QCVerifier(qc_dir).missing_outputs(fastqs).keys())
 
-def zip_report(project,report_html,qc_dir=None):
+def zip_report(project,report_html,qc_dir=None,inline_images=True,
+               update=False):
     """
     Create ZIP archive for a QC report
 
@@ -65,6 +66,10 @@ def zip_report(project,report_html,qc_dir=None):
       qc_dir (str): optional name of subdirectory
         containing QC outputs (defaults to default
         QC subdir from the project)
+      inline_images (bool): if False then also add
+        the assets directory for the report
+      update (bool): if True then only add new or
+        changed files to an existing ZIP file
 
     Returns:
       String: path to the output ZIP file.
@@ -82,24 +87,31 @@ def zip_report(project,report_html,qc_dir=None):
                           prefix="%s.%s.%s" %
                           (basename,
                            project.name,
-                           analysis_dir))
+                           analysis_dir),
+                          update=update)
     # Get QC dir if not set
     if qc_dir is None:
-        qc_dir = self.qc_dir
+        qc_dir = project.qc_dir
     # Add the HTML report
     zip_file.add_file(report_html)
+    # Add the images referenced by the report
+    assets_dir = report_assets_dir(report_html)
+    if not inline_images and os.path.isdir(assets_dir):
+        zip_file.add(assets_dir)
     # Add the FastQC and screen files
+    manifest = QCManifest(qc_dir)
     for sample in project.qc.samples:
         for fastqs in sample.fastq_pairs:
             for fq in fastqs:
                 logger.debug("Adding QC outputs for %s" % fq)
-                for f in expected_qc_outputs(fq,qc_dir):
+                for f in manifest.expected_outputs(fq):
                     if f.endswith('.zip'):
                         # Exclude .zip file
                         continue
                     if os.path.exists(f):
                         zip_file.add(f)
     # Finished
+    zip_file.close()
     return report_zip
 
 #######################################################################
@@ -136,6 +148,20 @@ def main():
                          dest='force',default=False,
                          help="force generation of reports even if "
                          "verification fails")
+    reporting.add_option('-n','--nprocessors',action='store',type='int',
+                         dest='nprocessors',default=1,
+                         help="number of processes to use when generating "
+                         "the report sections for each sample (default: 1)")
+    reporting.add_option('--external-images',action='store_true',
+                         dest='external_images',default=False,
+                         help="write FastQC and FastqScreen plots to a "
+                         "separate assets directory alongside the report "
+                         "instead of embedding them in the HTML")
+    reporting.add_option('--incremental',action='store_true',
+                         dest='incremental',default=False,
+                         help="only regenerate the report sections for "
+                         "samples with new or updated QC outputs (and "
+                         "only update changed files in the ZIP archive)")
     p.add_option_group(reporting)
     verification = optparse.OptionGroup(p,'Verification options')
     verification.add_option('--verify',action='store_true',dest='verify',
@@ -199,10 +225,17 @@ def main():
         print "Writing QC report to %s" % out_file
         report_html= QCReporter(p).report(qc_dir=qc_dir,
                                           title=opts.title,
-                                          filename=out_file)
+                                          filename=out_file,
+                                          nprocessors=opts.nprocessors,
+                                          inline_images=
+                                          (not opts.external_images),
+                                          incremental=opts.incremental)
         # Generate ZIP archive
         if opts.zip:
-            report_zip = zip_report(p,qc_dir,report_html)
+            report_zip = zip_report(p,report_html,qc_dir=qc_dir,
+                                    inline_images=
+                                    (not opts.external_images),
+                                    update=opts.incremental)
             print "ZIP archive: %s" % report_zip
     # Finish with appropriate exit code
     sys.exit(retval)
@@ -26,7 +26,8 @@ from bcftbx.JobRunner import fetch_runner
 from auto_process_ngs.utils import AnalysisProject
 from auto_process_ngs.applications import Command
 from auto_process_ngs.simple_scheduler import SimpleScheduler
-from auto_process_ngs.qc.illumina_qc import check_qc_outputs
+from auto_process_ngs.qc.illumina_qc import QCVerifier
+from auto_process_ngs.qc.illumina_qc import update_qc_manifests
 import auto_process_ngs
 import auto_process_ngs.settings
 import auto_process_ngs.envmod as envmod
@@ -187,18 +188,39 @@ if __name__ == "__main__":
         out_file = os.path.join(project.dirn,out_file)
     print "QC report: %s" % out_file
 
+    # Get QC script version
+    try:
+        status,qc_script_info = Command(
+            'illumina_qc.sh','--version').subprocess_check_output()
+        qc_script_version = qc_script_info.strip().split()[-1]
+        print "Using QC script %s" % qc_script_info.strip()
+    except Exception as ex:
+        logger.warning("Unable to get QC script version: %s" % ex)
+        qc_script_version = None
+
     # Run the QC
     announce("Running QC")
     max_jobs = __settings.general.max_concurrent_jobs
     sched = SimpleScheduler(runner=qc_runner,
-                            max_concurrent=max_jobs)
+                            max_concurrent=max_jobs,
+                            accounting_dir=log_dir)
     sched.start()
+    verifier = QCVerifier(qc_dir)
+    manifest = verifier.manifest
+    manifest.version = qc_script_version
+    qc_jobs = []
     for sample in samples:
         print "Checking/setting up for sample '%s'" % sample.name
         for fq in sample.fastq:
-            if sample.verify_qc(qc_dir,fq):
+            if verifier.verify(fq):
                 print "-- %s: QC ok" % fq
+                if fq not in manifest:
+                    manifest.add(fq)
             else:
+                if manifest.is_stale(fq):
+                    print "-- %s: Fastq has changed, removing old QC " \
+                        "outputs" % fq
+                    manifest.clear_outputs(fq)
                 print "-- %s: setting up QC" % fq
                 qc_cmd = Command('illumina_qc.sh',fq)
                 if args.nthreads > 1:
@@ -211,27 +233,35 @@ if __name__ == "__main__":
                                                    os.path.basename(fq)),
                                    log_dir=log_dir)
                 print "Job: %s" % job
+                qc_jobs.append((manifest,fq,job))
+    # Update the QC manifest with Fastqs which were already
+    # verified
+    manifest.save()
     # Wait for the scheduler to run all jobs
     sched.wait()
     sched.stop()
+    # Update the QC manifest for Fastqs which completed QC
+    # successfully
+    update_qc_manifests(qc_jobs)
 
     # Verify the QC
     announce("Verifying QC")
-    qc_ok = True
+    verifier.refresh()
+    fastqs = []
     for sample in samples:
-        for fq in sample.fastq:
-            if not sample.verify_qc(qc_dir,fq):
-                qc_ok = False
-                logger.warning("-- %s: QC failed" %
-                               os.path.basename(fq))
-                present,missing = check_qc_outputs(fq,qc_dir)
-                for output in missing:
-                    logger.warning("   %s: missing" % output)
+        fastqs.extend(sample.fastq)
+    missing_outputs = verifier.missing_outputs(fastqs)
+    qc_ok = (not missing_outputs)
+    for fq in missing_outputs:
+        logger.warning("-- %s: QC failed" % os.path.basename(fq))
+        for output in missing_outputs[fq]:
+            logger.warning("   %s: missing" % output)
     if not qc_ok:
         logger.error("QC failed (see warnings above)")
     else:
         print "QC ok: generating report"
         project.qc_report(report_html=out_file,
                           qc_dir=qc_dir,
-                          force=True)
+                          force=True,
+                          nprocessors=args.nthreads)
 
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+#     verify_manifest.py: check directory contents against manifest
+#     Copyright (C) University of Manchester 2018 Peter Briggs
+#
+"""
+verify_manifest.py
+
+Utility to check the files in a directory (for example an analysis
+directory copied to the archive) against the checksum manifest that
+was written when it was archived.
+"""
+
+######################################################################
+# Imports
+######################################################################
+
+import sys
+import os
+import argparse
+import logging
+from auto_process_ngs.checksums import verify_manifest
+from auto_process_ngs.checksums import MANIFEST_FILE
+from auto_process_ngs.checksums import CHECKSUM_OK
+from auto_process_ngs import get_version
+
+######################################################################
+# Main
+######################################################################
+
+if __name__ == "__main__":
+    # Handle the command line
+    p = argparse.ArgumentParser(
+        description="Check the files in DIR against the checksum "
+        "manifest that was written when it was archived.")
+    p.add_argument('--version',action='version',
+                   version="%(prog)s "+get_version())
+    p.add_argument("-m","--manifest",
+                   dest="manifest_file",default=None,
+                   help="manifest file to check against (default: "
+                   "'%s' in DIR)" % MANIFEST_FILE)
+    p.add_argument("-f","--fast",action='store_true',
+                   help="only compare file sizes and modification "
+                   "times, without recomputing checksums")
+    p.add_argument("-n","--nprocessors",
+                   type=int,default=1,
+                   help="number of processors/cores available for "
+                   "computing checksums (default: 1)")
+    p.add_argument("-q","--quiet",action='store_true',
+                   help="only report files which fail verification")
+    p.add_argument("dirn",metavar="DIR",
+                   help="directory to verify")
+    args = p.parse_args()
+
+    # Set up logging
+    logging.basicConfig(format='%(levelname) 8s: %(message)s')
+
+    # Check the files
+    nfiles = 0
+    nfailed = 0
+    for relpath,status in verify_manifest(args.dirn,
+                                          manifest_file=args.manifest_file,
+                                          fast=args.fast,
+                                          nprocessors=args.nprocessors):
+        nfiles += 1
+        if status != CHECKSUM_OK:
+            nfailed += 1
+        elif args.quiet:
+            continue
+        print "%s: %s" % (status,relpath)
+    print "Checked %d files: %d failed" % (nfiles,nfailed)
+    if nfailed:
+        sys.exit(1)
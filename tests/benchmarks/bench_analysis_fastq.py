@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#
+#     bench_analysis_fastq.py: benchmark parsing of Fastq names
+#     Copyright (C) University of Manchester 2018 Peter Briggs
+#
+"""
+Benchmark creation of AnalysisFastq instances from Fastq names
+
+Generates sets of realistic Fastq names and reports the time
+taken to create AnalysisFastq instances for them, first with an
+empty name cache (so every name is parsed) and then repeatedly
+with the cache populated (as happens when the same Fastqs are
+processed by 'populate', 'run_qc', 'publish_qc' etc).
+
+The name sets are:
+
+- 'illumina': bcl2fastq2 Fastqs for multiple lanes (e.g.
+  'PJB1_S1_L001_R1_001.fastq.gz')
+- 'casava': CASAVA/bcl2fastq 1.8 Fastqs with dual-index
+  barcodes (e.g. 'PJB1_ACAGTG-GTTCAC_L001_R1_001.fastq.gz')
+- '10x': 10xGenomics Fastqs including index reads (e.g.
+  'PJB1_S1_L001_I1_001.fastq.gz')
+- 'icell8': ICELL8-style per-barcode Fastqs (e.g.
+  'ICELL8.AAACCGTTGCA.r1.fastq.gz')
+
+Usage:
+
+    python bench_analysis_fastq.py [--fastqs N] [--repeats N]
+"""
+
+########################################################################
+# Imports
+#######################################################################
+
+import argparse
+import time
+from auto_process_ngs.utils import AnalysisFastq
+from auto_process_ngs.utils import clear_fastq_name_cache
+
+#######################################################################
+# Functions
+#######################################################################
+
+def barcode(i,length=11):
+    """
+    Return a unique barcode sequence for an integer
+    """
+    seq = []
+    for j in xrange(length):
+        seq.append("ACGT"[i%4])
+        i = i/4
+    return ''.join(seq)
+
+def illumina_fastqs(nfastqs):
+    """
+    Return bcl2fastq2-style Fastq names over 4 lanes
+    """
+    fastqs = []
+    i = 0
+    while len(fastqs) < nfastqs:
+        i += 1
+        for lane in (1,2,3,4):
+            for read in (1,2):
+                fastqs.append("/data/PJB/PJB%d_S%d_L%03d_R%d_001.fastq.gz" %
+                              (i,i,lane,read))
+    return fastqs[:nfastqs]
+
+def casava_fastqs(nfastqs):
+    """
+    Return CASAVA-style Fastq names with dual-index barcodes
+    """
+    fastqs = []
+    i = 0
+    while len(fastqs) < nfastqs:
+        i += 1
+        for read in (1,2):
+            fastqs.append("/data/PJB/PJB%d_%s-%s_L001_R%d_001.fastq.gz" %
+                          (i,barcode(i,6),barcode(i+1,6),read))
+    return fastqs[:nfastqs]
+
+def tenx_fastqs(nfastqs):
+    """
+    Return 10xGenomics-style Fastq names with index reads
+    """
+    fastqs = []
+    i = 0
+    while len(fastqs) < nfastqs:
+        i += 1
+        for read in ('I1','R1','R2'):
+            fastqs.append("/data/PJB/PJB%d_S%d_L001_%s_001.fastq.gz" %
+                          (i,i,read))
+    return fastqs[:nfastqs]
+
+def icell8_fastqs(nfastqs):
+    """
+    Return ICELL8-style per-barcode Fastq names
+    """
+    fastqs = []
+    for i in xrange(nfastqs/2):
+        for read in (1,2):
+            fastqs.append("/data/ICELL8/ICELL8.%s.r%d.fastq.gz" %
+                          (barcode(i),read))
+    return fastqs
+
+def timed(name,func,*args):
+    """
+    Run a function and report the time taken
+    """
+    start = time.time()
+    result = func(*args)
+    print "%-32s %8.3fs" % (name,time.time()-start)
+    return result
+
+def benchmark(name,fastqs,repeats):
+    """
+    Run the benchmarks for a set of Fastq names
+    """
+    print "%s: %d Fastqs" % (name,len(fastqs))
+    clear_fastq_name_cache()
+    timed("parse (empty cache)",
+          lambda: [AnalysisFastq(fq) for fq in fastqs])
+    timed("parse (cached) x%d" % repeats,
+          lambda: [[AnalysisFastq(fq) for fq in fastqs]
+                   for i in xrange(repeats)])
+    print ""
+
+#######################################################################
+# Main program
+#######################################################################
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(
+        description="Benchmark parsing of Fastq names by "
+        "AnalysisFastq")
+    p.add_argument("--fastqs",action='store',type=int,default=50000,
+                   help="number of Fastq names in each set "
+                   "(default: 50000)")
+    p.add_argument("--repeats",action='store',type=int,default=4,
+                   help="number of times to reparse each set once "
+                   "the names are cached (default: 4)")
+    args = p.parse_args()
+    benchmark('illumina',illumina_fastqs(args.fastqs),args.repeats)
+    benchmark('casava',casava_fastqs(args.fastqs),args.repeats)
+    benchmark('10x',tenx_fastqs(args.fastqs),args.repeats)
+    benchmark('icell8',icell8_fastqs(args.fastqs),args.repeats)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+#     bench_analysis_project.py: benchmark loading of AnalysisProjects
+#     Copyright (C) University of Manchester 2018 Peter Briggs
+#
+"""
+Benchmark loading and querying AnalysisProjects with many Fastqs
+
+Creates mock project directories using 'MockAnalysisProject' and
+reports the time taken to load each project and to look up its
+samples by name, by pattern and by read number.
+
+Two layouts are used:
+
+- 'samples': one R1/R2 pair of Illumina-style Fastqs per sample
+  (e.g. 'S1_S1_R1_001.fastq.gz')
+- 'icell8': ICELL8-style per-barcode Fastqs which all belong to
+  a single sample (e.g. 'ICELL8.AAACCGTTGCA.r1.fastq.gz')
+
+Usage:
+
+    python bench_analysis_project.py [--fastqs N]
+"""
+
+########################################################################
+# Imports
+#######################################################################
+
+import argparse
+import tempfile
+import shutil
+import time
+import os
+from auto_process_ngs.mock import MockAnalysisProject
+from auto_process_ngs.utils import AnalysisProject
+
+#######################################################################
+# Functions
+#######################################################################
+
+def barcode(i,length=11):
+    """
+    Return a unique barcode sequence for an integer
+    """
+    seq = []
+    for j in xrange(length):
+        seq.append("ACGT"[i%4])
+        i = i/4
+    return ''.join(seq)
+
+def sample_fastqs(nfastqs):
+    """
+    Return Illumina-style Fastq names for R1/R2 pairs
+    """
+    fastqs = []
+    for i in xrange(1,nfastqs/2+1):
+        for read in (1,2):
+            fastqs.append("S%d_S%d_R%d_001.fastq.gz" % (i,i,read))
+    return fastqs
+
+def icell8_fastqs(nfastqs):
+    """
+    Return ICELL8-style per-barcode Fastq names for R1/R2 pairs
+    """
+    fastqs = []
+    for i in xrange(nfastqs/2):
+        for read in (1,2):
+            fastqs.append("ICELL8.%s.r%d.fastq.gz" % (barcode(i),read))
+    return fastqs
+
+def timed(name,func,*args):
+    """
+    Run a function and report the time taken
+    """
+    start = time.time()
+    result = func(*args)
+    print "%-32s %8.3fs" % (name,time.time()-start)
+    return result
+
+def benchmark(layout,fastqs,wd):
+    """
+    Run the benchmarks for a project with the supplied Fastqs
+    """
+    print "%s: %d Fastqs" % (layout,len(fastqs))
+    MockAnalysisProject(layout,fastqs).create(top_dir=wd)
+    dirn = os.path.join(wd,layout)
+    project = timed("load project",
+                    lambda: AnalysisProject(layout,dirn))
+    samples = timed("assemble samples",
+                    lambda: project.samples)
+    print "%-32s %8d" % ("number of samples",len(samples))
+    names = [s.name for s in samples]
+    timed("get_sample (all samples)",
+          lambda: [project.get_sample(name) for name in names])
+    timed("get_samples (exact names)",
+          lambda: [project.get_samples(name) for name in names[:100]])
+    timed("get_samples (patterns)",
+          lambda: [project.get_samples("%s*" % name[:2])
+                   for name in names[:100]])
+    timed("fastq_subset (R1 and R2)",
+          lambda: [(s.fastq_subset(read_number=1),
+                    s.fastq_subset(read_number=2)) for s in samples])
+    timed("multiple_fastqs",
+          lambda: project.multiple_fastqs)
+    print ""
+
+#######################################################################
+# Main program
+#######################################################################
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(
+        description="Benchmark loading of AnalysisProjects with "
+        "large numbers of Fastqs")
+    p.add_argument("--fastqs",action='store',type=int,default=10000,
+                   help="number of Fastqs to put in each project "
+                   "(default: 10000)")
+    args = p.parse_args()
+    wd = tempfile.mkdtemp(suffix='.bench_analysis_project')
+    try:
+        benchmark('samples',sample_fastqs(args.fastqs),wd)
+        benchmark('icell8',icell8_fastqs(args.fastqs),wd)
+    finally:
+        shutil.rmtree(wd)